@@ -17,7 +17,7 @@
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
 import os
-from git2sc.git2sc import Git2SC
+import sys
 from git2sc.cli import load_parser
 
 
@@ -36,7 +36,89 @@ def main():
         print('GIT2SC_AUTH environmental variable not set')
         return
 
-    g = Git2SC(api_url, auth, args.space)
+    # The modules that load requests and pypandoc are imported once the
+    # arguments are valid, so the completion, the help and the errors of the
+    # command line don't wait for them
+    from git2sc.git2sc import Git2SC
+    from git2sc.cache import RenderCache
+    from git2sc.metrics import SyncMetrics
+    from git2sc.state import SyncState
+    from git2sc.tracing import Tracer
+    from git2sc.profiling import profile
+
+    cache = None
+    if args.cache_dir is not None:
+        cache = RenderCache(args.cache_dir, args.cache_size * 1024 * 1024)
+    tracer = Tracer(args.trace)
+
+    def new_git2sc(space, **shared):
+        '''Build the Git2SC instance of a space with the arguments, shared
+        are the pools shared with other instances'''
+
+        state = None
+        if args.state is not None:
+            state = SyncState(args.state, space)
+
+        return Git2SC(
+            api_url,
+            auth,
+            space,
+            pool_size=args.pool_size,
+            timeout=args.timeout,
+            keep_alive=args.keep_alive,
+            page_size=args.page_size,
+            fetch_concurrency=args.fetch_concurrency,
+            state=state,
+            max_retries=args.max_retries,
+            backoff=args.backoff,
+            adoc_workers=args.adoc_workers,
+            convert_workers=args.convert_workers,
+            upload_workers=args.upload_workers,
+            cache=cache,
+            tracer=tracer,
+            **shared
+        )
+
+    if args.subcommand == 'batch':
+        # The batch builds the instances of the spaces of its targets, its
+        # metrics are the sum of theirs
+        g = None
+        metrics = SyncMetrics()
+    else:
+        g = new_git2sc(args.space)
+        metrics = g.metrics
+
+    try:
+        with profile(
+            args.profile,
+            args.profile_dir,
+            'git2sc-{}'.format(args.subcommand),
+            args.profile_top,
+        ) as reports, tracer.span(
+            'git2sc {}'.format(args.subcommand),
+            space=args.space,
+        ):
+            if g is None:
+                run_batch(args, new_git2sc, auth, metrics)
+            else:
+                run_subcommand(g, args, new_git2sc)
+        for report in reports:
+            print_report(args, 'Profile written to {}'.format(report))
+    finally:
+        if args.metrics is not None:
+            metrics.write_json(args.metrics)
+        if args.prometheus is not None:
+            metrics.write_prometheus(args.prometheus)
+        if g is not None:
+            g.close()
+        tracer.close()
+
+
+def run_subcommand(g, args, new_git2sc=None):
+    '''Run the subcommand of the arguments with the Git2SC instance,
+    new_git2sc builds the instances of other spaces'''
+
+    from git2sc.git2sc import TooManyDeletions
 
     if args.subcommand == 'article':
         if args.article_command == 'delete':
@@ -52,9 +134,144 @@ def main():
                 g.create_page(args.title, html, args.parent_id)
 
     elif args.subcommand == 'upload':
-        g.directory_full_upload(args.path, args.exclude, args.parent_id)
+        if args.plan:
+            print(g.plan_full_upload(args.path, args.exclude, args.parent_id))
+        else:
+            g.directory_full_upload(
+                args.path,
+                args.exclude,
+                args.parent_id,
+                args.jobs,
+            )
     elif args.subcommand == 'sync':
-        g.directory_update(args.path, args.exclude)
+        incremental = args.incremental or args.since is not None
+        if args.plan and incremental:
+            print('--plan is not supported by the incremental sync')
+        elif args.plan:
+            print(g.plan_update(args.path, args.exclude))
+        else:
+            try:
+                if incremental:
+                    g.directory_incremental_update(
+                        args.path,
+                        args.exclude,
+                        since=args.since,
+                        jobs=args.jobs,
+                        max_deletes=args.max_deletes,
+                    )
+                else:
+                    g.directory_update(
+                        args.path,
+                        args.exclude,
+                        jobs=args.jobs,
+                        max_deletes=args.max_deletes,
+                    )
+            except TooManyDeletions as error:
+                print(error)
+                sys.exit(1)
+    elif args.subcommand == 'watch':
+        print('Watching {}, press Ctrl+C to stop'.format(args.path))
+        try:
+            g.directory_watch(
+                args.path,
+                args.exclude,
+                jobs=args.jobs,
+                max_deletes=args.max_deletes,
+                debounce=args.debounce,
+                max_delay=args.max_delay,
+            )
+        except TooManyDeletions as error:
+            print(error)
+            sys.exit(1)
+        except KeyboardInterrupt:
+            pass
+    elif args.subcommand == 'serve':
+        serve(g, args, new_git2sc)
+
+    if args.subcommand in ('upload', 'sync', 'watch'):
+        print_report(args, g.transport.stats.summary())
+
+
+def print_report(args, report):
+    '''Print a report of the run, to the standard error if the metrics are
+    written to the standard output so they stay valid json'''
+
+    if args.metrics == '-':
+        print(report, file=sys.stderr)
+    else:
+        print(report)
+
+
+def serve(g, args, new_git2sc):
+    '''Serve the push webhooks until the server is interrupted'''
+
+    from git2sc.server import SyncService, WebhookServer
+
+    service = SyncService(
+        new_git2sc,
+        args.workers,
+        args.exclude,
+        instances={args.space: g},
+        allowed_paths=args.allowed_path,
+    ).start()
+    server = WebhookServer(
+        service,
+        args.host,
+        args.port,
+        token=os.environ.get('GIT2SC_WEBHOOK_TOKEN'),
+        default_space=args.space,
+    )
+    print('Serving the webhooks on {}/sync, press Ctrl+C to stop'.format(
+        server.url,
+    ))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server.server_close()
+        service.stop()
+
+
+def run_batch(args, new_git2sc, auth, metrics):
+    '''Sync the targets of the batch configuration sharing the connections,
+    the request budget and the conversion workers, the metrics of the syncs
+    are added to metrics. It exits with an error if a target failed'''
+
+    from functools import partial
+    from git2sc.batch import BatchRunner, ConfigError, SharedPools, \
+        format_results, load_config
+
+    try:
+        targets = load_config(
+            args.config,
+            args.space,
+            args.state is not None,
+        )
+    except ConfigError as error:
+        print(error)
+        return
+
+    pools = SharedPools(
+        tuple(auth.split(':')),
+        args.pool_size,
+        args.keep_alive,
+        args.rate,
+        args.convert_workers,
+        args.adoc_workers,
+    )
+    try:
+        results = BatchRunner(
+            partial(new_git2sc, **pools.git2sc_arguments()),
+            targets,
+            args.parallel,
+            metrics,
+        ).run()
+    finally:
+        pools.close()
+    print_report(args, format_results(results))
+    if any(result.status != 'ok' for result in results):
+        sys.exit(1)
 
 
 if __name__ == "__main__":
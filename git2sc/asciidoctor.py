@@ -0,0 +1,145 @@
+import json
+import queue
+import threading
+import subprocess
+
+# Ruby program of the workers: it loads asciidoctor once and then renders the
+# files it receives, one json request per line, as the asciidoctor command
+# line does with `-b xhtml -o -`.
+WORKER_SCRIPT = '''
+require 'json'
+require 'asciidoctor'
+
+$stdout.sync = true
+$stdin.each_line do |line|
+  request = JSON.parse(line)
+  begin
+    html = Asciidoctor.convert_file(
+      request['path'],
+      backend: 'xhtml',
+      safe: :unsafe,
+      standalone: true,
+      header_footer: true,
+      to_file: false,
+    )
+    $stdout.puts JSON.generate({'html' => html})
+  rescue StandardError, ScriptError => error
+    $stdout.puts JSON.generate({'error' => error.message})
+  end
+end
+'''
+
+
+class AsciidoctorError(Exception):
+    pass
+
+
+class AsciidoctorWorker():
+    '''Long lived ruby process that renders AsciiDoc files to html, so the
+    interpreter and the asciidoctor gem are loaded only once'''
+
+    def __init__(self, ruby='ruby'):
+        self.process = subprocess.Popen(
+            [ruby, '-e', WORKER_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            shell=False,
+            universal_newlines=True,
+        )
+
+    def convert(self, adoc_file_path):
+        '''Takes a path to an adoc file and returns it rendered as html'''
+
+        try:
+            self.process.stdin.write(
+                json.dumps({'path': adoc_file_path}) + '\n'
+            )
+            self.process.stdin.flush()
+            line = self.process.stdout.readline()
+        except (BrokenPipeError, OSError):
+            line = ''
+        if not line:
+            raise AsciidoctorError('The asciidoctor worker died')
+
+        response = json.loads(line)
+        if 'error' in response:
+            raise AsciidoctorError('Error converting {}: {}'.format(
+                adoc_file_path,
+                response['error'],
+            ))
+        return response['html']
+
+    def is_alive(self):
+        '''Test if the worker process is still running'''
+
+        return self.process.poll() is None
+
+    def close(self):
+        '''Stop the worker process'''
+
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.process.stdout.close()
+
+
+class AsciidoctorPool():
+    '''Pool of asciidoctor workers shared by the threads that render AsciiDoc
+    files, the workers are started on demand up to size'''
+
+    def __init__(self, size=1, ruby='ruby'):
+        self.size = size
+        self.ruby = ruby
+        self._idle = queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        '''Get an idle worker, starting a new one if the pool isn't full'''
+
+        while True:
+            with self._lock:
+                if self._idle.empty() and len(self._workers) < self.size:
+                    worker = AsciidoctorWorker(self.ruby)
+                    self._workers.append(worker)
+                    return worker
+            worker = self._idle.get()
+            if worker is not None:
+                return worker
+
+    def _release(self, worker):
+        '''Return a worker to the pool, the dead ones are dropped and the
+        threads waiting for a worker are woken up to start a new one'''
+
+        if worker.is_alive():
+            self._idle.put(worker)
+            return
+        with self._lock:
+            self._workers.remove(worker)
+        worker.close()
+        self._idle.put(None)
+
+    def convert(self, adoc_file_path):
+        '''Takes a path to an adoc file and returns it rendered as html by
+        one of the workers of the pool'''
+
+        worker = self._acquire()
+        try:
+            return worker.convert(adoc_file_path)
+        finally:
+            self._release(worker)
+
+    def close(self):
+        '''Stop all the workers of the pool'''
+
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.close()
+        self._idle = queue.Queue()
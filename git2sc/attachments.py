@@ -0,0 +1,278 @@
+import os
+import re
+import uuid
+import hashlib
+import mimetypes
+import threading
+from functools import partial
+from html import escape, unescape
+from urllib.parse import unquote, urlsplit
+
+# Number of characters of the sha256 of a file that prefix the name of its
+# attachment, so a changed file gets a new attachment and an unchanged one is
+# never uploaded again
+DIGEST_LENGTH = 16
+
+IMAGE_TAG = re.compile(r'<img\b[^>]*>', re.IGNORECASE)
+LINK_TAG = re.compile(r'<a\b([^>]*)>(.*?)</a>', re.IGNORECASE | re.DOTALL)
+TAG_ATTRIBUTE = re.compile(r'([\w:-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+
+# References to other files in the sources of the documents: html attributes,
+# markdown links and images and asciidoc images and links
+SOURCE_REFERENCE = re.compile(
+    r'(?:src|href)\s*=\s*["\']([^"\']+)["\']'
+    r'|\]\(\s*<?([^)\s>]+)'
+    r'|image::?([^\[\s]+)\['
+    r'|link:([^\[\s]+)\['
+)
+
+ATTACHMENT_REFERENCE = re.compile(
+    r'ri:filename="([0-9a-f]{{{}}}-[^"]+)"'.format(DIGEST_LENGTH)
+)
+
+
+def file_digest(path):
+    '''Returns the sha256 of the content of a file, read in chunks'''
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(partial(f.read, 65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _attributes(tag):
+    '''Returns the attributes of an html tag'''
+
+    return {
+        name.lower(): unescape(double if double is not None else single)
+        for name, double, single in TAG_ATTRIBUTE.findall(tag)
+    }
+
+
+class Attachments():
+    '''Local files referenced by the documents, to be uploaded as attachments
+    of their pages.
+
+    Each attachment is named after the digest of its content and the name of
+    its file, so the name of an attachment always identifies the same content
+    and a page only needs the ones it doesn't have. The references are only
+    followed to files inside the root of the synced tree that aren't
+    documents, whose extensions are document_extensions.
+    '''
+
+    def __init__(self, document_extensions=()):
+        self.document_extensions = set(document_extensions)
+        self.sources = {}
+        self._digests = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, reference, document_path, root=None, exists=True):
+        '''Returns the path of the local file a reference of a document
+        points to, or None if it's not an attachable file. The references
+        are relative to the document, and they can't leave root, which is
+        the directory of the document by default. If exists is False the
+        file may not exist'''
+
+        url = urlsplit(reference.strip())
+        if url.scheme or url.netloc or not url.path or \
+                url.path.startswith('/'):
+            return None
+        document_directory = os.path.dirname(os.path.abspath(document_path))
+        path = os.path.realpath(
+            os.path.join(document_directory, unquote(url.path))
+        )
+        root = os.path.realpath(root or document_directory)
+        if os.path.commonpath([path, root]) != root or \
+                os.path.splitext(path)[1] in self.document_extensions or \
+                (exists and not os.path.isfile(path)):
+            return None
+        return path
+
+    def digest(self, path):
+        '''Returns the digest of a file, it's only computed again when the
+        file changes'''
+
+        stat = os.stat(path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._digests.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        digest = file_digest(path)
+        with self._lock:
+            self._digests[path] = (key, digest)
+        return digest
+
+    def name(self, path):
+        '''Returns the name of the attachment of a file and registers it as
+        its source'''
+
+        name = '{}-{}'.format(
+            self.digest(path)[:DIGEST_LENGTH],
+            os.path.basename(path),
+        )
+        with self._lock:
+            self.sources[name] = path
+        return name
+
+    def references(self, document_path, root=None, exists=True):
+        '''Returns the attachable files referenced by the source of a
+        document, if exists is False the ones that don't exist too'''
+
+        try:
+            with open(document_path, 'rb') as f:
+                source = f.read().decode(errors='replace')
+        except OSError:
+            return []
+
+        paths = []
+        for match in SOURCE_REFERENCE.finditer(source):
+            reference = next(group for group in match.groups() if group)
+            path = self.resolve(
+                unescape(reference),
+                document_path,
+                root,
+                exists,
+            )
+            if path is not None and path not in paths:
+                paths.append(path)
+        return paths
+
+    def referencing(self, document_paths, file_paths, root=None):
+        '''Returns the documents whose sources reference any of the files,
+        which may have been deleted'''
+
+        file_paths = {os.path.realpath(path) for path in file_paths}
+        return [
+            document_path
+            for document_path in document_paths
+            if file_paths.intersection(
+                self.references(document_path, root, exists=False)
+            )
+        ]
+
+    def rewrite(self, html, document_path, root=None):
+        '''Returns the html of a document with its images and links to local
+        files replaced by references to the attachments of its page'''
+
+        # Most documents don't reference any file
+        if '<img' not in html and '<a' not in html:
+            return html
+
+        def image(match):
+            attributes = _attributes(match.group(0))
+            path = self.resolve(
+                attributes.get('src', ''),
+                document_path,
+                root,
+            )
+            if path is None:
+                return match.group(0)
+            options = ''.join(
+                ' ac:{}="{}"'.format(name, escape(attributes[name]))
+                for name in ['alt', 'title', 'width', 'height']
+                if name in attributes
+            )
+            return '<ac:image{}><ri:attachment ri:filename="{}" />' \
+                '</ac:image>'.format(options, escape(self.name(path)))
+
+        def link(match):
+            attributes = _attributes('<a {}>'.format(match.group(1)))
+            path = self.resolve(
+                attributes.get('href', ''),
+                document_path,
+                root,
+            )
+            if path is None:
+                return match.group(0)
+            return '<ac:link><ri:attachment ri:filename="{}" />' \
+                '<ac:link-body>{}</ac:link-body></ac:link>'.format(
+                    escape(self.name(path)),
+                    match.group(2),
+                )
+
+        return LINK_TAG.sub(link, IMAGE_TAG.sub(image, html))
+
+    def names(self, html):
+        '''Returns the names of the attachments referenced by an html that
+        have a known source'''
+
+        names = []
+        for name in ATTACHMENT_REFERENCE.findall(html):
+            name = unescape(name)
+            with self._lock:
+                known = name in self.sources
+            if known and name not in names:
+                names.append(name)
+        return names
+
+
+class MultipartBody():
+    '''multipart/form-data body with a file, read from disk as it's sent so
+    the file is never loaded in memory. It can be read again after a seek to
+    the start, for the retries'''
+
+    def __init__(self, f, filename, fields=None, field_name='file'):
+        self.boundary = uuid.uuid4().hex
+        head = ''.join(
+            '--{}\r\nContent-Disposition: form-data; name="{}"\r\n\r\n'
+            '{}\r\n'.format(self.boundary, name, value)
+            for name, value in (fields or {}).items()
+        )
+        head += '--{}\r\nContent-Disposition: form-data; name="{}"; ' \
+            'filename="{}"\r\nContent-Type: {}\r\n\r\n'.format(
+                self.boundary,
+                field_name,
+                filename.replace('"', '%22'),
+                mimetypes.guess_type(filename)[0] or
+                'application/octet-stream',
+            )
+        self._head = head.encode()
+        self._tail = '\r\n--{}--\r\n'.format(self.boundary).encode()
+        self._file = f
+        self._file_start = f.tell()
+        self._file_size = os.fstat(f.fileno()).st_size - self._file_start
+        self._position = 0
+
+    @property
+    def content_type(self):
+        return 'multipart/form-data; boundary={}'.format(self.boundary)
+
+    def __len__(self):
+        return len(self._head) + self._file_size + len(self._tail)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += len(self)
+        self._position = offset
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = len(self) - self._position
+        chunks = []
+        while size > 0 and self._position < len(self):
+            chunk = self._read_part(size)
+            chunks.append(chunk)
+            size -= len(chunk)
+            self._position += len(chunk)
+        return b''.join(chunks)
+
+    def _read_part(self, size):
+        '''Read up to size bytes of the part at the current position'''
+
+        position = self._position
+        if position < len(self._head):
+            return self._head[position:position + size]
+        position -= len(self._head)
+        if position < self._file_size:
+            self._file.seek(self._file_start + position)
+            return self._file.read(min(size, self._file_size - position))
+        position -= self._file_size
+        return self._tail[position:position + size]
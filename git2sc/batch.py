@@ -0,0 +1,327 @@
+import os
+import time
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+from git2sc.asciidoctor import AsciidoctorPool
+from git2sc.git2sc import build_session
+from git2sc.metrics import PAGE_OPERATIONS, SyncMetrics
+from git2sc.transport import AdaptiveLimiter, RateLimiter
+
+DEFAULT_EXCLUDE = ['.git', '.gitignore', '.gitmodules']
+
+TARGET_OPTIONS = {
+    'space',
+    'path',
+    'parent_id',
+    'exclude',
+    'incremental',
+    'jobs',
+    'max_deletes',
+}
+
+
+class ConfigError(Exception):
+    pass
+
+
+class BatchTarget():
+    '''Directory to sync to a space, and the options of its sync'''
+
+    def __init__(
+        self,
+        space,
+        path,
+        parent_id=None,
+        exclude=DEFAULT_EXCLUDE,
+        incremental=False,
+        jobs=1,
+        max_deletes=None,
+    ):
+        self.space = space
+        self.path = os.path.normpath(path)
+        self.parent_id = parent_id
+        self.exclude = list(exclude)
+        self.incremental = incremental
+        self.jobs = jobs
+        self.max_deletes = max_deletes
+
+
+class TargetResult():
+    '''Outcome of the sync of a target'''
+
+    def __init__(self, target, status, duration, pages, error=None):
+        self.target = target
+        self.status = status
+        self.duration = duration
+        self.pages = pages
+        self.error = error
+
+
+def load_config(config_path, default_space=None, sync_state=False):
+    '''Load the targets of a batch from a yaml file like:
+
+        defaults:
+          exclude: [.git, .gitignore, .gitmodules]
+          jobs: 4
+        targets:
+          - space: DOC
+            path: /srv/repos/docs
+            parent_id: '1234'
+
+    The defaults apply to all the targets, and the relative paths are
+    relative to the directory of the file. The targets without space are
+    synced to default_space. sync_state tells if the syncs use a sync state.
+    '''
+
+    try:
+        import yaml
+    except ImportError:
+        raise ConfigError('PyYAML is needed to read the batch configuration')
+
+    with open(config_path) as f:
+        try:
+            config = yaml.safe_load(f)
+        except yaml.YAMLError as error:
+            raise ConfigError('Invalid yaml in {}: {}'.format(
+                config_path,
+                error,
+            ))
+
+    if not isinstance(config, dict) or \
+            not isinstance(config.get('targets'), list):
+        raise ConfigError('{} has no list of targets'.format(config_path))
+    defaults = config.get('defaults') or {}
+    if not isinstance(defaults, dict):
+        raise ConfigError('The defaults of {} are not a mapping'.format(
+            config_path,
+        ))
+
+    base_path = os.path.dirname(os.path.abspath(config_path))
+    targets = []
+    for position, entry in enumerate(config['targets'], 1):
+        if not isinstance(entry, dict):
+            raise ConfigError('The target {} is not a mapping'.format(
+                position,
+            ))
+        options = dict(defaults, **entry)
+        unknown_options = set(options) - TARGET_OPTIONS
+        if unknown_options:
+            raise ConfigError('Unknown options {} in the target {}'.format(
+                ', '.join(sorted(unknown_options)),
+                position,
+            ))
+        options.setdefault('space', default_space)
+        if not options['space'] or not options.get('path'):
+            raise ConfigError('The target {} needs a space and a path'.format(
+                position,
+            ))
+        if options.get('parent_id') is not None:
+            options['parent_id'] = str(options['parent_id'])
+        options['space'] = str(options['space'])
+        options['path'] = os.path.join(base_path, str(options['path']))
+        targets.append(BatchTarget(**options))
+    check_targets(targets, sync_state)
+    return targets
+
+
+def check_targets(targets, sync_state=False):
+    '''Raise ConfigError if the targets of a space can delete or overwrite
+    the pages of each other.
+
+    A target without parent_id owns the whole space, the titles of the pages
+    are unique in a space, and the paths of a sync state are relative to the
+    directory of each target, so the targets that share a space need a
+    parent_id, directories with different names and no sync state.
+    '''
+
+    spaces = collections.OrderedDict()
+    for target in targets:
+        spaces.setdefault(target.space, []).append(target)
+
+    for space, space_targets in spaces.items():
+        if len(space_targets) == 1:
+            continue
+        if sync_state:
+            raise ConfigError(
+                'The targets of the space {} can\'t share a sync state'.format(
+                    space,
+                )
+            )
+        names = set()
+        for target in space_targets:
+            if target.parent_id is None:
+                raise ConfigError(
+                    'The target {} needs a parent_id, the space {} has '
+                    'several targets'.format(target.path, space)
+                )
+            name = os.path.basename(target.path)
+            if name in names:
+                raise ConfigError(
+                    'The targets of the space {} have several directories '
+                    'named {}'.format(space, name)
+                )
+            names.add(name)
+
+
+class SharedPools():
+    '''Connections, request budget and conversion workers shared by the
+    Git2SC instances of a batch.
+
+    The pool_size connections and concurrent requests, and the rate requests
+    per second if set, are the budget of the whole batch instead of each
+    space.
+    '''
+
+    def __init__(
+        self,
+        auth,
+        pool_size=10,
+        keep_alive=True,
+        rate=None,
+        convert_workers=1,
+        adoc_workers=0,
+    ):
+        self.session = build_session(auth, pool_size, keep_alive)
+        self.limiter = AdaptiveLimiter(pool_size)
+        self.rate_limiter = None
+        if rate is not None:
+            self.rate_limiter = RateLimiter(rate)
+        self.convert_executor = ThreadPoolExecutor(
+            max_workers=convert_workers,
+        )
+        self.asciidoctor = None
+        if adoc_workers > 0:
+            self.asciidoctor = AsciidoctorPool(adoc_workers)
+
+    def git2sc_arguments(self):
+        '''Returns the keyword arguments that make a Git2SC use the pools'''
+
+        return {
+            'session': self.session,
+            'limiter': self.limiter,
+            'rate_limiter': self.rate_limiter,
+            'convert_executor': self.convert_executor,
+            'asciidoctor': self.asciidoctor,
+        }
+
+    def close(self):
+        self.session.close()
+        self.convert_executor.shutdown(wait=True)
+        if self.asciidoctor is not None:
+            self.asciidoctor.close()
+
+
+class BatchRunner():
+    '''Syncs the targets of a batch, workers spaces at a time.
+
+    The targets of the same space are synced one after the other with the
+    same Git2SC instance, built by factory, so its inventory is fetched once.
+    The metrics of the instances are added to metrics.
+    '''
+
+    def __init__(self, factory, targets, workers=4, metrics=None):
+        self.factory = factory
+        self.targets = targets
+        self.workers = workers
+        self.metrics = metrics if metrics is not None else SyncMetrics()
+
+    def _run_target(self, g, target):
+        '''Sync a target with the instance of its space, returns its
+        result'''
+
+        before = dict(g.metrics.pages)
+        started = time.perf_counter()
+        status, error = 'ok', None
+        try:
+            if target.incremental:
+                g.directory_incremental_update(
+                    target.path,
+                    target.exclude,
+                    target.parent_id,
+                    jobs=target.jobs,
+                    max_deletes=target.max_deletes,
+                )
+            else:
+                g.directory_update(
+                    target.path,
+                    target.exclude,
+                    target.parent_id,
+                    target.jobs,
+                    target.max_deletes,
+                )
+        except Exception as exception:
+            status = 'failed'
+            error = '{}: {}'.format(type(exception).__name__, exception)
+        pages = {
+            operation: g.metrics.pages[operation] - before[operation]
+            for operation in PAGE_OPERATIONS
+        }
+        return TargetResult(
+            target,
+            status,
+            time.perf_counter() - started,
+            pages,
+            error,
+        )
+
+    def _run_space(self, targets):
+        g = self.factory(targets[0].space)
+        try:
+            return [self._run_target(g, target) for target in targets]
+        finally:
+            self.metrics.merge(g.metrics)
+            g.close()
+
+    def run(self):
+        '''Sync all the targets, returns their results in the order of the
+        targets'''
+
+        spaces = collections.OrderedDict()
+        for target in self.targets:
+            spaces.setdefault(target.space, []).append(target)
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for space_results in executor.map(
+                self._run_space,
+                spaces.values(),
+            ):
+                for result in space_results:
+                    results[id(result.target)] = result
+        return [results[id(target)] for target in self.targets]
+
+
+def format_results(results):
+    '''Returns a table with the result of each target'''
+
+    lines = ['{:<12} {:<8} {:>8} {:>7} {:>7} {:>7} {:>7}  {}'.format(
+        'Space', 'Status', 'Time', 'Create', 'Update', 'Skip', 'Delete',
+        'Path',
+    )]
+    for result in results:
+        lines.append(
+            '{:<12} {:<8} {:>7.1f}s {:>7} {:>7} {:>7} {:>7}  {}'.format(
+                result.target.space,
+                result.status,
+                result.duration,
+                result.pages['create'],
+                result.pages['update'],
+                result.pages['skip'],
+                result.pages['delete'],
+                result.target.path,
+            )
+        )
+    for result in results:
+        if result.error is not None:
+            lines.append('{} {}: {}'.format(
+                result.target.space,
+                result.target.path,
+                result.error,
+            ))
+    failed = len([result for result in results if result.status != 'ok'])
+    lines.append('{} targets synced, {} failed'.format(
+        len(results) - failed,
+        failed,
+    ))
+    return '\n'.join(lines)
@@ -0,0 +1,105 @@
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+class RenderCache():
+    '''Directory of rendered html files addressed by the hash of their source
+    and converter. When the cache grows over max_size bytes, the least
+    recently used files are evicted.
+
+    The directory is only walked when the cache is opened, the order of use
+    of the files is kept in memory from then on.
+    '''
+
+    def __init__(self, directory, max_size=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        # Sizes of the cached files by path, the least recently used first
+        self._index = OrderedDict(
+            (path, size) for _, path, size in sorted(self._entries())
+        )
+        self.size = sum(self._index.values())
+
+    def _path(self, key):
+        '''Path of the file of a key, split in subdirectories by its first
+        characters to avoid huge directories'''
+
+        return os.path.join(self.directory, key[:2], '{}.html'.format(key))
+
+    def _entries(self):
+        '''Returns a list with the access time, path and size of the cached
+        files'''
+
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for file in files:
+                if not file.endswith('.html'):
+                    continue
+                path = os.path.join(root, file)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, path, stat.st_size))
+        return entries
+
+    def get(self, key):
+        '''Get the html stored with the key, or None if it's not cached'''
+
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                html = f.read()
+        except FileNotFoundError:
+            return None
+
+        with self._lock:
+            if path in self._index:
+                self._index.move_to_end(path)
+        # The modification time keeps the order of use for the next runs
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return html
+
+    def set(self, key, html):
+        '''Store the html with the key, evicting the least recently used
+        files if the cache is full'''
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = html.encode()
+
+        # Write to a temporary file first, so a concurrent reader never sees
+        # a partial file
+        descriptor, temporary_path = tempfile.mkstemp(
+            dir=os.path.dirname(path),
+            suffix='.tmp',
+        )
+        with os.fdopen(descriptor, 'wb') as f:
+            f.write(data)
+
+        with self._lock:
+            self.size -= self._index.pop(path, 0)
+            os.replace(temporary_path, path)
+            self._index[path] = len(data)
+            self.size += len(data)
+            if self.size > self.max_size:
+                self._evict()
+
+    def _evict(self):
+        '''Remove the least recently used files until the cache fits in
+        max_size'''
+
+        while self.size > self.max_size and self._index:
+            path, size = self._index.popitem(last=False)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.size -= size
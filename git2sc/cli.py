@@ -1,5 +1,5 @@
+import os
 import argparse
-import argcomplete
 
 
 def load_parser():
@@ -15,6 +15,121 @@ def load_parser():
         type=str,
         help='Confluence space id',
     )
+    parser.add_argument(
+        "--pool-size",
+        type=int,
+        default=10,
+        help='Number of pooled connections to the Confluence api',
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=30,
+        help='Seconds to wait for each Confluence api request',
+    )
+    parser.add_argument(
+        "--no-keep-alive",
+        dest='keep_alive',
+        action="store_false",
+        help="Don't reuse the connections between requests",
+    )
+    parser.add_argument(
+        "--page-size",
+        type=int,
+        default=100,
+        help='Number of pages to fetch on each request of the space inventory',
+    )
+    parser.add_argument(
+        "--fetch-concurrency",
+        type=int,
+        default=1,
+        help='Number of space inventory requests to make concurrently',
+    )
+    parser.add_argument(
+        "--state",
+        type=str,
+        default=None,
+        help='Path to the local database that maps the paths to their pages',
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=5,
+        help='Number of times to retry a throttled or failed request',
+    )
+    parser.add_argument(
+        "--backoff",
+        type=float,
+        default=0.5,
+        help='Base seconds of the exponential backoff between retries',
+    )
+    parser.add_argument(
+        "--adoc-workers",
+        type=int,
+        default=0,
+        help='Number of long lived asciidoctor processes to render the '
+        'AsciiDoc files, by default each file starts its own process',
+    )
+    parser.add_argument(
+        "--convert-workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help='Number of files to convert to html concurrently, by default '
+        'the number of cores',
+    )
+    parser.add_argument(
+        "--upload-workers",
+        type=int,
+        default=4,
+        help='Number of attachments of a page to upload concurrently',
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=None,
+        help='Directory to cache the rendered html of the files',
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=256,
+        help='Maximum size in megabytes of the rendered html cache',
+    )
+    parser.add_argument(
+        "--metrics",
+        default=None,
+        help='Write a json summary of the metrics of the run to this file, '
+        'use - for the standard output',
+    )
+    parser.add_argument(
+        "--prometheus",
+        default=None,
+        help='Write the metrics of the run to this prometheus textfile, for '
+        'the textfile collector of the node exporter',
+    )
+    parser.add_argument(
+        "--trace",
+        default=None,
+        help='Append the spans of the run to this file, as OTLP json lines',
+    )
+    parser.add_argument(
+        "--profile",
+        choices=['cpu', 'mem'],
+        default=None,
+        help='Profile the cpu time with cProfile or the memory of each phase '
+        'of the run with tracemalloc',
+    )
+    parser.add_argument(
+        "--profile-dir",
+        default='.',
+        help='Directory where the profile reports are written',
+    )
+    parser.add_argument(
+        "--profile-top",
+        type=int,
+        default=25,
+        help='Number of functions or allocations in the profile reports',
+    )
 
     subcommand_parser = parser.add_subparsers(
         dest='subcommand',
@@ -96,6 +211,18 @@ def load_parser():
         default=None,
         help="Parent id of the article to create",
     )
+    upload_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of pages to create concurrently",
+    )
+    upload_parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="Print the pages to create without touching anything",
+    )
     sync_parser = subcommand_parser.add_parser('sync')
     sync_parser.add_argument(
         "path",
@@ -109,6 +236,134 @@ def load_parser():
         default=['.git', '.gitignore', '.gitmodules'],
         help="List of directories to exclude",
     )
+    sync_parser.add_argument(
+        "--since",
+        type=str,
+        default=None,
+        help="Only sync the files changed in git since this revision",
+    )
+    sync_parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only sync the files changed in git since the last synced commit",
+    )
+    sync_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of pages to create, update or delete concurrently",
+    )
+    sync_parser.add_argument(
+        "--max-deletes",
+        type=int,
+        default=None,
+        help="Abort the sync if it would delete more than this number of "
+        "pages",
+    )
+    sync_parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="Print the pages to create, update and delete without touching "
+        "anything",
+    )
+
+    watch_parser = subcommand_parser.add_parser('watch')
+    watch_parser.add_argument(
+        "path",
+        type=str,
+        help='Path to directory',
+    )
+    watch_parser.add_argument(
+        "--exclude",
+        nargs='*',
+        default=['.git', '.gitignore', '.gitmodules'],
+        help="List of directories to exclude",
+    )
+    watch_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of pages to create, update or delete concurrently in "
+        "the first sync",
+    )
+    watch_parser.add_argument(
+        "--max-deletes",
+        type=int,
+        default=None,
+        help="Abort the full syncs if they would delete more than this "
+        "number of pages",
+    )
+    watch_parser.add_argument(
+        "--debounce",
+        type=float,
+        default=0.5,
+        help="Seconds without changes to wait before syncing them",
+    )
+    watch_parser.add_argument(
+        "--max-delay",
+        type=float,
+        default=10,
+        help="Maximum seconds to wait before syncing a burst of changes",
+    )
+
+    serve_parser = subcommand_parser.add_parser('serve')
+    serve_parser.add_argument(
+        "--host",
+        default='127.0.0.1',
+        help="Address to listen for the webhooks",
+    )
+    serve_parser.add_argument(
+        "--port",
+        type=int,
+        default=8080,
+        help="Port to listen for the webhooks",
+    )
+    serve_parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=2,
+        help="Number of spaces to sync concurrently",
+    )
+    serve_parser.add_argument(
+        "--exclude",
+        nargs='*',
+        default=['.git', '.gitignore', '.gitmodules'],
+        help="List of directories to exclude",
+    )
+    serve_parser.add_argument(
+        "--allowed-path",
+        nargs='*',
+        default=None,
+        help="Only sync the repositories under these directories",
+    )
+
+    batch_parser = subcommand_parser.add_parser('batch')
+    batch_parser.add_argument(
+        "config",
+        type=str,
+        help='Path to the yaml file with the directories and spaces to sync',
+    )
+    batch_parser.add_argument(
+        "-p",
+        "--parallel",
+        type=int,
+        default=4,
+        help="Number of spaces to sync concurrently",
+    )
+    batch_parser.add_argument(
+        "--rate",
+        type=float,
+        default=None,
+        help="Maximum requests per second to the Confluence api of the whole "
+        "batch",
+    )
 
-    argcomplete.autocomplete(parser)
+    # argcomplete only does something when the shell is completing a command
+    # line, which it announces with the _ARGCOMPLETE variable
+    if '_ARGCOMPLETE' in os.environ:
+        import argcomplete
+        argcomplete.autocomplete(parser)
     return parser
@@ -0,0 +1,88 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from git2sc.tracing import propagate
+
+
+class ConversionStage():
+    '''Converts files to html over a pool of workers ahead of the upload.
+
+    The files are converted in the order they were submitted and each result
+    is kept until it's requested, so the upload takes them as they finish.
+    At most ahead conversions, twice the workers by default, are running or
+    waiting to be requested, so the html of a large tree isn't buffered at
+    once. A file requested before its turn is converted right away.
+
+    The conversions are independent, the error of a file is only raised when
+    its result is requested. They run in the tracing context of the caller of
+    submit.
+
+    If an executor is given the conversions run in it, so its workers can be
+    shared with other stages, and it's left running on close.
+    '''
+
+    def __init__(self, convert, workers, executor=None, ahead=None):
+        self.convert = convert
+        self.ahead = ahead if ahead is not None else 2 * workers
+        self._own_executor = executor is None
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=workers)
+        self.executor = executor
+        self._futures = {}
+        # Submitted files waiting for room in the window, in order
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, file_path):
+        with self._lock:
+            return file_path in self._futures or file_path in self._pending
+
+    def _schedule(self, file_path):
+        self._futures[file_path] = self.executor.submit(
+            propagate(self.convert),
+            file_path,
+        )
+
+    def _fill(self):
+        '''Schedule the pending files while there is room in the window'''
+
+        while self._pending and len(self._futures) < self.ahead:
+            file_path = next(iter(self._pending))
+            del self._pending[file_path]
+            self._schedule(file_path)
+
+    def submit(self, file_paths):
+        '''Schedule the conversion of the files that aren't already
+        scheduled'''
+
+        with self._lock:
+            for file_path in file_paths:
+                if file_path not in self._futures:
+                    self._pending[file_path] = None
+            self._fill()
+
+    def result(self, file_path):
+        '''Wait for the conversion of a file and return its html, or raise the
+        error of its conversion'''
+
+        with self._lock:
+            if file_path in self._pending:
+                # It's requested before its turn
+                del self._pending[file_path]
+                self._schedule(file_path)
+            future = self._futures.pop(file_path)
+            self._fill()
+        return future.result()
+
+    def close(self):
+        '''Discard the conversions that weren't requested and stop the
+        workers'''
+
+        with self._lock:
+            futures, self._futures = self._futures, {}
+            self._pending = {}
+        for future in futures.values():
+            future.cancel()
+        if self._own_executor:
+            self.executor.shutdown(wait=True)
+        else:
+            wait(futures.values())
@@ -1,20 +1,209 @@
 import os
 import json
-import shlex
+import time
+import hashlib
 import requests
-import pypandoc
+import threading
 import subprocess
+from urllib.parse import quote, urlsplit
+from requests.exceptions import ConnectionError, Timeout
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from git2sc.pages import PageIndex, parent_id_of
+from git2sc.metrics import SyncMetrics
+from git2sc.profiling import phase
+from git2sc.tracing import Tracer, SPAN_KIND_CLIENT, propagate
+from git2sc.transport import Transport, RETRY_STATUS_CODES, \
+    THROTTLE_STATUS_CODES
+from git2sc.watch import TreeWatcher
+from git2sc.attachments import Attachments, MultipartBody
+from git2sc.asciidoctor import AsciidoctorPool
+from git2sc.conversion import ConversionStage
+from git2sc.plan import SyncAction, SyncPlan, HOMEPAGE, DIRECTORY, FILE, PAGE
+
+# Fields of the pages expanded by each fetch profile, so each caller only
+# downloads what it uses. The id and title are always returned by the api.
+FETCH_PROFILES = {
+    'index': 'ancestors,version,metadata.properties.git2sc',
+    'full': 'ancestors,body.storage,version,metadata.properties.git2sc',
+}
+
+# Options the converters are run with, they're part of the key of the rendered
+# html cache so changing them doesn't reuse the html rendered with the old ones
+CONVERTER_OPTIONS = {
+    '.adoc': '-b xhtml',
+    '.html': '',
+    '.md': 'html',
+}
+
+# Content property where the fingerprint of the source of each page is stored
+PAGE_PROPERTY = 'git2sc'
+
+NO_README_HTML = "No README here, keep on looking :("
+
+# pypandoc is only needed to convert markdown files, it's imported the first
+# time it's used by load_pypandoc
+pypandoc = None
+
+
+def load_pypandoc():
+    '''Import pypandoc if it wasn't imported yet and return it'''
+
+    global pypandoc
+    if pypandoc is None:
+        import pypandoc as module
+        pypandoc = module
+    return pypandoc
+
+
+def build_session(auth, pool_size=10, keep_alive=True):
+    '''Build the connection pooled http session shared by all the api calls,
+    so we don't pay a TCP and TLS handshake on each request'''
+
+    session = requests.Session()
+    session.auth = auth
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    if not keep_alive:
+        session.headers.update({'Connection': 'close'})
+    return session
 
 
 class Git2SC():
     '''Class to sync a git documentation repository to Confluence.'''
 
-    def __init__(self, confluence_api_url, auth, space_id):
+    def __init__(
+        self,
+        confluence_api_url,
+        auth,
+        space_id,
+        pool_size=10,
+        timeout=30,
+        keep_alive=True,
+        page_size=100,
+        fetch_concurrency=1,
+        state=None,
+        max_retries=5,
+        backoff=0.5,
+        adoc_workers=0,
+        convert_workers=1,
+        cache=None,
+        tracer=None,
+        session=None,
+        limiter=None,
+        rate_limiter=None,
+        convert_executor=None,
+        asciidoctor=None,
+        upload_workers=4,
+    ):
+        # The session, the limiters of the requests, the executor of the
+        # conversions and the asciidoctor pool can be shared by the instances
+        # of several spaces, in which case they're not closed with them
         self.api_url = confluence_api_url
         self.auth = tuple(auth.split(':'))
         self.space = space_id
+        self.timeout = timeout
+        self.page_size = page_size
+        self.fetch_concurrency = fetch_concurrency
+        self.state = state
+        self.cache = cache
+        self.convert_workers = convert_workers
+        self.convert_executor = convert_executor
+        self.upload_workers = upload_workers
+        self.attachments = Attachments(CONVERTER_OPTIONS)
+        self._conversions = None
+        self._sync_root = None
+        self.metrics = SyncMetrics({'space': space_id})
+        self.tracer = tracer if tracer is not None else Tracer()
+        self._own_session = session is None
+        if session is None:
+            session = build_session(self.auth, pool_size, keep_alive)
+        self.session = session
+        self.transport = Transport(
+            self.session,
+            timeout=timeout,
+            max_retries=max_retries,
+            backoff=backoff,
+            max_concurrency=pool_size,
+            metrics=self.metrics,
+            limiter=limiter,
+            rate_limiter=rate_limiter,
+        )
+        self._lock = threading.Lock()
+        self._reserved_titles = set()
+        self._converter_versions = {}
+        self._own_asciidoctor = asciidoctor is None
+        if asciidoctor is None and adoc_workers > 0:
+            asciidoctor = AsciidoctorPool(adoc_workers)
+        self.asciidoctor = asciidoctor
+        # The inventory of the space is loaded the first time a title lookup
+        # needs it, so the commands that work by page id don't fetch it
         self.pages = {}
-        self.get_space_articles()
+        self._inventory_loaded = False
+        self._inventory_lock = threading.Lock()
+
+    @property
+    def pages(self):
+        '''Pages of the confluence space indexed by id, title and parent'''
+
+        return self._pages
+
+    @pages.setter
+    def pages(self, pages):
+        self._pages = PageIndex(pages)
+
+    def _request(self, method, url, **kwargs):
+        '''Make a request to the confluence api through the pooled session,
+        the transient errors and throttled responses are retried'''
+
+        endpoint = self._endpoint(url)
+        with self.tracer.span(
+            '{} {}'.format(method, endpoint),
+            kind=SPAN_KIND_CLIENT,
+            **{'http.method': method, 'http.url': url}
+        ) as span:
+            r = self.transport.request(
+                method,
+                url,
+                endpoint=endpoint,
+                **kwargs
+            )
+            span.set_attribute('http.status_code', r.status_code)
+        return r
+
+    def _endpoint(self, url):
+        '''Name of the api endpoint of an url for the metrics, the path
+        relative to the api with the ids, space and keys replaced by
+        placeholders'''
+
+        path = urlsplit(url).path
+        base = urlsplit(self.api_url).path.rstrip('/')
+        if path.startswith(base):
+            path = path[len(base):]
+
+        segments = []
+        for segment in path.strip('/').split('/'):
+            if segments[-1:] == ['space']:
+                segment = '{space}'
+            elif segments[-1:] == ['property']:
+                segment = '{key}'
+            elif segment.isdigit():
+                segment = '{id}'
+            segments.append(segment)
+        return '/' + '/'.join(segments)
+
+    def close(self):
+        '''Close the pooled connections of the http session and stop the
+        asciidoctor workers'''
+
+        if self._own_session:
+            self.session.close()
+        if self.asciidoctor is not None and self._own_asciidoctor:
+            self.asciidoctor.close()
 
     def _requests_error(self, requests_object):
         '''Print the confluence error'''
@@ -29,16 +218,54 @@ class Git2SC():
                 response['message']
             ))
 
-    def get_page_info(self, pageid):
-        '''Get all the information of a confluence page'''
+    def get_page_info(self, pageid, profile='full'):
+        '''Get the information of a confluence page, the fields returned are
+        the ones of the fetch profile'''
 
-        url = '{base}/content/{pageid}?expand=ancestors,body.storage,version'\
-            .format(base=self.api_url, pageid=pageid)
+        url = '{base}/content/{pageid}?expand={expand}'.format(
+            base=self.api_url,
+            pageid=pageid,
+            expand=FETCH_PROFILES[profile],
+        )
 
-        r = requests.get(url, auth=self.auth)
+        r = self._request('GET', url)
+        self._check_page_found(r, pageid)
         self._requests_error(r)
         return r.json()
 
+    def _check_page_found(self, response, pageid):
+        '''Raise PageNotFound if the response of a request on a page says
+        it no longer exists, like when it was deleted or moved to another
+        space after the inventory was loaded. The page is forgotten so it's
+        looked up again'''
+
+        if response.status_code == 404:
+            self._forget_page(pageid)
+            raise PageNotFound('Page {} not found'.format(pageid))
+
+    def _forget_page(self, pageid):
+        '''Remove a page from the pages attribute and the sync state'''
+
+        with self._lock:
+            self.pages.pop(pageid, None)
+        if self.state is not None:
+            self.state.remove_page(pageid)
+
+    def is_space_page(self, pageid):
+        '''Tell if a page exists and belongs to the space'''
+
+        if pageid in self.pages:
+            return True
+        url = '{base}/content/{pageid}?expand=space'.format(
+            base=self.api_url,
+            pageid=pageid,
+        )
+        r = self._request('GET', url)
+        if r.status_code == 404:
+            return False
+        self._requests_error(r)
+        return r.json()['space']['key'] == self.space
+
     def get_space_homepage(self):
         '''Get the homepage of a confluence space'''
 
@@ -46,50 +273,155 @@ class Git2SC():
             base=self.api_url,
             spaceid=self.space,
         )
-        r = requests.get(url, auth=self.auth)
+        r = self._request('GET', url)
         self._requests_error(r)
         return r.json()['_expandable']['homepage'].split('/')[4]
 
-    def get_space_articles(self):
-        '''Get all the pages of a confluence space'''
+    def get_page_body(self, pageid):
+        '''Get the storage body of a confluence page, it's only downloaded if
+        the page in the pages attribute doesn't have it'''
+
+        try:
+            return self.pages[pageid]['body']['storage']['value']
+        except KeyError:
+            page = self.get_page_info(pageid, 'full')
+            return page['body']['storage']['value']
+
+    def _get_space_articles_batch(self, start, profile='index'):
+        '''Get a batch of page_size pages of a confluence space starting at
+        the start position, the fields returned are the ones of the fetch
+        profile'''
 
         url = '{base}/space/{spaceid}/'\
-            'content?expand=body.storage&limit=5000&start=0'.format(
+            'content?expand={expand}&limit={limit}&start={start}'.format(
                 base=self.api_url,
                 spaceid=self.space,
+                expand=FETCH_PROFILES[profile],
+                limit=self.page_size,
+                start=start,
             )
-        r = requests.get(url, auth=self.auth)
+        r = self._request('GET', url)
         self._requests_error(r)
-        self.pages = {}
-        for page in r.json()['page']['results']:
-            self.pages[page['id']] = page
+        return r.json()['page']
+
+    def iter_space_articles(self, profile='index'):
+        '''Generator of all the pages of a confluence space, it follows the
+        start/limit pagination of the api until there is no next link.
+
+        The first batch is fetched alone to learn the limit enforced by the
+        server, the following ones are fetched fetch_concurrency at a time.
+
+        By default the bodies of the pages are not fetched, use the full
+        profile or get_page_body if you need them.
+        '''
+
+        get_batch = partial(self._get_space_articles_batch, profile=profile)
+        batch = get_batch(0)
+        for page in batch['results']:
+            yield page
+
+        # The batches can be shorter than the limit, like when some pages
+        # are hidden by their permissions, so only the next link ends them
+        limit = batch.get('limit', len(batch['results']))
+        start = batch.get('start', 0) + limit
+        has_next = 'next' in batch.get('_links', {})
+        if not has_next or limit == 0:
+            return
+
+        executor = None
+        fetch = partial(map, get_batch)
+        if self.fetch_concurrency > 1:
+            executor = ThreadPoolExecutor(max_workers=self.fetch_concurrency)
+            fetch = partial(executor.map, propagate(get_batch))
+
+        try:
+            while has_next:
+                starts = [
+                    start + limit * position
+                    for position in range(self.fetch_concurrency)
+                ]
+                for batch in fetch(starts):
+                    for page in batch['results']:
+                        yield page
+                    start += limit
+                    has_next = 'next' in batch.get('_links', {})
+                    if not has_next:
+                        break
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+    def get_space_articles(self, profile='index'):
+        '''Get all the pages of a confluence space'''
+
+        with phase('inventory'):
+            self.pages = {}
+            for page in self.iter_space_articles(profile):
+                self.pages[page['id']] = page
+        self._inventory_loaded = True
+
+    def _ensure_inventory(self):
+        '''Load the pages of the space into the pages attribute if they
+        weren't loaded yet'''
+
+        with self._inventory_lock:
+            if not self._inventory_loaded:
+                self.get_space_articles()
+
+    def _reload_inventory(self):
+        '''Load the pages of the space again, once the loaded ones turned
+        out to be stale'''
+
+        print('Some pages changed in confluence, loading the space again')
+        with self._inventory_lock:
+            self.get_space_articles()
 
     def _get_article_id(self, title):
         '''Get the id of the article with the specified title'''
 
-        try:
-            article_id = [
-                pageid
-                for pageid, content in self.pages.items()
-                if content['title'] == title
-            ][0]
-        except IndexError:
-            article_id = None
-        return article_id
+        self._ensure_inventory()
+        return self.pages.get_id(title)
 
     def _title_exist(self, title):
         '''You can't create more than one article with a specified title, test
         if title exists in the existing pages'''
-        titles = [content['title'] for page, content in self.pages.items()]
-        return title in titles
+        self._ensure_inventory()
+        return self.pages.get_id(title) is not None or \
+            title in self._reserved_titles
+
+    def update_page(self, pageid, html, title=None, fingerprint=None):
+        '''Update a confluence page with the content of the html variable.
 
-    def update_page(self, pageid, html, title=None):
-        '''Update a confluence page with the content of the html variable'''
+        If fingerprint is set, it's stored in the page so the next syncs can
+        skip the update if the source didn't change. PageNotFound is raised if
+        the page no longer exists.
+        '''
 
         try:
             self.pages[pageid]['version']
         except KeyError:
-            self.pages[pageid] = self.get_page_info(pageid)
+            self.pages[pageid] = self.get_page_info(pageid, 'index')
+
+        # The attachments are uploaded first so the new version never shows
+        # missing images
+        self.upload_attachments(pageid, html)
+        r, version = self._put_page(pageid, html, title)
+        if r.status_code == 409:
+            # The known version is stale, someone else edited the page
+            self.pages[pageid] = self.get_page_info(pageid, 'index')
+            r, version = self._put_page(pageid, html, title)
+
+        self._check_page_found(r, pageid)
+        self._requests_error(r)
+        self._store_written_page(pageid, r, version)
+        self.metrics.count_page('update')
+
+        if fingerprint is not None:
+            self.set_page_fingerprint(pageid, fingerprint)
+
+    def _put_page(self, pageid, html, title=None):
+        '''Put the next version of a page of the pages attribute, returns the
+        response and the version number'''
 
         version = int(self.pages[pageid]['version']['number']) + 1
 
@@ -104,6 +436,8 @@ class Git2SC():
 
         if title is not None:
             self.pages[pageid]['title'] = title
+            with self._lock:
+                self.pages.reindex(pageid)
 
         data = {
             'id': str(pageid),
@@ -122,29 +456,65 @@ class Git2SC():
 
         data_json = json.dumps(data)
 
-        url = '{base}/content/{pageid}'.format(base=self.api_url, pageid=pageid)
+        # The response returns the fields of the index profile of the updated
+        # page, so we don't need to fetch it again
+        url = '{base}/content/{pageid}?expand={expand}'.format(
+            base=self.api_url,
+            pageid=pageid,
+            expand=FETCH_PROFILES['index'],
+        )
 
-        r = requests.put(
+        r = self._request(
+            'PUT',
             url,
             data=data_json,
-            auth=self.auth,
             headers={'Content-Type': 'application/json'}
         )
+        return r, version
 
-        self._requests_error(r)
+    def create_page(self, title, html, parent_id=None, fingerprint=None):
+        '''Create a confluence page with the content of the html variable.
 
-    def create_page(self, title, html, parent_id=None):
-        '''Create a confluence page with the content of the html variable'''
+        If fingerprint is set, it's stored in the page so the next syncs can
+        skip the update if the source didn't change.
+        '''
 
-        new_title = title
-        for counter in range(1, 10):
-            if not self._title_exist(new_title):
-                break
-            new_title = '{}_{}'.format(title, counter)
+        # The title is reserved until the page is created so that concurrent
+        # calls don't try to create two articles with the same title
+        self._ensure_inventory()
+        with self._lock:
+            new_title = title
+            for counter in range(1, 10):
+                if not self._title_exist(new_title):
+                    break
+                new_title = '{}_{}'.format(title, counter)
+            self._reserved_titles.add(new_title)
+
+        # The fingerprint of a page with attachments is stored once they're
+        # uploaded, so the next sync retries them if the upload fails
+        attachment_names = self.attachments.names(html)
+        try:
+            pageid = self._post_page(
+                new_title,
+                html,
+                parent_id,
+                None if attachment_names else fingerprint,
+            )
+        finally:
+            self._reserved_titles.discard(new_title)
+
+        if attachment_names:
+            self.upload_attachments(pageid, html)
+            if fingerprint is not None:
+                self.set_page_fingerprint(pageid, fingerprint)
+        return pageid
+
+    def _post_page(self, title, html, parent_id=None, fingerprint=None):
+        '''Post a new confluence page with an already available title'''
 
         data = {
             'type': 'page',
-            'title': new_title,
+            'title': title,
             'space': {'key': self.space},
             'body': {
                 'storage': {
@@ -157,41 +527,452 @@ class Git2SC():
         if parent_id is not None:
             data['ancestors'] = [{'id': parent_id}]
 
-        data_json = json.dumps(data)
+        if fingerprint is not None:
+            data['metadata'] = {
+                'properties': {
+                    PAGE_PROPERTY: {
+                        'key': PAGE_PROPERTY,
+                        'value': {'fingerprint': fingerprint},
+                    },
+                },
+            }
 
-        url = '{base}/content'.format(base=self.api_url)
+        data_json = json.dumps(data)
 
-        r = requests.post(
-            url,
-            data=data_json,
-            auth=self.auth,
-            headers={'Content-Type': 'application/json'}
+        # The response returns the fields of the index profile of the new
+        # page, so we don't need to fetch it again
+        url = '{base}/content?expand={expand}'.format(
+            base=self.api_url,
+            expand=FETCH_PROFILES['index'],
         )
 
+        page = self._send_create(url, data_json, title, parent_id)
+        with self._lock:
+            self.pages[page['id']] = page
+        self.metrics.count_page('create')
+        return page['id']
+
+    def _send_create(self, url, data_json, title, parent_id=None):
+        '''Post the creation of a page and return the created page.
+
+        A create that fails with a server error or without a response may
+        have been processed, so the page of the title is looked up before
+        sending it again.
+        '''
+
+        attempt = 0
+        while True:
+            try:
+                r = self._request(
+                    'POST',
+                    url,
+                    data=data_json,
+                    headers={'Content-Type': 'application/json'}
+                )
+            except (ConnectionError, Timeout):
+                if attempt >= self.transport.max_retries:
+                    raise
+            else:
+                if attempt >= self.transport.max_retries or \
+                        r.status_code not in RETRY_STATUS_CODES or \
+                        r.status_code in THROTTLE_STATUS_CODES:
+                    # The parent is the only page a create can miss
+                    if parent_id is not None:
+                        self._check_page_found(r, parent_id)
+                    self._requests_error(r)
+                    return json.loads(r.text)
+
+            page = self._find_page(title)
+            if page is not None and (
+                parent_id is None or
+                parent_id_of(page) == str(parent_id)
+            ):
+                return page
+            self.transport.wait_to_retry(attempt)
+            attempt += 1
+
+    def _find_page(self, title):
+        '''Get the page of the space with a title from the api with the
+        fields of the index profile, or None if there is none'''
+
+        url = '{base}/content?spaceKey={space}&title={title}&' \
+            'expand={expand}'.format(
+                base=self.api_url,
+                space=self.space,
+                title=quote(title),
+                expand=FETCH_PROFILES['index'],
+            )
+        r = self._request('GET', url)
         self._requests_error(r)
+        results = json.loads(r.text)['results']
+        if not results:
+            return None
+        return results[0]
 
-        pageid = json.loads(r.text)['id']
-        self.pages[pageid] = self.get_page_info(pageid)
-        return pageid
+    def _store_written_page(self, pageid, response, version):
+        '''Refresh a page of the pages attribute with the response of its
+        update, which has the fields of the index profile. The cached body is
+        dropped as it's no longer the current one'''
+
+        try:
+            written_page = json.loads(response.text)
+        except (TypeError, ValueError):
+            written_page = {}
+        if not isinstance(written_page, dict):
+            written_page = {}
+
+        with self._lock:
+            page = self.pages[pageid]
+            page.pop('body', None)
+            page.pop('_expandable', None)
+            page.update(written_page)
+            if 'version' not in written_page:
+                page['version'] = {'number': version}
+            self.pages.reindex(pageid)
+
+    def get_attachment_names(self, pageid):
+        '''Get the file names of the attachments of a confluence page'''
+
+        names = set()
+        start = 0
+        while True:
+            url = '{base}/content/{pageid}/child/attachment?start={start}&' \
+                'limit={limit}'.format(
+                    base=self.api_url,
+                    pageid=pageid,
+                    start=start,
+                    limit=self.page_size,
+                )
+            r = self._request('GET', url)
+            self._requests_error(r)
+            batch = r.json()
+            names.update(result['title'] for result in batch['results'])
+            # The server may cap the limit, only the next link ends them
+            if 'next' not in batch.get('_links', {}):
+                return names
+            start += batch.get('limit', len(batch['results']))
+
+    def _upload_attachment(self, pageid, name):
+        '''Upload a file as an attachment of a page, streaming it from
+        disk'''
+
+        url = '{base}/content/{pageid}/child/attachment'.format(
+            base=self.api_url,
+            pageid=pageid,
+        )
+        with open(self.attachments.sources[name], 'rb') as f:
+            body = MultipartBody(f, name, {'minorEdit': 'true'})
+            r = self._request(
+                'POST',
+                url,
+                data=body,
+                headers={
+                    'Content-Type': body.content_type,
+                    'X-Atlassian-Token': 'no-check',
+                },
+            )
+        self._requests_error(r)
+
+    def upload_attachments(self, pageid, html):
+        '''Upload the local files referenced by the html of a page that it
+        doesn't have yet. The attachments are named after their content, so
+        the unchanged files are never uploaded again'''
+
+        names = self.attachments.names(html)
+        if not names:
+            return
+
+        existing_names = self.get_attachment_names(pageid)
+        missing_names = [name for name in names if name not in existing_names]
+        for _ in range(len(names) - len(missing_names)):
+            self.metrics.count_attachment('skip')
+        if not missing_names:
+            return
+
+        upload = propagate(partial(self._upload_attachment, pageid))
+        workers = min(self.upload_workers, len(missing_names))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for _ in executor.map(upload, missing_names):
+                self.metrics.count_attachment('upload')
 
     def delete_page(self, pageid):
         '''Delete a confluence page given the pageid'''
 
         url = '{base}/content/{pageid}'.format(base=self.api_url, pageid=pageid)
 
-        r = requests.delete(
+        r = self._request('DELETE', url)
+
+        if r.status_code != 204:
+            self._requests_error(r)
+
+        self._forget_page(pageid)
+        self.metrics.count_page('delete')
+
+    def _state_key(self, path):
+        '''Get the key of a path in the sync state, its path relative to the
+        synced directory'''
+
+        return os.path.relpath(path, self._sync_root)
+
+    def _get_state_page_id(self, path):
+        '''Get the id of the page pushed from a path according to the sync
+        state, or None if it's unknown.
+
+        The page is added to the pages attribute if it's not there and the
+        state knows its version and title, so it can be updated without
+        fetching its information.
+        '''
+
+        if self.state is None:
+            return None
+
+        entry = self.state.get(self._state_key(path))
+        if entry is None:
+            return None
+
+        pageid = entry['page_id']
+        if pageid not in self.pages and entry['version'] is not None and \
+                entry.get('title') is not None:
+            ancestors = []
+            if entry['parent_id'] is not None:
+                ancestors = [{'id': entry['parent_id']}]
+            # The content property of the page isn't known until it's
+            # fetched
+            page = {
+                'id': pageid,
+                'title': entry['title'],
+                'version': {'number': entry['version']},
+                'ancestors': ancestors,
+                '_expandable': {'metadata': ''},
+            }
+            with self._lock:
+                self.pages[pageid] = page
+        return pageid
+
+    def _lookup_article_id(self, path, title):
+        '''Get the id of the article of a path, from the sync state if it's
+        known or by its title otherwise'''
+
+        pageid = self._get_state_page_id(path)
+        if pageid is not None:
+            return pageid
+        return self._get_article_id(title)
+
+    def _record_path(self, path, pageid, fingerprint=None, html=None):
+        '''Store in the sync state the page pushed from a path'''
+
+        if self.state is None or pageid is None:
+            return
+
+        fields = {}
+        page = self.pages.get(pageid, {})
+        if 'version' in page:
+            fields['version'] = int(page['version']['number'])
+        if 'ancestors' in page:
+            fields['parent_id'] = parent_id_of(page)
+        if 'title' in page:
+            fields['title'] = page['title']
+        if fingerprint is not None:
+            fields['source_hash'] = fingerprint
+        if html is not None:
+            fields['html_hash'] = hashlib.sha256(html.encode()).hexdigest()
+        self.state.set(self._state_key(path), pageid, **fields)
+
+    def _fetch_page_property(self, pageid):
+        '''Get the git2sc content property of a page from the api, or None if
+        it doesn't have one'''
+
+        url = '{base}/content/{pageid}/property/{key}'.format(
+            base=self.api_url,
+            pageid=pageid,
+            key=PAGE_PROPERTY,
+        )
+        r = self._request('GET', url)
+        if r.status_code == 404:
+            return None
+        self._requests_error(r)
+        return r.json()
+
+    def _get_page_property(self, pageid):
+        '''Get the git2sc content property of a page, or None if it doesn't
+        have one.
+
+        It's taken from the pages attribute, and it's fetched if the page
+        isn't loaded yet or it was only known from the sync state.
+        '''
+
+        if pageid is None:
+            return None
+
+        page = self.pages.get(pageid)
+        if page is None and self._inventory_loaded:
+            return None
+        if page is not None and \
+                'metadata' not in page.get('_expandable', {}):
+            try:
+                return page['metadata']['properties'][PAGE_PROPERTY]
+            except (KeyError, TypeError):
+                return None
+
+        page_property = self._fetch_page_property(pageid)
+        if page is not None:
+            with self._lock:
+                properties = page.setdefault('metadata', {}).setdefault(
+                    'properties',
+                    {},
+                )
+                if page_property is not None:
+                    properties[PAGE_PROPERTY] = page_property
+                page['_expandable'].pop('metadata', None)
+        return page_property
+
+    def get_page_fingerprint(self, pageid):
+        '''Get the fingerprint of the source stored in a page'''
+
+        try:
+            return self._get_page_property(pageid)['value']['fingerprint']
+        except (KeyError, TypeError):
+            return None
+
+    def _page_is_current(self, pageid, fingerprint, path=None):
+        '''Test if the page was last updated from the source with the
+        fingerprint, so there's no need to update it again.
+
+        If the path is given and it's in the sync state, the stored source
+        hash is used instead of the one of the page.
+        '''
+
+        if pageid is None:
+            return False
+
+        if self.state is not None and path is not None:
+            entry = self.state.get(self._state_key(path))
+            if entry is not None and entry['page_id'] == pageid:
+                return entry['source_hash'] == fingerprint
+
+        return self.get_page_fingerprint(pageid) == fingerprint
+
+    def set_page_fingerprint(self, pageid, fingerprint):
+        '''Store the fingerprint of the source of a page in its git2sc content
+        property'''
+
+        self.set_page_property(pageid, {'fingerprint': fingerprint})
+
+    def get_synced_commit(self, pageid):
+        '''Get the last git commit synced to the tree hanging from a page'''
+
+        try:
+            return self._get_page_property(pageid)['value']['commit']
+        except (KeyError, TypeError):
+            return None
+
+    def set_synced_commit(self, pageid, commit):
+        '''Store the last git commit synced to the tree hanging from a page'''
+
+        self.set_page_property(pageid, {'commit': commit})
+
+    def set_page_property(self, pageid, values):
+        '''Merge the values dictionary into the value of the git2sc content
+        property of a page'''
+
+        page_property = self._get_page_property(pageid)
+        value = {}
+        if page_property is not None:
+            value.update(page_property.get('value', {}))
+        value.update(values)
+        data = {
+            'key': PAGE_PROPERTY,
+            'value': value,
+        }
+        if page_property is None:
+            method = 'POST'
+            url = '{base}/content/{pageid}/property'.format(
+                base=self.api_url,
+                pageid=pageid,
+            )
+        else:
+            method = 'PUT'
+            url = '{base}/content/{pageid}/property/{key}'.format(
+                base=self.api_url,
+                pageid=pageid,
+                key=PAGE_PROPERTY,
+            )
+            data['version'] = {
+                'number': int(page_property['version']['number']) + 1,
+            }
+
+        r = self._request(
+            method,
             url,
-            auth=self.auth,
+            data=json.dumps(data),
+            headers={'Content-Type': 'application/json'}
         )
+        self._requests_error(r)
 
-        if r.status_code is not 204:
-            self._requests_error(r)
+        if pageid in self.pages:
+            metadata = self.pages[pageid].setdefault('metadata', {})
+            metadata.setdefault('properties', {})[PAGE_PROPERTY] = r.json()
+
+    def _converter_version(self, extension):
+        '''Get the name and version of the converter used for the files with
+        the extension, it's part of the fingerprint of the pages as a new
+        converter may render the same source differently'''
+
+        try:
+            return self._converter_versions[extension]
+        except KeyError:
+            pass
+
+        if extension == '.adoc':
+            version = subprocess.check_output(
+                ['asciidoctor', '--version'],
+                shell=False,
+            ).decode().splitlines()[0]
+        elif extension == '.html':
+            version = 'html'
+        elif extension == '.md':
+            version = 'pandoc {}'.format(load_pypandoc().get_pandoc_version())
+        else:
+            raise UnknownExtension('Extension {} not known'.format(extension))
+
+        self._converter_versions[extension] = version
+        return version
+
+    def file_fingerprint(self, file_path):
+        '''Takes a path to a file and returns the fingerprint of its content
+        and the converter that will render it'''
+
+        extension = os.path.splitext(file_path)[-1]
+        fingerprint = hashlib.sha256(
+            self._converter_version(extension).encode()
+        )
+        with open(self._safe_load_file(file_path), 'rb') as f:
+            for chunk in iter(partial(f.read, 65536), b''):
+                fingerprint.update(chunk)
+        # The files it references are part of the page as attachments
+        for path in self.attachments.references(file_path, self._sync_root):
+            fingerprint.update(self.attachments.digest(path).encode())
+        return fingerprint.hexdigest()
+
+    def directory_fingerprint(self, directory_path):
+        '''Takes a directory path and returns the fingerprint of its README'''
+
+        readme_file = self._find_directory_readme(directory_path)
+        if readme_file is None:
+            return hashlib.sha256(NO_README_HTML.encode()).hexdigest()
+        return self.file_fingerprint(readme_file)
 
     def _safe_load_file(self, file_path):
         '''Takes a file path and loads it in a safe way evading posible
         injections'''
 
-        return os.path.expanduser(shlex.quote(file_path))
+        # The converters are run without a shell, so quoting the path would
+        # only break the names with spaces or accents. It just can't be taken
+        # as an option of the converter
+        file_path = os.path.expanduser(file_path)
+        if file_path.startswith('-'):
+            file_path = os.path.join('.', file_path)
+        return file_path
 
     def _process_adoc(self, adoc_file_path):
         '''Takes a path to an adoc file, transform it and return it as
@@ -204,12 +985,19 @@ class Git2SC():
 
         clean_path = self._safe_load_file(adoc_file_path)
 
+        # With a pool of asciidoctor workers we don't pay the startup of ruby
+        # and the asciidoctor gem on each file
+        if self.asciidoctor is not None:
+            html = self.asciidoctor.convert(clean_path)
+        else:
+            html = subprocess.check_output(
+                ['asciidoctor', '-b', 'xhtml', clean_path, '-o', '-'],
+                shell=False,
+            ).decode()
+
         # Confluence doesn't like the <!DOCTYPE html> line, therefore
         # the split('/n')
-        return subprocess.check_output(
-            ['asciidoctor', '-b', 'xhtml', clean_path, '-o', '-'],
-            shell=False,
-        ).decode().replace('<!DOCTYPE html>\n', '')
+        return html.replace('<!DOCTYPE html>\n', '')
 
     def _process_md(self, md_file_path):
         '''Takes a path to an md file, transform it and return it as
@@ -217,7 +1005,7 @@ class Git2SC():
 
         clean_path = self._safe_load_file(md_file_path)
 
-        return pypandoc.convert_file(clean_path, 'html')
+        return load_pypandoc().convert_file(clean_path, 'html')
 
     def _process_html(self, html_file_path):
         '''Takes a path to an html file and returns it'''
@@ -225,49 +1013,110 @@ class Git2SC():
         with open(clean_path, 'r') as f:
             return f.read()
 
-    def _process_mainpage(self, directory_path):
-        '''Takes a path to a file and updates the confluence homepage'''
-        homepage_id = self.get_space_homepage()
+    def _process_mainpage(self, directory_path, homepage_id=None):
+        '''Takes a path to a file and updates the confluence homepage if the
+        README changed'''
+        if homepage_id is None:
+            homepage_id = self._get_root_page_id(directory_path)
+        fingerprint = self.directory_fingerprint(directory_path)
+        if self._page_is_current(homepage_id, fingerprint, directory_path):
+            self._record_path(directory_path, homepage_id, fingerprint)
+            self.metrics.count_page('skip')
+            return homepage_id
         html = self._discover_directory_readme(directory_path)
-        self.update_page(homepage_id, html)
+        self.update_page(homepage_id, html, fingerprint=fingerprint)
+        self._record_path(directory_path, homepage_id, fingerprint, html)
         return homepage_id
 
-    def _discover_directory_readme(self, directory_path, parent_id=None):
-        '''Takes a directory path, searches for README.adoc or README.md and
-        returns it's html'''
+    def _find_directory_readme(self, directory_path):
+        '''Takes a directory path and returns the path to its README.adoc or
+        README.md, or None if it doesn't have any'''
 
         adoc_file = os.path.join(directory_path, 'README.adoc')
         md_file = os.path.join(directory_path, 'README.md')
         if os.path.isfile(adoc_file):
-            readme_file = adoc_file
+            return adoc_file
         elif os.path.isfile(md_file):
-            readme_file = md_file
-        else:
-            return "No README here, keep on looking :("
+            return md_file
+        return None
+
+    def _discover_directory_readme(self, directory_path, parent_id=None):
+        '''Takes a directory path, searches for README.adoc or README.md and
+        returns it's html'''
+
+        readme_file = self._find_directory_readme(directory_path)
+        if readme_file is None:
+            return NO_README_HTML
 
         return self.import_file(readme_file)
 
     def _create_directory_readme(self, directory_path, parent_id=None):
         '''Takes a directory path, searches for README.adoc or README.md and
         creates a confluence page with that information'''
-        return self.create_page(
+        html = self._discover_directory_readme(directory_path)
+        fingerprint = self.directory_fingerprint(directory_path)
+        pageid = self.create_page(
             os.path.basename(directory_path),
-            self._discover_directory_readme(directory_path),
+            html,
             parent_id,
+            fingerprint=fingerprint,
         )
+        self._record_path(directory_path, pageid, fingerprint, html)
+        return pageid
 
     def _update_directory_readme(self, directory_path):
         '''Takes a directory path, deduces the article_id and updates it with
-        the contents of the README.adoc or README.md'''
-        self.update_page(
-            self._get_article_id(os.path.basename(directory_path)),
-            self._discover_directory_readme(directory_path),
+        the contents of the README.adoc or README.md if they changed'''
+        article_id = self._lookup_article_id(
+            directory_path,
+            os.path.basename(directory_path),
         )
+        fingerprint = self.directory_fingerprint(directory_path)
+        if self._page_is_current(article_id, fingerprint, directory_path):
+            self._record_path(directory_path, article_id, fingerprint)
+            self.metrics.count_page('skip')
+            return
+        html = self._discover_directory_readme(directory_path)
+        self.update_page(article_id, html, fingerprint=fingerprint)
+        self._record_path(directory_path, article_id, fingerprint, html)
 
-    def import_file(self, file_path):
+    def _cache_key(self, file_path):
+        '''Key of the rendered html of a file in the cache, it depends on the
+        content of the file and the name, version and options of its
+        converter'''
+
+        extension = os.path.splitext(file_path)[-1]
+        key = hashlib.sha256(self.file_fingerprint(file_path).encode())
+        key.update(CONVERTER_OPTIONS.get(extension, '').encode())
+        return key.hexdigest()
+
+    def _convert_file(self, file_path):
+        '''Takes a path to a file and returns it as html, from the rendered
+        html cache if it was already converted'''
+
+        with self.tracer.span('convert', path=file_path) as span:
+            if self.cache is None:
+                return self.attachments.rewrite(
+                    self._render_file(file_path),
+                    file_path,
+                    self._sync_root,
+                )
+
+            key = self._cache_key(file_path)
+            html = self.cache.get(key)
+            span.set_attribute('cache.hit', html is not None)
+            if html is None:
+                html = self._render_file(file_path)
+                self.cache.set(key, html)
+            else:
+                self.metrics.count_cache_hit()
+            return self.attachments.rewrite(html, file_path, self._sync_root)
+
+    def _render_file(self, file_path):
         '''Takes a path to a file and decides which _process.* method to use
         based on the extension'''
         extension = os.path.splitext(file_path)[-1]
+        started = time.perf_counter()
         if extension == '.adoc':
             html = self._process_adoc(file_path)
         elif extension == '.html':
@@ -279,70 +1128,507 @@ class Git2SC():
                 extension,
                 file_path,
             ))
+        self.metrics.observe_conversion(
+            extension,
+            time.perf_counter() - started,
+        )
         return html
 
-    def directory_full_upload(
+    def import_file(self, file_path):
+        '''Takes a path to a file and returns it as html, taking the result
+        of the conversion stage if the file was scheduled there'''
+
+        conversions = self._conversions
+        if conversions is not None and file_path in conversions:
+            return conversions.result(file_path)
+        return self._convert_file(file_path)
+
+    def _start_conversions(self, file_paths):
+        '''Schedule the conversion of the files in the conversion stage, so
+        they're converted in parallel while the pages are uploaded'''
+
+        if self._conversions is None:
+            self._conversions = ConversionStage(
+                self._convert_file,
+                self.convert_workers,
+                self.convert_executor,
+            )
+        self._conversions.submit(file_paths)
+
+    def _stop_conversions(self):
+        '''Stop the conversion stage discarding the results not used'''
+
+        if self._conversions is not None:
+            self._conversions.close()
+            self._conversions = None
+
+    def _plan_homepage(self, directory_path):
+        '''Returns the action to sync the README of the root directory to the
+        homepage of the space'''
+
+        homepage_id = self._get_root_page_id(directory_path)
+        fingerprint = self.directory_fingerprint(directory_path)
+        if self._page_is_current(homepage_id, fingerprint, directory_path):
+            operation = 'skip'
+        else:
+            operation = 'update'
+        return SyncAction(
+            operation,
+            HOMEPAGE,
+            directory_path,
+            page_id=homepage_id,
+            fingerprint=fingerprint,
+        )
+
+    def _plan_page(
         self,
+        kind,
         path,
-        excluded_items,
-        parent_id=None
+        title,
+        parent_path,
+        fingerprint,
+        lookup=True,
     ):
-        '''Takes a path to a directory and crawls all the subdirectories and
-        files and uploads them to confluence.
+        '''Returns the action to sync the page of a path. If lookup is False
+        the page is assumed not to exist'''
 
-        The uploaded files are the ones supported by the import_file method.
+        article_id = None
+        if lookup:
+            article_id = self._lookup_article_id(path, title)
 
-        Optionally you can set up a parent_id to create the confluence structure
-        hanging below a confluence article id
+        if article_id is None:
+            operation = 'create'
+        elif self._page_is_current(article_id, fingerprint, path):
+            operation = 'skip'
+        else:
+            operation = 'update'
+        return SyncAction(
+            operation,
+            kind,
+            path,
+            title=title,
+            page_id=article_id,
+            parent_path=parent_path,
+            fingerprint=fingerprint,
+        )
+
+    def _plan_tree(self, path, excluded_items, parent_id=None, lookup=True):
+        '''Walks the directory tree and returns the plan to create or update
+        its pages, without converting any file.
+
+        If lookup is False the pages are assumed not to exist, as in a full
+        upload. Otherwise the files whose page is already synced by another
+        action of the plan are left out.
         '''
 
-        is_root_directory = True
-        parent_ids = {}
-        parent_ids[path] = parent_id
+        self._sync_root = path
+        plan = SyncPlan(parent_id=parent_id)
+        planned_ids = set()
+        planned_titles = set()
         for root, directories, files in os.walk(path):
-            if is_root_directory and parent_id is None:
-                self._process_mainpage(root)
-            elif is_root_directory and parent_id is not None:
-                parent_id = self._create_directory_readme(
-                    root,
-                    parent_id,
+            with self.tracer.span('walk', path=root, files=len(files)):
+                directories[:] = [
+                    directory
+                    for directory in directories
+                    if directory not in excluded_items
+                ]
+
+                if root == path and parent_id is None:
+                    action = self._plan_homepage(root)
+                else:
+                    action = self._plan_page(
+                        DIRECTORY,
+                        root,
+                        os.path.basename(root),
+                        None if root == path else os.path.dirname(root),
+                        self.directory_fingerprint(root),
+                        lookup,
+                    )
+                plan.append(action)
+                planned_ids.add(action.page_id)
+                planned_titles.add(action.title)
+
+                for file in files:
+                    filename = os.path.splitext(os.path.basename(file))[0]
+                    if filename == 'README' or file in excluded_items:
+                        continue
+
+                    file_path = os.path.join(root, file)
+                    try:
+                        fingerprint = self.file_fingerprint(file_path)
+                    except UnknownExtension:
+                        continue
+
+                    action = self._plan_page(
+                        FILE,
+                        file_path,
+                        filename,
+                        root,
+                        fingerprint,
+                        lookup,
+                    )
+                    if lookup:
+                        # The new files have no page id yet, they're only
+                        # told apart by their title
+                        if action.page_id is None:
+                            if filename in planned_titles:
+                                continue
+                        elif action.page_id in planned_ids:
+                            continue
+                        planned_ids.add(action.page_id)
+                        planned_titles.add(filename)
+                    plan.append(action)
+
+        planned_ids.discard(None)
+        return plan
+
+    def plan_full_upload(self, path, excluded_items, parent_id=None):
+        '''Takes a path to a directory and returns the plan to upload all its
+        subdirectories and files to confluence, without touching anything'''
+
+        return self._plan_tree(path, excluded_items, parent_id, lookup=False)
+
+    def plan_update(self, path, excluded_items, parent_id=None):
+        '''Takes a path to a directory and returns the plan to update it on
+        confluence, without touching anything.
+
+        The pages whose stored fingerprint matches the one of their source are
+        skipped.
+
+        The pages of the tree that don't belong to the directory are deleted.
+        The tree is the whole space if parent_id is None, otherwise the pages
+        hanging from the page of the directory. If there is a sync state,
+        only the pages pushed from the paths it knows are candidates to be
+        deleted. The homepage, the parent_id page and its ancestors are never
+        deleted.
+        '''
+
+        plan = self._plan_tree(path, excluded_items, parent_id)
+        planned_ids = {action.page_id for action in plan}
+
+        root_id = plan[0].page_id
+        if parent_id is not None and root_id is None:
+            # The directory page is new, there is nothing to delete yet
+            candidates = []
+        elif self.state is not None:
+            entries = {
+                entry['page_id']: entry for entry in self.state.entries()
+            }
+            children = {}
+            for entry in entries.values():
+                children.setdefault(entry['parent_id'], set()).add(
+                    entry['page_id'],
+                )
+            if parent_id is not None:
+                entries = {
+                    page_id: entries[page_id]
+                    for page_id in _descendants(
+                        root_id,
+                        lambda page_id: children.get(page_id, set()),
+                    )
+                }
+            candidates = [
+                (page_id, entry['path'], None, entry['parent_id'])
+                for page_id, entry in entries.items()
+            ]
+        else:
+            self._ensure_inventory()
+            page_ids = list(self.pages)
+            if parent_id is not None:
+                page_ids = _descendants(root_id, self.pages.children)
+            candidates = [
+                (page_id, None, self.pages[page_id].get('title'),
+                 parent_id_of(self.pages[page_id]))
+                for page_id in page_ids
+            ]
+
+        # The pages of the inventory that hang from the directory page can't
+        # be any of these, but the sync state may be stale
+        if self.state is not None and any(
+            candidate[0] not in planned_ids for candidate in candidates
+        ):
+            planned_ids.update(self._protected_page_ids(plan, parent_id))
+        for page_id, state_path, title, page_parent_id in candidates:
+            if page_id in planned_ids:
+                continue
+            plan.append(
+                SyncAction(
+                    'delete',
+                    PAGE,
+                    state_path,
+                    title=title,
+                    page_id=page_id,
+                    parent_id=page_parent_id,
+                )
+            )
+            planned_ids.add(page_id)
+        return plan
+
+    def _protected_page_ids(self, plan, parent_id=None):
+        '''Returns the ids of the pages a sync never deletes: the homepage of
+        the space, and the parent_id page and its ancestors'''
+
+        if parent_id is None:
+            return {plan[0].page_id}
+
+        page = self.pages.get(parent_id)
+        if page is None or 'ancestors' not in page:
+            page = self.get_page_info(parent_id, 'index')
+        protected = {self.get_space_homepage(), parent_id}
+        protected.update(ancestor['id'] for ancestor in page['ancestors'])
+        return protected
+
+    def _conversion_paths(self, plan):
+        '''Returns the paths of the files that the plan converts to html'''
+
+        paths = []
+        for action in plan:
+            if action.operation not in ('create', 'update'):
+                continue
+            if action.kind == FILE:
+                paths.append(action.path)
+                continue
+            readme_file = self._find_directory_readme(action.path)
+            if readme_file is not None:
+                paths.append(readme_file)
+        return paths
+
+    def _execute_action(self, action, page_ids):
+        '''Apply an action of a plan. page_ids maps the paths of the
+        directories to the ids of their pages, the ones of the directory
+        actions are added to it'''
+
+        with self.tracer.span(
+            '{} {}'.format(action.operation, action.kind),
+            path=action.path,
+            page_id=action.page_id,
+        ):
+            self._apply_action(action, page_ids)
+
+    def _apply_action(self, action, page_ids):
+        '''Apply an action of a plan, see _execute_action'''
+
+        parent_id = page_ids.get(action.parent_path)
+
+        if action.operation == 'delete':
+            self.delete_page(action.page_id)
+            return
+        if action.operation == 'skip':
+            self.metrics.count_page('skip')
+
+        if action.kind == HOMEPAGE:
+            if action.operation == 'skip':
+                self._record_path(
+                    action.path,
+                    action.page_id,
+                    action.fingerprint,
                 )
-                parent_ids[root] = parent_id
             else:
-                directory_parent_id = parent_ids[os.path.dirname(root)]
-                parent_id = self._create_directory_readme(
-                    root,
-                    directory_parent_id,
+                self._process_mainpage(action.path, action.page_id)
+            # The files of the root directory hang from the root of the space
+            page_ids[action.path] = None
+            return
+
+        if action.kind == DIRECTORY:
+            if action.operation == 'create':
+                page_id = self._create_directory_readme(action.path, parent_id)
+            elif action.operation == 'update':
+                self._update_directory_readme(action.path)
+                page_id = action.page_id
+            else:
+                self._record_path(
+                    action.path,
+                    action.page_id,
+                    action.fingerprint,
                 )
-                parent_ids[root] = parent_id
-            is_root_directory = False
+                page_id = action.page_id
+            page_ids[action.path] = page_id
+            return
 
-            for file in files:
-                filename = os.path.splitext(os.path.basename(file))[0]
+        if action.operation == 'skip':
+            self._record_path(action.path, action.page_id, action.fingerprint)
+            return
 
-                try:
-                    html = self.import_file(
-                        os.path.join(root, file)
-                    )
-                except UnknownExtension:
-                    continue
+        html = self.import_file(action.path)
+        if action.operation == 'update':
+            page_id = action.page_id
+            self.update_page(page_id, html, fingerprint=action.fingerprint)
+        else:
+            page_id = self.create_page(
+                action.title,
+                html,
+                parent_id,
+                fingerprint=action.fingerprint,
+            )
+        self._record_path(action.path, page_id, action.fingerprint, html)
 
-                if not filename == 'README' and file not in excluded_items:
-                    self.create_page(
-                        filename,
-                        html,
-                        parent_id,
-                    )
+    def _execute_plan_concurrently(self, actions, page_ids, jobs):
+        '''Executes the actions scheduling them as a dependency graph over a
+        pool of jobs workers.
 
-            for directory in directories:
-                if directory in excluded_items:
-                    directories.remove(directory)
+        Each directory action unblocks the actions of its files and
+        subdirectories, while the sibling actions are executed in parallel.
+        '''
+
+        children = {}
+        for action in actions:
+            children.setdefault(action.parent_path, []).append(action)
+
+        @propagate
+        def execute(action):
+            self._execute_action(action, page_ids)
+            if action.kind == FILE:
+                return []
+            return children.get(action.path, [])
+
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            pending = {
+                executor.submit(execute, action)
+                for action in children.get(None, [])
+            }
+            try:
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        for action in future.result():
+                            pending.add(executor.submit(execute, action))
+            except Exception:
+                for future in pending:
+                    future.cancel()
+                raise
+
+    def _deletion_levels(self, actions):
+        '''Split the delete actions in levels, each level has the pages whose
+        children to delete are in the previous levels, so the leaves go
+        first'''
+
+        pending = {action.page_id: action for action in actions}
+        levels = []
+        while pending:
+            parents = {
+                action.parent_id
+                for action in pending.values()
+                if action.parent_id in pending
+            }
+            level = [
+                action
+                for page_id, action in pending.items()
+                if page_id not in parents
+            ]
+            if level == []:
+                # The ancestors are inconsistent, delete the rest at once
+                level = list(pending.values())
+            for action in level:
+                del pending[action.page_id]
+            levels.append(level)
+        return levels
+
+    def _execute_deletion(self, action):
+        '''Delete the page of a delete action'''
+
+        with self.tracer.span(
+            'delete page',
+            title=action.title,
+            page_id=action.page_id,
+        ):
+            self.delete_page(action.page_id)
+
+    def _execute_deletions(self, actions, jobs=1):
+        '''Delete the pages of the delete actions leaves first, so a page is
+        never deleted at the same time as its children.
+
+        If jobs is greater than one, the pages of each level are deleted
+        concurrently with that number of workers.
+        '''
+
+        levels = self._deletion_levels(actions)
+        if jobs <= 1:
+            for level in levels:
+                for action in level:
+                    self._execute_deletion(action)
+            return
+
+        execute = propagate(self._execute_deletion)
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            for level in levels:
+                for future in [
+                    executor.submit(execute, action)
+                    for action in level
+                ]:
+                    future.result()
+
+    def execute_plan(self, plan, jobs=1, max_deletes=None):
+        '''Apply the actions of a plan to confluence.
+
+        The files that need it are converted in parallel ahead of the upload
+        if convert_workers is greater than one.
+
+        If jobs is greater than one, the actions are executed concurrently
+        with that number of workers, each page being created once the page of
+        its directory exists.
+
+        The deletions are made at the end, the children before their parents.
+        If the plan deletes more than max_deletes pages, TooManyDeletions is
+        raised before touching anything.
+        '''
+
+        deletions = plan.operations('delete')
+        _check_deletions(len(deletions), max_deletes)
+
+        page_ids = {None: plan.parent_id}
+        # The files are converted while the pages are written, so they're
+        # measured as a single phase
+        with phase('convert and write'):
+            if self.convert_workers > 1:
+                self._start_conversions(self._conversion_paths(plan))
+            try:
+                actions = [
+                    action
+                    for action in plan
+                    if action.operation != 'delete'
+                ]
+                if jobs > 1:
+                    self._execute_plan_concurrently(actions, page_ids, jobs)
+                else:
+                    for action in actions:
+                        self._execute_action(action, page_ids)
+            finally:
+                self._stop_conversions()
+
+        with phase('delete sweep'):
+            self._execute_deletions(deletions, jobs)
+
+    def directory_full_upload(
+        self,
+        path,
+        excluded_items,
+        parent_id=None,
+        jobs=1,
+    ):
+        '''Takes a path to a directory and crawls all the subdirectories and
+        files and uploads them to confluence.
+
+        The uploaded files are the ones supported by the import_file method.
+
+        Optionally you can set up a parent_id to create the confluence structure
+        hanging below a confluence article id.
+
+        If jobs is greater than one, the sibling pages are created
+        concurrently with that number of workers.
+        '''
+
+        with self.tracer.span('plan', path=path), phase('walk'):
+            plan = self.plan_full_upload(path, excluded_items, parent_id)
+        with self.tracer.span('execute', actions=len(plan)):
+            self.execute_plan(plan, jobs)
 
     def directory_update(
         self,
         path,
         excluded_items,
-        parent_id=None
+        parent_id=None,
+        jobs=1,
+        max_deletes=None,
     ):
         '''Takes a path to a directory and crawls all the subdirectories and
         files and updates them on confluence.
@@ -352,73 +1638,516 @@ class Git2SC():
         Optionally you can set up a parent_id to create the confluence structure
         hanging below a confluence article id.
 
-        Right now it will update or create each article even though it doesn't
-        have any changes.
+        The articles whose stored fingerprint matches the one of their source
+        file are not converted nor updated.
+
+        The articles of the tree that don't belong to the directory are
+        deleted, as described in plan_update. They're deleted leaves first,
+        and if there are more than max_deletes TooManyDeletions is raised
+        before touching anything.
+
+        If jobs is greater than one, the pages are created, updated and
+        deleted concurrently with that number of workers.
         '''
 
-        is_root_directory = True
-        parent_ids = {}
-        processed_articles_ids = []
-        parent_ids[path] = parent_id
+        try:
+            self._plan_and_execute(
+                path,
+                excluded_items,
+                parent_id,
+                jobs,
+                max_deletes,
+            )
+        except PageNotFound:
+            # The inventory of a long lived instance, like the ones of the
+            # watch and the server, misses the changes made in confluence
+            self._reload_inventory()
+            self._plan_and_execute(
+                path,
+                excluded_items,
+                parent_id,
+                jobs,
+                max_deletes,
+            )
+
+    def _plan_and_execute(
+        self,
+        path,
+        excluded_items,
+        parent_id=None,
+        jobs=1,
+        max_deletes=None,
+    ):
+        '''Plan the update of a directory and apply it'''
+
+        with self.tracer.span('plan', path=path), phase('walk'):
+            plan = self.plan_update(path, excluded_items, parent_id)
+        with self.tracer.span('execute', actions=len(plan)):
+            self.execute_plan(plan, jobs, max_deletes)
+
+    def _git(self, path, *arguments):
+        '''Run a git command in the repository of the path and return its
+        output'''
+
+        return subprocess.check_output(
+            ['git', '-C', path] + list(arguments),
+            shell=False,
+        ).decode()
+
+    def get_head_commit(self, path):
+        '''Get the commit checked out in the repository of the path'''
+
+        return self._git(path, 'rev-parse', 'HEAD').strip()
+
+    def contains_commit(self, path, commit):
+        '''Tell if the commit is the one checked out in the repository of the
+        path or one of its ancestors'''
+
+        return subprocess.call(
+            ['git', '-C', path, 'merge-base', '--is-ancestor', commit, 'HEAD'],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        ) == 0
+
+    def get_changed_files(self, path, since):
+        '''Get the files of the path that changed between the since revision
+        and HEAD.
+
+        Returns a tuple with the list of deleted and the list of added or
+        modified file paths relative to path. Renames are a deletion of the old
+        path and an addition of the new one.
+        '''
+
+        # The fields are separated by NUL so git doesn't quote the paths
+        # with special characters
+        output = self._git(
+            path,
+            'diff',
+            '-z',
+            '--name-status',
+            '-M',
+            '--relative',
+            since,
+            'HEAD',
+        )
+        fields = iter(output.split('\0'))
+        deleted = []
+        changed = []
+        for status in fields:
+            if status == '':
+                continue
+            status = status[0]
+            if status == 'D':
+                deleted.append(next(fields))
+            elif status == 'R':
+                deleted.append(next(fields))
+                changed.append(next(fields))
+            elif status == 'C':
+                next(fields)
+                changed.append(next(fields))
+            else:
+                changed.append(next(fields))
+        return deleted, changed
+
+    def _get_root_page_id(self, path, parent_id=None):
+        '''Get the id of the page of the root directory of a synced tree'''
+
+        if parent_id is None:
+            homepage_id = self._get_state_page_id(path)
+            if homepage_id is None:
+                homepage_id = self.get_space_homepage()
+            return homepage_id
+        return self._lookup_article_id(path, os.path.basename(path))
+
+    def _is_excluded(self, relative_path, excluded_items):
+        '''Test if any of the components of a path is excluded'''
+
+        return any(
+            item in excluded_items
+            for item in relative_path.split('/')
+        )
+
+    def _referencing_documents(self, path, excluded_items, file_paths):
+        '''Returns the documents of the tree that reference any of the files
+        that aren't documents, as their pages change with them'''
+
+        file_paths = [
+            file_path
+            for file_path in file_paths
+            if os.path.splitext(file_path)[1] not in CONVERTER_OPTIONS
+        ]
+        if not file_paths:
+            return []
+
+        documents = []
         for root, directories, files in os.walk(path):
-            if is_root_directory and parent_id is None:
-                article_id = self._process_mainpage(root)
+            directories[:] = [
+                directory
+                for directory in directories
+                if directory not in excluded_items
+            ]
+            documents += [
+                os.path.join(root, file)
+                for file in sorted(files)
+                if file not in excluded_items and
+                os.path.splitext(file)[1] in CONVERTER_OPTIONS
+            ]
+        return self.attachments.referencing(documents, file_paths, path)
+
+    def _ensure_directory_page(self, path, directory_path, parent_id=None):
+        '''Get the id of the page where the files of a directory of the
+        synced tree hang, creating the missing directory pages'''
+
+        if directory_path == path and parent_id is None:
+            return None
+
+        article_id = self._lookup_article_id(
+            directory_path,
+            os.path.basename(directory_path),
+        )
+        if article_id is not None:
+            return article_id
+
+        if directory_path == path:
+            directory_parent_id = parent_id
+        else:
+            directory_parent_id = self._ensure_directory_page(
+                path,
+                os.path.dirname(directory_path),
+                parent_id,
+            )
+        return self._create_directory_readme(
+            directory_path,
+            directory_parent_id,
+        )
+
+    def _sync_changed_file(self, path, file_path, parent_id=None):
+        '''Update or create the page of a file of the synced tree.
+
+        If one of its pages no longer exists, like when the inventory of a
+        long lived instance misses the pages deleted in confluence, the
+        inventory is loaded again and the file pushed once more.
+        '''
+
+        try:
+            self._push_changed_file(path, file_path, parent_id)
+        except PageNotFound:
+            self._reload_inventory()
+            self._push_changed_file(path, file_path, parent_id)
+
+    def _push_changed_file(self, path, file_path, parent_id=None):
+        '''Update or create the page of a file of the synced tree with the
+        known pages'''
+
+        directory_path = os.path.dirname(file_path)
+        filename = os.path.splitext(os.path.basename(file_path))[0]
+
+        if filename == 'README':
+            if directory_path == path and parent_id is None:
+                self._process_mainpage(directory_path)
+            elif self._lookup_article_id(
+                directory_path,
+                os.path.basename(directory_path),
+            ):
+                self._update_directory_readme(directory_path)
             else:
-                article_id = self._get_article_id(os.path.basename(root))
-                if is_root_directory:
-                    directory_parent_id = parent_id
-                else:
-                    directory_parent_id = parent_ids[os.path.dirname(root)]
-                if article_id is not None:
-                    self._update_directory_readme(root)
-                else:
-                    article_id = self._create_directory_readme(
-                        root,
-                        directory_parent_id,
-                    )
-                parent_ids[root] = article_id
-            processed_articles_ids.append(article_id)
+                self._ensure_directory_page(path, directory_path, parent_id)
+            return
+
+        try:
+            fingerprint = self.file_fingerprint(file_path)
+        except UnknownExtension:
+            return
 
-            for file in files:
-                filename = os.path.splitext(os.path.basename(file))[0]
+        article_id = self._lookup_article_id(file_path, filename)
+        if self._page_is_current(article_id, fingerprint, file_path):
+            self.metrics.count_page('skip')
+            return
 
-                try:
-                    html = self.import_file(
-                        os.path.join(root, file)
-                    )
-                except UnknownExtension:
-                    continue
+        html = self.import_file(file_path)
+        if article_id is not None:
+            self.update_page(article_id, html, fingerprint=fingerprint)
+        else:
+            article_id = self.create_page(
+                filename,
+                html,
+                self._ensure_directory_page(path, directory_path, parent_id),
+                fingerprint=fingerprint,
+            )
+        self._record_path(file_path, article_id, fingerprint, html)
+
+    def _pages_of_deleted_file(self, path, file_path):
+        '''Returns the ids of the pages that go away with a deleted file of
+        the synced tree, its own and the ones of the directories that no
+        longer exist'''
+
+        directory_path = os.path.dirname(file_path)
+        filename = os.path.splitext(os.path.basename(file_path))[0]
+
+        pageids = []
+        if filename != 'README':
+            pageids.append(self._lookup_article_id(file_path, filename))
+        elif os.path.isdir(directory_path):
+            # The directory page is kept without README
+            return []
+
+        while directory_path != path and not os.path.isdir(directory_path):
+            pageids.append(self._lookup_article_id(
+                directory_path,
+                os.path.basename(directory_path),
+            ))
+            directory_path = os.path.dirname(directory_path)
+        return [pageid for pageid in pageids if pageid is not None]
 
-                if not filename == 'README' and file not in excluded_items:
-                    article_id = self._get_article_id(filename)
+    def _check_deleted_files(self, path, file_paths, max_deletes=None):
+        '''Raise TooManyDeletions if the deleted files of the synced tree
+        take more than max_deletes pages with them'''
 
-                    if article_id in processed_articles_ids:
-                        continue
-                    directory_parent_id = parent_ids[root]
+        if max_deletes is None:
+            return
+        pageids = set()
+        for file_path in file_paths:
+            pageids.update(self._pages_of_deleted_file(path, file_path))
+        _check_deletions(len(pageids), max_deletes)
+
+    def _sync_deleted_file(self, path, file_path, parent_id=None):
+        '''Delete the page of a deleted file of the synced tree and the pages
+        of the directories that no longer exist'''
+
+        filename = os.path.splitext(os.path.basename(file_path))[0]
+        if filename == 'README' and os.path.isdir(os.path.dirname(file_path)):
+            # The directory page is left without README
+            self._sync_changed_file(path, file_path, parent_id)
+            return
+
+        for pageid in self._pages_of_deleted_file(path, file_path):
+            self.delete_page(pageid)
+
+    def directory_incremental_update(
+        self,
+        path,
+        excluded_items,
+        parent_id=None,
+        since=None,
+        jobs=1,
+        max_deletes=None,
+    ):
+        '''Takes a path to a directory of a git repository and updates on
+        confluence only the files that changed since the since revision.
 
-                    if article_id is not None:
-                        self.update_page(
-                            article_id,
-                            html,
-                        )
-                    else:
-                        article_id = self.create_page(
-                            filename,
-                            html,
-                            directory_parent_id,
-                        )
-                    processed_articles_ids.append(article_id)
+        If since is None, the last synced commit stored in the root page of
+        the tree is used, and if there is none, or it's not in the history
+        of HEAD, like after a force push or in a shallow clone, the whole
+        directory is updated with directory_update with jobs workers.
 
-            for directory in directories:
-                if directory in excluded_items:
-                    directories.remove(directory)
+        If the changes delete more than max_deletes pages, TooManyDeletions
+        is raised before touching anything.
 
-            is_root_directory = False
+        Once synced, HEAD is stored as the last synced commit of the tree.
+        '''
+
+        path = os.path.normpath(path)
+        self._sync_root = path
+        root_id = self._get_root_page_id(path, parent_id)
+        if since is None and root_id is not None:
+            since = self.get_synced_commit(root_id)
+            if since is not None and not self.contains_commit(path, since):
+                print(
+                    'The synced commit {} is not in the history of HEAD, '
+                    'syncing the whole directory'.format(since)
+                )
+                since = None
+
+        head = self.get_head_commit(path)
+
+        if since is None:
+            self.directory_update(
+                path,
+                excluded_items,
+                parent_id,
+                jobs,
+                max_deletes,
+            )
+        else:
+            deleted, changed = [
+                [
+                    os.path.join(path, relative_path)
+                    for relative_path in relative_paths
+                    if not self._is_excluded(relative_path, excluded_items)
+                ]
+                for relative_paths in self.get_changed_files(path, since)
+            ]
+            # The pages of the documents that reference a changed file change
+            # with it
+            changed += [
+                file_path
+                for file_path in self._referencing_documents(
+                    path,
+                    excluded_items,
+                    deleted + changed,
+                )
+                if file_path not in changed
+            ]
+            self._check_deleted_files(path, deleted, max_deletes)
+            for file_path in deleted:
+                self._sync_deleted_file(path, file_path, parent_id)
+            for file_path in changed:
+                self._sync_changed_file(path, file_path, parent_id)
+
+        # The sync may have created the page of the root directory
+        root_id = self._get_root_page_id(path, parent_id)
+        self.set_synced_commit(root_id, head)
+
+    def _sync_watched_changes(
+        self,
+        path,
+        excluded_items,
+        changes,
+        parent_id=None,
+        jobs=1,
+        max_deletes=None,
+    ):
+        '''Push the files of a batch of changes of a watched tree, the errors
+        of a file are printed so they don't stop the watch.
+
+        The deletions of a batch that deletes more than max_deletes pages are
+        skipped.
+        '''
+
+        if changes.overflow:
+            print('Too many changes to follow, syncing the whole directory')
+            try:
+                self.directory_update(
+                    path,
+                    excluded_items,
+                    parent_id,
+                    jobs,
+                    max_deletes,
+                )
+            except TooManyDeletions as error:
+                print(error)
+            return
+
+        # Only the supported files have pages, the temporary and backup
+        # files of the editors are left out
+        def is_document(file_path):
+            return os.path.splitext(file_path)[1] in CONVERTER_OPTIONS
+
+        deleted = sorted(filter(is_document, changes.deleted))
+        try:
+            self._check_deleted_files(path, deleted, max_deletes)
+        except TooManyDeletions as error:
+            print(error)
+            deleted = []
+        for file_path in deleted:
+            try:
+                self._sync_deleted_file(path, file_path, parent_id)
+            except Exception as error:
+                print('Error deleting {}: {}'.format(file_path, error))
+
+        # The pages of the documents that reference a changed file change
+        # with it
+        changed = set(filter(is_document, changes.changed))
+        changed.update(self._referencing_documents(
+            path,
+            excluded_items,
+            changes.deleted | changes.changed,
+        ))
+
+        for file_path in sorted(changed):
+            if not os.path.isfile(file_path):
+                continue
+            try:
+                self._sync_changed_file(path, file_path, parent_id)
+            except Exception as error:
+                print('Error syncing {}: {}'.format(file_path, error))
 
-        for page_id in self.pages.keys():
-            if page_id not in processed_articles_ids:
-                self.delete_page(page_id)
+    def directory_watch(
+        self,
+        path,
+        excluded_items,
+        parent_id=None,
+        jobs=1,
+        max_deletes=None,
+        debounce=0.5,
+        max_delay=10,
+        stop=None,
+        watcher=None,
+    ):
+        '''Takes a path to a directory, syncs it with directory_update and
+        keeps it synced, pushing the files that change under it until the
+        stop event is set.
+
+        The events of the tree are collected until there are none for
+        debounce seconds, or for max_delay seconds since the first one, so a
+        burst of changes like a checkout is pushed at once. Each file is
+        pushed once per batch, with the inventory and the connections of the
+        instance kept warm between batches.
+        '''
+
+        path = os.path.normpath(path)
+        if watcher is None:
+            watcher = TreeWatcher(path, excluded_items)
+        # The tree is watched before the first sync, so the changes made
+        # during it are pushed afterwards
+        watcher.start()
+        try:
+            self.directory_update(
+                path,
+                excluded_items,
+                parent_id,
+                jobs,
+                max_deletes,
+            )
+            while stop is None or not stop.is_set():
+                changes = watcher.wait(debounce, max_delay, stop)
+                if changes:
+                    self._sync_watched_changes(
+                        path,
+                        excluded_items,
+                        changes,
+                        parent_id,
+                        jobs,
+                        max_deletes,
+                    )
+        finally:
+            watcher.close()
+
+
+def _descendants(root_id, children):
+    '''Returns the ids of the pages that hang from the root_id page, children
+    returns the ids of the direct children of a page'''
+
+    descendants = set()
+    pending = [root_id]
+    while pending:
+        for child_id in children(pending.pop()):
+            if child_id not in descendants:
+                descendants.add(child_id)
+                pending.append(child_id)
+    return sorted(descendants)
 
 
 class UnknownExtension(Exception):
     pass
+
+
+def _check_deletions(deletions, max_deletes):
+    '''Raise TooManyDeletions if a sync deletes more than max_deletes pages,
+    there is no limit if it's None'''
+
+    if max_deletes is not None and deletions > max_deletes:
+        raise TooManyDeletions(
+            'The sync would delete {} pages and the limit is {}'.format(
+                deletions,
+                max_deletes,
+            )
+        )
+
+
+class TooManyDeletions(Exception):
+    pass
+
+
+class PageNotFound(Exception):
+    pass
@@ -0,0 +1,394 @@
+import os
+import json
+import time
+import tempfile
+import threading
+
+# Upper bounds in seconds of the buckets of the latency histograms
+REQUEST_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+CONVERSION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+PAGE_OPERATIONS = ['create', 'update', 'skip', 'delete']
+ATTACHMENT_OPERATIONS = ['upload', 'skip']
+
+
+class Histogram():
+    '''Distribution of observed values over fixed buckets, as prometheus
+    histograms do. The counts of the buckets are not cumulative'''
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        '''Add a value to the distribution'''
+
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            position = len(self.buckets)
+        self.counts[position] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        '''Add the values of another histogram with the same buckets'''
+
+        self.counts = [
+            count + other_count
+            for count, other_count in zip(self.counts, other.counts)
+        ]
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def cumulative_counts(self):
+        '''Returns the upper bound and the number of values less or equal to
+        it of each bucket, the last bound is infinite'''
+
+        bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+        counts = []
+        total = 0
+        for count in self.counts:
+            total += count
+            counts.append(total)
+        return list(zip(bounds, counts))
+
+    def summary(self):
+        '''Returns a dictionary with the count, sum, mean, max and the
+        cumulative counts of the buckets'''
+
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else 0.0,
+            'max': self.max,
+            'buckets': dict(self.cumulative_counts()),
+        }
+
+
+class SyncMetrics():
+    '''Counters of a git2sc run: the pages created, updated, skipped and
+    deleted, the requests and their latency per endpoint, the time spent by
+    each converter and the bytes sent and received.
+
+    The labels are added to all the prometheus metrics, to tell apart the
+    runs of different spaces in the same node exporter.
+    '''
+
+    def __init__(self, labels=None):
+        self.labels = labels or {}
+        self.started = time.time()
+        self.pages = {operation: 0 for operation in PAGE_OPERATIONS}
+        self.attachments = {
+            operation: 0 for operation in ATTACHMENT_OPERATIONS
+        }
+        self.requests = {}
+        self.request_latency = {}
+        self.conversion_time = {}
+        self.cache_hits = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self._lock = threading.Lock()
+
+    def count_page(self, operation):
+        '''Count a page created, updated, skipped or deleted'''
+
+        with self._lock:
+            self.pages[operation] += 1
+
+    def count_attachment(self, operation):
+        '''Count an attachment uploaded or skipped because the page already
+        had it'''
+
+        with self._lock:
+            self.attachments[operation] += 1
+
+    def observe_request(
+        self,
+        method,
+        endpoint,
+        status,
+        seconds,
+        sent=0,
+        received=0,
+    ):
+        '''Record a response of the api, status is the status code or error
+        if no response was received'''
+
+        key = (method, endpoint)
+        with self._lock:
+            statuses = self.requests.setdefault(key, {})
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            if key not in self.request_latency:
+                self.request_latency[key] = Histogram(REQUEST_BUCKETS)
+            self.request_latency[key].observe(seconds)
+            self.bytes_sent += sent
+            self.bytes_received += received
+
+    def observe_conversion(self, converter, seconds):
+        '''Record the time a converter took to render a file'''
+
+        with self._lock:
+            if converter not in self.conversion_time:
+                self.conversion_time[converter] = Histogram(
+                    CONVERSION_BUCKETS,
+                )
+            self.conversion_time[converter].observe(seconds)
+
+    def count_cache_hit(self):
+        '''Count a file taken from the rendered html cache'''
+
+        with self._lock:
+            self.cache_hits += 1
+
+    def merge(self, other):
+        '''Add the counters and the histograms of other metrics, like the
+        ones of the spaces of a batch'''
+
+        with other._lock:
+            pages = dict(other.pages)
+            attachments = dict(other.attachments)
+            requests = {
+                key: dict(statuses) for key, statuses in other.requests.items()
+            }
+            histograms = [
+                (self.request_latency, REQUEST_BUCKETS, key, histogram)
+                for key, histogram in other.request_latency.items()
+            ] + [
+                (self.conversion_time, CONVERSION_BUCKETS, key, histogram)
+                for key, histogram in other.conversion_time.items()
+            ]
+            cache_hits = other.cache_hits
+            bytes_sent = other.bytes_sent
+            bytes_received = other.bytes_received
+
+        with self._lock:
+            for operation, count in pages.items():
+                self.pages[operation] += count
+            for operation, count in attachments.items():
+                self.attachments[operation] += count
+            for key, statuses in requests.items():
+                own_statuses = self.requests.setdefault(key, {})
+                for status, count in statuses.items():
+                    own_statuses[status] = own_statuses.get(status, 0) + count
+            for own_histograms, buckets, key, histogram in histograms:
+                if key not in own_histograms:
+                    own_histograms[key] = Histogram(buckets)
+                own_histograms[key].merge(histogram)
+            self.cache_hits += cache_hits
+            self.bytes_sent += bytes_sent
+            self.bytes_received += bytes_received
+
+    def summary(self):
+        '''Returns the metrics as a dictionary that can be dumped to json'''
+
+        with self._lock:
+            return {
+                'labels': dict(self.labels),
+                'started': self.started,
+                'duration': time.time() - self.started,
+                'pages': dict(self.pages),
+                'attachments': dict(self.attachments),
+                'requests': {
+                    '{} {}'.format(method, endpoint): {
+                        'statuses': dict(statuses),
+                        'latency': self.request_latency[
+                            (method, endpoint)
+                        ].summary(),
+                    }
+                    for (method, endpoint), statuses in sorted(
+                        self.requests.items()
+                    )
+                },
+                'conversions': {
+                    converter: histogram.summary()
+                    for converter, histogram in sorted(
+                        self.conversion_time.items()
+                    )
+                },
+                'cache_hits': self.cache_hits,
+                'bytes': {
+                    'sent': self.bytes_sent,
+                    'received': self.bytes_received,
+                },
+            }
+
+    def to_json(self):
+        '''Returns the summary of the metrics as json'''
+
+        return json.dumps(self.summary(), indent=2)
+
+    def _labels(self, **labels):
+        '''Format the labels of a prometheus sample, the ones of the metrics
+        go first'''
+
+        labels = dict(self.labels, **labels)
+        if not labels:
+            return ''
+        return '{{{}}}'.format(','.join(
+            '{}="{}"'.format(
+                name,
+                str(value).replace('\\', '\\\\').replace('"', '\\"'),
+            )
+            for name, value in labels.items()
+        ))
+
+    def _histogram_lines(self, name, histogram, **labels):
+        lines = []
+        for bound, count in histogram.cumulative_counts():
+            lines.append('{}_bucket{} {}'.format(
+                name,
+                self._labels(le=bound, **labels),
+                count,
+            ))
+        lines.append('{}_sum{} {}'.format(
+            name,
+            self._labels(**labels),
+            histogram.sum,
+        ))
+        lines.append('{}_count{} {}'.format(
+            name,
+            self._labels(**labels),
+            histogram.count,
+        ))
+        return lines
+
+    def to_prometheus(self):
+        '''Returns the metrics in the prometheus text exposition format'''
+
+        summary = self.summary()
+        lines = [
+            '# HELP git2sc_pages_total Pages processed by operation.',
+            '# TYPE git2sc_pages_total counter',
+        ]
+        for operation, count in summary['pages'].items():
+            lines.append('git2sc_pages_total{} {}'.format(
+                self._labels(operation=operation),
+                count,
+            ))
+
+        lines += [
+            '# HELP git2sc_attachments_total Attachments uploaded or '
+            'skipped.',
+            '# TYPE git2sc_attachments_total counter',
+        ]
+        for operation, count in summary['attachments'].items():
+            lines.append('git2sc_attachments_total{} {}'.format(
+                self._labels(operation=operation),
+                count,
+            ))
+
+        lines += [
+            '# HELP git2sc_requests_total Confluence api responses by '
+            'endpoint and status.',
+            '# TYPE git2sc_requests_total counter',
+        ]
+        with self._lock:
+            requests = sorted(self.requests.items())
+            latencies = sorted(self.request_latency.items())
+            conversions = sorted(self.conversion_time.items())
+        for (method, endpoint), statuses in requests:
+            for status, count in sorted(statuses.items()):
+                lines.append('git2sc_requests_total{} {}'.format(
+                    self._labels(
+                        method=method,
+                        endpoint=endpoint,
+                        status=status,
+                    ),
+                    count,
+                ))
+
+        lines += [
+            '# HELP git2sc_request_duration_seconds Latency of the '
+            'Confluence api requests.',
+            '# TYPE git2sc_request_duration_seconds histogram',
+        ]
+        for (method, endpoint), histogram in latencies:
+            lines += self._histogram_lines(
+                'git2sc_request_duration_seconds',
+                histogram,
+                method=method,
+                endpoint=endpoint,
+            )
+
+        lines += [
+            '# HELP git2sc_conversion_duration_seconds Time spent rendering '
+            'the files by converter.',
+            '# TYPE git2sc_conversion_duration_seconds histogram',
+        ]
+        for converter, histogram in conversions:
+            lines += self._histogram_lines(
+                'git2sc_conversion_duration_seconds',
+                histogram,
+                converter=converter,
+            )
+
+        lines += [
+            '# HELP git2sc_cache_hits_total Files taken from the rendered '
+            'html cache.',
+            '# TYPE git2sc_cache_hits_total counter',
+            'git2sc_cache_hits_total{} {}'.format(
+                self._labels(),
+                summary['cache_hits'],
+            ),
+            '# HELP git2sc_sent_bytes_total Bytes of the request bodies.',
+            '# TYPE git2sc_sent_bytes_total counter',
+            'git2sc_sent_bytes_total{} {}'.format(
+                self._labels(),
+                summary['bytes']['sent'],
+            ),
+            '# HELP git2sc_received_bytes_total Bytes of the response '
+            'bodies.',
+            '# TYPE git2sc_received_bytes_total counter',
+            'git2sc_received_bytes_total{} {}'.format(
+                self._labels(),
+                summary['bytes']['received'],
+            ),
+            '# HELP git2sc_run_duration_seconds Duration of the last run.',
+            '# TYPE git2sc_run_duration_seconds gauge',
+            'git2sc_run_duration_seconds{} {}'.format(
+                self._labels(),
+                summary['duration'],
+            ),
+            '# HELP git2sc_last_run_timestamp_seconds Time the last run '
+            'finished.',
+            '# TYPE git2sc_last_run_timestamp_seconds gauge',
+            'git2sc_last_run_timestamp_seconds{} {}'.format(
+                self._labels(),
+                summary['started'] + summary['duration'],
+            ),
+        ]
+        return '\n'.join(lines) + '\n'
+
+    def write_json(self, path):
+        '''Write the summary of the metrics to a json file, or to the
+        standard output if path is -'''
+
+        if path == '-':
+            print(self.to_json())
+        else:
+            _write_atomically(path, self.to_json() + '\n')
+
+    def write_prometheus(self, path):
+        '''Write the metrics to a textfile of the node exporter textfile
+        collector'''
+
+        _write_atomically(path, self.to_prometheus())
+
+
+def _write_atomically(path, content):
+    '''Write a file through a temporary one, so the readers like the node
+    exporter never see it half written'''
+
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(descriptor, 'w') as f:
+        f.write(content)
+    os.chmod(temporary_path, 0o644)
+    os.replace(temporary_path, path)
@@ -0,0 +1,85 @@
+def parent_id_of(page):
+    '''Returns the id of the direct parent of a confluence page or None if
+    it doesn't have ancestors'''
+
+    try:
+        return page['ancestors'][-1]['id']
+    except (KeyError, IndexError):
+        return None
+
+
+class PageIndex(dict):
+    '''Dictionary of confluence pages by page id that keeps a title to id and
+    a parent to children indexes updated on each change, so the lookups don't
+    need to scan all the pages of the space'''
+
+    def __init__(self, pages=None):
+        super().__init__()
+        self._titles = {}
+        self._children = {}
+        self._keys = {}
+        if pages is not None:
+            self.update(pages)
+
+    def __setitem__(self, pageid, page):
+        if pageid in self:
+            self._unindex(pageid)
+        super().__setitem__(pageid, page)
+        self._index(pageid, page)
+
+    def __delitem__(self, pageid):
+        super().__delitem__(pageid)
+        self._unindex(pageid)
+
+    def pop(self, pageid, *default):
+        if pageid in self:
+            self._unindex(pageid)
+        return super().pop(pageid, *default)
+
+    def update(self, *args, **kwargs):
+        for pageid, page in dict(*args, **kwargs).items():
+            self[pageid] = page
+
+    def clear(self):
+        super().clear()
+        self._titles.clear()
+        self._children.clear()
+        self._keys.clear()
+
+    def _index(self, pageid, page):
+        '''Add the page to the title and children indexes'''
+
+        title = page.get('title')
+        parent_id = parent_id_of(page)
+        if title is not None:
+            self._titles[title] = pageid
+        self._children.setdefault(parent_id, set()).add(pageid)
+        self._keys[pageid] = (title, parent_id)
+
+    def _unindex(self, pageid):
+        '''Remove the page from the title and children indexes, we use the
+        keys it was indexed with as the page may have been changed in place'''
+
+        title, parent_id = self._keys.pop(pageid)
+        if self._titles.get(title) == pageid:
+            del self._titles[title]
+        siblings = self._children.get(parent_id, set())
+        siblings.discard(pageid)
+        if not siblings:
+            self._children.pop(parent_id, None)
+
+    def reindex(self, pageid):
+        '''Update the indexes of a page that has been changed in place'''
+
+        self[pageid] = self[pageid]
+
+    def get_id(self, title):
+        '''Returns the id of the page with the title or None if it doesn't
+        exist'''
+
+        return self._titles.get(title)
+
+    def children(self, parent_id):
+        '''Returns the ids of the pages whose direct parent is parent_id'''
+
+        return set(self._children.get(parent_id, set()))
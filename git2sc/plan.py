@@ -0,0 +1,100 @@
+# Confluence api calls made to execute each operation of a plan:
+# * create: POST of the page with its fingerprint.
+# * update: PUT of the page and POST or PUT of its fingerprint property.
+# * delete: DELETE of the page.
+API_CALLS = {
+    'create': 1,
+    'update': 2,
+    'delete': 1,
+    'skip': 0,
+}
+
+OPERATIONS = ['create', 'update', 'delete', 'skip']
+
+# Kinds of the paths of a plan
+HOMEPAGE = 'homepage'
+DIRECTORY = 'directory'
+FILE = 'file'
+PAGE = 'page'
+
+
+class SyncAction():
+    '''Operation to apply to the page of a path of the synced tree.
+
+    The parent of the pages to create is the page of the parent_path
+    directory, which may be created by a previous action of the plan. The
+    parent_id of the pages to delete is used to delete the children first.
+    '''
+
+    def __init__(
+        self,
+        operation,
+        kind,
+        path,
+        title=None,
+        page_id=None,
+        parent_path=None,
+        fingerprint=None,
+        parent_id=None,
+    ):
+        if operation not in OPERATIONS:
+            raise ValueError('Unknown operation {}'.format(operation))
+        self.operation = operation
+        self.kind = kind
+        self.path = path
+        self.title = title
+        self.page_id = page_id
+        self.parent_path = parent_path
+        self.fingerprint = fingerprint
+        self.parent_id = parent_id
+
+    def __repr__(self):
+        return 'SyncAction({}, {}, {})'.format(
+            self.operation,
+            self.kind,
+            self.path or self.page_id,
+        )
+
+    def __str__(self):
+        target = self.path or self.title
+        if target is None:
+            target = 'page {}'.format(self.page_id)
+        return '{:<6} {:<9} {}'.format(self.operation, self.kind, target)
+
+
+class SyncPlan(list):
+    '''Ordered list of the actions of a sync, the directories go before their
+    contents and the deletions at the end.
+
+    The pages of the root directory hang from parent_id.
+    '''
+
+    def __init__(self, actions=None, parent_id=None):
+        super().__init__(actions or [])
+        self.parent_id = parent_id
+
+    def operations(self, operation):
+        '''Returns the actions of an operation'''
+
+        return [action for action in self if action.operation == operation]
+
+    def api_calls(self):
+        '''Estimated number of Confluence api calls to execute the plan'''
+
+        return sum(API_CALLS[action.operation] for action in self)
+
+    def summary(self):
+        '''Returns a one line report of the plan'''
+
+        return '{}, {} api calls'.format(
+            ', '.join(
+                '{} {}'.format(len(self.operations(operation)), operation)
+                for operation in OPERATIONS
+            ),
+            self.api_calls(),
+        )
+
+    def __str__(self):
+        return '\n'.join(
+            [str(action) for action in self] + [self.summary()]
+        )
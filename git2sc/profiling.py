@@ -0,0 +1,294 @@
+import os
+import sys
+import time
+import pstats
+import cProfile
+import resource
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+PROFILE_MODES = ['cpu', 'mem']
+
+# Files whose allocations are left out of the memory reports
+IGNORED_FILES = {
+    tracemalloc.__file__,
+    '<frozen importlib._bootstrap>',
+    '<unknown>',
+}
+
+# tracemalloc.reset_peak is new in python 3.9
+_reset_peak = getattr(tracemalloc, 'reset_peak', None)
+
+# Memory profiler of the running profile, the phases are only measured while
+# there's one. tracemalloc and the profilers are process wide, so there can
+# only be one at a time.
+_memory_profiler = None
+
+
+@contextmanager
+def phase(name):
+    '''Mark the block as a phase of the run for the memory profiler, it does
+    nothing if the memory isn't being profiled'''
+
+    profiler = _memory_profiler
+    if profiler is None:
+        yield
+        return
+
+    profiler.enter(name)
+    try:
+        yield
+    finally:
+        profiler.exit()
+
+
+def _size(size):
+    '''Format a number of bytes'''
+
+    for unit in ['B', 'KiB', 'MiB']:
+        if abs(size) < 1024:
+            return '{:.1f} {}'.format(size, unit)
+        size /= 1024
+    return '{:.1f} GiB'.format(size)
+
+
+def _max_rss():
+    '''Returns the peak resident memory of the process in bytes'''
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # It's in kilobytes on linux and in bytes on macos
+    if sys.platform == 'darwin':
+        return max_rss
+    return max_rss * 1024
+
+
+class CPUProfiler():
+    '''Profiles the cpu time of the run with cProfile, in all the threads
+    started while it runs'''
+
+    def __init__(self, top=25):
+        self.top = top
+        self.profiles = []
+        self._lock = threading.Lock()
+
+    def _new_profile(self):
+        profile = cProfile.Profile()
+        with self._lock:
+            self.profiles.append(profile)
+        profile.enable()
+
+    def _profile_thread(self, frame, event, arg):
+        '''Start profiling a new thread on its first event'''
+
+        self._new_profile()
+
+    def start(self):
+        self._new_profile()
+        # Since python 3.12 a profile sees all the threads
+        if sys.version_info < (3, 12):
+            threading.setprofile(self._profile_thread)
+
+    def stop(self):
+        if sys.version_info < (3, 12):
+            threading.setprofile(None)
+        for profile in self.profiles:
+            profile.disable()
+
+    def write(self, path_prefix):
+        '''Write the profile to path_prefix.prof and the top functions by
+        cumulative time to path_prefix.txt, returns their paths'''
+
+        stats = pstats.Stats(*self.profiles)
+        stats.dump_stats(path_prefix + '.prof')
+        with open(path_prefix + '.txt', 'w') as f:
+            stats.stream = f
+            stats.sort_stats('cumulative').print_stats(self.top)
+        return [path_prefix + '.prof', path_prefix + '.txt']
+
+
+class MemoryProfiler():
+    '''Profiles the memory allocated in each phase of the run with
+    tracemalloc snapshots taken when the phases start and end.
+
+    Each thread has its own stack of phases, the ones of the worker threads
+    hang from the run phase. The memory is traced for the whole process, so
+    the peaks and allocations of the phases that run at the same time
+    include each other's.
+    '''
+
+    def __init__(self, top=25, frames=1):
+        self.top = top
+        self.frames = frames
+        self.phases = []
+        self._stacks = []
+        self._local = threading.local()
+        self._last_peak = 0
+        self._lock = threading.Lock()
+
+    def _thread_stack(self):
+        '''Returns the stack of running phases of the current thread'''
+
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            # The first thread runs the run phase, the others nest in it
+            self._local.depth = 1 if self._stacks else 0
+            stack = self._local.stack = []
+            self._stacks.append(stack)
+        return stack
+
+    def _top_allocations(self, snapshot, previous):
+        '''Returns the lines that allocated more memory between the
+        snapshots'''
+
+        return [
+            statistic
+            for statistic in snapshot.compare_to(previous, 'lineno')
+            if statistic.traceback[0].filename not in IGNORED_FILES
+        ][:self.top]
+
+    def _update_peaks(self):
+        '''Fold the peak since the last reset in the peaks of the running
+        phases and return the current memory'''
+
+        current, peak = tracemalloc.get_traced_memory()
+        if _reset_peak is None:
+            # The peak can't be reset, it belongs to the running phases only
+            # if it grew since the last time
+            if peak > self._last_peak:
+                self._last_peak = peak
+            else:
+                peak = current
+        for stack in self._stacks:
+            for running in stack:
+                running['peak'] = max(running['peak'], peak)
+        return current
+
+    def enter(self, name):
+        '''Start a phase, they can be nested'''
+
+        with self._lock:
+            stack = self._thread_stack()
+            current = self._update_peaks()
+            if _reset_peak is not None:
+                _reset_peak()
+            stack.append({
+                'name': name,
+                'depth': self._local.depth + len(stack),
+                'started': time.perf_counter(),
+                'start_memory': current,
+                'peak': current,
+                'snapshot': tracemalloc.take_snapshot(),
+            })
+
+    def exit(self):
+        '''End the last phase started by the thread'''
+
+        with self._lock:
+            current = self._update_peaks()
+            running = self._thread_stack().pop()
+            snapshot = tracemalloc.take_snapshot()
+            self.phases.append({
+                'name': running['name'],
+                'depth': running['depth'],
+                'started': running['started'],
+                'duration': time.perf_counter() - running['started'],
+                'start_memory': running['start_memory'],
+                'end_memory': current,
+                'peak': running['peak'],
+                'allocations': self._top_allocations(
+                    snapshot,
+                    running['snapshot'],
+                ),
+            })
+
+    def start(self):
+        tracemalloc.start(self.frames)
+        self.enter('run')
+
+    def stop(self):
+        self.exit()
+        tracemalloc.stop()
+
+    def report(self):
+        '''Returns the report of the phases and their top allocations'''
+
+        # The run phase wraps the others, it ends the last
+        run = self.phases[-1]
+        phases = sorted(self.phases, key=lambda phase: phase['started'])
+        lines = [
+            'Peak traced memory {}, peak resident memory {}'.format(
+                _size(run['peak']),
+                _size(_max_rss()),
+            ),
+            '',
+            '{:<24} {:>9} {:>11} {:>11} {:>11}'.format(
+                'Phase', 'Duration', 'Start', 'End', 'Peak',
+            ),
+        ]
+        for phase in phases:
+            lines.append('{:<24} {:>8.2f}s {:>11} {:>11} {:>11}'.format(
+                '  ' * phase['depth'] + phase['name'],
+                phase['duration'],
+                _size(phase['start_memory']),
+                _size(phase['end_memory']),
+                _size(phase['peak']),
+            ))
+
+        for phase in phases:
+            lines += [
+                '',
+                'Top {} allocations of the {} phase:'.format(
+                    self.top,
+                    phase['name'],
+                ),
+            ]
+            lines += [
+                '  {}'.format(statistic)
+                for statistic in phase['allocations']
+            ]
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path_prefix):
+        '''Write the report to path_prefix.mem.txt, returns its path'''
+
+        with open(path_prefix + '.mem.txt', 'w') as f:
+            f.write(self.report())
+        return [path_prefix + '.mem.txt']
+
+
+@contextmanager
+def profile(mode, directory='.', name='git2sc', top=25):
+    '''Profile the block with the cpu or mem profiler and write its reports
+    to the directory, they're named after name and the time of the run.
+
+    Returns the list of written reports, it does nothing if mode is None.
+    '''
+
+    global _memory_profiler
+
+    reports = []
+    if mode is None:
+        yield reports
+        return
+
+    if mode == 'cpu':
+        profiler = CPUProfiler(top)
+    elif mode == 'mem':
+        profiler = MemoryProfiler(top)
+    else:
+        raise ValueError('Unknown profile mode {}'.format(mode))
+
+    profiler.start()
+    if mode == 'mem':
+        _memory_profiler = profiler
+    try:
+        yield reports
+    finally:
+        _memory_profiler = None
+        profiler.stop()
+        os.makedirs(directory, exist_ok=True)
+        reports.extend(profiler.write(os.path.join(
+            directory,
+            '{}-{}'.format(name, time.strftime('%Y%m%d-%H%M%S')),
+        )))
@@ -0,0 +1,413 @@
+import os
+import re
+import hmac
+import json
+import time
+import itertools
+import threading
+import collections
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+COMMIT_PATTERN = re.compile(r'^[0-9a-f]{7,40}$')
+
+
+class InvalidJob(Exception):
+    pass
+
+
+class SyncJob():
+    '''Sync of a directory to a space requested by one or more pushes, the
+    pushes of the same tree that arrive while it's queued are merged in it'''
+
+    def __init__(self, job_id, space, path, commit=None, parent_id=None):
+        self.id = job_id
+        self.space = space
+        self.path = path
+        self.commit = commit
+        self.parent_id = parent_id
+        self.pushes = 1
+        self.status = 'queued'
+        self.error = None
+        self.queued = time.time()
+        self.started = None
+        self.finished = None
+
+    @property
+    def key(self):
+        '''Jobs with the same key sync the same tree'''
+
+        return (self.space, self.path, self.parent_id)
+
+    def merge(self, job):
+        '''Take a newer push of the same tree'''
+
+        self.commit = job.commit
+        self.pushes += job.pushes
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'space': self.space,
+            'path': self.path,
+            'commit': self.commit,
+            'parent_id': self.parent_id,
+            'pushes': self.pushes,
+            'status': self.status,
+            'error': self.error,
+            'queued': self.queued,
+            'started': self.started,
+            'finished': self.finished,
+        }
+
+
+class JobQueue():
+    '''Queue of sync jobs that coalesces the pushes of the same tree in one
+    job and hands out the jobs of a space one at a time, so a space is never
+    synced twice at once'''
+
+    def __init__(self):
+        self._pending = collections.OrderedDict()
+        self._busy_spaces = set()
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def __len__(self):
+        with self._condition:
+            return len(self._pending)
+
+    def put(self, job):
+        '''Queue a job, returns the queued one, which is an older job of the
+        same tree if there was one waiting'''
+
+        with self._condition:
+            if self._closed:
+                raise InvalidJob('The queue is closed')
+            queued = self._pending.get(job.key)
+            if queued is not None:
+                queued.merge(job)
+                return queued
+            self._pending[job.key] = job
+            self._condition.notify_all()
+            return job
+
+    def get(self, timeout=None):
+        '''Wait for the oldest job whose space isn't being synced, returns
+        None if the queue is closed or the timeout expires'''
+
+        with self._condition:
+            while not self._closed:
+                for key, job in self._pending.items():
+                    if job.space not in self._busy_spaces:
+                        del self._pending[key]
+                        self._busy_spaces.add(job.space)
+                        return job
+                if not self._condition.wait(timeout):
+                    return None
+            return None
+
+    def task_done(self, job):
+        '''Mark the job taken with get as finished, so the next job of its
+        space can start'''
+
+        with self._condition:
+            self._busy_spaces.discard(job.space)
+            self._condition.notify_all()
+
+    def close(self):
+        '''Stop handing out jobs, the pending ones are dropped'''
+
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+class SyncService():
+    '''Runs the sync jobs with a pool of workers.
+
+    A Git2SC instance is kept per space and reused by all its jobs, so the
+    space inventory and the pooled connections survive between pushes. The
+    factory builds the instance of a space the first time it's needed, and
+    instances maps the spaces to the ones already built.
+
+    If allowed_paths is given, only the directories under them can be
+    synced.
+    '''
+
+    def __init__(
+        self,
+        factory,
+        workers=2,
+        excluded_items=('.git', '.gitignore', '.gitmodules'),
+        instances=None,
+        allowed_paths=None,
+        history=100,
+    ):
+        self.factory = factory
+        self.excluded_items = list(excluded_items)
+        self.instances = dict(instances or {})
+        self.allowed_paths = None
+        if allowed_paths:
+            self.allowed_paths = [
+                os.path.realpath(path) for path in allowed_paths
+            ]
+        self.history = history
+        self.queue = JobQueue()
+        self.jobs = collections.OrderedDict()
+        self._built_spaces = set()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._workers = [
+            threading.Thread(target=self._work, daemon=True)
+            for _ in range(workers)
+        ]
+
+    def start(self):
+        for worker in self._workers:
+            worker.start()
+        return self
+
+    def stop(self):
+        '''Wait for the running jobs and close the instances built by the
+        service'''
+
+        self.queue.close()
+        for worker in self._workers:
+            if worker.is_alive():
+                worker.join()
+        for space in self._built_spaces:
+            self.instances[space].close()
+
+    def _check_path(self, path):
+        if self.allowed_paths is None:
+            return
+        real_path = os.path.realpath(path)
+        for allowed_path in self.allowed_paths:
+            if os.path.commonpath([real_path, allowed_path]) == allowed_path:
+                return
+        raise InvalidJob('The path {} is not allowed'.format(path))
+
+    def submit(self, space, path, commit=None, parent_id=None):
+        '''Queue the sync of a directory to a space, returns its job'''
+
+        path = os.path.normpath(path)
+        self._check_path(path)
+        with self._lock:
+            job = SyncJob(next(self._ids), space, path, commit, parent_id)
+        queued = self.queue.put(job)
+        if queued is job:
+            with self._lock:
+                self.jobs[job.id] = job
+                while len(self.jobs) > self.history:
+                    self.jobs.popitem(last=False)
+        return queued
+
+    def get_job(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def _instance(self, space):
+        '''Returns the Git2SC instance of a space, building it if needed'''
+
+        with self._lock:
+            if space not in self.instances:
+                self.instances[space] = self.factory(space)
+                self._built_spaces.add(space)
+            return self.instances[space]
+
+    def _work(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            try:
+                self.run(job)
+            finally:
+                self.queue.task_done(job)
+
+    def run(self, job):
+        '''Sync the tree of a job to its space, the errors are stored in the
+        job.
+
+        The parent page of the job has to be a page of its space, and the
+        pushed commit has to be checked out in the repository, or be an
+        ancestor of the checked out one, as the working tree is what's
+        synced.
+        '''
+
+        job.status = 'running'
+        job.started = time.time()
+        try:
+            g = self._instance(job.space)
+            if job.parent_id is not None and \
+                    not g.is_space_page(job.parent_id):
+                raise InvalidJob('The page {} is not in the space {}'.format(
+                    job.parent_id,
+                    job.space,
+                ))
+            if job.commit is not None and \
+                    not g.contains_commit(job.path, job.commit):
+                raise InvalidJob(
+                    'The commit {} is not checked out in {}'.format(
+                        job.commit,
+                        job.path,
+                    )
+                )
+            g.directory_incremental_update(
+                job.path,
+                self.excluded_items,
+                job.parent_id,
+            )
+        except Exception as error:
+            job.status = 'failed'
+            job.error = '{}: {}'.format(type(error).__name__, error)
+            print('Job {} failed: {}'.format(job.id, job.error))
+        else:
+            job.status = 'done'
+            print('Job {} synced {} to {} ({} pushes)'.format(
+                job.id,
+                job.path,
+                job.space,
+                job.pushes,
+            ))
+        finally:
+            job.finished = time.time()
+
+
+class WebhookServer():
+    '''HTTP server that queues a sync job for each push webhook it receives.
+
+    The pushes are POSTed to /sync with a json payload with the path of the
+    repository and optionally the pushed commit, the space and the parent
+    page id. The jobs are queried in /jobs/{id}. If token is set, the
+    requests need an Authorization: Bearer {token} header.
+    '''
+
+    def __init__(
+        self,
+        service,
+        host='127.0.0.1',
+        port=8080,
+        token=None,
+        default_space=None,
+    ):
+        self.service = service
+        self.token = token
+        self.default_space = default_space
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.webhook = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def serve_forever(self):
+        self.server.serve_forever(0.05)
+
+    def start(self):
+        '''Serve in a background thread'''
+
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def authorized(self, headers):
+        if self.token is None:
+            return True
+        return hmac.compare_digest(
+            headers.get('Authorization', ''),
+            'Bearer {}'.format(self.token),
+        )
+
+    def dispatch(self, method, path, data):
+        '''Returns the status code and the json response of a request'''
+
+        parts = path.strip('/').split('/')
+        if method == 'POST' and parts == ['sync']:
+            return self.post_sync(data)
+        if method == 'GET' and parts == ['health']:
+            return 200, {'status': 'ok', 'pending': len(self.service.queue)}
+        if method == 'GET' and len(parts) == 2 and parts[0] == 'jobs':
+            job = None
+            if parts[1].isdigit():
+                job = self.service.get_job(int(parts[1]))
+            if job is None:
+                return 404, {'error': 'Unknown job {}'.format(parts[1])}
+            return 200, job.to_dict()
+        return 404, {'error': 'Unknown resource {}'.format(path)}
+
+    def post_sync(self, data):
+        space = data.get('space') or self.default_space
+        path = data.get('path')
+        commit = data.get('commit')
+        parent_id = data.get('parent_id')
+        if isinstance(parent_id, int) and not isinstance(parent_id, bool):
+            parent_id = str(parent_id)
+        if not isinstance(path, str) or not path:
+            return 400, {'error': 'The path of the repository is required'}
+        if not isinstance(space, str) or not space:
+            return 400, {'error': 'The space is required'}
+        if commit is not None and (
+            not isinstance(commit, str) or
+            not COMMIT_PATTERN.match(commit)
+        ):
+            return 400, {'error': 'The commit is not a commit hash'}
+        if parent_id is not None and (
+            not isinstance(parent_id, str) or not parent_id.isdigit()
+        ):
+            return 400, {'error': 'The parent_id is not a page id'}
+        try:
+            job = self.service.submit(space, path, commit, parent_id)
+        except InvalidJob as error:
+            return 403, {'error': str(error)}
+        return 202, job.to_dict()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    '''Translates the http requests to calls to the WebhookServer of the
+    server'''
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def _handle(self):
+        webhook = self.server.webhook
+        data = {}
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            try:
+                data = json.loads(self.rfile.read(length).decode())
+            except ValueError:
+                data = None
+
+        if not webhook.authorized(self.headers):
+            status_code, response = 401, {'error': 'Invalid token'}
+        elif not isinstance(data, dict):
+            status_code, response = 400, {'error': 'Invalid json'}
+        else:
+            status_code, response = webhook.dispatch(
+                self.command,
+                self.path.split('?')[0],
+                data,
+            )
+
+        body = json.dumps(response).encode()
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _handle
+    do_POST = _handle
+
+    def log_message(self, format, *args):
+        pass
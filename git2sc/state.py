@@ -0,0 +1,115 @@
+import sqlite3
+import threading
+
+FIELDS = [
+    'page_id',
+    'parent_id',
+    'version',
+    'source_hash',
+    'html_hash',
+    'title',
+]
+
+
+class SyncState():
+    '''Local database that maps the paths of a repository, relative to the
+    synced directory, to the confluence pages of a space where they were
+    pushed'''
+
+    def __init__(self, database_path, space_id):
+        self.space = space_id
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            database_path,
+            check_same_thread=False,
+        )
+        self.connection.row_factory = sqlite3.Row
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS pages ('
+                'space TEXT NOT NULL, '
+                'path TEXT NOT NULL, '
+                'page_id TEXT NOT NULL, '
+                'parent_id TEXT, '
+                'version INTEGER, '
+                'source_hash TEXT, '
+                'html_hash TEXT, '
+                'title TEXT, '
+                'PRIMARY KEY (space, path))'
+            )
+            # The databases created before the titles were stored
+            columns = [
+                row['name']
+                for row in self.connection.execute('PRAGMA table_info(pages)')
+            ]
+            if 'title' not in columns:
+                self.connection.execute(
+                    'ALTER TABLE pages ADD COLUMN title TEXT'
+                )
+            self.connection.execute(
+                'CREATE INDEX IF NOT EXISTS pages_page_id '
+                'ON pages (space, page_id)'
+            )
+
+    def get(self, path):
+        '''Get the stored state of a path as a dictionary or None if the path
+        was never pushed'''
+
+        with self._lock:
+            row = self.connection.execute(
+                'SELECT * FROM pages WHERE space = ? AND path = ?',
+                (self.space, path),
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(row)
+
+    def set(self, path, page_id, **fields):
+        '''Store the state of a path, the fields not given keep their stored
+        value'''
+
+        unknown_fields = set(fields) - set(FIELDS)
+        if unknown_fields:
+            raise ValueError('Unknown state fields {}'.format(
+                ', '.join(sorted(unknown_fields))
+            ))
+
+        entry = self.get(path) or {}
+        if entry.get('page_id') != page_id:
+            entry = {}
+        entry.update(fields)
+        entry['page_id'] = page_id
+
+        with self._lock, self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO pages (space, path, {}) '
+                'VALUES (?, ?, {})'.format(
+                    ', '.join(FIELDS),
+                    ', '.join('?' * len(FIELDS)),
+                ),
+                [self.space, path] + [entry.get(field) for field in FIELDS],
+            )
+
+    def remove_page(self, page_id):
+        '''Remove the paths pushed to a page'''
+
+        with self._lock, self.connection:
+            self.connection.execute(
+                'DELETE FROM pages WHERE space = ? AND page_id = ?',
+                (self.space, page_id),
+            )
+
+    def entries(self):
+        '''Get the stored state of all the paths of the space'''
+
+        with self._lock:
+            rows = self.connection.execute(
+                'SELECT * FROM pages WHERE space = ? ORDER BY path',
+                (self.space,),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self):
+        '''Close the database'''
+
+        self.connection.close()
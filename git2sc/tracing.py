@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Kinds and status codes of the OTLP spans
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_CLIENT = 3
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+# Span of the running operation in the current thread or task
+_current_span = contextvars.ContextVar('git2sc_span', default=None)
+
+
+def propagate(function):
+    '''Bind a function to the current context, so the spans it opens in
+    other threads are children of the current span'''
+
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        # A context can't be entered by two threads at once
+        return context.copy().run(function, *args, **kwargs)
+    return run
+
+
+def _attribute(key, value):
+    '''Returns an OTLP key value pair'''
+
+    if isinstance(value, bool):
+        typed_value = {'boolValue': value}
+    elif isinstance(value, int):
+        typed_value = {'intValue': str(value)}
+    elif isinstance(value, float):
+        typed_value = {'doubleValue': value}
+    else:
+        typed_value = {'stringValue': str(value)}
+    return {'key': key, 'value': typed_value}
+
+
+class Span():
+    '''Timed operation of a trace, its parent is the span that was current
+    when it started'''
+
+    def __init__(self, name, trace_id, parent_id, kind, attributes):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = dict(attributes)
+        self.start = time.time_ns()
+        self.end = None
+        self.error = None
+
+    def set_attribute(self, key, value):
+        '''Add an attribute to the span, None values are ignored'''
+
+        if value is not None:
+            self.attributes[key] = value
+
+    def to_otlp(self):
+        '''Returns the span in the OTLP json encoding'''
+
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start),
+            'endTimeUnixNano': str(self.end),
+            'attributes': [
+                _attribute(key, value)
+                for key, value in self.attributes.items()
+            ],
+            'status': {'code': STATUS_OK},
+        }
+        if self.parent_id is not None:
+            span['parentSpanId'] = self.parent_id
+        if self.error is not None:
+            span['status'] = {'code': STATUS_ERROR, 'message': self.error}
+        return span
+
+
+class _NullSpan():
+    '''Span of a disabled tracer, it discards everything'''
+
+    def set_attribute(self, key, value):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Tracer():
+    '''Records the spans of a run in a file, one OTLP json export request per
+    line as the file exporter of the OpenTelemetry collector writes them, so
+    it can be loaded in a trace viewer without running a collector.
+
+    If path is None the tracer is disabled and the spans cost nothing.
+    '''
+
+    def __init__(self, path=None, service='git2sc'):
+        self.path = path
+        self.service = service
+        self.trace_id = os.urandom(16).hex()
+        self._file = None
+        self._lock = threading.Lock()
+        if path is not None:
+            self._file = open(path, 'a')
+
+    @property
+    def enabled(self):
+        return self._file is not None
+
+    @contextmanager
+    def span(self, name, kind=SPAN_KIND_INTERNAL, **attributes):
+        '''Context manager that times the operation of its block as a child
+        of the current span, the exceptions raised in the block are recorded
+        as its error'''
+
+        if not self.enabled:
+            yield NULL_SPAN
+            return
+
+        parent = _current_span.get()
+        span = Span(
+            name,
+            self.trace_id,
+            parent.span_id if parent is not None else None,
+            kind,
+            {key: value for key, value in attributes.items()
+             if value is not None},
+        )
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as error:
+            span.error = '{}: {}'.format(type(error).__name__, error)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end = time.time_ns()
+            self._export(span)
+
+    def _export(self, span):
+        '''Write a finished span to the trace file'''
+
+        line = json.dumps({
+            'resourceSpans': [{
+                'resource': {
+                    'attributes': [_attribute('service.name', self.service)],
+                },
+                'scopeSpans': [{
+                    'scope': {'name': 'git2sc'},
+                    'spans': [span.to_otlp()],
+                }],
+            }],
+        })
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line + '\n')
+
+    def close(self):
+        '''Flush and close the trace file'''
+
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,281 @@
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from requests.exceptions import ConnectionError, Timeout
+
+# Responses worth retrying, confluence uses 429 to throttle the clients
+THROTTLE_STATUS_CODES = {429}
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+
+# Methods that can be sent again without changing the result. A POST is only
+# retried when it was throttled, as it was rejected before being processed,
+# the callers that can tell if it was processed retry it with wait_to_retry.
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+
+class AdaptiveLimiter():
+    '''Limits the number of concurrent requests with an additive increase
+    multiplicative decrease (AIMD) window: each successful response grows the
+    window by 1/window and each throttled response halves it'''
+
+    def __init__(self, max_limit, min_limit=1):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        '''Wait until there is room in the window for another request'''
+
+        with self._condition:
+            while self.in_flight >= max(int(self.limit), self.min_limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, throttled=False):
+        '''Free the slot of a finished request and adapt the window'''
+
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(float(self.min_limit), self.limit / 2)
+            else:
+                self.limit = min(
+                    float(self.max_limit),
+                    self.limit + 1 / self.limit,
+                )
+            self._condition.notify_all()
+
+
+class RateLimiter():
+    '''Limits the requests to rate per second with a token bucket, so a
+    budget of requests can be shared by several transports. Up to burst
+    requests are let through at once'''
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        '''Wait until there is budget for another request'''
+
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                float(self.burst),
+                self.tokens + (now - self.updated) * self.rate,
+            )
+            self.updated = now
+            # The missing tokens are borrowed, so each waiting request gets
+            # its own slot in the future
+            self.tokens -= 1
+            delay = -self.tokens / self.rate
+        if delay > 0:
+            time.sleep(delay)
+
+
+class TransportStats():
+    '''Throughput counters of the requests made through a transport'''
+
+    def __init__(self):
+        self.started = time.time()
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def add(self, **counters):
+        '''Increase the counters by the given amounts'''
+
+        with self._lock:
+            for counter, amount in counters.items():
+                setattr(self, counter, getattr(self, counter) + amount)
+
+    def summary(self):
+        '''Returns a one line report of the throughput'''
+
+        elapsed = max(time.time() - self.started, 1e-9)
+        return '{} requests in {:.1f}s ({:.1f} req/s), {} retries, ' \
+            '{} throttled, {} errors'.format(
+                self.requests,
+                elapsed,
+                self.requests / elapsed,
+                self.retries,
+                self.throttled,
+                self.errors,
+            )
+
+
+def body_size(data):
+    '''Returns the bytes of the body of a request'''
+
+    if data is None:
+        return 0
+    if isinstance(data, str):
+        return len(data.encode())
+    try:
+        return len(data)
+    except TypeError:
+        return 0
+
+
+def retry_after(response):
+    '''Returns the seconds to wait stated by the Retry-After header of the
+    response or None if it doesn't have one'''
+
+    try:
+        value = response.headers['Retry-After']
+    except (KeyError, TypeError):
+        return None
+
+    try:
+        return max(float(value), 0)
+    except (TypeError, ValueError):
+        pass
+
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    return max((date - datetime.now(timezone.utc)).total_seconds(), 0)
+
+
+class Transport():
+    '''Sends the requests of a session retrying the transient errors with
+    jittered exponential backoff, honouring the Retry-After header, and
+    adapting the concurrency to the throttling of the server.
+
+    If metrics is set, each attempt is recorded in it under the endpoint
+    given to request. The limiter of the concurrency and the rate_limiter of
+    the requests per second can be shared with other transports to keep
+    them under a global budget.
+    '''
+
+    def __init__(
+        self,
+        session,
+        timeout=30,
+        max_retries=5,
+        backoff=0.5,
+        max_backoff=60,
+        max_concurrency=10,
+        metrics=None,
+        limiter=None,
+        rate_limiter=None,
+    ):
+        self.session = session
+        self.metrics = metrics
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        if limiter is None:
+            limiter = AdaptiveLimiter(max_concurrency)
+        self.limiter = limiter
+        self.rate_limiter = rate_limiter
+        self.stats = TransportStats()
+
+    def _backoff_delay(self, attempt):
+        '''Seconds to wait before the retry number attempt, with full
+        jitter'''
+
+        return random.uniform(
+            0,
+            min(self.max_backoff, self.backoff * 2 ** attempt),
+        )
+
+    def wait_to_retry(self, attempt):
+        '''Wait before the retry number attempt of a request that the caller
+        retries itself, like a create that it made sure is safe to send
+        again'''
+
+        self.stats.add(retries=1)
+        time.sleep(self._backoff_delay(attempt))
+
+    def _is_retryable(self, method, status_code):
+        '''Test if a response with the status code can be retried'''
+
+        if status_code in THROTTLE_STATUS_CODES:
+            return True
+        return status_code in RETRY_STATUS_CODES and \
+            method in IDEMPOTENT_METHODS
+
+    def _observe(self, method, endpoint, status, started, data, response):
+        '''Record an attempt in the metrics'''
+
+        if self.metrics is None:
+            return
+        received = 0
+        if response is not None:
+            received = body_size(response.content)
+        self.metrics.observe_request(
+            method,
+            endpoint or method,
+            status,
+            time.perf_counter() - started,
+            sent=body_size(data),
+            received=received,
+        )
+
+    def request(self, method, url, endpoint=None, **kwargs):
+        '''Send a request retrying it while it fails with a transient
+        error. The endpoint names the kind of request in the metrics'''
+
+        kwargs.setdefault('timeout', self.timeout)
+        data = kwargs.get('data')
+        attempt = 0
+        while True:
+            # The streamed bodies are sent again from the start
+            if hasattr(data, 'seek'):
+                data.seek(0)
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            self.limiter.acquire()
+            started = time.perf_counter()
+            try:
+                r = self.session.request(method, url, **kwargs)
+            except (ConnectionError, Timeout):
+                self.limiter.release()
+                self.stats.add(requests=1, errors=1)
+                self._observe(
+                    method,
+                    endpoint,
+                    'error',
+                    started,
+                    kwargs.get('data'),
+                    None,
+                )
+                if method not in IDEMPOTENT_METHODS or \
+                        attempt >= self.max_retries:
+                    raise
+                delay = self._backoff_delay(attempt)
+            else:
+                throttled = r.status_code in THROTTLE_STATUS_CODES
+                self.limiter.release(throttled)
+                self.stats.add(requests=1, throttled=int(throttled))
+                self._observe(
+                    method,
+                    endpoint,
+                    r.status_code,
+                    started,
+                    kwargs.get('data'),
+                    r,
+                )
+                if attempt >= self.max_retries or \
+                        not self._is_retryable(method, r.status_code):
+                    return r
+                delay = retry_after(r)
+                if delay is None:
+                    delay = self._backoff_delay(attempt)
+                delay = min(delay, self.max_backoff)
+
+            self.stats.add(retries=1)
+            attempt += 1
+            time.sleep(delay)
@@ -0,0 +1,249 @@
+import os
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+
+# inotify event masks, from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+# Events that change the files of a watched directory. The files are synced
+# when they're closed after a write, not while they're being written. The
+# creations only matter for the directories.
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | \
+    IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR
+
+EVENT_HEADER = struct.Struct('iIII')
+
+
+class WatchError(Exception):
+    pass
+
+
+class Inotify():
+    '''Minimal binding of the linux inotify api through ctypes'''
+
+    def __init__(self):
+        try:
+            self.libc = ctypes.CDLL(
+                ctypes.util.find_library('c') or 'libc.so.6',
+                use_errno=True,
+            )
+            self.libc.inotify_init1
+        except (OSError, AttributeError):
+            raise WatchError('inotify is not available in this system')
+
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            self._raise('Error starting inotify')
+
+    def _raise(self, message):
+        error = ctypes.get_errno()
+        raise WatchError('{}: {}'.format(message, os.strerror(error)))
+
+    def add_watch(self, path, mask=WATCH_MASK):
+        '''Watch the events of the mask in a directory, returns the watch
+        descriptor'''
+
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            self._raise('Error watching {}'.format(path))
+        return wd
+
+    def rm_watch(self, wd):
+        '''Stop watching a directory'''
+
+        self.libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self, timeout=None):
+        '''Wait up to timeout seconds for events, returns a list of tuples
+        with the watch descriptor, mask, cookie and name of each one'''
+
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except OSError as error:
+            if error.errno == errno.EAGAIN:
+                return []
+            raise
+
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            events.append((wd, mask, cookie, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class Changes():
+    '''Files changed and deleted in a batch of events, the last event of a
+    file wins. overflow is set if the kernel dropped events'''
+
+    def __init__(self):
+        self.changed = set()
+        self.deleted = set()
+        self.overflow = False
+
+    def __bool__(self):
+        return bool(self.changed or self.deleted or self.overflow)
+
+    def change(self, path):
+        self.deleted.discard(path)
+        self.changed.add(path)
+
+    def delete(self, path):
+        self.changed.discard(path)
+        self.deleted.add(path)
+
+
+class TreeWatcher():
+    '''Watches the files of a directory tree with inotify, the directories
+    created under it are watched as they appear. The excluded items are
+    names of files or directories to ignore'''
+
+    def __init__(self, path, excluded_items=(), inotify=None):
+        self.path = os.path.normpath(path)
+        self.excluded_items = set(excluded_items)
+        self.inotify = inotify
+        self.directories = {}
+        self.files = set()
+
+    def _is_excluded(self, path):
+        relative_path = os.path.relpath(path, self.path)
+        return any(
+            item in self.excluded_items
+            for item in relative_path.split(os.sep)
+        )
+
+    def _watch_tree(self, directory_path, changes=None):
+        '''Watch a directory and its subdirectories, their files are added to
+        the changes if given'''
+
+        for root, directories, files in os.walk(directory_path):
+            directories[:] = [
+                directory
+                for directory in directories
+                if directory not in self.excluded_items
+            ]
+            try:
+                wd = self.inotify.add_watch(root)
+            except WatchError:
+                # The directory was removed while walking
+                continue
+            self.directories[wd] = root
+            for file in files:
+                if file in self.excluded_items:
+                    continue
+                file_path = os.path.join(root, file)
+                self.files.add(file_path)
+                if changes is not None:
+                    changes.change(file_path)
+
+    def _forget_tree(self, directory_path, changes):
+        '''Stop watching a directory that is no longer in the tree, its files
+        are added to the deleted ones of the changes'''
+
+        prefix = directory_path + os.sep
+        for wd, path in list(self.directories.items()):
+            if path == directory_path or path.startswith(prefix):
+                self.inotify.rm_watch(wd)
+                del self.directories[wd]
+        for file_path in list(self.files):
+            if file_path.startswith(prefix):
+                self.files.discard(file_path)
+                changes.delete(file_path)
+
+    def start(self):
+        '''Start watching the tree'''
+
+        if self.inotify is None:
+            self.inotify = Inotify()
+        self._watch_tree(self.path)
+
+    def _apply(self, event, changes):
+        '''Add the files touched by an event to the changes'''
+
+        wd, mask, _, name = event
+        if mask & IN_Q_OVERFLOW:
+            changes.overflow = True
+            return
+        if mask & IN_IGNORED:
+            self.directories.pop(wd, None)
+            return
+        if wd not in self.directories or not name:
+            return
+
+        path = os.path.join(self.directories[wd], name)
+        if self._is_excluded(path):
+            return
+
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                self._watch_tree(path, changes)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self._forget_tree(path, changes)
+        elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+            self.files.add(path)
+            changes.change(path)
+        elif mask & (IN_DELETE | IN_MOVED_FROM):
+            self.files.discard(path)
+            changes.delete(path)
+
+    def wait(self, debounce=0.5, max_delay=10, stop=None, poll=0.5):
+        '''Block until the tree changes and then collect its events until
+        there are none for debounce seconds or max_delay seconds went by
+        since the first one. Returns the Changes of the batch.
+
+        If the stop event is set, it returns the changes collected until
+        then, which may be none.
+        '''
+
+        changes = Changes()
+        first_event = None
+        while stop is None or not stop.is_set():
+            if first_event is None:
+                timeout = poll
+            else:
+                timeout = min(
+                    debounce,
+                    max(first_event + max_delay - time.monotonic(), 0),
+                )
+
+            events = self.inotify.read(timeout)
+            for event in events:
+                self._apply(event, changes)
+
+            if first_event is None:
+                if changes:
+                    first_event = time.monotonic()
+            elif not events or \
+                    time.monotonic() - first_event >= max_delay:
+                break
+        return changes
+
+    def close(self):
+        '''Stop watching the tree'''
+
+        if self.inotify is not None:
+            self.inotify.close()
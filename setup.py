@@ -10,6 +10,7 @@ setup(
     author_email='jamatute@paradigmadigital.com',
     packages=['git2sc', ],
     license='GPLv2',
+    python_requires='>=3.7',
     long_description=open('README.md').read(),
     entry_points={
       'console_scripts': ['git2sc = git2sc:main']}
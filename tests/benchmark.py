@@ -0,0 +1,314 @@
+'''Throughput benchmark of the syncs against the fake Confluence server.
+
+It generates a synthetic documentation repository, uploads it with
+directory_full_upload, changes some of its files and syncs them with
+directory_update, reporting for each command the requests issued, the wall
+time and the peak memory of the client.
+
+Each command runs in its own process so the peak memory is the one of that
+command alone, the fake server runs in the benchmark process.
+
+The markdown and AsciiDoc files need pandoc and asciidoctor installed, use
+`--formats html` to measure the syncs without the converters.
+
+Run `python -m tests.benchmark --help` from the root of the repository.
+'''
+
+import os
+import json
+import time
+import random
+import shutil
+import argparse
+import resource
+import tempfile
+import multiprocessing
+
+from tests.fake_confluence import FakeConfluence
+
+FORMATS = ['md', 'adoc', 'html']
+
+PARAGRAPH = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed ' \
+    'do eiusmod tempor incididunt ut labore et dolore magna aliqua. '
+
+
+def _document(extension, title, size, salt=''):
+    '''Returns a document of about size bytes in the format of the
+    extension'''
+
+    paragraphs = [
+        '{} {}'.format(salt, PARAGRAPH * 3).strip()
+        for _ in range(max(size // (len(PARAGRAPH) * 3), 1))
+    ]
+    if extension == 'md':
+        return '# {}\n\n{}\n'.format(title, '\n\n'.join(paragraphs))
+    elif extension == 'adoc':
+        return '= {}\n\n{}\n'.format(title, '\n\n'.join(paragraphs))
+    return '<h1>{}</h1>\n{}\n'.format(
+        title,
+        '\n'.join('<p>{}</p>'.format(paragraph) for paragraph in paragraphs),
+    )
+
+
+def generate_repository(
+    path,
+    files,
+    depth,
+    formats=FORMATS,
+    branching=3,
+    size=2048,
+    seed=None,
+):
+    '''Create a documentation repository in path with files documents of
+    the formats spread over a tree of directories depth levels deep, each
+    directory has branching subdirectories.
+
+    The directories have a README in the first of the markdown and AsciiDoc
+    formats that is used. Returns the paths of the documents.
+    '''
+
+    generator = random.Random(seed)
+    directories = [path]
+    level = [path]
+    for depth_level in range(1, depth):
+        next_level = []
+        for directory in level:
+            for branch in range(branching):
+                next_level.append(os.path.join(
+                    directory,
+                    'section_{}_{}'.format(depth_level, len(next_level)),
+                ))
+        directories.extend(next_level)
+        level = next_level
+
+    readme = next(
+        (extension for extension in ['md', 'adoc'] if extension in formats),
+        None,
+    )
+    for directory in directories:
+        os.makedirs(directory, exist_ok=True)
+        if readme is not None:
+            with open(os.path.join(directory, 'README.' + readme), 'w') as f:
+                f.write(_document(readme, os.path.basename(directory), size))
+
+    documents = []
+    for number in range(files):
+        extension = generator.choice(formats)
+        title = 'document_{}'.format(number)
+        document = os.path.join(
+            generator.choice(directories),
+            '{}.{}'.format(title, extension),
+        )
+        with open(document, 'w') as f:
+            f.write(_document(extension, title, size))
+        documents.append(document)
+    return documents
+
+
+def change_repository(documents, fraction, seed=None):
+    '''Change the content of a fraction of the documents, returns the changed
+    ones'''
+
+    generator = random.Random(seed)
+    changed = generator.sample(documents, int(len(documents) * fraction))
+    for document in changed:
+        with open(document, 'a') as f:
+            f.write('\n\nChanged at {}\n'.format(time.time()))
+    return changed
+
+
+def _run_command(results, command, url, space, path, options):
+    '''Run a sync command in the current process and put its measures in
+    the results queue'''
+
+    from git2sc.git2sc import Git2SC
+
+    result = {'command': command}
+    try:
+        g = Git2SC(
+            url,
+            'benchmark:benchmark',
+            space,
+            pool_size=options['pool_size'],
+            page_size=options['page_size'],
+            fetch_concurrency=options['fetch_concurrency'],
+            adoc_workers=options['adoc_workers'],
+            convert_workers=options['convert_workers'],
+        )
+        start = time.perf_counter()
+        if command == 'upload':
+            g.directory_full_upload(path, [], jobs=options['jobs'])
+        else:
+            g.directory_update(path, [], jobs=options['jobs'])
+        result['wall_time'] = time.perf_counter() - start
+        result['retries'] = g.transport.stats.retries
+        g.close()
+    except Exception as error:
+        result['error'] = '{}: {}'.format(type(error).__name__, error)
+
+    # ru_maxrss is in kilobytes on linux
+    result['peak_memory'] = \
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    results.put(result)
+
+
+def run_command(confluence, command, path, options):
+    '''Run a sync command in a new process against the fake server and
+    return its measures'''
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    before = confluence.snapshot()
+    process = context.Process(
+        target=_run_command,
+        args=(results, command, confluence.url, confluence.space, path,
+              options),
+    )
+    process.start()
+    result = results.get()
+    process.join()
+    after = confluence.snapshot()
+
+    for counter in ['requests', 'throttled', 'errors']:
+        result[counter] = after[counter] - before[counter]
+    result['methods'] = {
+        method: count - before['methods'].get(method, 0)
+        for method, count in after['methods'].items()
+        if count - before['methods'].get(method, 0) > 0
+    }
+    result['pages'] = len(confluence.pages)
+    return result
+
+
+def format_result(result):
+    '''Returns a one line report of the measures of a command'''
+
+    if 'error' in result:
+        return '{:<7} failed: {}'.format(result['command'], result['error'])
+
+    wall_time = result['wall_time']
+    return '{:<7} {:>6} requests ({}) in {:.2f}s ({:.1f} req/s), ' \
+        '{} throttled, {} errors, {} retries, {:.1f} MB peak memory, ' \
+        '{} pages'.format(
+            result['command'],
+            result['requests'],
+            ' '.join(
+                '{} {}'.format(method, count)
+                for method, count in sorted(result['methods'].items())
+            ),
+            wall_time,
+            result['requests'] / max(wall_time, 1e-9),
+            result['throttled'],
+            result['errors'],
+            result['retries'],
+            result['peak_memory'] / 1024 / 1024,
+            result['pages'],
+        )
+
+
+def load_parser():
+    parser = argparse.ArgumentParser(
+        description='Measure the syncs of a synthetic repository against a '
+        'fake Confluence server'
+    )
+    parser.add_argument('--files', type=int, default=200)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--branching', type=int, default=3)
+    parser.add_argument(
+        '--size',
+        type=int,
+        default=2048,
+        help='Approximate bytes of each document',
+    )
+    parser.add_argument(
+        '--formats',
+        default=','.join(FORMATS),
+        help='Comma separated formats of the documents, from md, adoc and '
+        'html',
+    )
+    parser.add_argument(
+        '--change-rate',
+        type=float,
+        default=0.1,
+        help='Fraction of the documents changed before the sync',
+    )
+    parser.add_argument(
+        '--commands',
+        default='upload,sync',
+        help='Comma separated commands to run in order, upload or sync',
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.01)
+    parser.add_argument('--throttle-rate', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--retry-after', type=float, default=0)
+    parser.add_argument('--max-limit', type=int, default=100)
+    parser.add_argument('-j', '--jobs', type=int, default=1)
+    parser.add_argument('--pool-size', type=int, default=10)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--fetch-concurrency', type=int, default=1)
+    parser.add_argument('--adoc-workers', type=int, default=0)
+    parser.add_argument(
+        '--convert-workers',
+        type=int,
+        default=os.cpu_count() or 1,
+    )
+    parser.add_argument(
+        '--json',
+        action='store_true',
+        help='Print the measures as json',
+    )
+    return parser
+
+
+def main():
+    args = load_parser().parse_args()
+    formats = args.formats.split(',')
+    options = {
+        'jobs': args.jobs,
+        'pool_size': args.pool_size,
+        'page_size': args.page_size,
+        'fetch_concurrency': args.fetch_concurrency,
+        'adoc_workers': args.adoc_workers,
+        'convert_workers': args.convert_workers,
+    }
+
+    path = tempfile.mkdtemp(prefix='git2sc-benchmark-')
+    confluence = FakeConfluence(
+        latency=args.latency,
+        throttle_rate=args.throttle_rate,
+        error_rate=args.error_rate,
+        retry_after=args.retry_after,
+        max_limit=args.max_limit,
+        seed=args.seed,
+    )
+    try:
+        repository = os.path.join(path, 'docs')
+        documents = generate_repository(
+            repository,
+            args.files,
+            args.depth,
+            formats,
+            branching=args.branching,
+            size=args.size,
+            seed=args.seed,
+        )
+        confluence.start()
+
+        results = []
+        for command in args.commands.split(','):
+            if command == 'sync':
+                change_repository(documents, args.change_rate, args.seed)
+            result = run_command(confluence, command, repository, options)
+            results.append(result)
+            if not args.json:
+                print(format_result(result))
+        if args.json:
+            print(json.dumps(results, indent=2))
+    finally:
+        confluence.stop()
+        shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    main()
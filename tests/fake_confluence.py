@@ -0,0 +1,663 @@
+'''Stand-in of the Confluence REST api to run git2sc end to end without a
+Confluence instance.
+
+It keeps the pages of a single space in memory and implements the endpoints
+used by git2sc:
+
+* GET /space/{space}
+* GET /space/{space}/content with start/limit pagination
+* GET, PUT and DELETE /content/{id}
+* POST /content
+* POST /content/{id}/property and GET and PUT /content/{id}/property/{key}
+* GET and POST /content/{id}/child/attachment
+
+The latency of each request and the rate of throttled (429) and failed (503)
+responses are configurable, so it can be used to benchmark how the syncs
+behave against a slow or overloaded server. GET /_fake/stats returns the
+counters of the requests served.
+
+Run `python -m tests.fake_confluence --help` to start it standalone.
+'''
+
+import json
+import time
+import random
+import argparse
+import threading
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+API_PREFIX = '/rest/api'
+
+
+class FakeConfluence():
+    '''In memory Confluence space served over http.
+
+    Each request waits latency seconds, and then it's throttled with a
+    probability of throttle_rate or fails with a probability of error_rate.
+    The page size of the space listing is capped to max_limit like the real
+    server does.
+    '''
+
+    def __init__(
+        self,
+        space='TST',
+        latency=0,
+        throttle_rate=0,
+        error_rate=0,
+        retry_after=0,
+        max_limit=100,
+        seed=None,
+        host='127.0.0.1',
+        port=0,
+    ):
+        self.space = space
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.max_limit = max_limit
+        self.pages = {}
+        self.stats = {
+            'requests': 0,
+            'throttled': 0,
+            'errors': 0,
+            'uploads': 0,
+            'methods': {},
+        }
+        self._random = random.Random(seed)
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._thread = None
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.confluence = self
+
+        self.homepage_id = self._add_page('{} Home'.format(space), None, '')
+
+    @property
+    def url(self):
+        '''Base url of the api, to be used as GIT2SC_API_URL'''
+
+        host, port = self.server.server_address[:2]
+        return 'http://{}:{}{}'.format(host, port, API_PREFIX)
+
+    def start(self):
+        '''Serve the api in a background thread'''
+
+        # A short poll interval so stop doesn't wait half a second
+        self._thread = threading.Thread(
+            target=self.server.serve_forever,
+            args=(0.05,),
+            daemon=True,
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        '''Stop serving the api'''
+
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def snapshot(self):
+        '''Returns a copy of the request counters'''
+
+        with self._lock:
+            stats = dict(self.stats)
+            stats['methods'] = dict(self.stats['methods'])
+        return stats
+
+    # Pages
+
+    def _add_page(self, title, parent_id, body, properties=None):
+        page_id = str(self._next_id)
+        self._next_id += 1
+        self.pages[page_id] = {
+            'id': page_id,
+            'title': title,
+            'parent_id': parent_id,
+            'version': 1,
+            'body': body,
+            'properties': properties or {},
+            'attachments': {},
+        }
+        return page_id
+
+    def _title_id(self, title):
+        for page in self.pages.values():
+            if page['title'] == title:
+                return page['id']
+        return None
+
+    def _ancestors(self, page):
+        ancestors = []
+        parent_id = page['parent_id']
+        while parent_id is not None and parent_id in self.pages:
+            ancestors.insert(0, {'id': parent_id})
+            parent_id = self.pages[parent_id]['parent_id']
+        return ancestors
+
+    def render(self, page, expand=''):
+        '''Returns the json representation of a page with the expanded
+        fields'''
+
+        expand = set(expand.split(',')) if expand else set()
+        content = {
+            'id': page['id'],
+            'type': 'page',
+            'status': 'current',
+            'title': page['title'],
+            'space': {'key': self.space},
+            '_links': {
+                'webui': '/display/{}/{}'.format(self.space, page['id']),
+            },
+        }
+        if 'ancestors' in expand:
+            content['ancestors'] = self._ancestors(page)
+        if 'version' in expand:
+            content['version'] = {'number': page['version']}
+        if 'body.storage' in expand:
+            content['body'] = {
+                'storage': {
+                    'value': page['body'],
+                    'representation': 'storage',
+                },
+            }
+        properties = {
+            key: page['properties'][key]
+            for key in page['properties']
+            if 'metadata.properties.{}'.format(key) in expand
+        }
+        if properties:
+            content['metadata'] = {'properties': properties}
+        return content
+
+    # Endpoints, they return the status code and the json response
+
+    def get_space(self, space):
+        if space != self.space:
+            return _error(404, 'No space with key : {}'.format(space))
+        return 200, {
+            'key': self.space,
+            'name': self.space,
+            '_expandable': {
+                'homepage': '{}/content/{}'.format(
+                    API_PREFIX,
+                    self.homepage_id,
+                ),
+            },
+        }
+
+    def get_space_content(self, space, query):
+        if space != self.space:
+            return _error(404, 'No space with key : {}'.format(space))
+        start = int(query.get('start', 0))
+        limit = min(int(query.get('limit', 25)), self.max_limit)
+        expand = query.get('expand', '')
+
+        page_ids = sorted(self.pages, key=int)
+        results = [
+            self.render(self.pages[page_id], expand)
+            for page_id in page_ids[start:start + limit]
+        ]
+        links = {}
+        if start + limit < len(page_ids):
+            links['next'] = '{}/space/{}/content/page?' \
+                'limit={}&start={}'.format(
+                    API_PREFIX,
+                    self.space,
+                    limit,
+                    start + limit,
+                )
+        return 200, {
+            'page': {
+                'results': results,
+                'start': start,
+                'limit': limit,
+                'size': len(results),
+                '_links': links,
+            },
+        }
+
+    def get_content(self, page_id, query):
+        if page_id not in self.pages:
+            return _not_found(page_id)
+        return 200, self.render(self.pages[page_id], query.get('expand', ''))
+
+    def find_content(self, query):
+        if query.get('spaceKey') != self.space:
+            return 200, {'results': [], 'size': 0}
+        page_id = self._title_id(query.get('title'))
+        results = []
+        if page_id is not None:
+            results.append(
+                self.render(self.pages[page_id], query.get('expand', '')),
+            )
+        return 200, {'results': results, 'size': len(results)}
+
+    def post_content(self, data, query):
+        title = data.get('title')
+        if not title:
+            return _error(400, 'A page must have a title')
+        if self._title_id(title) is not None:
+            return _error(
+                400,
+                'A page with this title already exists: A page already '
+                'exists with the title {} in the space with key {}'.format(
+                    title,
+                    self.space,
+                ),
+            )
+
+        parent_id = self.homepage_id
+        if data.get('ancestors'):
+            parent_id = str(data['ancestors'][-1]['id'])
+            if parent_id not in self.pages:
+                return _not_found(parent_id)
+
+        properties = {}
+        metadata = data.get('metadata', {}).get('properties', {})
+        for key, content_property in metadata.items():
+            properties[key] = {
+                'key': key,
+                'value': content_property.get('value'),
+                'version': {'number': 1},
+            }
+
+        page_id = self._add_page(
+            title,
+            parent_id,
+            data.get('body', {}).get('storage', {}).get('value', ''),
+            properties,
+        )
+        return 200, self.render(self.pages[page_id], query.get('expand', ''))
+
+    def put_content(self, page_id, data, query):
+        if page_id not in self.pages:
+            return _not_found(page_id)
+        page = self.pages[page_id]
+
+        version = data.get('version', {}).get('number')
+        if version != page['version'] + 1:
+            return _error(
+                409,
+                'Version must be incremented on update. Current version '
+                'is: {}'.format(page['version']),
+            )
+
+        title = data.get('title', page['title'])
+        owner_id = self._title_id(title)
+        if owner_id is not None and owner_id != page_id:
+            return _error(
+                400,
+                'A page with this title already exists: {}'.format(title),
+            )
+
+        if data.get('ancestors'):
+            parent_id = str(data['ancestors'][-1]['id'])
+            if parent_id not in self.pages:
+                return _not_found(parent_id)
+            page['parent_id'] = parent_id
+
+        page['title'] = title
+        page['version'] = version
+        if 'body' in data:
+            page['body'] = data['body'].get('storage', {}).get('value', '')
+        return 200, self.render(page, query.get('expand', ''))
+
+    def delete_content(self, page_id):
+        if page_id not in self.pages:
+            return _not_found(page_id)
+
+        # The children of a deleted page are moved to its parent
+        page = self.pages.pop(page_id)
+        for child in self.pages.values():
+            if child['parent_id'] == page_id:
+                child['parent_id'] = page['parent_id']
+        return 204, None
+
+    def post_property(self, page_id, data):
+        if page_id not in self.pages:
+            return _not_found(page_id)
+        properties = self.pages[page_id]['properties']
+        key = data.get('key')
+        if key in properties:
+            return _error(
+                409,
+                'Cannot add a property with the same key: {}'.format(key),
+            )
+        properties[key] = {
+            'key': key,
+            'value': data.get('value'),
+            'version': {'number': 1},
+        }
+        return 200, properties[key]
+
+    def get_property(self, page_id, key):
+        if page_id not in self.pages:
+            return _not_found(page_id)
+        properties = self.pages[page_id]['properties']
+        if key not in properties:
+            return _error(404, 'No property with key {}'.format(key))
+        return 200, properties[key]
+
+    def put_property(self, page_id, key, data):
+        if page_id not in self.pages:
+            return _not_found(page_id)
+        properties = self.pages[page_id]['properties']
+        if key not in properties:
+            return _error(404, 'No property with key {}'.format(key))
+
+        version = data.get('version', {}).get('number')
+        if version != properties[key]['version']['number'] + 1:
+            return _error(
+                409,
+                'Version must be incremented on update. Current version '
+                'is: {}'.format(properties[key]['version']['number']),
+            )
+        properties[key] = {
+            'key': key,
+            'value': data.get('value'),
+            'version': {'number': version},
+        }
+        return 200, properties[key]
+
+    # Attachments
+
+    def get_attachments(self, page_id, query):
+        if page_id not in self.pages:
+            return _not_found(page_id)
+        start = int(query.get('start', 0))
+        limit = min(int(query.get('limit', 25)), self.max_limit)
+        attachments = sorted(
+            self.pages[page_id]['attachments'].values(),
+            key=lambda attachment: int(attachment['id'][3:]),
+        )
+        links = {}
+        if start + limit < len(attachments):
+            links['next'] = '{}/content/{}/child/attachment?' \
+                'limit={}&start={}'.format(
+                    API_PREFIX,
+                    page_id,
+                    limit,
+                    start + limit,
+                )
+        attachments = attachments[start:start + limit]
+        return 200, {
+            'results': [
+                {'id': attachment['id'], 'title': attachment['title']}
+                for attachment in attachments
+            ],
+            'start': start,
+            'limit': limit,
+            'size': len(attachments),
+            '_links': links,
+        }
+
+    def post_attachments(self, page_id, data):
+        if page_id not in self.pages:
+            return _not_found(page_id)
+        if data.get('token') != 'no-check':
+            return _error(403, 'XSRF check failed')
+        if not data.get('files'):
+            return _error(400, 'No file in the request')
+
+        attachments = self.pages[page_id]['attachments']
+        results = []
+        for title, content in data['files']:
+            if title in attachments:
+                return _error(
+                    400,
+                    'Cannot add a new attachment with same file name as an '
+                    'existing attachment: {}'.format(title),
+                )
+            attachments[title] = {
+                'id': 'att{}'.format(self._next_id),
+                'title': title,
+                'content': content,
+            }
+            self._next_id += 1
+            self.stats['uploads'] += 1
+            results.append({
+                'id': attachments[title]['id'],
+                'title': title,
+                'extensions': {'fileSize': len(content)},
+            })
+        return 200, {'results': results, 'size': len(results)}
+
+    def dispatch(self, method, path, query, data):
+        '''Route a request to its endpoint, returns the status code, the
+        json response and the extra headers'''
+
+        if method == 'GET' and path == '/_fake/stats':
+            return 200, self.snapshot(), {}
+
+        with self._lock:
+            self.stats['requests'] += 1
+            methods = self.stats['methods']
+            methods[method] = methods.get(method, 0) + 1
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self._lock:
+            draw = self._random.random()
+            if draw < self.throttle_rate:
+                self.stats['throttled'] += 1
+                return (
+                    429,
+                    {'statusCode': 429, 'message': 'Too many requests'},
+                    {'Retry-After': str(self.retry_after)},
+                )
+            if draw < self.throttle_rate + self.error_rate:
+                self.stats['errors'] += 1
+                return (
+                    503,
+                    {'statusCode': 503, 'message': 'Service unavailable'},
+                    {},
+                )
+
+            if not path.startswith(API_PREFIX):
+                return _not_found(path) + ({},)
+
+            parts = path[len(API_PREFIX):].strip('/').split('/')
+
+            if parts[0] == 'space' and len(parts) == 2 and method == 'GET':
+                response = self.get_space(parts[1])
+            elif parts[0] == 'space' and len(parts) == 3 and \
+                    parts[2] == 'content' and method == 'GET':
+                response = self.get_space_content(parts[1], query)
+            elif parts == ['content'] and method == 'GET':
+                response = self.find_content(query)
+            elif parts == ['content'] and method == 'POST':
+                response = self.post_content(data, query)
+            elif parts[0] == 'content' and len(parts) == 2:
+                if method == 'GET':
+                    response = self.get_content(parts[1], query)
+                elif method == 'PUT':
+                    response = self.put_content(parts[1], data, query)
+                elif method == 'DELETE':
+                    response = self.delete_content(parts[1])
+                else:
+                    response = _error(405, 'Method not allowed')
+            elif parts[0] == 'content' and len(parts) == 3 and \
+                    parts[2] == 'property' and method == 'POST':
+                response = self.post_property(parts[1], data)
+            elif parts[0] == 'content' and len(parts) == 4 and \
+                    parts[2] == 'property':
+                if method == 'GET':
+                    response = self.get_property(parts[1], parts[3])
+                elif method == 'PUT':
+                    response = self.put_property(parts[1], parts[3], data)
+                else:
+                    response = _error(405, 'Method not allowed')
+            elif parts[0] == 'content' and len(parts) == 4 and \
+                    parts[2:] == ['child', 'attachment']:
+                if method == 'GET':
+                    response = self.get_attachments(parts[1], query)
+                elif method == 'POST':
+                    response = self.post_attachments(parts[1], data)
+                else:
+                    response = _error(405, 'Method not allowed')
+            else:
+                response = _not_found(path)
+        return response + ({},)
+
+
+def _error(status_code, message):
+    return status_code, {'statusCode': status_code, 'message': message}
+
+
+def _not_found(resource):
+    return _error(404, 'No content found with id: {}'.format(resource))
+
+
+def _parse_multipart(content_type, body):
+    '''Returns the files of a multipart/form-data body as a list of file
+    name and content pairs'''
+
+    message = BytesParser().parsebytes(
+        'Content-Type: {}\r\n\r\n'.format(content_type).encode() + body,
+    )
+    return [
+        (part.get_filename(), part.get_payload(decode=True))
+        for part in message.get_payload()
+        if part.get_filename() is not None
+    ]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    '''Translates the http requests to calls to the FakeConfluence of the
+    server'''
+
+    # Keep the connections alive like the real server does, the headers and
+    # the body are sent apart so Nagle's algorithm would delay each response
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def _handle(self):
+        url = urlsplit(self.path)
+        query = {
+            key: values[-1]
+            for key, values in parse_qs(url.query).items()
+        }
+
+        data = {}
+        length = int(self.headers.get('Content-Length') or 0)
+        content_type = self.headers.get('Content-Type') or ''
+        if content_type.startswith('multipart/form-data'):
+            data = {
+                'files': _parse_multipart(
+                    content_type,
+                    self.rfile.read(length),
+                ),
+                'token': self.headers.get('X-Atlassian-Token'),
+            }
+        elif length:
+            try:
+                data = json.loads(self.rfile.read(length).decode())
+            except ValueError:
+                data = None
+        if not isinstance(data, dict):
+            status_code, response = _error(400, 'Invalid json')
+            headers = {}
+        else:
+            status_code, response, headers = \
+                self.server.confluence.dispatch(
+                    self.command,
+                    url.path,
+                    query,
+                    data,
+                )
+
+        body = b''
+        if response is not None:
+            body = json.dumps(response).encode()
+        self.send_response(status_code)
+        for header, value in headers.items():
+            self.send_header(header, value)
+        if body:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _handle
+    do_POST = _handle
+    do_PUT = _handle
+    do_DELETE = _handle
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Serve a fake Confluence space to run git2sc against'
+    )
+    parser.add_argument('--space', default='TST', help='Space key')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument(
+        '--latency',
+        type=float,
+        default=0,
+        help='Seconds each request takes',
+    )
+    parser.add_argument(
+        '--throttle-rate',
+        type=float,
+        default=0,
+        help='Fraction of the requests answered with a 429',
+    )
+    parser.add_argument(
+        '--error-rate',
+        type=float,
+        default=0,
+        help='Fraction of the requests answered with a 503',
+    )
+    parser.add_argument(
+        '--retry-after',
+        type=float,
+        default=0,
+        help='Retry-After seconds of the throttled responses',
+    )
+    parser.add_argument(
+        '--max-limit',
+        type=int,
+        default=100,
+        help='Maximum page size of the space content listing',
+    )
+    args = parser.parse_args()
+
+    confluence = FakeConfluence(
+        args.space,
+        latency=args.latency,
+        throttle_rate=args.throttle_rate,
+        error_rate=args.error_rate,
+        retry_after=args.retry_after,
+        max_limit=args.max_limit,
+        host=args.host,
+        port=args.port,
+    )
+    print('Serving the {} space at {}'.format(args.space, confluence.url))
+    try:
+        confluence.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        confluence.server.server_close()
+
+
+if __name__ == '__main__':
+    main()
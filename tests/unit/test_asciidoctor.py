@@ -0,0 +1,134 @@
+import json
+import unittest
+from unittest.mock import patch, Mock
+from git2sc.asciidoctor import AsciidoctorError, AsciidoctorPool, \
+    AsciidoctorWorker, WORKER_SCRIPT
+
+
+class TestAsciidoctorWorker(unittest.TestCase):
+    '''Test class for the AsciidoctorWorker class'''
+
+    def setUp(self):
+        self.subprocess_patch = patch(
+            'git2sc.asciidoctor.subprocess.Popen',
+            autospec=True,
+        )
+        self.popen = self.subprocess_patch.start()
+        self.process = self.popen.return_value
+        # The pipes are set in the constructor, they aren't part of the spec
+        self.process.stdin = Mock()
+        self.process.stdout = Mock()
+        self.worker = AsciidoctorWorker()
+
+    def tearDown(self):
+        self.subprocess_patch.stop()
+
+    def test_starts_a_ruby_process(self):
+        '''Required to load asciidoctor only once'''
+
+        self.assertEqual(
+            self.popen.call_args[0][0],
+            ['ruby', '-e', WORKER_SCRIPT],
+        )
+
+    def test_can_convert_a_file(self):
+        '''Required to render the AsciiDoc files through the worker'''
+
+        self.process.stdout.readline.return_value = \
+            json.dumps({'html': '<p>html</p>'}) + '\n'
+
+        result = self.worker.convert('/path/to/file.adoc')
+
+        self.assertEqual(
+            self.process.stdin.write.assert_called_with(
+                '{"path": "/path/to/file.adoc"}\n'
+            ),
+            None,
+        )
+        self.assertTrue(self.process.stdin.flush.called)
+        self.assertEqual(result, '<p>html</p>')
+
+    def test_convert_raises_the_asciidoctor_errors(self):
+        '''Required to report the files that can't be rendered'''
+
+        self.process.stdout.readline.return_value = \
+            json.dumps({'error': 'No such file'}) + '\n'
+
+        with self.assertRaises(AsciidoctorError):
+            self.worker.convert('/path/to/file.adoc')
+
+    def test_convert_raises_if_the_worker_died(self):
+        '''Required to avoid waiting forever for a dead worker'''
+
+        self.process.stdout.readline.return_value = ''
+
+        with self.assertRaises(AsciidoctorError):
+            self.worker.convert('/path/to/file.adoc')
+
+    def test_close_stops_the_process(self):
+        self.worker.close()
+        self.assertTrue(self.process.stdin.close.called)
+        self.assertTrue(self.process.wait.called)
+
+
+class TestAsciidoctorPool(unittest.TestCase):
+    '''Test class for the AsciidoctorPool class'''
+
+    def setUp(self):
+        self.worker_patch = patch(
+            'git2sc.asciidoctor.AsciidoctorWorker',
+            autospec=True,
+        )
+        self.worker = self.worker_patch.start()
+        self.worker.side_effect = lambda ruby: Mock()
+        self.pool = AsciidoctorPool(2)
+
+    def tearDown(self):
+        self.worker_patch.stop()
+
+    def test_workers_are_started_on_demand(self):
+        '''Required to avoid starting workers that aren't used'''
+
+        self.assertEqual(self.worker.call_count, 0)
+        self.pool.convert('/path/to/file.adoc')
+        self.assertEqual(self.worker.call_count, 1)
+
+    def test_idle_workers_are_reused(self):
+        '''Required to pay the startup of asciidoctor only once per worker'''
+
+        first = self.pool.convert('/path/to/first.adoc')
+        second = self.pool.convert('/path/to/second.adoc')
+
+        self.assertEqual(self.worker.call_count, 1)
+        self.assertEqual(
+            self.pool._workers[0].convert.call_args_list[-1][0],
+            ('/path/to/second.adoc',),
+        )
+        self.assertEqual(first, second)
+
+    def test_dead_workers_are_replaced(self):
+        '''Required to recover from a crashed worker'''
+
+        self.worker.side_effect = None
+        dead_worker = self.worker.return_value
+        dead_worker.is_alive.return_value = False
+        dead_worker.convert.side_effect = AsciidoctorError
+
+        with self.assertRaises(AsciidoctorError):
+            self.pool.convert('/path/to/file.adoc')
+
+        self.assertEqual(self.pool._workers, [])
+        self.assertTrue(dead_worker.close.called)
+
+        self.worker.side_effect = lambda ruby: Mock()
+        self.pool.convert('/path/to/file.adoc')
+        self.assertEqual(len(self.pool._workers), 1)
+
+    def test_close_stops_the_workers(self):
+        self.pool.convert('/path/to/file.adoc')
+        worker = self.pool._workers[0]
+
+        self.pool.close()
+
+        self.assertTrue(worker.close.called)
+        self.assertEqual(self.pool._workers, [])
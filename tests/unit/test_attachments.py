@@ -0,0 +1,198 @@
+import os
+import shutil
+import tempfile
+import unittest
+from email.parser import BytesParser
+
+from git2sc.attachments import Attachments, MultipartBody, file_digest
+
+
+class TestAttachments(unittest.TestCase):
+    '''Test class for the Attachments class'''
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmp, 'docs')
+        os.makedirs(os.path.join(self.root, 'images'))
+        self.document = os.path.join(self.root, 'README.html')
+        self.image = self.write('images/logo.png', b'\x89PNG logo')
+        self.write('guide.md', b'# Guide')
+        self.attachments = Attachments(['.html', '.md', '.adoc'])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, path, content):
+        path = os.path.join(self.root, path)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def name(self):
+        return '{}-logo.png'.format(file_digest(self.image)[:16])
+
+    def test_images_are_replaced_by_attachments(self):
+        '''Required to show the images of the repository in the pages'''
+
+        html = self.attachments.rewrite(
+            '<p><img src="images/logo.png" alt="Logo &amp; name" '
+            'width="40"></p>',
+            self.document,
+            self.root,
+        )
+
+        self.assertEqual(
+            html,
+            '<p><ac:image ac:alt="Logo &amp; name" ac:width="40">'
+            '<ri:attachment ri:filename="{}" /></ac:image></p>'.format(
+                self.name(),
+            ),
+        )
+        self.assertEqual(self.attachments.sources[self.name()], self.image)
+        self.assertEqual(self.attachments.names(html), [self.name()])
+
+    def test_links_to_files_are_replaced_by_attachments(self):
+        html = self.attachments.rewrite(
+            '<a href="./images/logo.png">the <b>logo</b></a> '
+            '<a href="guide.md">Guide</a> '
+            '<a href="https://example.com/logo.png">remote</a>',
+            self.document,
+            self.root,
+        )
+
+        self.assertEqual(
+            html,
+            '<ac:link><ri:attachment ri:filename="{}" />'
+            '<ac:link-body>the <b>logo</b></ac:link-body></ac:link> '
+            '<a href="guide.md">Guide</a> '
+            '<a href="https://example.com/logo.png">remote</a>'.format(
+                self.name(),
+            ),
+        )
+
+    def test_references_cant_leave_the_root(self):
+        '''Required to ensure that a document can't publish any file of the
+        machine that runs the sync'''
+
+        secret = os.path.join(self.tmp, 'secret.txt')
+        with open(secret, 'w') as f:
+            f.write('secret')
+
+        for reference in [
+            '../secret.txt',
+            secret,
+            'file://{}'.format(secret),
+            'images/missing.png',
+            'images',
+            'guide.md',
+        ]:
+            self.assertEqual(
+                self.attachments.resolve(reference, self.document, self.root),
+                None,
+            )
+        self.assertEqual(
+            self.attachments.resolve(
+                'images/logo.png?raw=1#top',
+                self.document,
+                self.root,
+            ),
+            self.image,
+        )
+
+    def test_references_are_found_in_the_sources(self):
+        '''Required to sync the pages again when a referenced file
+        changes'''
+
+        document = self.write(
+            'images/README.md',
+            b'![Logo](logo.png) [Guide](../guide.md) '
+            b'![Remote](https://example.com/a.png) [Again](./logo.png)',
+        )
+        adoc = self.write(
+            'index.adoc',
+            b'image::images/logo.png[Logo]\nlink:images/logo.png[Logo]\n',
+        )
+
+        self.assertEqual(
+            self.attachments.references(document, self.root),
+            [self.image],
+        )
+        self.assertEqual(
+            self.attachments.references(adoc, self.root),
+            [self.image],
+        )
+
+    def test_documents_referencing_a_file_are_found(self):
+        '''Required to sync the pages of the documents whose referenced
+        files changed or were deleted'''
+
+        guide = self.write('guide.md', b'![Logo](images/logo.png)')
+        other = self.write('other.md', b'![Chart](images/chart.png)')
+        removed = os.path.join(self.root, 'images', 'chart.png')
+
+        self.assertEqual(
+            self.attachments.referencing(
+                [self.document, guide, other],
+                [self.image, removed],
+                self.root,
+            ),
+            [guide, other],
+        )
+        self.assertEqual(
+            self.attachments.referencing([guide, other], [self.image]),
+            [guide],
+        )
+
+    def test_digests_are_computed_again_when_the_file_changes(self):
+        first = self.attachments.digest(self.image)
+        self.assertEqual(self.attachments.digest(self.image), first)
+
+        self.write('images/logo.png', b'\x89PNG new logo')
+        os.utime(self.image, ns=(0, 0))
+
+        self.assertNotEqual(self.attachments.digest(self.image), first)
+
+    def test_names_ignore_the_attachments_without_source(self):
+        self.assertEqual(
+            self.attachments.names(
+                '<ri:attachment ri:filename="0123456789abcdef-other.png" />'
+            ),
+            [],
+        )
+
+
+class TestMultipartBody(unittest.TestCase):
+    '''Test class for the MultipartBody class'''
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'logo.png')
+        self.content = bytes(range(256)) * 100
+        with open(self.path, 'wb') as f:
+            f.write(self.content)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_body_can_be_read_in_chunks_and_rewound(self):
+        '''Required to stream the attachments from disk and send them again
+        on the retries'''
+
+        with open(self.path, 'rb') as f:
+            body = MultipartBody(f, 'logo.png', {'minorEdit': 'true'})
+            chunks = iter(lambda: body.read(1000), b'')
+            content = b''.join(chunks)
+            self.assertEqual(len(content), len(body))
+
+            body.seek(0)
+            self.assertEqual(body.read(), content)
+
+        message = BytesParser().parsebytes(
+            'Content-Type: {}\r\n\r\n'.format(body.content_type).encode() +
+            content,
+        )
+        field, file_part = message.get_payload()
+        self.assertEqual(field.get_payload(), 'true')
+        self.assertEqual(file_part.get_filename(), 'logo.png')
+        self.assertEqual(file_part.get_content_type(), 'image/png')
+        self.assertEqual(file_part.get_payload(decode=True), self.content)
@@ -0,0 +1,292 @@
+import os
+import shutil
+import tempfile
+import unittest
+from functools import partial
+from unittest.mock import Mock, call
+
+from git2sc.batch import BatchRunner, BatchTarget, ConfigError, \
+    SharedPools, TargetResult, format_results, load_config
+from git2sc.git2sc import Git2SC
+from git2sc.metrics import SyncMetrics
+from tests.benchmark import generate_repository
+from tests.fake_confluence import FakeConfluence
+
+
+class TestLoadConfig(unittest.TestCase):
+    '''Test class for the load_config function'''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.config_path = os.path.join(self.directory, 'config.yaml')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def load(self, content, default_space=None, sync_state=False):
+        with open(self.config_path, 'w') as f:
+            f.write(content)
+        return load_config(self.config_path, default_space, sync_state)
+
+    def test_can_load_the_targets(self):
+        '''Required to describe the fleet of repositories in one file'''
+
+        targets = self.load(
+            'defaults:\n'
+            '  jobs: 4\n'
+            'targets:\n'
+            '  - space: DOC\n'
+            '    path: /srv/docs\n'
+            '    parent_id: 1234\n'
+            '  - path: repos/api\n'
+            '    exclude: [.git, drafts]\n'
+            '    incremental: true\n'
+            '    jobs: 1\n',
+            default_space='TST',
+        )
+
+        self.assertEqual(
+            [
+                (target.space, target.path, target.parent_id, target.jobs,
+                 target.incremental)
+                for target in targets
+            ],
+            [
+                ('DOC', '/srv/docs', '1234', 4, False),
+                ('TST', os.path.join(self.directory, 'repos', 'api'), None,
+                 1, True),
+            ],
+        )
+        self.assertEqual(targets[0].exclude, ['.git', '.gitignore',
+                                              '.gitmodules'])
+        self.assertEqual(targets[1].exclude, ['.git', 'drafts'])
+
+    def test_invalid_configurations_are_rejected(self):
+        for content in [
+            'targets: nope\n',
+            '- space: DOC\n',
+            'targets:\n  - space: DOC\n',
+            'targets:\n  - path: /srv/docs\n',
+            'targets:\n  - path: /srv/docs\n    space: DOC\n    other: 1\n',
+            'targets: [\n',
+        ]:
+            with self.assertRaises(ConfigError):
+                self.load(content)
+
+
+    def test_targets_of_a_space_cant_overlap(self):
+        '''Required to ensure that the targets of a space don't delete nor
+        overwrite the pages of each other'''
+
+        for content in [
+            # A target without parent_id owns the whole space
+            'targets:\n'
+            '  - {space: DOC, path: /srv/a, parent_id: 1}\n'
+            '  - {space: DOC, path: /srv/b}\n',
+            # The directory pages would have the same title
+            'targets:\n'
+            '  - {space: DOC, path: /srv/a/docs, parent_id: 1}\n'
+            '  - {space: DOC, path: /srv/b/docs, parent_id: 2}\n',
+        ]:
+            with self.assertRaises(ConfigError):
+                self.load(content)
+
+        content = (
+            'targets:\n'
+            '  - {space: DOC, path: /srv/a, parent_id: 1}\n'
+            '  - {space: DOC, path: /srv/b, parent_id: 2}\n'
+            '  - {space: API, path: /srv/c}\n'
+        )
+        self.assertEqual(len(self.load(content)), 3)
+        with self.assertRaises(ConfigError):
+            self.load(content, sync_state=True)
+        self.assertEqual(
+            len(self.load('targets:\n  - {space: DOC, path: /srv/a}\n',
+                          sync_state=True)),
+            1,
+        )
+
+class TestBatchRunner(unittest.TestCase):
+    '''Test class for the BatchRunner class'''
+
+    def setUp(self):
+        self.instances = {}
+        self.factory = Mock(side_effect=self.build)
+
+    def build(self, space):
+        g = Mock()
+        g.metrics = SyncMetrics({'space': space})
+        self.instances[space] = g
+        return g
+
+    def test_targets_of_a_space_share_its_instance(self):
+        '''Required to fetch the inventory of each space once'''
+
+        targets = [
+            BatchTarget('DOC', '/a'),
+            BatchTarget('API', '/b', incremental=True),
+            BatchTarget('DOC', '/c', parent_id='1', jobs=4, max_deletes=5),
+        ]
+
+        results = BatchRunner(self.factory, targets, workers=2).run()
+
+        self.assertEqual(
+            sorted(self.factory.mock_calls),
+            sorted([call('DOC'), call('API')]),
+        )
+        self.assertEqual(
+            self.instances['DOC'].directory_update.mock_calls,
+            [
+                call('/a', ['.git', '.gitignore', '.gitmodules'], None, 1,
+                     None),
+                call('/c', ['.git', '.gitignore', '.gitmodules'], '1', 4, 5),
+            ],
+        )
+        self.assertEqual(
+            self.instances['API'].directory_incremental_update.
+            assert_called_with('/b', ['.git', '.gitignore', '.gitmodules'],
+                               None, jobs=1, max_deletes=None),
+            None,
+        )
+        self.assertEqual(
+            [result.target for result in results],
+            targets,
+        )
+        self.assertTrue(self.instances['DOC'].close.called)
+
+    def test_a_failed_target_doesnt_stop_the_batch(self):
+        def build(space):
+            g = self.build(space)
+            g.directory_update.side_effect = [Exception('Conflict'), None]
+            return g
+        self.factory.side_effect = build
+
+        results = BatchRunner(
+            self.factory,
+            [BatchTarget('DOC', '/a'), BatchTarget('DOC', '/b')],
+        ).run()
+
+        self.assertEqual(
+            [(result.status, result.error) for result in results],
+            [('failed', 'Exception: Conflict'), ('ok', None)],
+        )
+
+    def test_results_can_be_printed(self):
+        '''Required to review the outcome of each target of the batch'''
+
+        pages = {'create': 1, 'update': 2, 'skip': 30, 'delete': 0}
+        results = [
+            TargetResult(BatchTarget('DOC', '/a'), 'ok', 1.25, pages),
+            TargetResult(BatchTarget('API', '/b'), 'failed', 0.5, pages,
+                         'Exception: Conflict'),
+        ]
+
+        self.assertEqual(
+            format_results(results).splitlines(),
+            [
+                'Space        Status       Time  Create  Update    Skip  '
+                'Delete  Path',
+                'DOC          ok           1.2s       1       2      30  '
+                '     0  /a',
+                'API          failed       0.5s       1       2      30  '
+                '     0  /b',
+                'API /b: Exception: Conflict',
+                '1 targets synced, 1 failed',
+            ],
+        )
+
+
+class TestBatchAgainstFakeConfluence(unittest.TestCase):
+    '''Test class for the batches against the fake Confluence server'''
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'docs')
+        generate_repository(self.path, 6, 1, ['html'], seed=0)
+        self.confluence = FakeConfluence().start()
+
+    def tearDown(self):
+        self.confluence.stop()
+        shutil.rmtree(self.tmp)
+
+    def test_targets_share_the_pools(self):
+        '''Required to ensure that the instances of a batch sync through the
+        shared connections and budget'''
+
+        pools = SharedPools(('user', 'password'), pool_size=2, rate=1000)
+        factory = partial(
+            Git2SC,
+            self.confluence.url,
+            'user:password',
+            **pools.git2sc_arguments()
+        )
+        metrics = SyncMetrics()
+        try:
+            results = BatchRunner(
+                factory,
+                [BatchTarget('TST', self.path)],
+                metrics=metrics,
+            ).run()
+        finally:
+            pools.close()
+
+        self.assertEqual(results[0].status, 'ok')
+        self.assertEqual(results[0].pages['create'], 6)
+        self.assertEqual(len(self.confluence.pages), 7)
+        # The metrics of the batch are the ones of its instances
+        self.assertEqual(metrics.pages['create'], 6)
+        self.assertEqual(
+            sum(
+                sum(statuses.values())
+                for statuses in metrics.requests.values()
+            ),
+            self.confluence.stats['requests'],
+        )
+
+    def write(self, path, content):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def test_targets_of_a_space_only_delete_their_pages(self):
+        '''Required to ensure that the targets of a space don't delete the
+        pages of each other, nor the pages they hang from'''
+
+        homepage_id = self.confluence.homepage_id
+        team_ids = [
+            self.confluence._add_page(title, homepage_id, '')
+            for title in ['TeamA', 'TeamB']
+        ]
+        self.confluence._add_page('Other', homepage_id, '')
+        targets = []
+        for name, team_id in zip(['alpha', 'beta'], team_ids):
+            path = os.path.join(self.tmp, name)
+            for number in range(2):
+                self.write(
+                    os.path.join(path, '{}{}.html'.format(name, number)),
+                    '<p>{}</p>'.format(number),
+                )
+            targets.append(BatchTarget('TST', path, parent_id=team_id))
+        factory = partial(Git2SC, self.confluence.url, 'user:password')
+
+        for _ in range(2):
+            results = BatchRunner(factory, targets).run()
+            self.assertEqual([result.status for result in results],
+                             ['ok', 'ok'])
+        os.remove(os.path.join(self.tmp, 'alpha', 'alpha1.html'))
+        results = BatchRunner(factory, targets).run()
+
+        self.assertEqual(
+            [result.pages['delete'] for result in results],
+            [1, 0],
+        )
+        self.assertEqual(
+            sorted(page['title'] for page in self.confluence.pages.values()),
+            ['Other', 'TST Home', 'TeamA', 'TeamB', 'alpha', 'alpha0',
+             'beta', 'beta0', 'beta1'],
+        )
+        pages = {
+            page['title']: page for page in self.confluence.pages.values()
+        }
+        self.assertEqual(pages['alpha']['parent_id'], team_ids[0])
+        self.assertEqual(pages['beta0']['parent_id'], pages['beta']['id'])
@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from git2sc.cache import RenderCache
+
+
+class TestRenderCache(unittest.TestCase):
+    '''Test class for the RenderCache class'''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = RenderCache(self.directory, max_size=10)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_unknown_keys_are_not_cached(self):
+        self.assertEqual(self.cache.get('aabbcc'), None)
+
+    def test_can_store_rendered_html(self):
+        '''Required to avoid converting again the files that didn't
+        change'''
+
+        self.cache.set('aabbcc', '<p>a</p>')
+
+        self.assertEqual(self.cache.get('aabbcc'), '<p>a</p>')
+        self.assertTrue(
+            os.path.isfile(os.path.join(self.directory, 'aa', 'aabbcc.html'))
+        )
+
+    def test_cache_is_persisted_between_runs(self):
+        '''Required to reuse the cache between CI jobs'''
+
+        self.cache.set('aabbcc', '<p>a</p>')
+
+        cache = RenderCache(self.directory, max_size=10)
+
+        self.assertEqual(cache.get('aabbcc'), '<p>a</p>')
+        self.assertEqual(cache.size, 8)
+
+    def test_overwriting_a_key_keeps_the_size(self):
+        self.cache.set('aabbcc', '<p>a</p>')
+        self.cache.set('aabbcc', '<p>b</p>')
+
+        self.assertEqual(self.cache.size, 8)
+        self.assertEqual(self.cache.get('aabbcc'), '<p>b</p>')
+
+    def test_least_recently_used_files_are_evicted(self):
+        '''Required to bound the size of the cache'''
+
+        self.cache.set('aa0001', '12345')
+        self.cache.set('aa0002', '12345')
+        os.utime(self.cache._path('aa0001'), (1, 1))
+        os.utime(self.cache._path('aa0002'), (2, 2))
+
+        self.cache.set('aa0003', '12345')
+
+        self.assertEqual(self.cache.get('aa0001'), None)
+        self.assertEqual(self.cache.get('aa0002'), '12345')
+        self.assertEqual(self.cache.get('aa0003'), '12345')
+        self.assertEqual(self.cache.size, 10)
+
+    def test_reads_refresh_the_eviction_order(self):
+        self.cache.set('aa0001', '12345')
+        self.cache.set('aa0002', '12345')
+        os.utime(self.cache._path('aa0001'), (1, 1))
+        os.utime(self.cache._path('aa0002'), (2, 2))
+
+        self.cache.get('aa0001')
+        self.cache.set('aa0003', '12345')
+
+        self.assertEqual(self.cache.get('aa0001'), '12345')
+        self.assertEqual(self.cache.get('aa0002'), None)
+
+    def test_eviction_order_is_loaded_from_the_directory(self):
+        '''Required to keep evicting the least recently used files of the
+        previous runs'''
+
+        self.cache.set('aa0001', '12345')
+        self.cache.set('aa0002', '12345')
+        os.utime(self.cache._path('aa0001'), (2, 2))
+        os.utime(self.cache._path('aa0002'), (1, 1))
+
+        cache = RenderCache(self.directory, max_size=10)
+        cache.set('aa0003', '12345')
+
+        self.assertEqual(cache.get('aa0001'), '12345')
+        self.assertEqual(cache.get('aa0002'), None)
+
+    def test_eviction_doesnt_walk_the_directory(self):
+        '''Required to keep the writes of a full cache cheap'''
+
+        self.cache.set('aa0001', '12345')
+        self.cache.set('aa0002', '12345')
+
+        with patch('git2sc.cache.os.walk', autospec=True) as walkMock:
+            self.cache.set('aa0003', '12345')
+
+        self.assertFalse(walkMock.called)
+        self.assertEqual(self.cache.get('aa0001'), None)
+
+    def test_can_store_non_ascii_html(self):
+        cache = RenderCache(self.directory)
+        cache.set('aabbcc', '<p>Introducción</p>')
+
+        self.assertEqual(cache.get('aabbcc'), '<p>Introducción</p>')
+        self.assertEqual(cache.size, 20)
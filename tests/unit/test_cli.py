@@ -1,3 +1,4 @@
+import os
 import unittest
 from git2sc.cli import load_parser
 
@@ -146,6 +147,19 @@ class TestArgparse(unittest.TestCase):
         )
         self.assertEqual(parsed.parent_id, 'parent_id')
 
+    def test_has_subcommand_upload_directory_can_specify_jobs(self):
+        '''Required to ensure that the parser is correctly configured to
+        upload a directory concurrently'''
+        parsed = self.parser.parse_args(
+            ['TST', 'upload', '/path/to/directory', '--jobs', '8']
+        )
+        self.assertEqual(parsed.jobs, 8)
+
+    def test_upload_directory_is_sequential_by_default(self):
+        '''Required to ensure that the upload is sequential by default'''
+        parsed = self.parser.parse_args(['TST', 'upload', '/path/to/directory'])
+        self.assertEqual(parsed.jobs, 1)
+
     def test_has_subcommand_sync_directory(self):
         '''Required to ensure that the parser is correctly configured to
         sync a directory'''
@@ -159,6 +173,24 @@ class TestArgparse(unittest.TestCase):
         self.assertEqual(parsed.subcommand, 'sync')
         self.assertEqual(parsed.path, '/path/to/directory')
         self.assertEqual(parsed.exclude, ['.git', '.gitignore', '.gitmodules'])
+        self.assertEqual(parsed.since, None)
+        self.assertEqual(parsed.incremental, False)
+
+    def test_has_subcommand_sync_directory_can_specify_since(self):
+        '''Required to ensure that the parser is correctly configured to
+        sync the files changed since a revision'''
+        parsed = self.parser.parse_args(
+            ['TST', 'sync', '/path/to/directory', '--since', 'HEAD~1']
+        )
+        self.assertEqual(parsed.since, 'HEAD~1')
+
+    def test_has_subcommand_sync_directory_can_be_incremental(self):
+        '''Required to ensure that the parser is correctly configured to
+        sync the files changed since the last synced commit'''
+        parsed = self.parser.parse_args(
+            ['TST', 'sync', '/path/to/directory', '--incremental']
+        )
+        self.assertEqual(parsed.incremental, True)
 
     def test_has_subcommand_sync_directory_can_specify_excluded_dirs(self):
         '''Required to ensure that the parser is correctly configured to
@@ -174,3 +206,260 @@ class TestArgparse(unittest.TestCase):
             ]
         )
         self.assertEqual(parsed.exclude, ['excluded_dir1', 'excluded_dir2'])
+
+    def test_has_connection_pool_defaults(self):
+        '''Required to ensure that the parser configures the http connection
+        pool with sane defaults'''
+        parsed = self.parser.parse_args(['TST', 'article', 'delete', '1'])
+        self.assertEqual(parsed.pool_size, 10)
+        self.assertEqual(parsed.timeout, 30)
+        self.assertEqual(parsed.keep_alive, True)
+        self.assertEqual(parsed.state, None)
+
+    def test_has_space_inventory_defaults(self):
+        '''Required to ensure that the space inventory is paginated with sane
+        defaults'''
+        parsed = self.parser.parse_args(['TST', 'sync', '/path/to/directory'])
+        self.assertEqual(parsed.page_size, 100)
+        self.assertEqual(parsed.fetch_concurrency, 1)
+
+    def test_can_configure_space_inventory(self):
+        '''Required to ensure that the space inventory pagination can be
+        tuned'''
+        parsed = self.parser.parse_args(
+            [
+                '--page-size',
+                '50',
+                '--fetch-concurrency',
+                '4',
+                'TST',
+                'sync',
+                '/path/to/directory',
+            ]
+        )
+        self.assertEqual(parsed.page_size, 50)
+        self.assertEqual(parsed.fetch_concurrency, 4)
+
+    def test_can_configure_connection_pool(self):
+        '''Required to ensure that the parser can tune the http connection
+        pool'''
+        parsed = self.parser.parse_args(
+            [
+                '--pool-size',
+                '20',
+                '--timeout',
+                '5',
+                '--no-keep-alive',
+                'TST',
+                'article',
+                'delete',
+                '1',
+            ]
+        )
+        self.assertEqual(parsed.pool_size, 20)
+        self.assertEqual(parsed.timeout, 5)
+        self.assertEqual(parsed.keep_alive, False)
+
+    def test_can_configure_sync_state(self):
+        '''Required to ensure that the parser can load a sync state'''
+        parsed = self.parser.parse_args(
+            ['--state', 'state.db', 'TST', 'sync', '/path/to/directory']
+        )
+        self.assertEqual(parsed.state, 'state.db')
+
+    def test_has_retry_defaults(self):
+        parsed = self.parser.parse_args(['TST', 'sync', '/path/to/directory'])
+        self.assertEqual(parsed.max_retries, 5)
+        self.assertEqual(parsed.backoff, 0.5)
+
+    def test_can_configure_retries(self):
+        '''Required to ensure that the parser can tune the retries of the
+        throttled requests'''
+        parsed = self.parser.parse_args(
+            [
+                '--max-retries',
+                '2',
+                '--backoff',
+                '1.5',
+                'TST',
+                'sync',
+                '/path/to/directory',
+            ]
+        )
+        self.assertEqual(parsed.max_retries, 2)
+        self.assertEqual(parsed.backoff, 1.5)
+
+    def test_asciidoctor_workers_are_disabled_by_default(self):
+        parsed = self.parser.parse_args(['TST', 'sync', '/path/to/directory'])
+        self.assertEqual(parsed.adoc_workers, 0)
+
+    def test_can_configure_asciidoctor_workers(self):
+        parsed = self.parser.parse_args(
+            ['--adoc-workers', '4', 'TST', 'sync', '/path/to/directory']
+        )
+        self.assertEqual(parsed.adoc_workers, 4)
+
+    def test_converts_with_all_the_cores_by_default(self):
+        parsed = self.parser.parse_args(['TST', 'sync', '/path/to/directory'])
+        self.assertEqual(parsed.convert_workers, os.cpu_count() or 1)
+
+    def test_can_configure_convert_workers(self):
+        '''Required to ensure that the parser can tune the conversion
+        stage'''
+        parsed = self.parser.parse_args(
+            ['--convert-workers', '2', 'TST', 'upload', '/path/to/directory']
+        )
+        self.assertEqual(parsed.convert_workers, 2)
+
+    def test_can_configure_upload_workers(self):
+        parsed = self.parser.parse_args(['TST', 'sync', '/path/to/directory'])
+        self.assertEqual(parsed.upload_workers, 4)
+
+        parsed = self.parser.parse_args(
+            ['--upload-workers', '8', 'TST', 'sync', '/path/to/directory']
+        )
+        self.assertEqual(parsed.upload_workers, 8)
+
+    def test_render_cache_is_disabled_by_default(self):
+        parsed = self.parser.parse_args(['TST', 'sync', '/path/to/directory'])
+        self.assertEqual(parsed.cache_dir, None)
+        self.assertEqual(parsed.cache_size, 256)
+
+    def test_can_configure_render_cache(self):
+        '''Required to ensure that the parser can persist the rendered html
+        between runs'''
+        parsed = self.parser.parse_args(
+            [
+                '--cache-dir',
+                '.cache',
+                '--cache-size',
+                '64',
+                'TST',
+                'sync',
+                '/path/to/directory',
+            ]
+        )
+        self.assertEqual(parsed.cache_dir, '.cache')
+        self.assertEqual(parsed.cache_size, 64)
+
+    def test_can_write_the_metrics(self):
+        '''Required to ensure that the parser can emit the metrics of the
+        run'''
+        parsed = self.parser.parse_args(['TST', 'sync', '/path/to/directory'])
+        self.assertEqual(parsed.metrics, None)
+        self.assertEqual(parsed.prometheus, None)
+
+        parsed = self.parser.parse_args(
+            [
+                '--metrics',
+                '-',
+                '--prometheus',
+                'git2sc.prom',
+                'TST',
+                'sync',
+                '/path/to/directory',
+            ]
+        )
+        self.assertEqual(parsed.metrics, '-')
+        self.assertEqual(parsed.prometheus, 'git2sc.prom')
+
+    def test_can_trace_the_run(self):
+        '''Required to ensure that the parser can write the spans of the
+        run'''
+        parsed = self.parser.parse_args(
+            ['--trace', 'trace.jsonl', 'TST', 'sync', '/path/to/directory']
+        )
+        self.assertEqual(parsed.trace, 'trace.jsonl')
+
+    def test_can_profile_the_run(self):
+        '''Required to ensure that the parser can profile the cpu or the
+        memory of a run'''
+        parsed = self.parser.parse_args(['TST', 'sync', '/path/to/directory'])
+        self.assertEqual(parsed.profile, None)
+
+        parsed = self.parser.parse_args(
+            [
+                '--profile',
+                'mem',
+                '--profile-dir',
+                'profiles',
+                '--profile-top',
+                '10',
+                'TST',
+                'sync',
+                '/path/to/directory',
+            ]
+        )
+        self.assertEqual(parsed.profile, 'mem')
+        self.assertEqual(parsed.profile_dir, 'profiles')
+        self.assertEqual(parsed.profile_top, 10)
+
+    def test_upload_and_sync_can_only_plan(self):
+        '''Required to ensure that the parser can print the plan without
+        touching anything'''
+        parsed = self.parser.parse_args(['TST', 'upload', '--plan', '/path'])
+        self.assertTrue(parsed.plan)
+        parsed = self.parser.parse_args(['TST', 'sync', '/path'])
+        self.assertFalse(parsed.plan)
+
+    def test_sync_can_specify_jobs_and_max_deletes(self):
+        '''Required to ensure that the parser can tune the deletions of the
+        sync'''
+        parsed = self.parser.parse_args(
+            ['TST', 'sync', '-j', '8', '--max-deletes', '50', '/path']
+        )
+        self.assertEqual(parsed.jobs, 8)
+        self.assertEqual(parsed.max_deletes, 50)
+
+        parsed = self.parser.parse_args(['TST', 'sync', '/path'])
+        self.assertEqual(parsed.jobs, 1)
+        self.assertEqual(parsed.max_deletes, None)
+
+    def test_has_subcommand_watch(self):
+        '''Required to ensure that the parser can keep a directory
+        synced'''
+        parsed = self.parser.parse_args(['TST', 'watch', '/path'])
+        self.assertEqual(parsed.subcommand, 'watch')
+        self.assertEqual(parsed.path, '/path')
+        self.assertEqual(parsed.exclude, ['.git', '.gitignore', '.gitmodules'])
+        self.assertEqual(parsed.debounce, 0.5)
+        self.assertEqual(parsed.max_delay, 10)
+
+        parsed = self.parser.parse_args(
+            ['TST', 'watch', '--debounce', '2', '--max-delay', '30', '/path']
+        )
+        self.assertEqual(parsed.debounce, 2)
+        self.assertEqual(parsed.max_delay, 30)
+
+    def test_has_subcommand_serve(self):
+        '''Required to ensure that the parser can serve the push
+        webhooks'''
+        parsed = self.parser.parse_args(['TST', 'serve'])
+        self.assertEqual(parsed.subcommand, 'serve')
+        self.assertEqual(parsed.host, '127.0.0.1')
+        self.assertEqual(parsed.port, 8080)
+        self.assertEqual(parsed.workers, 2)
+        self.assertEqual(parsed.allowed_path, None)
+
+        parsed = self.parser.parse_args(
+            ['TST', 'serve', '--port', '9000', '-w', '4', '--allowed-path',
+             '/srv/docs']
+        )
+        self.assertEqual(parsed.port, 9000)
+        self.assertEqual(parsed.workers, 4)
+        self.assertEqual(parsed.allowed_path, ['/srv/docs'])
+
+    def test_has_subcommand_batch(self):
+        '''Required to ensure that the parser can sync a fleet of
+        repositories from a configuration file'''
+        parsed = self.parser.parse_args(['TST', 'batch', 'config.yaml'])
+        self.assertEqual(parsed.subcommand, 'batch')
+        self.assertEqual(parsed.config, 'config.yaml')
+        self.assertEqual(parsed.parallel, 4)
+        self.assertEqual(parsed.rate, None)
+
+        parsed = self.parser.parse_args(
+            ['TST', 'batch', '-p', '8', '--rate', '20', 'config.yaml']
+        )
+        self.assertEqual(parsed.parallel, 8)
+        self.assertEqual(parsed.rate, 20)
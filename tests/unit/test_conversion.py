@@ -0,0 +1,103 @@
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock
+from git2sc.conversion import ConversionStage
+
+
+class TestConversionStage(unittest.TestCase):
+    '''Test class for the ConversionStage class'''
+
+    def setUp(self):
+        self.convert = Mock()
+        self.convert.side_effect = lambda path: '<p>{}</p>'.format(path)
+        self.stage = ConversionStage(self.convert, 4)
+
+    def tearDown(self):
+        self.stage.close()
+
+    def test_can_convert_the_submitted_files(self):
+        '''Required to convert the files ahead of the upload'''
+
+        self.stage.submit(['a.md', 'b.adoc'])
+
+        self.assertTrue('a.md' in self.stage)
+        self.assertEqual(self.stage.result('a.md'), '<p>a.md</p>')
+        self.assertEqual(self.stage.result('b.adoc'), '<p>b.adoc</p>')
+        self.assertFalse('a.md' in self.stage)
+
+    def test_files_are_converted_once(self):
+        '''Required to avoid converting twice the files submitted twice'''
+
+        self.stage.submit(['a.md'])
+        self.stage.submit(['a.md'])
+        self.stage.result('a.md')
+
+        self.assertEqual(self.convert.call_count, 1)
+
+    def test_conversion_errors_are_isolated(self):
+        '''Required to ensure that a failing file doesn't break the
+        conversion of the others'''
+
+        def convert(path):
+            if path == 'broken.md':
+                raise ValueError(path)
+            return path
+
+        self.convert.side_effect = convert
+        self.stage.submit(['broken.md', 'fine.md'])
+
+        self.assertEqual(self.stage.result('fine.md'), 'fine.md')
+        with self.assertRaises(ValueError):
+            self.stage.result('broken.md')
+
+    def test_conversions_run_in_parallel(self):
+        '''Required to use all the cores while converting'''
+
+        barrier = threading.Barrier(2, timeout=5)
+        self.convert.side_effect = lambda path: barrier.wait()
+        self.stage.submit(['a.md', 'b.md'])
+
+        self.stage.result('a.md')
+        self.stage.result('b.md')
+
+    def test_conversions_are_limited_ahead_of_the_consumer(self):
+        '''Required to keep the html of a large tree from being buffered at
+        once'''
+
+        release = threading.Event()
+        self.convert.side_effect = lambda path: release.wait(5) and path
+        stage = ConversionStage(self.convert, 2)
+        self.addCleanup(stage.close)
+        stage.submit(['{}.md'.format(number) for number in range(10)])
+
+        self.assertEqual(len(stage._futures), 4)
+        self.assertTrue('9.md' in stage)
+
+        release.set()
+        self.assertEqual(stage.result('0.md'), '0.md')
+        self.assertEqual(len(stage._futures), 4)
+        self.assertEqual(stage.result('9.md'), '9.md')
+        self.assertEqual(
+            [stage.result('{}.md'.format(number)) for number in range(1, 9)],
+            ['{}.md'.format(number) for number in range(1, 9)],
+        )
+        self.assertEqual(self.convert.call_count, 10)
+
+    def test_close_discards_the_pending_conversions(self):
+        self.stage.submit(['a.md'])
+        self.stage.close()
+        self.assertFalse('a.md' in self.stage)
+
+    def test_can_share_an_executor(self):
+        '''Required to share the conversion workers between the syncs of
+        several spaces'''
+
+        executor = ThreadPoolExecutor(max_workers=2)
+        stage = ConversionStage(self.convert, 4, executor)
+        stage.submit(['a.md'])
+
+        self.assertEqual(stage.result('a.md'), '<p>a.md</p>')
+        stage.close()
+        self.assertEqual(executor.submit(len, 'ab').result(), 2)
+        executor.shutdown()
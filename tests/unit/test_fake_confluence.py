@@ -0,0 +1,544 @@
+import os
+import shutil
+import tempfile
+import subprocess
+import unittest
+from unittest.mock import Mock
+
+from git2sc.git2sc import Git2SC, TooManyDeletions
+from git2sc.state import SyncState
+from git2sc.watch import Changes
+from tests.benchmark import change_repository, generate_repository
+from tests.fake_confluence import FakeConfluence
+
+
+class TestFakeConfluence(unittest.TestCase):
+    '''Test class for the syncs against the fake Confluence server'''
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'docs')
+        self.documents = generate_repository(
+            self.path,
+            12,
+            2,
+            ['html'],
+            branching=2,
+            size=100,
+            seed=0,
+        )
+        self.confluence = FakeConfluence(seed=0).start()
+
+    def tearDown(self):
+        self.confluence.stop()
+        shutil.rmtree(self.tmp)
+
+    def git2sc(self, **kwargs):
+        g = Git2SC(self.confluence.url, 'user:password', 'TST', **kwargs)
+        self.addCleanup(g.close)
+        return g
+
+    def titles(self):
+        return sorted(
+            page['title'] for page in self.confluence.pages.values()
+        )
+
+    def test_full_upload_creates_the_tree(self):
+        '''Required to ensure that the upload creates a page per document and
+        directory below the homepage'''
+
+        self.git2sc().directory_full_upload(self.path, [])
+
+        self.assertEqual(
+            self.titles(),
+            sorted(
+                ['TST Home', 'section_1_0', 'section_1_1'] +
+                ['document_{}'.format(number) for number in range(12)]
+            ),
+        )
+        homepage_id = self.confluence.homepage_id
+        for page in self.confluence.pages.values():
+            if page['title'].startswith('section'):
+                self.assertEqual(page['parent_id'], homepage_id)
+
+    def test_sync_only_writes_the_changed_documents(self):
+        '''Required to measure the requests of an incremental change'''
+
+        self.git2sc().directory_full_upload(self.path, [])
+        changed = change_repository(self.documents, 0.25, seed=0)
+        before = self.confluence.snapshot()
+
+        self.git2sc().directory_update(self.path, [])
+
+        after = self.confluence.snapshot()
+        self.assertEqual(
+            after['methods'].get('PUT', 0) - before['methods'].get('PUT', 0),
+            2 * len(changed),
+        )
+        self.assertEqual(
+            after['methods'].get('POST', 0),
+            before['methods'].get('POST', 0),
+        )
+
+    def test_inventory_follows_the_pagination(self):
+        '''Required to ensure that the server caps the page size and the
+        client follows the next links'''
+
+        self.git2sc().directory_full_upload(self.path, [])
+        self.confluence.max_limit = 4
+
+        g = self.git2sc(page_size=10)
+        g.get_space_articles()
+
+        self.assertEqual(
+            sorted(page['title'] for page in g.pages.values()),
+            self.titles(),
+        )
+
+    def test_throttled_requests_are_retried(self):
+        '''Required to ensure that the uploads survive the throttling of the
+        server'''
+
+        self.confluence.throttle_rate = 0.3
+
+        g = self.git2sc(backoff=0, max_retries=20)
+        g.directory_full_upload(self.path, [], jobs=4)
+
+        self.assertGreater(self.confluence.stats['throttled'], 0)
+        self.assertEqual(g.transport.stats.throttled,
+                         self.confluence.stats['throttled'])
+        self.assertEqual(len(self.confluence.pages), 15)
+
+    def test_server_errors_are_retried(self):
+        '''Required to ensure that the uploads survive the transient errors
+        of the server, the creates included'''
+
+        self.confluence.error_rate = 0.3
+
+        g = self.git2sc(backoff=0, max_retries=20)
+        g.directory_full_upload(self.path, [], jobs=4)
+
+        self.assertGreater(self.confluence.stats['errors'], 0)
+        self.assertEqual(len(self.confluence.pages), 15)
+
+    def test_stale_versions_are_rejected(self):
+        '''Required to reproduce the conflicts of concurrent editions'''
+
+        g = self.git2sc()
+        page_id = g.create_page('Article', '<p>Article</p>')
+        self.confluence.pages[page_id]['version'] += 1
+
+        g.update_page(page_id, '<p>Updated article</p>')
+
+        self.assertEqual(self.confluence.pages[page_id]['version'], 3)
+        self.assertEqual(
+            self.confluence.pages[page_id]['body'],
+            '<p>Updated article</p>',
+        )
+
+    def test_referenced_images_are_uploaded_once(self):
+        '''Required to ensure that the images of the documents are attached
+        to their pages and never uploaded again while they don't change'''
+
+        image_path = os.path.join(self.path, 'logo.png')
+        with open(image_path, 'wb') as f:
+            f.write(b'\x89PNG logo')
+        with open(os.path.join(self.path, 'logos.html'), 'w') as f:
+            f.write('<p><img src="logo.png" alt="Logo"></p>'
+                    '<p><a href="logo.png">Download</a></p>')
+
+        self.git2sc().directory_update(self.path, [])
+
+        page = self.confluence.pages[
+            self.confluence._title_id('logos')
+        ]
+        self.assertEqual(len(page['attachments']), 1)
+        attachment = next(iter(page['attachments'].values()))
+        self.assertTrue(attachment['title'].endswith('-logo.png'))
+        self.assertEqual(attachment['content'], b'\x89PNG logo')
+        self.assertIn(
+            '<ri:attachment ri:filename="{}" />'.format(attachment['title']),
+            page['body'],
+        )
+        self.assertEqual(self.confluence.stats['uploads'], 1)
+
+        self.git2sc().directory_update(self.path, [])
+        self.assertEqual(self.confluence.stats['uploads'], 1)
+
+        with open(image_path, 'wb') as f:
+            f.write(b'\x89PNG new logo')
+        g = self.git2sc()
+        g.directory_update(self.path, [])
+
+        self.assertEqual(self.confluence.stats['uploads'], 2)
+        self.assertEqual(len(page['attachments']), 2)
+        self.assertEqual(g.metrics.pages['update'], 1)
+        self.assertEqual(g.metrics.attachments, {'upload': 1, 'skip': 0})
+
+    def test_attachment_names_follow_the_pagination(self):
+        '''Required to know every attachment of a page when the server caps
+        the page size'''
+
+        page_id = self.confluence._add_page(
+            'logos',
+            self.confluence.homepage_id,
+            '',
+        )
+        self.confluence.pages[page_id]['attachments'] = {
+            title: {'id': 'att{}'.format(number), 'title': title}
+            for number, title in enumerate(['a.png', 'b.png', 'c.png'])
+        }
+        self.confluence.max_limit = 2
+
+        names = self.git2sc(page_size=10).get_attachment_names(page_id)
+
+        self.assertEqual(names, {'a.png', 'b.png', 'c.png'})
+
+    def incremental_git2sc(self, changed=(), **kwargs):
+        '''Git2SC instance whose repository is at commit head and has the
+        changed files since any revision'''
+
+        g = self.git2sc(**kwargs)
+        g.get_head_commit = Mock(return_value='head')
+        g.contains_commit = Mock(return_value=True)
+        g.get_changed_files = Mock(return_value=([], list(changed)))
+        g.directory_update = Mock(side_effect=g.directory_update)
+        return g
+
+    def synced_commit(self):
+        properties = self.confluence.pages[self.confluence.homepage_id][
+            'properties'
+        ]
+        return properties['git2sc']['value']['commit']
+
+    def test_incremental_sync_reads_the_synced_commit_of_the_root(self):
+        '''Required to sync only the changed files when the inventory isn't
+        loaded'''
+
+        self.incremental_git2sc().directory_incremental_update(self.path, [])
+        changed = change_repository(self.documents, 0.25, seed=0)
+
+        g = self.incremental_git2sc([
+            os.path.relpath(document, self.path) for document in changed
+        ])
+        g.directory_incremental_update(self.path, [])
+
+        self.assertFalse(g.directory_update.called)
+        self.assertEqual(
+            g.get_changed_files.assert_called_with(self.path, 'head'),
+            None,
+        )
+        self.assertEqual(g.metrics.pages['update'], len(changed))
+        self.assertEqual(self.synced_commit(), 'head')
+
+    def test_incremental_sync_without_changes_stores_the_commit(self):
+        '''Required to update the git2sc property of a page that isn't
+        loaded instead of creating it again'''
+
+        self.git2sc().directory_update(self.path, [])
+
+        self.incremental_git2sc().directory_incremental_update(
+            self.path,
+            [],
+            since='HEAD~1',
+        )
+
+        self.assertEqual(self.synced_commit(), 'head')
+
+    def test_incremental_sync_with_sync_state(self):
+        '''Required to ensure that the pages known from the sync state have
+        their git2sc property read before it's written'''
+
+        database = os.path.join(self.tmp, 'state.db')
+        for _ in range(2):
+            state = SyncState(database, 'TST')
+            self.addCleanup(state.close)
+            self.incremental_git2sc(state=state).directory_incremental_update(
+                self.path,
+                [],
+            )
+
+        self.assertEqual(self.synced_commit(), 'head')
+
+    def test_plan_skips_the_current_homepage(self):
+        '''Required to plan the syncs of a space without loading its
+        inventory'''
+
+        self.git2sc().directory_update(self.path, [])
+
+        plan = self.git2sc().plan_update(self.path, [])
+
+        self.assertEqual(plan.operations('update'), [])
+
+    def test_sync_state_keeps_the_titles_of_the_pages(self):
+        '''Required to update the homepage from the sync state without
+        renaming it after the synced directory'''
+
+        database = os.path.join(self.tmp, 'state.db')
+        readme_path = os.path.join(self.path, 'README.md')
+        for content in ['Home', 'New home']:
+            with open(readme_path, 'w') as f:
+                f.write(content)
+            state = SyncState(database, 'TST')
+            self.addCleanup(state.close)
+            g = self.git2sc(state=state)
+            g._converter_version = Mock(return_value='pandoc')
+            g._process_md = Mock(return_value='<p>{}</p>'.format(content))
+            g.directory_update(self.path, [])
+
+        homepage = self.confluence.pages[self.confluence.homepage_id]
+        self.assertEqual(homepage['title'], 'TST Home')
+        self.assertEqual(homepage['body'], '<p>New home</p>')
+
+
+class TestIncrementalSyncOfRepository(unittest.TestCase):
+    '''Test class for the incremental syncs of a git repository against the
+    fake Confluence server'''
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'docs')
+        os.makedirs(self.path)
+        self.git('init', '-q')
+        self.write('article.html', '<p>article</p>')
+        self.commit()
+        self.confluence = FakeConfluence().start()
+
+    def tearDown(self):
+        self.confluence.stop()
+        shutil.rmtree(self.tmp)
+
+    def git(self, *arguments):
+        return subprocess.check_output(
+            [
+                'git',
+                '-C',
+                self.path,
+                '-c',
+                'user.name=git2sc',
+                '-c',
+                'user.email=git2sc@example.com',
+            ] + list(arguments),
+        ).decode().strip()
+
+    def write(self, relative_path, content):
+        path = os.path.join(self.path, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def commit(self):
+        self.git('add', '-A')
+        self.git('commit', '-q', '-m', 'Change the docs')
+        return self.git('rev-parse', 'HEAD')
+
+    def git2sc(self):
+        g = Git2SC(self.confluence.url, 'user:password', 'TST')
+        self.addCleanup(g.close)
+        return g
+
+    def titles(self):
+        return sorted(
+            page['title'] for page in self.confluence.pages.values()
+        )
+
+    def synced_commit(self):
+        properties = self.confluence.pages[self.confluence.homepage_id][
+            'properties'
+        ]
+        return properties['git2sc']['value']['commit']
+
+    def test_unknown_synced_commits_sync_the_whole_directory(self):
+        '''Required to keep syncing after a force push or in a shallow
+        clone, where the last synced commit is not in the repository'''
+
+        self.git2sc().directory_incremental_update(self.path, ['.git'])
+        self.git2sc().set_synced_commit(
+            self.confluence.homepage_id,
+            '0123456789abcdef0123456789abcdef01234567',
+        )
+        self.write('new.html', '<p>new</p>')
+        head = self.commit()
+
+        self.git2sc().directory_incremental_update(self.path, ['.git'])
+
+        self.assertEqual(self.titles(), ['TST Home', 'article', 'new'])
+        self.assertEqual(self.synced_commit(), head)
+
+    def test_since_revision_creates_the_page_of_the_tree(self):
+        '''Required to store the synced commit in the page of the directory
+        when the sync since a revision creates it'''
+
+        parent_id = self.confluence._add_page(
+            'Team',
+            self.confluence.homepage_id,
+            '',
+        )
+        first = self.git('rev-parse', 'HEAD')
+        self.write('new.html', '<p>new</p>')
+        head = self.commit()
+
+        self.git2sc().directory_incremental_update(
+            self.path,
+            ['.git'],
+            parent_id,
+            since=first,
+        )
+
+        pages = {
+            page['title']: page for page in self.confluence.pages.values()
+        }
+        self.assertEqual(pages['docs']['parent_id'], parent_id)
+        self.assertEqual(pages['new']['parent_id'], pages['docs']['id'])
+        self.assertEqual(
+            pages['docs']['properties']['git2sc']['value']['commit'],
+            head,
+        )
+
+    def test_paths_with_special_characters_are_synced(self):
+        '''Required to sync the files whose names git quotes, like the
+        ones with accents'''
+
+        self.git2sc().directory_incremental_update(self.path, ['.git'])
+        self.write('introducción.html', '<p>new</p>')
+        self.write('guía rápida.html', '<p>guide</p>')
+        self.commit()
+        self.git2sc().directory_incremental_update(self.path, ['.git'])
+
+        self.assertEqual(
+            self.titles(),
+            ['TST Home', 'article', 'guía rápida', 'introducción'],
+        )
+
+        os.remove(os.path.join(self.path, 'introducción.html'))
+        self.commit()
+        self.git2sc().directory_incremental_update(self.path, ['.git'])
+
+        self.assertEqual(
+            self.titles(),
+            ['TST Home', 'article', 'guía rápida'],
+        )
+
+    def test_incremental_deletions_are_limited(self):
+        '''Required to keep a commit that removes most of the docs from
+        wiping their pages when the deletions are limited'''
+
+        self.write('guides/first.html', '<p>first</p>')
+        self.write('guides/second.html', '<p>second</p>')
+        self.commit()
+        self.git2sc().directory_incremental_update(self.path, ['.git'])
+        self.git('rm', '-q', '-r', 'guides')
+        self.commit()
+
+        with self.assertRaises(TooManyDeletions):
+            self.git2sc().directory_incremental_update(
+                self.path,
+                ['.git'],
+                max_deletes=2,
+            )
+        self.assertEqual(
+            self.titles(),
+            ['TST Home', 'article', 'first', 'guides', 'second'],
+        )
+
+        self.git2sc().directory_incremental_update(
+            self.path,
+            ['.git'],
+            max_deletes=3,
+        )
+        self.assertEqual(self.titles(), ['TST Home', 'article'])
+
+    def page(self, title):
+        return next(
+            page for page in self.confluence.pages.values()
+            if page['title'] == title
+        )
+
+    def delete_in_confluence(self, *titles):
+        for title in titles:
+            self.confluence.delete_content(self.page(title)['id'])
+
+    def test_warm_instances_recreate_the_deleted_pages(self):
+        '''Required to keep the instances of the server and the watch
+        syncing the pages deleted in confluence after their inventory was
+        loaded'''
+
+        self.write('guides/first.html', '<p>first</p>')
+        self.write('guides/second.html', '<p>second</p>')
+        self.commit()
+        g = self.git2sc()
+        g.directory_incremental_update(self.path, ['.git'])
+        self.delete_in_confluence('first', 'guides')
+        self.write('guides/first.html', '<p>new first</p>')
+        self.write('guides/second.html', '<p>new second</p>')
+        self.commit()
+
+        g.directory_incremental_update(self.path, ['.git'])
+
+        guides_id = self.page('guides')['id']
+        self.assertEqual(self.page('first')['parent_id'], guides_id)
+        self.assertEqual(self.page('first')['body'], '<p>new first</p>')
+        self.assertEqual(self.page('second')['body'], '<p>new second</p>')
+
+    def test_warm_full_syncs_recreate_the_deleted_pages(self):
+        '''Required to keep the watch syncing the whole directory after a
+        page was deleted in confluence'''
+
+        self.write('guides/first.html', '<p>first</p>')
+        g = self.git2sc()
+        g.directory_update(self.path, ['.git'])
+        self.delete_in_confluence('first')
+        self.write('guides/first.html', '<p>new first</p>')
+
+        g.directory_update(self.path, ['.git'])
+
+        self.assertEqual(self.page('first')['body'], '<p>new first</p>')
+        self.assertEqual(
+            self.page('first')['parent_id'],
+            self.page('guides')['id'],
+        )
+
+    def test_changed_images_update_the_pages_that_reference_them(self):
+        '''Required to sync the same pages as a full sync when only a file
+        referenced by the documents changes'''
+
+        self.write('images/diagram.png', 'first diagram')
+        self.write('guide.html', '<p><img src="images/diagram.png"></p>')
+        self.commit()
+        self.git2sc().directory_incremental_update(self.path, ['.git'])
+        self.write('images/diagram.png', 'second diagram')
+        self.commit()
+
+        self.git2sc().directory_incremental_update(self.path, ['.git'])
+
+        page = self.page('guide')
+        self.assertEqual(len(page['attachments']), 2)
+        self.assertIn('-diagram.png', page['body'])
+        self.assertIn(
+            max(
+                page['attachments'].values(),
+                key=lambda attachment: attachment['id'],
+            )['title'],
+            page['body'],
+        )
+        self.assertEqual(self.page('article')['version'], 1)
+
+        os.remove(os.path.join(self.path, 'images', 'diagram.png'))
+        self.commit()
+        self.git2sc().directory_incremental_update(self.path, ['.git'])
+
+        self.assertNotIn('-diagram.png', self.page('guide')['body'])
+
+    def test_watched_images_update_the_pages_that_reference_them(self):
+        self.write('images/diagram.png', 'first diagram')
+        self.write('guide.html', '<p><img src="images/diagram.png"></p>')
+        self.write('other.html', '<p>other</p>')
+        g = self.git2sc()
+        g._sync_root = self.path
+        changes = Changes()
+        changes.change(os.path.join(self.path, 'images', 'diagram.png'))
+
+        g._sync_watched_changes(self.path, ['.git'], changes)
+
+        self.assertEqual(self.titles(), ['TST Home', 'guide'])
+        self.assertEqual(len(self.page('guide')['attachments']), 1)
@@ -1,8 +1,22 @@
 import os
 import json
+import hashlib
 import unittest
 from unittest.mock import patch, Mock, call
-from git2sc.git2sc import Git2SC, UnknownExtension
+from git2sc.git2sc import Git2SC, UnknownExtension, TooManyDeletions, \
+    PageNotFound, FETCH_PROFILES
+from git2sc.plan import SyncAction, SyncPlan, DIRECTORY, FILE, PAGE
+from git2sc.watch import Changes
+
+
+def fingerprint_side_effect(git2sc, path):
+    '''Fake fingerprint of a file or directory, it fails with the unknown
+    extensions as the real one'''
+
+    extension = os.path.splitext(path)[-1]
+    if extension not in ['', '.adoc', '.html', '.md']:
+        raise UnknownExtension
+    return 'fingerprint_{}'.format(os.path.basename(path))
 
 
 class TestGit2SC(unittest.TestCase):
@@ -14,28 +28,43 @@ class TestGit2SC(unittest.TestCase):
         self.auth = tuple(self.auth_string.split(':'))
         self.space = 'TST'
 
-        self.requests_patch = patch('git2sc.git2sc.requests', autospect=True)
+        self.requests_patch = patch('git2sc.git2sc.requests')
         self.requests = self.requests_patch.start()
+        self.session = self.requests.Session.return_value
         self.requests_error_patch = patch(
             'git2sc.git2sc.Git2SC._requests_error',
-            autospect=True
+            autospec=True
         )
         self.requests_error = self.requests_error_patch.start()
 
-        self.json_patch = patch('git2sc.git2sc.json', autospect=True)
+        self.json_patch = patch('git2sc.git2sc.json')
         self.json = self.json_patch.start()
 
-        self.os_patch = patch('git2sc.git2sc.os', autospect=True)
+        self.os_patch = patch('git2sc.git2sc.os')
         self.os = self.os_patch.start()
 
-        self.print_patch = patch('git2sc.git2sc.print', autospect=True)
+        self.print_patch = patch('git2sc.git2sc.print')
         self.print = self.print_patch.start()
 
         self.getspacearticles_patch = patch(
             'git2sc.git2sc.Git2SC.get_space_articles',
-            autospect=True,
+            autospec=True,
         )
         self.getspacearticles = self.getspacearticles_patch.start()
+
+        self.filefingerprint_patch = patch(
+            'git2sc.git2sc.Git2SC.file_fingerprint',
+            autospec=True,
+        )
+        self.filefingerprint = self.filefingerprint_patch.start()
+        self.filefingerprint.side_effect = fingerprint_side_effect
+        self.directoryfingerprint_patch = patch(
+            'git2sc.git2sc.Git2SC.directory_fingerprint',
+            autospec=True,
+        )
+        self.directoryfingerprint = self.directoryfingerprint_patch.start()
+        self.directoryfingerprint.side_effect = fingerprint_side_effect
+
         self.git2sc = Git2SC(self.api_url, self.auth_string, self.space)
 
     def tearDown(self):
@@ -45,6 +74,8 @@ class TestGit2SC(unittest.TestCase):
         self.json_patch.stop()
         self.os_patch.stop()
         self.getspacearticles_patch.stop()
+        self.filefingerprint_patch.stop()
+        self.directoryfingerprint_patch.stop()
 
     def test_has_auth_set(self):
         'Required attribute for some methods'
@@ -66,12 +97,159 @@ class TestGit2SC(unittest.TestCase):
 
         self.assertEqual(self.git2sc.api_url, self.api_url)
 
-    def test_get_space_articles_called_on_init(self):
-        '''Required to test that get_space_articles get called on init, this
-        is a requirement for create_page, update_page and other methods '''
+    def test_has_pooled_session_set(self):
+        '''Required to ensure that all the api calls share a connection pooled
+        session authenticated with the user credentials'''
+
+        self.assertEqual(self.git2sc.session, self.session)
+        self.assertEqual(self.session.auth, self.auth)
+        self.assertEqual(
+            self.requests.adapters.HTTPAdapter.assert_called_with(
+                pool_connections=10,
+                pool_maxsize=10,
+            ),
+            None,
+        )
+        self.assertEqual(
+            self.session.mount.mock_calls,
+            [
+                call(
+                    'https://',
+                    self.requests.adapters.HTTPAdapter.return_value,
+                ),
+                call(
+                    'http://',
+                    self.requests.adapters.HTTPAdapter.return_value,
+                ),
+            ]
+        )
+
+    def test_can_configure_pool_size_and_timeout(self):
+        '''Required to ensure that the pool size and the per request timeout
+        can be tuned'''
+
+        git2sc = Git2SC(
+            self.api_url,
+            self.auth_string,
+            self.space,
+            pool_size=20,
+            timeout=5,
+        )
+        self.assertEqual(
+            self.requests.adapters.HTTPAdapter.assert_called_with(
+                pool_connections=20,
+                pool_maxsize=20,
+            ),
+            None,
+        )
+        git2sc._request('GET', 'url')
+        self.assertEqual(
+            self.session.request.assert_called_with('GET', 'url', timeout=5),
+            None,
+        )
+
+    def test_can_close_session(self):
+        '''Required to release the pooled connections'''
+
+        self.git2sc.close()
+        self.assertTrue(self.session.close.called)
+
+    def test_shared_pools_are_not_closed(self):
+        '''Required to share the connections and the workers between the
+        instances of several spaces'''
+
+        session = Mock()
+        asciidoctor = Mock()
+        limiter = Mock()
+        git2sc = Git2SC(
+            self.api_url,
+            self.auth_string,
+            self.space,
+            session=session,
+            limiter=limiter,
+            asciidoctor=asciidoctor,
+        )
+
+        self.assertEqual(git2sc.session, session)
+        self.assertEqual(git2sc.transport.limiter, limiter)
+        self.assertEqual(git2sc.asciidoctor, asciidoctor)
+        git2sc.close()
+        self.assertFalse(session.close.called)
+        self.assertFalse(asciidoctor.close.called)
+
+    def test_endpoint_of_the_metrics(self):
+        '''Required to group the requests of the metrics by endpoint'''
+
+        base = self.git2sc.api_url
+        for url, endpoint in [
+            (base + '/content/1?expand=version', '/content/{id}'),
+            (base + '/content?expand=version', '/content'),
+            (base + '/space/TST', '/space/{space}'),
+            (base + '/space/TST/content?limit=100', '/space/{space}/content'),
+            (base + '/content/1/property/git2sc',
+             '/content/{id}/property/{key}'),
+        ]:
+            self.assertEqual(self.git2sc._endpoint(url), endpoint)
+
+    @patch('git2sc.git2sc.Git2SC.get_page_info', autospec=True)
+    def test_written_pages_are_counted_in_the_metrics(self, getPageInfoMock):
+        '''Required to report the pages created, updated and deleted'''
+
+        self.json.loads.return_value = {'id': '2'}
+        self.git2sc.pages = {'1': {'version': {'number': 1}, 'ancestors': [],
+                                   'title': 'Article'}}
+        self.session.request.return_value.status_code = 204
+
+        self.git2sc.create_page('New article', '<p>New</p>')
+        self.git2sc.update_page('1', '<p>Updated</p>')
+        self.git2sc.delete_page('1')
+
+        self.assertEqual(
+            self.git2sc.metrics.pages,
+            {'create': 1, 'update': 1, 'skip': 0, 'delete': 1},
+        )
+
+    def test_get_space_articles_not_called_on_init(self):
+        '''Required to ensure that the commands that work by page id don't
+        fetch the whole space'''
+
+        self.assertFalse(self.getspacearticles.called)
 
+    def test_get_space_articles_called_on_title_lookups(self):
+        '''Required to ensure that the pages are loaded before looking for a
+        title, this is a requirement for create_page and the syncs'''
+
+        self.git2sc._get_article_id('Article')
+        self.assertTrue(self.getspacearticles.called)
+
+        self.getspacearticles.reset_mock()
+        self.git2sc._title_exist('Article')
         self.assertTrue(self.getspacearticles.called)
 
+    def test_inventory_is_loaded_once(self):
+        '''Required to fetch the space only once per run'''
+
+        self.getspacearticles_patch.stop()
+        self.session.request.return_value.json.return_value = {
+            'page': {'results': [{'id': '1', 'title': 'Article'}]},
+        }
+
+        self.assertEqual(self.git2sc._get_article_id('Article'), '1')
+        self.assertTrue(self.git2sc._title_exist('Article'))
+        self.assertEqual(self.session.request.call_count, 1)
+        self.getspacearticles_patch.start()
+
+    @patch('git2sc.git2sc.Git2SC.get_page_info', autospec=True)
+    def test_delete_page_doesnt_load_the_inventory(self, getPageInfoMock):
+        '''Required to delete a page with a single request'''
+
+        self.session.request.return_value.status_code = 204
+
+        self.git2sc.delete_page('1')
+
+        self.assertEqual(self.session.request.call_count, 1)
+        self.assertFalse(self.getspacearticles.called)
+
     def test_can_get_page_info(self):
         '''Required to ensure that the get_page_info method calls the correct
         api endpoint and returns a json object'''
@@ -79,33 +257,81 @@ class TestGit2SC(unittest.TestCase):
         page_id = '372274410'
         result = self.git2sc.get_page_info(page_id)
         self.assertEqual(
-            self.requests.get.assert_called_with(
-                '{}/content/{}?expand=ancestors,body.storage,version'.format(
+            self.session.request.assert_called_with(
+                'GET',
+                '{}/content/{}?expand=ancestors,body.storage,version,'
+                'metadata.properties.git2sc'.format(
                     self.api_url,
                     page_id,
                 ),
-                auth=self.auth
+                timeout=30,
             ),
             None,
         )
         self.assertTrue(self.requests_error.called)
-        self.assertEqual(result, self.requests.get.return_value.json())
+        self.assertEqual(result, self.session.request.return_value.json())
+
+    def test_can_get_page_info_with_fetch_profile(self):
+        '''Required to ensure that the get_page_info method only expands the
+        fields of the fetch profile'''
+
+        page_id = '372274410'
+        self.git2sc.get_page_info(page_id, 'index')
+        self.assertEqual(
+            self.session.request.assert_called_with(
+                'GET',
+                '{}/content/{}?expand=ancestors,version,'
+                'metadata.properties.git2sc'.format(
+                    self.api_url,
+                    page_id,
+                ),
+                timeout=30,
+            ),
+            None,
+        )
+
+    def test_get_page_body_uses_loaded_body(self):
+        '''Required to ensure that the body is not downloaded if the page
+        already has it'''
+
+        self.git2sc.pages = {
+            '1': {'id': '1', 'body': {'storage': {'value': '<p>body</p>'}}},
+        }
+        self.assertEqual(self.git2sc.get_page_body('1'), '<p>body</p>')
+        self.assertFalse(self.session.request.called)
+
+    @patch('git2sc.git2sc.Git2SC.get_page_info', autospec=True)
+    def test_get_page_body_loads_body_lazily(self, getPageInfoMock):
+        '''Required to ensure that the body is downloaded when the page was
+        fetched with the index profile'''
+
+        self.git2sc.pages = {'1': {'id': '1', 'title': 'Article'}}
+        getPageInfoMock.return_value = {
+            'id': '1',
+            'body': {'storage': {'value': '<p>body</p>'}},
+        }
+        self.assertEqual(self.git2sc.get_page_body('1'), '<p>body</p>')
+        self.assertEqual(
+            getPageInfoMock.assert_called_with(self.git2sc, '1', 'full'),
+            None,
+        )
 
     def test_can_get_space_homepage(self):
         '''Required to ensure that the get_space_homepage method calls the
         correct api endpoint and returns the article id'''
 
-        self.requests.get.return_value.json.return_value = {
+        self.session.request.return_value.json.return_value = {
             '_expandable': {'homepage': '/rest/api/content/372334010'},
         }
         result = self.git2sc.get_space_homepage()
         self.assertEqual(
-            self.requests.get.assert_called_with(
+            self.session.request.assert_called_with(
+                'GET',
                 '{}/space/{}'.format(
                     self.api_url,
                     self.space,
                 ),
-                auth=self.auth
+                timeout=30,
             ),
             None,
         )
@@ -118,7 +344,7 @@ class TestGit2SC(unittest.TestCase):
         pages as a dictionary of dictionaries'''
 
         self.getspacearticles_patch.stop()
-        self.requests.get.return_value.json.return_value = {
+        self.session.request.return_value.json.return_value = {
             "page": {
                 "results": [
                     {
@@ -148,13 +374,14 @@ class TestGit2SC(unittest.TestCase):
         }
         self.git2sc.get_space_articles()
         self.assertEqual(
-            self.requests.get.assert_called_with(
+            self.session.request.assert_called_with(
+                'GET',
                 '{}/space/{}/content'
-                '?expand=body.storage&limit=5000&start=0'.format(
+                '?expand=ancestors,version,metadata.properties.git2sc&limit=100&start=0'.format(
                     self.api_url,
                     self.space,
                 ),
-                auth=self.auth
+                timeout=30,
             ),
             None,
         )
@@ -162,6 +389,122 @@ class TestGit2SC(unittest.TestCase):
         self.assertEqual(self.git2sc.pages, desired_pages)
         self.getspacearticles_patch.start()
 
+    def _paginated_response(self, total, limit, hidden=()):
+        '''Returns a side effect for the session requests that paginates
+        total pages in batches of limit pages, the hidden pages are left out
+        of their batches'''
+
+        def request_side_effect(method, url, **kwargs):
+            start = int(url.split('start=')[-1])
+            batch = {
+                'results': [
+                    {'id': str(page_id), 'title': 'Article{}'.format(page_id)}
+                    for page_id in range(start, min(start + limit, total))
+                    if page_id not in hidden
+                ],
+                'start': start,
+                'limit': limit,
+                '_links': {},
+            }
+            if start + limit < total:
+                batch['_links']['next'] = '/rest/api/space/TST/content'
+            response = Mock()
+            response.json.return_value = {'page': batch}
+            return response
+        return request_side_effect
+
+    def test_get_space_articles_follows_pagination(self):
+        '''Required to ensure that large spaces don't lose pages, the method
+        must follow the next links of the api'''
+
+        self.getspacearticles_patch.stop()
+        self.git2sc.page_size = 2
+        self.session.request.side_effect = self._paginated_response(5, 2)
+
+        self.git2sc.get_space_articles()
+
+        self.assertEqual(
+            sorted(self.git2sc.pages.keys()),
+            ['0', '1', '2', '3', '4'],
+        )
+        self.assertEqual(
+            self.session.request.mock_calls,
+            [
+                call(
+                    'GET',
+                    '{}/space/{}/content'
+                    '?expand=ancestors,version,metadata.properties.git2sc&limit=2&start={}'.format(
+                        self.api_url,
+                        self.space,
+                        start,
+                    ),
+                    timeout=30,
+                )
+                for start in [0, 2, 4]
+            ]
+        )
+        self.getspacearticles_patch.start()
+
+    def test_get_space_articles_uses_the_limit_of_the_server(self):
+        '''Required to ensure that no page is skipped if the server enforces
+        a smaller limit than the requested page size'''
+
+        self.git2sc.page_size = 100
+        self.session.request.side_effect = self._paginated_response(5, 2)
+
+        pages = list(self.git2sc.iter_space_articles())
+
+        self.assertEqual(
+            [page['id'] for page in pages],
+            ['0', '1', '2', '3', '4'],
+        )
+
+    def test_get_space_articles_can_fetch_batches_concurrently(self):
+        '''Required to ensure that the batches fetched concurrently are
+        yielded in order and that the fetch stops at the last batch'''
+
+        self.git2sc.page_size = 2
+        self.git2sc.fetch_concurrency = 3
+        self.session.request.side_effect = self._paginated_response(9, 2)
+
+        pages = list(self.git2sc.iter_space_articles())
+
+        self.assertEqual(
+            [page['id'] for page in pages],
+            [str(page_id) for page_id in range(9)],
+        )
+
+    def test_get_space_articles_follows_short_batches(self):
+        '''Required to ensure that a batch shorter than the limit, like one
+        with pages hidden by their permissions, doesn't end the inventory'''
+
+        self.git2sc.page_size = 3
+        self.git2sc.fetch_concurrency = 2
+        self.session.request.side_effect = self._paginated_response(
+            12,
+            3,
+            hidden={1, 2, 4},
+        )
+
+        pages = list(self.git2sc.iter_space_articles())
+
+        self.assertEqual(
+            [page['id'] for page in pages],
+            ['0', '3', '5', '6', '7', '8', '9', '10', '11'],
+        )
+
+    def test_iter_space_articles_is_a_generator(self):
+        '''Required to ensure that the pages are streamed and the next batch
+        is not fetched until it's needed'''
+
+        self.git2sc.page_size = 2
+        self.session.request.side_effect = self._paginated_response(5, 2)
+
+        pages = self.git2sc.iter_space_articles()
+        next(pages)
+
+        self.assertEqual(self.session.request.call_count, 1)
+
     def test_can_detect_if_title_exist_in_pages(self):
         '''You can't create more than one article with a specified title, test
         if title exists in the existing pages. test that it detects one'''
@@ -225,14 +568,16 @@ class TestGit2SC(unittest.TestCase):
         self.git2sc.update_page(page_id, html)
 
         self.assertEqual(
-            self.requests.put.assert_called_with(
-                '{}/content/{}'.format(
+            self.session.request.assert_called_with(
+                'PUT',
+                '{}/content/{}?expand={}'.format(
                     self.api_url,
                     page_id,
+                    FETCH_PROFILES['index'],
                 ),
                 data=data_json,
-                auth=self.auth,
                 headers={'Content-Type': 'application/json'},
+                timeout=30,
             ),
             None,
         )
@@ -273,14 +618,16 @@ class TestGit2SC(unittest.TestCase):
         self.git2sc.update_page(page_id, html)
 
         self.assertEqual(
-            self.requests.put.assert_called_with(
-                '{}/content/{}'.format(
+            self.session.request.assert_called_with(
+                'PUT',
+                '{}/content/{}?expand={}'.format(
                     self.api_url,
                     page_id,
+                    FETCH_PROFILES['index'],
                 ),
                 data=data_json,
-                auth=self.auth,
                 headers={'Content-Type': 'application/json'},
+                timeout=30,
             ),
             None,
         )
@@ -295,7 +642,10 @@ class TestGit2SC(unittest.TestCase):
         html = '<p> This is a test </p>'
         self.git2sc.pages = {}
         self.git2sc.update_page(page_id, html)
-        self.assertEqual(getPageInfoMock.assert_called_with(page_id), None)
+        self.assertEqual(
+            getPageInfoMock.assert_called_with(page_id, 'index'),
+            None,
+        )
 
     def test_can_update_articles_with_title(self):
         '''Required to ensure that the update_page method can update a page
@@ -320,6 +670,8 @@ class TestGit2SC(unittest.TestCase):
         }
         self.git2sc.update_page(page_id, html, 'new title')
         self.assertEqual(self.git2sc.pages[page_id]['title'], 'new title')
+        self.assertEqual(self.git2sc._get_article_id('new title'), page_id)
+        self.assertEqual(self.git2sc._get_article_id('Test page title'), None)
 
     def test_can_update_articles_with_missing_link(self):
         '''Required to ensure that the update_page method can update a page
@@ -344,7 +696,7 @@ class TestGit2SC(unittest.TestCase):
         self.git2sc.update_page(page_id, html, 'new title')
         self.assertEqual(self.git2sc.pages[page_id]['title'], 'new title')
 
-    @patch('git2sc.git2sc.Git2SC.get_page_info', autospect=True)
+    @patch('git2sc.git2sc.Git2SC.get_page_info', autospec=True)
     def test_can_create_articles_as_parent(self, getPageInfoMock):
         '''Required to ensure that the create_page method posts to the
         correct api endpoint with the correct data structure if no
@@ -368,7 +720,7 @@ class TestGit2SC(unittest.TestCase):
 
         response_data = {'id': '412254212', 'type': 'page'}
         response_data_json = json.dumps(response_data)
-        self.requests.post.return_value.text = response_data_json
+        self.session.request.return_value.text = response_data_json
         self.json.loads.return_value = response_data
 
         page_id = self.git2sc.create_page('new title', html)
@@ -378,11 +730,15 @@ class TestGit2SC(unittest.TestCase):
             None,
         )
         self.assertEqual(
-            self.requests.post.assert_called_with(
-                '{}/content'.format(self.api_url),
+            self.session.request.assert_called_with(
+                'POST',
+                '{}/content?expand={}'.format(
+                    self.api_url,
+                    FETCH_PROFILES['index'],
+                ),
                 data=requests_data_json,
-                auth=self.auth,
                 headers={'Content-Type': 'application/json'},
+                timeout=30,
             ),
             None,
         )
@@ -391,9 +747,10 @@ class TestGit2SC(unittest.TestCase):
             self.json.loads.assert_called_with(response_data_json),
             None,
         )
+        self.assertFalse(getPageInfoMock.called)
         self.assertEqual(
-            getPageInfoMock.assert_called_with(page_id),
-            None,
+            self.git2sc.pages['412254212'],
+            response_data,
         )
         self.assertEqual(page_id, '412254212')
 
@@ -422,7 +779,7 @@ class TestGit2SC(unittest.TestCase):
 
         response_data = {'id': '412254212', 'type': 'page'}
         response_data_json = json.dumps(response_data)
-        self.requests.post.return_value.text = response_data_json
+        self.session.request.return_value.text = response_data_json
         self.json.loads.return_value = response_data
 
         page_id = self.git2sc.create_page('new title', html, parent_id)
@@ -432,11 +789,15 @@ class TestGit2SC(unittest.TestCase):
             None,
         )
         self.assertEqual(
-            self.requests.post.assert_called_with(
-                '{}/content'.format(self.api_url),
+            self.session.request.assert_any_call(
+                'POST',
+                '{}/content?expand={}'.format(
+                    self.api_url,
+                    FETCH_PROFILES['index'],
+                ),
                 data=requests_data_json,
-                auth=self.auth,
                 headers={'Content-Type': 'application/json'},
+                timeout=30,
             ),
             None,
         )
@@ -447,13 +808,13 @@ class TestGit2SC(unittest.TestCase):
         )
         self.assertEqual(page_id, '412254212')
 
-    @patch('git2sc.git2sc.Git2SC._title_exist', autospect=True)
+    @patch('git2sc.git2sc.Git2SC._title_exist', autospec=True)
     def test_can_create_articles_when_name_exists(self, titleexistMock):
         '''In Confluence even though they use an article_id, you can't have two
         articles with the same name, so this test makes sure that in this case
         the title will be '{}_{}'.format(directoryname, filename) -.-'''
 
-        def title_side_effect(title):
+        def title_side_effect(git2sc, title):
             if title == 'new title' or title == 'new title_1':
                 return True
             return False
@@ -481,495 +842,2052 @@ class TestGit2SC(unittest.TestCase):
             None,
         )
 
-    @patch('git2sc.git2sc.shlex', autospect=True)
-    def test_can_load_files_safely(self, shlexMock):
-        '''Required to ensure that we can load files in a safe way'''
-        path_to_file = '/path/to/file'
+    @patch('git2sc.git2sc.Git2SC.get_page_info', autospec=True)
+    def test_create_page_releases_reserved_title(self, getPageInfoMock):
+        '''Required to ensure that the title reserved while the page is being
+        created is released once the page is stored in the pages attribute'''
 
-        self.git2sc._safe_load_file(path_to_file)
+        self.json.loads.return_value = {'id': '412254212', 'title': 'title'}
 
+        self.git2sc.create_page('title', '<p>html</p>')
+
+        self.assertEqual(self.git2sc._reserved_titles, set())
         self.assertEqual(
-            shlexMock.quote.assert_called_with(path_to_file),
-            None,
-        )
-        self.assertEqual(
-            self.os.path.expanduser.assert_called_with(
-                shlexMock.quote.return_value,
-            ),
-            None,
+            self.git2sc.pages['412254212'],
+            self.json.loads.return_value,
         )
 
-    @patch('git2sc.git2sc.Git2SC._safe_load_file', autospect=True)
-    @patch('git2sc.git2sc.subprocess', autospect=True)
-    def test_can_process_adoc(self, subprocessMock, loadfileMock):
-        '''Required to ensure that we can transform adoc files to html'''
-        path_to_file = '/path/to/file.adoc'
-        result = self.git2sc._process_adoc(path_to_file)
+    @patch('git2sc.git2sc.Git2SC.get_page_info', autospec=True)
+    def test_create_page_doesnt_fetch_the_created_page(self, getPageInfoMock):
+        '''Required to avoid a read after each write, the POST response
+        already has the fields of the index profile'''
 
+        self.json.loads.return_value = {
+            'id': '412254212',
+            'title': 'title',
+            'version': {'number': 1},
+            'ancestors': [{'id': '1'}],
+        }
+
+        result = self.git2sc.create_page('title', '<p>html</p>', '1')
+
+        self.assertEqual(result, '412254212')
+        self.assertFalse(getPageInfoMock.called)
+        self.assertEqual(self.git2sc.pages.children('1'), {'412254212'})
+
+    @patch('git2sc.transport.Transport.wait_to_retry', autospec=True)
+    @patch('git2sc.git2sc.Git2SC._find_page', autospec=True)
+    def test_create_page_is_retried_after_a_server_error(
+        self,
+        findpageMock,
+        waitMock,
+    ):
+        '''Required to ensure that a transient error doesn't abort an upload
+        when the page wasn't created'''
+
+        self.session.request.side_effect = [
+            Mock(status_code=503),
+            Mock(status_code=200),
+        ]
+        findpageMock.return_value = None
+        self.json.loads.return_value = {'id': '2', 'title': 'title'}
+
+        result = self.git2sc.create_page('title', '<p>html</p>', '1')
+
+        self.assertEqual(result, '2')
         self.assertEqual(
-            loadfileMock.assert_called_with(path_to_file),
-            None,
+            [
+                request[1][0]
+                for request in self.session.request.mock_calls
+            ],
+            ['POST', 'POST'],
         )
         self.assertEqual(
-            subprocessMock.check_output.assert_called_with(
-                [
-                    'asciidoctor',
-                    '-b',
-                    'xhtml',
-                    loadfileMock.return_value,
-                    '-o',
-                    '-',
-                ],
-                shell=False,
-            ),
+            findpageMock.assert_called_once_with(self.git2sc, 'title'),
             None,
         )
+        self.assertEqual(waitMock.call_args[0][1], 0)
+
+    @patch('git2sc.transport.Transport.wait_to_retry', autospec=True)
+    @patch('git2sc.git2sc.Git2SC._find_page', autospec=True)
+    def test_create_page_isnt_repeated_if_it_was_processed(
+        self,
+        findpageMock,
+        waitMock,
+    ):
+        '''Required to ensure that a create that failed after creating the
+        page isn't sent again'''
+
+        self.session.request.return_value.status_code = 502
+        findpageMock.return_value = {
+            'id': '2',
+            'title': 'title',
+            'ancestors': [{'id': '1'}],
+        }
+
+        result = self.git2sc.create_page('title', '<p>html</p>', '1')
+
+        self.assertEqual(result, '2')
+        self.assertEqual(self.session.request.call_count, 1)
+        self.assertEqual(self.git2sc.pages.children('1'), {'2'})
+        self.assertFalse(waitMock.called)
+
+    @patch('git2sc.transport.Transport.wait_to_retry', autospec=True)
+    @patch('git2sc.git2sc.Git2SC._find_page', autospec=True)
+    def test_create_page_retries_are_limited(self, findpageMock, waitMock):
+        '''Required to ensure that the create fails once it's out of
+        retries'''
+
+        self.git2sc.transport.max_retries = 2
+        self.session.request.return_value.status_code = 503
+        findpageMock.return_value = None
+
+        self.git2sc.create_page('title', '<p>html</p>', '1')
+
+        self.assertEqual(self.session.request.call_count, 3)
+        self.assertEqual(waitMock.call_count, 2)
+        self.assertIn(
+            self.session.request.return_value,
+            self.requests_error.call_args[0],
+        )
+
+    @patch('git2sc.git2sc.Git2SC.get_page_info', autospec=True)
+    def test_update_page_refreshes_the_page_from_the_response(
+        self,
+        getPageInfoMock,
+    ):
+        '''Required to ensure that a second update of a page in the same run
+        uses the new version without fetching the page'''
+
+        self.git2sc.pages = {
+            '1': {
+                'id': '1',
+                'title': 'Article',
+                'version': {'number': 1},
+                'ancestors': [],
+                'body': {'storage': {'value': '<p>old</p>'}},
+            }
+        }
+        self.session.request.return_value.status_code = 200
+        self.json.dumps.side_effect = json.dumps
+        self.json.loads.side_effect = [
+            {'id': '1', 'title': 'Article', 'version': {'number': 2}},
+            {'id': '1', 'title': 'Article', 'version': {'number': 3}},
+        ]
+
+        self.git2sc.update_page('1', '<p>first</p>')
+        self.git2sc.update_page('1', '<p>second</p>')
+
         self.assertEqual(
-            result,
-            subprocessMock.check_output.return_value.decode.
-            return_value.replace('<!DOCTYPE html>\n', '')
+            json.loads(self.session.request.call_args[1]['data'])['version'],
+            {'number': 3},
         )
+        self.assertEqual(self.git2sc.pages['1']['version'], {'number': 3})
+        self.assertNotIn('body', self.git2sc.pages['1'])
+        self.assertFalse(getPageInfoMock.called)
 
-    @patch('git2sc.git2sc.Git2SC._safe_load_file', autospect=True)
-    @patch('git2sc.git2sc.open', autospect=True)
-    def test_can_process_html(self, openMock, loadfileMock):
-        '''Required to ensure that we can load html files'''
-        path_to_file = '/path/to/file.html'
-        result = self.git2sc._process_html(path_to_file)
+    def test_title_exist_detects_reserved_titles(self):
+        '''Required to ensure that concurrent calls to create_page don't use
+        a title that is being created'''
+
+        self.git2sc._reserved_titles.add('Article1')
+        self.assertTrue(self.git2sc._title_exist('Article1'))
+
+    def test_update_page_forgets_the_missing_pages(self):
+        '''Required to look up again the pages deleted in confluence after
+        the inventory was loaded'''
 
+        self.git2sc.pages = {
+            '1': {
+                'title': 'Article',
+                'version': {'number': 1},
+                'ancestors': [],
+            },
+        }
+        self.git2sc.state = Mock()
+        self.session.request.return_value.status_code = 404
+
+        with self.assertRaises(PageNotFound):
+            self.git2sc.update_page('1', '<p>html</p>')
+
+        self.assertNotIn('1', self.git2sc.pages)
         self.assertEqual(
-            loadfileMock.assert_called_with(path_to_file),
+            self.git2sc.state.remove_page.assert_called_with('1'),
             None,
         )
+
+    @patch('git2sc.git2sc.Git2SC.set_page_fingerprint', autospec=True)
+    def test_update_page_stores_fingerprint(self, setfingerprintMock):
+        '''Required to ensure that the fingerprint of the source is stored
+        in the page once it's updated'''
+
+        self.git2sc.pages = {
+            '1': {'title': 'Article', 'version': {'number': 1}, 'ancestors': []}
+        }
+
+        self.git2sc.update_page('1', '<p>html</p>', fingerprint='fingerprint')
+
         self.assertEqual(
-            openMock.assert_called_with(
-                loadfileMock.return_value,
-                'r',
+            setfingerprintMock.assert_called_with(
+                self.git2sc,
+                '1',
+                'fingerprint',
             ),
             None,
         )
-        self.assertEqual(
-            result,
-            openMock.return_value.__enter__.return_value.read.return_value
-        )
 
-    @patch('git2sc.git2sc.Git2SC._safe_load_file')
-    @patch('git2sc.git2sc.pypandoc')
-    def test_can_process_md(self, pypandocMock, loadfileMock):
-        '''Required to ensure that we can transform md files to html'''
-        path_to_file = '/path/to/file'
-        result = self.git2sc._process_md(path_to_file)
+    @patch('git2sc.git2sc.Git2SC.get_page_info', autospec=True)
+    def test_create_page_stores_fingerprint_in_the_page(self, getPageInfoMock):
+        '''Required to ensure that the fingerprint of the source is stored
+        as a content property of the new page in the same request'''
+
+        self.json.loads.return_value = {'id': '1', 'type': 'page'}
 
+        self.git2sc.create_page('title', '<p>html</p>', fingerprint='abc')
+
+        data = self.json.dumps.call_args[0][0]
         self.assertEqual(
-            loadfileMock.assert_called_with(path_to_file),
-            None,
+            data['metadata'],
+            {
+                'properties': {
+                    'git2sc': {
+                        'key': 'git2sc',
+                        'value': {'fingerprint': 'abc'},
+                    },
+                },
+            }
         )
+
+    def test_can_create_page_fingerprint(self):
+        '''Required to ensure that the fingerprint is posted as a new content
+        property if the page doesn't have one'''
+
+        self.git2sc.pages = {'1': {'id': '1', 'title': 'Article'}}
+        self.json.dumps.side_effect = json.dumps
+
+        self.git2sc.set_page_fingerprint('1', 'abc')
+
         self.assertEqual(
-            pypandocMock.convert_file.assert_called_with(
-                loadfileMock.return_value,
-                'html',
+            self.session.request.assert_called_with(
+                'POST',
+                '{}/content/1/property'.format(self.api_url),
+                data=json.dumps({
+                    'key': 'git2sc',
+                    'value': {'fingerprint': 'abc'},
+                }),
+                headers={'Content-Type': 'application/json'},
+                timeout=30,
             ),
             None,
         )
+        self.assertTrue(self.requests_error.called)
         self.assertEqual(
-            result,
-            pypandocMock.convert_file.return_value
+            self.git2sc.pages['1']['metadata']['properties']['git2sc'],
+            self.session.request.return_value.json.return_value,
         )
 
-    @patch('git2sc.git2sc.Git2SC._process_adoc', autospect=True)
-    def test_import_file_method_supports_adoc_files(self, adocMock):
-        '''Required to ensure that the import_file method as a wrapper
-        of the _process_* recognizes asciidoc files'''
-        path_to_file = '/path/to/file.adoc'
-        self.os.path.splitext.side_effect = os.path.splitext
-        html = self.git2sc.import_file(path_to_file)
+    def test_can_update_page_fingerprint(self):
+        '''Required to ensure that the content property is updated with the
+        next version if the page already has one'''
+
+        self.git2sc.pages = {
+            '1': {
+                'id': '1',
+                'title': 'Article',
+                'metadata': {
+                    'properties': {
+                        'git2sc': {
+                            'key': 'git2sc',
+                            'value': {'fingerprint': 'old'},
+                            'version': {'number': 3},
+                        },
+                    },
+                },
+            },
+        }
+        self.json.dumps.side_effect = json.dumps
+
+        self.git2sc.set_page_fingerprint('1', 'abc')
+
         self.assertEqual(
-            adocMock.assert_called_with(path_to_file),
+            self.session.request.assert_called_with(
+                'PUT',
+                '{}/content/1/property/git2sc'.format(self.api_url),
+                data=json.dumps({
+                    'key': 'git2sc',
+                    'value': {'fingerprint': 'abc'},
+                    'version': {'number': 4},
+                }),
+                headers={'Content-Type': 'application/json'},
+                timeout=30,
+            ),
             None,
         )
-        self.assertEqual(
-            html,
-            adocMock.return_value
-        )
 
-    @patch('git2sc.git2sc.Git2SC._process_html', autospect=True)
-    def test_import_file_method_supports_html_files(self, htmlMock):
-        '''Required to ensure that the import_file method as a wrapper
-        of the _process_* recognizes html files'''
-        path_to_file = '/path/to/file.html'
-        self.os.path.splitext.side_effect = os.path.splitext
-        html = self.git2sc.import_file(path_to_file)
-        self.assertEqual(
-            htmlMock.assert_called_with(path_to_file),
-            None,
-        )
-        self.assertEqual(
-            html,
-            htmlMock.return_value
-        )
+    def test_can_get_page_fingerprint(self):
+        '''Required to compare the stored fingerprint with the source one'''
 
-    @patch('git2sc.git2sc.Git2SC._process_md', autospect=True)
-    def test_import_file_method_supports_md_files(self, mdMock):
-        '''Required to ensure that the import_file method as a wrapper
-        of the _process_* recognizes markdown files'''
-        path_to_file = '/path/to/file.md'
-        self.os.path.splitext.side_effect = os.path.splitext
-        html = self.git2sc.import_file(path_to_file)
+        self.git2sc.pages = {
+            '1': {
+                'metadata': {
+                    'properties': {
+                        'git2sc': {'value': {'fingerprint': 'abc'}},
+                    },
+                },
+            },
+            '2': {'metadata': {'properties': {}}},
+        }
+        self.git2sc._inventory_loaded = True
+
+        self.assertEqual(self.git2sc.get_page_fingerprint('1'), 'abc')
+        self.assertEqual(self.git2sc.get_page_fingerprint('2'), None)
+        self.assertEqual(self.git2sc.get_page_fingerprint('3'), None)
+        self.assertFalse(self.session.request.called)
+
+    def test_page_property_is_fetched_if_the_page_isnt_loaded(self):
+        '''Required to read the fingerprint and the synced commit of a page
+        without loading the inventory of the space'''
+
+        self.session.request.return_value.status_code = 200
+        self.session.request.return_value.json.return_value = {
+            'key': 'git2sc',
+            'value': {'commit': 'abc'},
+            'version': {'number': 2},
+        }
+
+        self.assertEqual(self.git2sc.get_synced_commit('1'), 'abc')
         self.assertEqual(
-            mdMock.assert_called_with(path_to_file),
+            self.session.request.assert_called_with(
+                'GET',
+                '{}/content/1/property/git2sc'.format(self.api_url),
+                timeout=30,
+            ),
             None,
         )
-        self.assertEqual(
-            html,
-            mdMock.return_value
-        )
-
-    def test_import_file_exits_gracefully_if_extension_unknown(self):
-        '''Required to ensure that the import_file method doesn't crash if
-        the extension is unknown'''
-        path_to_file = '/path/to/file.unknown_extension'
-        with self.assertRaises(UnknownExtension):
-            self.git2sc.import_file(path_to_file)
 
-    def test_can_delete_articles(self):
-        '''Required to ensure that the delete_page method posts to the
-        correct api endpoint with the correct data structure'''
+        self.session.request.return_value.status_code = 404
+        self.assertEqual(self.git2sc.get_page_fingerprint('2'), None)
 
-        page_id = '372274410'
-        self.requests.delete.return_value.status_code = 204
+    def test_can_tell_if_a_page_is_of_the_space(self):
+        '''Required to ensure that the webhooks can't hang the trees from the
+        pages of other spaces'''
 
-        self.git2sc.delete_page(page_id)
+        self.git2sc.pages = {'1': {'id': '1', 'title': 'article'}}
+        self.session.request.return_value.status_code = 200
+        self.session.request.return_value.json.return_value = {
+            'id': '2',
+            'space': {'key': 'OTH'},
+        }
 
+        self.assertTrue(self.git2sc.is_space_page('1'))
+        self.assertFalse(self.session.request.called)
+        self.assertFalse(self.git2sc.is_space_page('2'))
         self.assertEqual(
-            self.requests.delete.assert_called_with(
-                '{}/content/{}'.format(self.api_url, page_id),
-                auth=self.auth,
+            self.session.request.assert_called_with(
+                'GET',
+                '{}/content/2?expand=space'.format(self.api_url),
+                timeout=30,
             ),
             None,
         )
-        self.assertFalse(self.requests_error.called)
 
-    def test_delete_articles_calls_requests_error_if_rc_not_204(self):
-        '''If the deletion of article works it returns a 204 as stated by the
-        docs, we need to make sure that requests_error gets called otherwise'''
+        self.session.request.return_value.json.return_value['space'] = {
+            'key': 'TST',
+        }
+        self.assertTrue(self.git2sc.is_space_page('2'))
+        self.session.request.return_value.status_code = 404
+        self.assertFalse(self.git2sc.is_space_page('3'))
 
-        page_id = '372274410'
-        self.requests.delete.return_value.status_code = 404
+    def test_page_property_of_a_state_page_is_fetched_once(self):
+        self.git2sc.pages = {
+            '1': {
+                'id': '1',
+                'title': 'article',
+                'version': {'number': 3},
+                'ancestors': [],
+                '_expandable': {'metadata': ''},
+            },
+        }
+        self.session.request.return_value.status_code = 404
 
-        self.git2sc.delete_page(page_id)
+        self.assertEqual(self.git2sc.get_page_fingerprint('1'), None)
+        self.assertEqual(self.git2sc.get_page_fingerprint('1'), None)
 
-        self.assertTrue(self.requests_error.called)
+        self.assertEqual(self.session.request.call_count, 1)
+        self.assertEqual(
+            self.git2sc.pages['1']['metadata'],
+            {'properties': {}},
+        )
 
-    @patch('git2sc.git2sc.Git2SC.update_page', autospect=True)
-    @patch('git2sc.git2sc.Git2SC._discover_directory_readme', autospect=True)
-    @patch('git2sc.git2sc.Git2SC.get_space_homepage', autospect=True)
-    def test_can_import_mainpage(
+    @patch('git2sc.git2sc.Git2SC._converter_version', autospec=True)
+    def test_file_fingerprint_depends_on_content_and_converter(
         self,
-        gethomepageMock,
-        discoverreadmeMock,
-        updatepageMock,
+        converterversionMock,
     ):
-        '''Given a root directory path test that git2sc substitutes the homepage
-        of the confluence page with the README.adoc
-        '''
+        '''Required to ensure that a page is updated if its source or the
+        converter change'''
 
-        gethomepageMock.return_value = '372223610'
-        discoverreadmeMock.return_value = '<p> This is a test </p>'
+        self.filefingerprint_patch.stop()
+        self.os.path.splitext.side_effect = os.path.splitext
+        self.os.path.expanduser.side_effect = os.path.expanduser
+        path = 'tests/data/repository_example/parent_article.adoc'
+        with open(path, 'rb') as f:
+            content = f.read()
 
-        self.git2sc._process_mainpage('.')
+        converterversionMock.return_value = 'Asciidoctor 1.5.6.1'
+        fingerprint = self.git2sc.file_fingerprint(path)
+        converterversionMock.return_value = 'Asciidoctor 2.0.10'
+        new_converter_fingerprint = self.git2sc.file_fingerprint(path)
 
         self.assertEqual(
-            gethomepageMock.assert_called_with(),
-            None,
-        )
-        self.assertEqual(
-            discoverreadmeMock.assert_called_with('.'),
-            None,
+            fingerprint,
+            hashlib.sha256(b'Asciidoctor 1.5.6.1' + content).hexdigest(),
         )
+        self.assertNotEqual(fingerprint, new_converter_fingerprint)
         self.assertEqual(
-            updatepageMock.assert_called_with(
-                gethomepageMock.return_value,
-                discoverreadmeMock.return_value,
-            ),
+            converterversionMock.assert_called_with(self.git2sc, '.adoc'),
             None,
         )
+        self.filefingerprint_patch.start()
 
-    @patch('git2sc.git2sc.Git2SC.import_file', autospect=True)
-    def test_can_discover_directory_readme_adoc(self, importfileMock):
-        '''Given a directory path test that git2sc returns the html of the
-        README.adoc file'''
+    @patch('git2sc.git2sc.subprocess', autospec=True)
+    def test_converter_version_is_only_queried_once(self, subprocessMock):
+        '''Required to avoid running the converter on each fingerprint'''
 
-        directory_path = '/path/to/directory'
-        self.os.path.join.side_effect = os.path.join
-        self.os.path.basename.side_effect = os.path.basename
+        subprocessMock.check_output.return_value = \
+            b'Asciidoctor 1.5.6.1 [https://asciidoctor.org]\nRuntime\n'
 
-        def true_if_adoc(file_path):
-            extension = os.path.splitext(file_path)[-1]
-            if extension == '.adoc':
-                return True
-            return False
+        self.git2sc._converter_version('.adoc')
+        version = self.git2sc._converter_version('.adoc')
 
-        self.os.path.isfile.side_effect = true_if_adoc
+        self.assertEqual(
+            version,
+            'Asciidoctor 1.5.6.1 [https://asciidoctor.org]',
+        )
+        self.assertEqual(subprocessMock.check_output.call_count, 1)
 
-        result = self.git2sc._discover_directory_readme(directory_path)
+    def test_converter_version_fails_with_unknown_extension(self):
+        '''Required to skip the files that can't be imported'''
 
-        self.assertTrue(
-            call(directory_path, 'README.adoc')
-            in self.os.path.join.mock_calls
-        )
+        with self.assertRaises(UnknownExtension):
+            self.git2sc._converter_version('.unknown_extension')
+
+    def test_can_load_files_safely(self):
+        '''Required to ensure that we can load files in a safe way'''
+        self.os.path.expanduser.side_effect = os.path.expanduser
+        self.os.path.join.side_effect = os.path.join
 
         self.assertEqual(
-            importfileMock.assert_called_with('/path/to/directory/README.adoc'),
-            None,
+            self.git2sc._safe_load_file('/path/to/guía rápida.md'),
+            '/path/to/guía rápida.md',
         )
         self.assertEqual(
-            result,
-            importfileMock.return_value
+            self.git2sc._safe_load_file('--output=file.md'),
+            './--output=file.md',
         )
 
-    @patch('git2sc.git2sc.Git2SC.import_file', autospect=True)
-    def test_can_discover_directory_readme_md(self, importfileMock):
-        '''Given a directory path test that git2sc returns the html of the
-        README.md file'''
-
-        directory_path = '/path/to/directory'
-        self.os.path.join.side_effect = os.path.join
-        self.os.path.basename.side_effect = os.path.basename
-
-        def true_if_md(file_path):
-            extension = os.path.splitext(file_path)[-1]
-            if extension == '.md':
-                return True
-            return False
-
-        self.os.path.isfile.side_effect = true_if_md
-
-        result = self.git2sc._discover_directory_readme(directory_path)
+    @patch('git2sc.git2sc.Git2SC._safe_load_file', autospec=True)
+    @patch('git2sc.git2sc.subprocess')
+    def test_can_process_adoc(self, subprocessMock, loadfileMock):
+        '''Required to ensure that we can transform adoc files to html'''
+        path_to_file = '/path/to/file.adoc'
+        result = self.git2sc._process_adoc(path_to_file)
 
-        self.assertTrue(
-            call(directory_path, 'README.md')
-            in self.os.path.join.mock_calls
+        self.assertEqual(
+            loadfileMock.assert_called_with(self.git2sc, path_to_file),
+            None,
         )
-
         self.assertEqual(
-            importfileMock.assert_called_with('/path/to/directory/README.md'),
+            subprocessMock.check_output.assert_called_with(
+                [
+                    'asciidoctor',
+                    '-b',
+                    'xhtml',
+                    loadfileMock.return_value,
+                    '-o',
+                    '-',
+                ],
+                shell=False,
+            ),
             None,
         )
         self.assertEqual(
             result,
-            importfileMock.return_value
+            subprocessMock.check_output.return_value.decode.
+            return_value.replace('<!DOCTYPE html>\n', '')
         )
 
-    @patch('git2sc.git2sc.Git2SC.import_file', autospect=True)
-    def test_discover_directory_readme_works_when_no_readme(
+    @patch('git2sc.git2sc.Git2SC._safe_load_file', autospec=True)
+    @patch('git2sc.git2sc.subprocess', autospec=True)
+    def test_can_process_adoc_with_asciidoctor_workers(
         self,
-        importfileMock,
+        subprocessMock,
+        loadfileMock,
     ):
-        '''Given a directory path test that git2sc where no README exist return
-        "No README here, keep on looking"'''
-
-        directory_path = '/path/to/directory'
-        self.os.path.join.side_effect = os.path.join
-        self.os.path.basename.side_effect = os.path.basename
-
-        self.os.path.isfile.return_value = False
+        '''Required to ensure that the adoc files are rendered by the long
+        lived asciidoctor workers when they are configured'''
+        self.git2sc.asciidoctor = Mock()
+        self.git2sc.asciidoctor.convert.return_value = \
+            '<!DOCTYPE html>\n<p>html</p>'
 
-        result = self.git2sc._discover_directory_readme(directory_path)
+        result = self.git2sc._process_adoc('/path/to/file.adoc')
 
         self.assertEqual(
-            result,
-            "No README here, keep on looking :("
+            self.git2sc.asciidoctor.convert.assert_called_with(
+                loadfileMock.return_value,
+            ),
+            None,
         )
+        self.assertFalse(subprocessMock.check_output.called)
+        self.assertEqual(result, '<p>html</p>')
 
-    @patch('git2sc.git2sc.Git2SC.create_page', autospect=True)
-    @patch('git2sc.git2sc.Git2SC._discover_directory_readme', autospect=True)
-    def test_can_process_directory_readme(
-        self,
-        discoverreadmeMock,
-        createpageMock,
-    ):
-        '''Given a directory path test that git2sc creates a page with the
-        contents of README being the title the name of the directory'''
+    @patch('git2sc.git2sc.AsciidoctorPool', autospec=True)
+    def test_can_configure_asciidoctor_workers(self, poolMock):
+        '''Required to ensure that the asciidoctor workers are started and
+        stopped with the git2sc object'''
+        git2sc = Git2SC(
+            self.api_url,
+            self.auth_string,
+            self.space,
+            adoc_workers=3,
+        )
+        self.assertEqual(poolMock.assert_called_with(3), None)
+        self.assertEqual(git2sc.asciidoctor, poolMock.return_value)
 
-        directory_path = '/path/to/directory'
-        createpageMock.return_value = '372223610'
-        self.os.path.join.side_effect = os.path.join
-        self.os.path.basename.side_effect = os.path.basename
+        git2sc.close()
+        self.assertTrue(poolMock.return_value.close.called)
 
-        result = self.git2sc._create_directory_readme(directory_path)
+    def test_asciidoctor_workers_are_disabled_by_default(self):
+        self.assertEqual(self.git2sc.asciidoctor, None)
+
+    @patch('git2sc.git2sc.Git2SC._safe_load_file', autospec=True)
+    @patch('git2sc.git2sc.open')
+    def test_can_process_html(self, openMock, loadfileMock):
+        '''Required to ensure that we can load html files'''
+        path_to_file = '/path/to/file.html'
+        result = self.git2sc._process_html(path_to_file)
 
         self.assertEqual(
-            discoverreadmeMock.assert_called_with(
-                '/path/to/directory',
-            ),
+            loadfileMock.assert_called_with(self.git2sc, path_to_file),
             None,
         )
         self.assertEqual(
-            createpageMock.assert_called_with(
-                'directory',
-                discoverreadmeMock.return_value,
-                None,
+            openMock.assert_called_with(
+                loadfileMock.return_value,
+                'r',
             ),
-            None
+            None,
         )
         self.assertEqual(
             result,
-            createpageMock.return_value,
+            openMock.return_value.__enter__.return_value.read.return_value
         )
 
-    @patch('git2sc.git2sc.Git2SC.update_page', autospect=True)
-    @patch('git2sc.git2sc.Git2SC._get_article_id', autospect=True)
-    @patch('git2sc.git2sc.Git2SC._discover_directory_readme', autospect=True)
-    def test_can_update_the_directory_readme(
-        self,
-        discoverreadmeMock,
-        getarticleMock,
-        updatepageMock,
-    ):
-        '''Given a directory path test that git2sc updates a page with the
-        contents of README being the title the name of the directory'''
-
-        directory_path = '/path/to/directory'
-        self.os.path.join.side_effect = os.path.join
-        self.os.path.basename.side_effect = os.path.basename
-        getarticleMock.return_value = '412254212'
-
-        self.git2sc._update_directory_readme(directory_path)
-
-        self.assertEqual(getarticleMock.assert_called_with('directory'), None)
+    @patch('git2sc.git2sc.Git2SC._safe_load_file')
+    @patch('git2sc.git2sc.pypandoc')
+    def test_can_process_md(self, pypandocMock, loadfileMock):
+        '''Required to ensure that we can transform md files to html'''
+        path_to_file = '/path/to/file'
+        result = self.git2sc._process_md(path_to_file)
 
         self.assertEqual(
-            discoverreadmeMock.assert_called_with(
-                '/path/to/directory',
-            ),
+            loadfileMock.assert_called_with(path_to_file),
             None,
         )
         self.assertEqual(
-            updatepageMock.assert_called_with(
-                '412254212',
-                discoverreadmeMock.return_value,
+            pypandocMock.convert_file.assert_called_with(
+                loadfileMock.return_value,
+                'html',
             ),
-            None
+            None,
         )
-
-    @patch('git2sc.git2sc.Git2SC.create_page', autospect=True)
-    @patch('git2sc.git2sc.Git2SC.import_file', autospect=True)
-    def test_process_directory_readme_can_accept_parent_id(
-        self,
-        importfileMock,
-        createpageMock,
-    ):
-        '''Given a directory path test that git2sc creates a page with the
-        contents of README.md under a specified article id'''
-
-        directory_path = '/path/to/directory'
-        parent_id = '372223610'
-        self.os.path.join.side_effect = os.path.join
-        self.os.path.basename.side_effect = os.path.basename
-
-        def true_if_md(file_path):
-            extension = os.path.splitext(file_path)[-1]
-            if extension == '.md':
-                return True
-            return False
-
-        self.os.path.isfile.side_effect = true_if_md
-
-        self.git2sc._create_directory_readme(directory_path, parent_id)
-
         self.assertEqual(
-            createpageMock.assert_called_with(
-                'directory',
-                importfileMock.return_value,
-                parent_id
-            ),
-            None
+            result,
+            pypandocMock.convert_file.return_value
         )
 
-    def test_request_error_display_message_if_rc_not_200(self):
-        '''Required to ensure that the _requests_error method returns the
+    @patch('git2sc.git2sc.Git2SC._process_adoc', autospec=True)
+    def test_import_file_method_supports_adoc_files(self, adocMock):
+        '''Required to ensure that the import_file method as a wrapper
+        of the _process_* recognizes asciidoc files'''
+        path_to_file = '/path/to/file.adoc'
+        self.os.path.splitext.side_effect = os.path.splitext
+        html = self.git2sc.import_file(path_to_file)
+        self.assertEqual(
+            adocMock.assert_called_with(self.git2sc, path_to_file),
+            None,
+        )
+        self.assertEqual(
+            html,
+            adocMock.return_value
+        )
+
+    @patch('git2sc.git2sc.Git2SC._process_html', autospec=True)
+    def test_import_file_method_supports_html_files(self, htmlMock):
+        '''Required to ensure that the import_file method as a wrapper
+        of the _process_* recognizes html files'''
+        path_to_file = '/path/to/file.html'
+        self.os.path.splitext.side_effect = os.path.splitext
+        html = self.git2sc.import_file(path_to_file)
+        self.assertEqual(
+            htmlMock.assert_called_with(self.git2sc, path_to_file),
+            None,
+        )
+        self.assertEqual(
+            html,
+            htmlMock.return_value
+        )
+
+    @patch('git2sc.git2sc.Git2SC._process_md', autospec=True)
+    def test_import_file_method_supports_md_files(self, mdMock):
+        '''Required to ensure that the import_file method as a wrapper
+        of the _process_* recognizes markdown files'''
+        path_to_file = '/path/to/file.md'
+        self.os.path.splitext.side_effect = os.path.splitext
+        html = self.git2sc.import_file(path_to_file)
+        self.assertEqual(
+            mdMock.assert_called_with(self.git2sc, path_to_file),
+            None,
+        )
+        self.assertEqual(
+            html,
+            mdMock.return_value
+        )
+
+    def test_import_file_exits_gracefully_if_extension_unknown(self):
+        '''Required to ensure that the import_file method doesn't crash if
+        the extension is unknown'''
+        path_to_file = '/path/to/file.unknown_extension'
+        with self.assertRaises(UnknownExtension):
+            self.git2sc.import_file(path_to_file)
+
+    @patch('git2sc.git2sc.Git2SC._convert_file', autospec=True)
+    def test_import_file_takes_the_result_of_the_conversion_stage(
+        self,
+        convertMock,
+    ):
+        '''Required to ensure that the files converted ahead of the upload
+        are not converted again'''
+        self.git2sc._conversions = Mock()
+        self.git2sc._conversions.__contains__ = Mock(return_value=True)
+
+        html = self.git2sc.import_file('/path/to/file.md')
+
+        self.assertEqual(
+            self.git2sc._conversions.result.assert_called_with(
+                '/path/to/file.md',
+            ),
+            None,
+        )
+        self.assertEqual(html, self.git2sc._conversions.result.return_value)
+        self.assertFalse(convertMock.called)
+
+    @patch('git2sc.git2sc.Git2SC._convert_file', autospec=True)
+    def test_import_file_converts_the_files_not_scheduled(self, convertMock):
+        self.git2sc._conversions = Mock()
+        self.git2sc._conversions.__contains__ = Mock(return_value=False)
+
+        html = self.git2sc.import_file('/path/to/file.md')
+
+        self.assertEqual(html, convertMock.return_value)
+
+    @patch('git2sc.git2sc.ConversionStage', autospec=True)
+    def test_conversion_stage_is_started_and_stopped(self, stageMock):
+        '''Required to ensure that the conversion stage is shared by the
+        submissions and released afterwards'''
+        self.git2sc._start_conversions(['a.md'])
+        self.git2sc._start_conversions(['b.md'])
+
+        self.assertEqual(stageMock.call_count, 1)
+        self.assertEqual(
+            stageMock.return_value.submit.mock_calls,
+            [call(['a.md']), call(['b.md'])],
+        )
+
+        self.git2sc._stop_conversions()
+        self.assertTrue(stageMock.return_value.close.called)
+        self.assertEqual(self.git2sc._conversions, None)
+
+    @patch('git2sc.git2sc.Git2SC.delete_page', autospec=True)
+    @patch('git2sc.git2sc.Git2SC._find_directory_readme', autospec=True)
+    @patch('git2sc.git2sc.Git2SC._execute_action', autospec=True)
+    @patch('git2sc.git2sc.ConversionStage', autospec=True)
+    def test_execute_plan_converts_the_files_ahead(
+        self,
+        stageMock,
+        executeMock,
+        findreadmeMock,
+        deletepageMock,
+    ):
+        '''Required to ensure that only the files the plan uploads are
+        converted, in parallel while the pages are uploaded'''
+        self.git2sc.convert_workers = 4
+        findreadmeMock.side_effect = lambda git2sc, path: \
+            '{}/README.md'.format(path)
+        plan = SyncPlan([
+            SyncAction('create', DIRECTORY, '/path/dir'),
+            SyncAction('skip', DIRECTORY, '/path/current_dir'),
+            SyncAction('update', FILE, '/path/dir/stale.md'),
+            SyncAction('skip', FILE, '/path/dir/current.md'),
+            SyncAction('delete', PAGE, None, page_id='1'),
+        ])
+
+        self.git2sc.execute_plan(plan)
+
+        self.assertEqual(
+            stageMock.return_value.submit.assert_called_with(
+                ['/path/dir/README.md', '/path/dir/stale.md'],
+            ),
+            None,
+        )
+        self.assertEqual(stageMock.call_args[0][1], 4)
+        self.assertEqual(
+            [args[0][1] for args in executeMock.call_args_list],
+            list(plan[:4]),
+        )
+        self.assertEqual(deletepageMock.mock_calls, [call(self.git2sc, '1')])
+        self.assertTrue(stageMock.return_value.close.called)
+
+    @patch('git2sc.git2sc.Git2SC._execute_action', autospec=True)
+    @patch('git2sc.git2sc.ConversionStage', autospec=True)
+    def test_execute_plan_stops_the_conversion_stage_on_errors(
+        self,
+        stageMock,
+        executeMock,
+    ):
+        self.git2sc.convert_workers = 4
+        executeMock.side_effect = ValueError
+
+        with self.assertRaises(ValueError):
+            self.git2sc.execute_plan(
+                SyncPlan([SyncAction('create', FILE, '/path/file.md')])
+            )
+
+        self.assertTrue(stageMock.return_value.close.called)
+
+    def test_deletion_levels_go_leaves_first(self):
+        '''Required to ensure that a page is never deleted at the same time
+        as its children'''
+        actions = [
+            SyncAction('delete', PAGE, None, page_id='root'),
+            SyncAction('delete', PAGE, None, page_id='dir', parent_id='root'),
+            SyncAction('delete', PAGE, None, page_id='a', parent_id='dir'),
+            SyncAction('delete', PAGE, None, page_id='b', parent_id='kept'),
+        ]
+
+        levels = self.git2sc._deletion_levels(actions)
+
+        self.assertEqual(
+            [sorted(action.page_id for action in level) for level in levels],
+            [['a', 'b'], ['dir'], ['root']],
+        )
+
+    @patch('git2sc.git2sc.Git2SC.delete_page', autospec=True)
+    def test_execute_plan_deletes_concurrently_leaves_first(
+        self,
+        deletepageMock,
+    ):
+        '''Required to delete restructured trees in parallel'''
+        plan = SyncPlan([
+            SyncAction('delete', PAGE, None, page_id='dir'),
+            SyncAction('delete', PAGE, None, page_id='a', parent_id='dir'),
+            SyncAction('delete', PAGE, None, page_id='b', parent_id='dir'),
+        ])
+
+        self.git2sc.execute_plan(plan, jobs=4)
+
+        self.assertEqual(
+            sorted(deletepageMock.mock_calls[:2]),
+            [call(self.git2sc, 'a'), call(self.git2sc, 'b')],
+        )
+        self.assertEqual(
+            deletepageMock.mock_calls[2],
+            call(self.git2sc, 'dir'),
+        )
+
+    @patch('git2sc.git2sc.Git2SC.delete_page', autospec=True)
+    @patch('git2sc.git2sc.Git2SC._execute_action', autospec=True)
+    def test_execute_plan_refuses_too_many_deletions(
+        self,
+        executeMock,
+        deletepageMock,
+    ):
+        '''Required to avoid wiping a space by mistake'''
+        plan = SyncPlan([
+            SyncAction('update', FILE, '/path/file.md', page_id='1'),
+            SyncAction('delete', PAGE, None, page_id='2'),
+            SyncAction('delete', PAGE, None, page_id='3'),
+        ])
+
+        with self.assertRaises(TooManyDeletions):
+            self.git2sc.execute_plan(plan, max_deletes=1)
+
+        self.assertFalse(executeMock.called)
+        self.assertFalse(deletepageMock.called)
+
+        self.git2sc.execute_plan(plan, max_deletes=2)
+        self.assertEqual(len(deletepageMock.mock_calls), 2)
+
+    @patch('git2sc.git2sc.Git2SC.import_file', autospec=True)
+    def test_plan_update_doesnt_convert_nor_touch_anything(
+        self,
+        importfileMock,
+    ):
+        '''Required to print the plan of a sync without side effects'''
+        self.os.walk.side_effect = os.walk
+        self.os.path.basename.side_effect = os.path.basename
+        self.os.path.splitext.side_effect = os.path.splitext
+        self.os.path.dirname.side_effect = os.path.dirname
+        self.os.path.join.side_effect = os.path.join
+        self.git2sc.pages = {
+            'id_molecule': {
+                'id': 'id_molecule',
+                'title': 'molecule',
+                'metadata': {
+                    'properties': {
+                        'git2sc': {
+                            'value': {'fingerprint': 'fingerprint_molecule'},
+                        },
+                    },
+                },
+            },
+            'id_old': {
+                'id': 'id_old',
+                'title': 'old',
+                'ancestors': [
+                    {'id': 'initial_parent_id'},
+                    {'id': 'id_molecule'},
+                ],
+            },
+            'id_other': {'id': 'id_other', 'title': 'other'},
+        }
+        self.session.reset_mock()
+
+        plan = self.git2sc.plan_update(
+            'tests/data/repository_example/formation/ansible/molecule',
+            ['.git'],
+            'initial_parent_id',
+        )
+
+        self.assertEqual(
+            [
+                (action.operation, action.kind, action.title)
+                for action in plan
+            ],
+            [
+                ('skip', DIRECTORY, 'molecule'),
+                ('create', FILE, 'child_child_doc'),
+                ('delete', PAGE, 'old'),
+            ],
+        )
+        self.assertEqual(plan.parent_id, 'initial_parent_id')
+        self.assertEqual(
+            plan[1].parent_path,
+            'tests/data/repository_example/formation/ansible/molecule',
+        )
+        self.assertFalse(importfileMock.called)
+        self.assertFalse(self.session.request.called)
+
+    def test_plan_update_creates_all_the_new_files(self):
+        '''Required to ensure that the files without page are all created,
+        not only the first one'''
+        self.os.walk.side_effect = os.walk
+        self.os.path.basename.side_effect = os.path.basename
+        self.os.path.splitext.side_effect = os.path.splitext
+        self.os.path.dirname.side_effect = os.path.dirname
+        self.os.path.join.side_effect = os.path.join
+        self.git2sc.pages = {}
+
+        plan = self.git2sc.plan_update(
+            'tests/data/repository_example/formation',
+            ['excluded_dir', 'excluded_file.adoc'],
+            'initial_parent_id',
+        )
+
+        self.assertEqual(
+            sorted(action.title for action in plan.operations('create')),
+            ['ansible', 'aws', 'child_child_doc', 'formation',
+             'formation_guide', 'molecule'],
+        )
+
+    def test_plan_full_upload_skips_excluded_items(self):
+        '''Required to ensure that the excluded items, the READMEs and the
+        files of unknown extensions are left out of the plan'''
+        self.os.walk.side_effect = os.walk
+        self.os.path.basename.side_effect = os.path.basename
+        self.os.path.splitext.side_effect = os.path.splitext
+        self.os.path.dirname.side_effect = os.path.dirname
+        self.os.path.join.side_effect = os.path.join
+
+        plan = self.git2sc.plan_full_upload(
+            'tests/data/repository_example/formation',
+            ['excluded_dir', 'excluded_file.adoc'],
+            'initial_parent_id',
+        )
+
+        self.assertEqual(
+            sorted(action.title for action in plan),
+            ['ansible', 'aws', 'child_child_doc', 'formation',
+             'formation_guide', 'molecule'],
+        )
+        self.assertEqual(plan.operations('create'), list(plan))
+
+    @patch('git2sc.git2sc.Git2SC._render_file', autospec=True)
+    def test_convert_file_uses_the_render_cache(self, renderMock):
+        '''Required to avoid converting again the files whose source and
+        converter didn't change'''
+        self.os.path.splitext.side_effect = os.path.splitext
+        self.git2sc.cache = Mock()
+        self.git2sc.cache.get.return_value = '<p>cached</p>'
+
+        html = self.git2sc._convert_file('/path/to/file.md')
+
+        self.assertEqual(html, '<p>cached</p>')
+        self.assertFalse(renderMock.called)
+
+    @patch('git2sc.git2sc.Git2SC._render_file', autospec=True)
+    def test_convert_file_stores_the_misses_in_the_render_cache(
+        self,
+        renderMock,
+    ):
+        self.os.path.splitext.side_effect = os.path.splitext
+        self.git2sc.cache = Mock()
+        self.git2sc.cache.get.return_value = None
+
+        html = self.git2sc._convert_file('/path/to/file.md')
+
+        key = self.git2sc._cache_key('/path/to/file.md')
+        self.assertEqual(self.git2sc.cache.get.assert_called_with(key), None)
+        self.assertEqual(
+            self.git2sc.cache.set.assert_called_with(
+                key,
+                renderMock.return_value,
+            ),
+            None,
+        )
+        self.assertEqual(html, renderMock.return_value)
+
+    def test_cache_key_depends_on_the_converter_options(self):
+        '''Required to ensure that the html rendered with other options is
+        not reused'''
+        self.os.path.splitext.side_effect = os.path.splitext
+        self.filefingerprint.side_effect = lambda git2sc, path: 'fingerprint'
+
+        self.assertNotEqual(
+            self.git2sc._cache_key('/path/to/file.md'),
+            self.git2sc._cache_key('/path/to/file.adoc'),
+        )
+
+    def test_can_delete_articles(self):
+        '''Required to ensure that the delete_page method posts to the
+        correct api endpoint with the correct data structure'''
+
+        page_id = '372274410'
+        self.session.request.return_value.status_code = 204
+
+        self.git2sc.delete_page(page_id)
+
+        self.assertEqual(
+            self.session.request.assert_called_with(
+                'DELETE',
+                '{}/content/{}'.format(self.api_url, page_id),
+                timeout=30,
+            ),
+            None,
+        )
+        self.assertFalse(self.requests_error.called)
+
+    def test_delete_articles_removes_them_from_pages(self):
+        '''Required to ensure that the title of a deleted article can be
+        used again'''
+
+        self.git2sc.pages = {'1': {'id': '1', 'title': 'Article'}}
+        self.session.request.return_value.status_code = 204
+
+        self.git2sc.delete_page('1')
+
+        self.assertEqual(self.git2sc.pages, {})
+        self.assertFalse(self.git2sc._title_exist('Article'))
+
+    def test_delete_articles_calls_requests_error_if_rc_not_204(self):
+        '''If the deletion of article works it returns a 204 as stated by the
+        docs, we need to make sure that requests_error gets called otherwise'''
+
+        page_id = '372274410'
+        self.session.request.return_value.status_code = 404
+
+        self.git2sc.delete_page(page_id)
+
+        self.assertTrue(self.requests_error.called)
+
+    @patch('git2sc.git2sc.Git2SC.update_page', autospec=True)
+    @patch('git2sc.git2sc.Git2SC._discover_directory_readme', autospec=True)
+    @patch('git2sc.git2sc.Git2SC.get_space_homepage', autospec=True)
+    def test_can_import_mainpage(
+        self,
+        gethomepageMock,
+        discoverreadmeMock,
+        updatepageMock,
+    ):
+        '''Given a root directory path test that git2sc substitutes the homepage
+        of the confluence page with the README.adoc
+        '''
+
+        gethomepageMock.return_value = '372223610'
+        discoverreadmeMock.return_value = '<p> This is a test </p>'
+
+        self.git2sc._process_mainpage('.')
+
+        self.assertEqual(
+            gethomepageMock.assert_called_with(self.git2sc, ),
+            None,
+        )
+        self.assertEqual(
+            discoverreadmeMock.assert_called_with(self.git2sc, '.'),
+            None,
+        )
+        self.assertEqual(
+            updatepageMock.assert_called_with(
+                self.git2sc,
+                gethomepageMock.return_value,
+                discoverreadmeMock.return_value,
+                fingerprint='fingerprint_.',
+            ),
+            None,
+        )
+
+    @patch('git2sc.git2sc.Git2SC.update_page', autospec=True)
+    @patch('git2sc.git2sc.Git2SC._discover_directory_readme', autospec=True)
+    @patch('git2sc.git2sc.Git2SC.get_space_homepage', autospec=True)
+    def test_mainpage_is_not_updated_if_readme_did_not_change(
+        self,
+        gethomepageMock,
+        discoverreadmeMock,
+        updatepageMock,
+    ):
+        '''Given a root directory whose README fingerprint is the one stored
+        in the homepage, test that git2sc doesn't convert nor update it'''
+
+        gethomepageMock.return_value = '372223610'
+        self.git2sc.pages = {
+            '372223610': {
+                'metadata': {
+                    'properties': {
+                        'git2sc': {'value': {'fingerprint': 'fingerprint_.'}},
+                    },
+                },
+            },
+        }
+
+        result = self.git2sc._process_mainpage('.')
+
+        self.assertEqual(result, '372223610')
+        self.assertFalse(discoverreadmeMock.called)
+        self.assertFalse(updatepageMock.called)
+
+    @patch('git2sc.git2sc.Git2SC.import_file', autospec=True)
+    def test_can_discover_directory_readme_adoc(self, importfileMock):
+        '''Given a directory path test that git2sc returns the html of the
+        README.adoc file'''
+
+        directory_path = '/path/to/directory'
+        self.os.path.join.side_effect = os.path.join
+        self.os.path.basename.side_effect = os.path.basename
+
+        def true_if_adoc(file_path):
+            extension = os.path.splitext(file_path)[-1]
+            if extension == '.adoc':
+                return True
+            return False
+
+        self.os.path.isfile.side_effect = true_if_adoc
+
+        result = self.git2sc._discover_directory_readme(directory_path)
+
+        self.assertTrue(
+            call(directory_path, 'README.adoc')
+            in self.os.path.join.mock_calls
+        )
+
+        self.assertEqual(
+            importfileMock.assert_called_with(
+                self.git2sc,
+                '/path/to/directory/README.adoc',
+            ),
+            None,
+        )
+        self.assertEqual(
+            result,
+            importfileMock.return_value
+        )
+
+    @patch('git2sc.git2sc.Git2SC.import_file', autospec=True)
+    def test_can_discover_directory_readme_md(self, importfileMock):
+        '''Given a directory path test that git2sc returns the html of the
+        README.md file'''
+
+        directory_path = '/path/to/directory'
+        self.os.path.join.side_effect = os.path.join
+        self.os.path.basename.side_effect = os.path.basename
+
+        def true_if_md(file_path):
+            extension = os.path.splitext(file_path)[-1]
+            if extension == '.md':
+                return True
+            return False
+
+        self.os.path.isfile.side_effect = true_if_md
+
+        result = self.git2sc._discover_directory_readme(directory_path)
+
+        self.assertTrue(
+            call(directory_path, 'README.md')
+            in self.os.path.join.mock_calls
+        )
+
+        self.assertEqual(
+            importfileMock.assert_called_with(
+                self.git2sc,
+                '/path/to/directory/README.md',
+            ),
+            None,
+        )
+        self.assertEqual(
+            result,
+            importfileMock.return_value
+        )
+
+    @patch('git2sc.git2sc.Git2SC.import_file', autospec=True)
+    def test_discover_directory_readme_works_when_no_readme(
+        self,
+        importfileMock,
+    ):
+        '''Given a directory path test that git2sc where no README exist return
+        "No README here, keep on looking"'''
+
+        directory_path = '/path/to/directory'
+        self.os.path.join.side_effect = os.path.join
+        self.os.path.basename.side_effect = os.path.basename
+
+        self.os.path.isfile.return_value = False
+
+        result = self.git2sc._discover_directory_readme(directory_path)
+
+        self.assertEqual(
+            result,
+            "No README here, keep on looking :("
+        )
+
+    @patch('git2sc.git2sc.Git2SC.create_page', autospec=True)
+    @patch('git2sc.git2sc.Git2SC._discover_directory_readme', autospec=True)
+    def test_can_process_directory_readme(
+        self,
+        discoverreadmeMock,
+        createpageMock,
+    ):
+        '''Given a directory path test that git2sc creates a page with the
+        contents of README being the title the name of the directory'''
+
+        directory_path = '/path/to/directory'
+        createpageMock.return_value = '372223610'
+        self.os.path.join.side_effect = os.path.join
+        self.os.path.basename.side_effect = os.path.basename
+
+        result = self.git2sc._create_directory_readme(directory_path)
+
+        self.assertEqual(
+            discoverreadmeMock.assert_called_with(
+                self.git2sc,
+                '/path/to/directory',
+            ),
+            None,
+        )
+        self.assertEqual(
+            createpageMock.assert_called_with(
+                self.git2sc,
+                'directory',
+                discoverreadmeMock.return_value,
+                None,
+                fingerprint='fingerprint_directory',
+            ),
+            None
+        )
+        self.assertEqual(
+            result,
+            createpageMock.return_value,
+        )
+
+    @patch('git2sc.git2sc.Git2SC.update_page', autospec=True)
+    @patch('git2sc.git2sc.Git2SC._get_article_id', autospec=True)
+    @patch('git2sc.git2sc.Git2SC._discover_directory_readme', autospec=True)
+    def test_can_update_the_directory_readme(
+        self,
+        discoverreadmeMock,
+        getarticleMock,
+        updatepageMock,
+    ):
+        '''Given a directory path test that git2sc updates a page with the
+        contents of README being the title the name of the directory'''
+
+        directory_path = '/path/to/directory'
+        self.os.path.join.side_effect = os.path.join
+        self.os.path.basename.side_effect = os.path.basename
+        getarticleMock.return_value = '412254212'
+
+        self.git2sc._update_directory_readme(directory_path)
+
+        self.assertEqual(
+            getarticleMock.assert_called_with(self.git2sc, 'directory'),
+            None,
+        )
+
+        self.assertEqual(
+            discoverreadmeMock.assert_called_with(
+                self.git2sc,
+                '/path/to/directory',
+            ),
+            None,
+        )
+        self.assertEqual(
+            updatepageMock.assert_called_with(
+                self.git2sc,
+                '412254212',
+                discoverreadmeMock.return_value,
+                fingerprint='fingerprint_directory',
+            ),
+            None
+        )
+
+    @patch('git2sc.git2sc.Git2SC.create_page', autospec=True)
+    @patch('git2sc.git2sc.Git2SC.import_file', autospec=True)
+    def test_process_directory_readme_can_accept_parent_id(
+        self,
+        importfileMock,
+        createpageMock,
+    ):
+        '''Given a directory path test that git2sc creates a page with the
+        contents of README.md under a specified article id'''
+
+        directory_path = '/path/to/directory'
+        parent_id = '372223610'
+        self.os.path.join.side_effect = os.path.join
+        self.os.path.basename.side_effect = os.path.basename
+
+        def true_if_md(file_path):
+            extension = os.path.splitext(file_path)[-1]
+            if extension == '.md':
+                return True
+            return False
+
+        self.os.path.isfile.side_effect = true_if_md
+
+        self.git2sc._create_directory_readme(directory_path, parent_id)
+
+        self.assertEqual(
+            createpageMock.assert_called_with(
+                self.git2sc,
+                'directory',
+                importfileMock.return_value,
+                parent_id,
+                fingerprint='fingerprint_directory',
+            ),
+            None
+        )
+
+    def test_request_error_display_message_if_rc_not_200(self):
+        '''Required to ensure that the _requests_error method returns the
         desired structure inside the print when a requests instance has a
         return code different from 200'''
 
-        self.requests_error_patch.stop()
-        self.requests_object = Mock()
-        self.requests_object.status_code = 400
-        self.requests_object.text = json.dumps({
-            'statusCode': 400,
-            'message': 'Error message',
-        })
-        self.json.loads.side_effect = json.loads
-        with self.assertRaises(Exception) as err:
-            self.git2sc._requests_error(self.requests_object)
-        self.assertEqual(err.exception.args[0], 'Error 400: Error message')
-        self.requests_error_patch.start()
+        self.requests_error_patch.stop()
+        self.requests_object = Mock()
+        self.requests_object.status_code = 400
+        self.requests_object.text = json.dumps({
+            'statusCode': 400,
+            'message': 'Error message',
+        })
+        self.json.loads.side_effect = json.loads
+        with self.assertRaises(Exception) as err:
+            self.git2sc._requests_error(self.requests_object)
+        self.assertEqual(err.exception.args[0], 'Error 400: Error message')
+        self.requests_error_patch.start()
+
+    def test_request_error_do_nothing_if_rc_is_200(self):
+        '''Required to ensure that the _requests_error method does nothing
+        if the return code is 200'''
+
+        self.requests_error_patch.stop()
+        self.requests_object = Mock()
+        self.requests_object.status_code = 200
+        self.requests_object.text = json.dumps({
+            'statusCode': 200,
+            'message': 'Error message',
+        })
+        self.git2sc._requests_error(self.requests_object)
+        self.assertFalse(self.print.called)
+        self.requests_error_patch.start()
+
+    @patch('git2sc.git2sc.Git2SC.create_page', autospec=True)
+    @patch('git2sc.git2sc.Git2SC._create_directory_readme', autospec=True)
+    @patch('git2sc.git2sc.Git2SC._process_mainpage', autospec=True)
+    @patch('git2sc.git2sc.Git2SC.import_file', autospec=True)
+    def test_can_full_upload_directory(
+        self,
+        importfileMock,
+        mainpageMock,
+        readmeMock,
+        createpageMock,
+    ):
+        '''Given a directory path test that git2sc crawls all the files and
+        uploads them to confluence.
+
+        The repository structure is under tests/data:
+        └── repository_example
+            ├── formation
+            │   ├── ansible
+            │   │   ├── molecule
+            │   │   │   ├── child_child_doc.adoc
+            │   │   │   └── README.md
+            │   │   └── README.md
+            │   ├── aws
+            │   │   └── README.md
+            │   ├── excluded_dir
+            │   │   └── excluded_file
+            │   ├── formation_guide.adoc
+            │   └── README.md
+            ├── parent_article.adoc
+            ├── README.md
+            └── unknown.file
+
+        It should ignore the .git, .gitignore and excluded_dir directories as
+        they are in the excluded list
+        '''
+
+        def create_side_effect(git2sc, directory_name, parent_id=None):
+            return 'id_{}'.format(os.path.basename(directory_name))
+
+        def import_side_effect(git2sc, file_name):
+            if 'unknown.file' in file_name:
+                raise UnknownExtension
+            return "article_id"
+
+        excluded_directories = [
+            '.git',
+            '.gitignore',
+            'excluded_dir',
+            'excluded_file.adoc',
+        ]
+        readmeMock.side_effect = create_side_effect
+        importfileMock.side_effect = import_side_effect
+        self.os.walk.side_effect = os.walk
+        self.os.path.basename.side_effect = os.path.basename
+        self.os.path.splitext.side_effect = os.path.splitext
+        self.os.path.dirname.side_effect = os.path.dirname
+        self.os.path.join.side_effect = os.path.join
+
+        self.git2sc.get_space_homepage = Mock(return_value='id_homepage')
+
+        self.git2sc.directory_full_upload(
+            'tests/data/repository_example',
+            excluded_directories,
+        )
+
+        # Assert that the directories are created
+        self.assertEqual(
+            readmeMock.mock_calls,
+            [
+                call(
+                    self.git2sc,
+                    'tests/data/repository_example/formation',
+                    None,
+                ),
+                call(
+                    self.git2sc,
+                    'tests/data/repository_example/formation/aws',
+                    'id_formation',
+                ),
+                call(
+                    self.git2sc,
+                    'tests/data/repository_example/formation/ansible',
+                    'id_formation',
+                ),
+                call(
+                    self.git2sc,
+                    'tests/data/repository_example/formation/ansible/molecule',
+                    'id_ansible',
+                )
+            ]
+        )
+
+        self.assertEqual(
+            createpageMock.mock_calls,
+            [
+                call(
+                    self.git2sc,
+                    'parent_article',
+                    'article_id',
+                    None,
+                    fingerprint='fingerprint_parent_article.adoc',
+                ),
+                call(
+                    self.git2sc,
+                    'formation_guide',
+                    'article_id',
+                    'id_formation',
+                    fingerprint='fingerprint_formation_guide.adoc',
+                ),
+                call(
+                    self.git2sc,
+                    'child_child_doc',
+                    'article_id',
+                    'id_molecule',
+                    fingerprint='fingerprint_child_child_doc.adoc',
+                )
+            ]
+        )
+
+        # Assert that the homepage is created
+        self.assertEqual(
+            mainpageMock.assert_called_with(
+                self.git2sc,
+                'tests/data/repository_example',
+                'id_homepage',
+            ),
+            None,
+        )
+
+    @patch('git2sc.git2sc.Git2SC.create_page', autospec=True)
+    @patch('git2sc.git2sc.Git2SC._create_directory_readme', autospec=True)
+    @patch('git2sc.git2sc.Git2SC._process_mainpage', autospec=True)
+    @patch('git2sc.git2sc.Git2SC.import_file', autospec=True)
+    def test_can_full_upload_directory_hanging_from_parent_article(
+        self,
+        importfileMock,
+        mainpageMock,
+        readmeMock,
+        createpageMock,
+    ):
+        '''Test that we can upload the whole directory but hanging from an
+        confluence article'''
+
+        def create_side_effect(git2sc, directory_name, parent_id=None):
+            return 'id_{}'.format(os.path.basename(directory_name))
+
+        def import_side_effect(git2sc, file_name):
+            if 'unknown.file' in file_name:
+                raise UnknownExtension
+            return "article_id"
+
+        excluded_directories = [
+            '.git',
+            '.gitignore',
+            'excluded_dir',
+            'excluded_file.adoc',
+        ]
+        readmeMock.side_effect = create_side_effect
+        importfileMock.side_effect = import_side_effect
+        self.os.walk.side_effect = os.walk
+        self.os.path.basename.side_effect = os.path.basename
+        self.os.path.splitext.side_effect = os.path.splitext
+        self.os.path.dirname.side_effect = os.path.dirname
+        self.os.path.join.side_effect = os.path.join
+
+        self.git2sc.directory_full_upload(
+            'tests/data/repository_example',
+            excluded_directories,
+            'initial_parent_id',
+        )
+
+        # Assert that the directories are created
+        self.assertEqual(
+            readmeMock.mock_calls,
+            [
+                call(
+                    self.git2sc,
+                    'tests/data/repository_example',
+                    'initial_parent_id',
+                ),
+                call(
+                    self.git2sc,
+                    'tests/data/repository_example/formation',
+                    'id_repository_example'
+                ),
+                call(
+                    self.git2sc,
+                    'tests/data/repository_example/formation/aws',
+                    'id_formation',
+                ),
+                call(
+                    self.git2sc,
+                    'tests/data/repository_example/formation/ansible',
+                    'id_formation',
+                ),
+                call(
+                    self.git2sc,
+                    'tests/data/repository_example/formation/ansible/molecule',
+                    'id_ansible',
+                )
+            ]
+        )
+
+        # Assert that the files are created
+        self.assertEqual(
+            createpageMock.mock_calls,
+            [
+                call(
+                    self.git2sc,
+                    'parent_article',
+                    'article_id',
+                    'id_repository_example',
+                    fingerprint='fingerprint_parent_article.adoc',
+                ),
+                call(
+                    self.git2sc,
+                    'formation_guide',
+                    'article_id',
+                    'id_formation',
+                    fingerprint='fingerprint_formation_guide.adoc',
+                ),
+                call(
+                    self.git2sc,
+                    'child_child_doc',
+                    'article_id',
+                    'id_molecule',
+                    fingerprint='fingerprint_child_child_doc.adoc',
+                )
+            ]
+        )
+
+        # Assert that the homepage is not created
+        self.assertFalse(mainpageMock.called)
+
+    @patch('git2sc.git2sc.Git2SC.create_page', autospec=True)
+    @patch('git2sc.git2sc.Git2SC._create_directory_readme', autospec=True)
+    @patch('git2sc.git2sc.Git2SC._process_mainpage', autospec=True)
+    @patch('git2sc.git2sc.Git2SC.import_file', autospec=True)
+    def test_can_full_upload_directory_concurrently(
+        self,
+        importfileMock,
+        mainpageMock,
+        readmeMock,
+        createpageMock,
+    ):
+        '''Test that the concurrent upload creates the same pages as the
+        sequential one, with each page hanging from its directory page'''
+
+        def create_side_effect(git2sc, directory_name, parent_id=None):
+            return 'id_{}'.format(os.path.basename(directory_name))
+
+        def import_side_effect(git2sc, file_name):
+            if 'unknown.file' in file_name:
+                raise UnknownExtension
+            return "article_id"
+
+        excluded_directories = [
+            '.git',
+            '.gitignore',
+            'excluded_dir',
+            'excluded_file.adoc',
+        ]
+        readmeMock.side_effect = create_side_effect
+        importfileMock.side_effect = import_side_effect
+        self.os.walk.side_effect = os.walk
+        self.os.path.basename.side_effect = os.path.basename
+        self.os.path.splitext.side_effect = os.path.splitext
+        self.os.path.dirname.side_effect = os.path.dirname
+        self.os.path.join.side_effect = os.path.join
+
+        self.git2sc.directory_full_upload(
+            'tests/data/repository_example',
+            excluded_directories,
+            'initial_parent_id',
+            jobs=4,
+        )
+
+        self.assertEqual(
+            sorted(readmeMock.mock_calls),
+            sorted([
+                call(
+                    self.git2sc,
+                    'tests/data/repository_example',
+                    'initial_parent_id',
+                ),
+                call(
+                    self.git2sc,
+                    'tests/data/repository_example/formation',
+                    'id_repository_example'
+                ),
+                call(
+                    self.git2sc,
+                    'tests/data/repository_example/formation/aws',
+                    'id_formation',
+                ),
+                call(
+                    self.git2sc,
+                    'tests/data/repository_example/formation/ansible',
+                    'id_formation',
+                ),
+                call(
+                    self.git2sc,
+                    'tests/data/repository_example/formation/ansible/molecule',
+                    'id_ansible',
+                )
+            ])
+        )
+        self.assertEqual(
+            sorted(createpageMock.mock_calls),
+            sorted([
+                call(
+                    self.git2sc,
+                    'parent_article',
+                    'article_id',
+                    'id_repository_example',
+                    fingerprint='fingerprint_parent_article.adoc',
+                ),
+                call(
+                    self.git2sc,
+                    'formation_guide',
+                    'article_id',
+                    'id_formation',
+                    fingerprint='fingerprint_formation_guide.adoc',
+                ),
+                call(
+                    self.git2sc,
+                    'child_child_doc',
+                    'article_id',
+                    'id_molecule',
+                    fingerprint='fingerprint_child_child_doc.adoc',
+                )
+            ])
+        )
+        self.assertFalse(mainpageMock.called)
+
+    @patch('git2sc.git2sc.Git2SC.create_page', autospec=True)
+    @patch('git2sc.git2sc.Git2SC._create_directory_readme', autospec=True)
+    @patch('git2sc.git2sc.Git2SC.import_file', autospec=True)
+    def test_concurrent_full_upload_raises_task_errors(
+        self,
+        importfileMock,
+        readmeMock,
+        createpageMock,
+    ):
+        '''Test that an error creating a page stops the concurrent upload'''
+
+        readmeMock.side_effect = Exception('Error 400: Bad request')
+        self.os.walk.side_effect = os.walk
+        self.os.path.join.side_effect = os.path.join
+
+        with self.assertRaises(Exception):
+            self.git2sc.directory_full_upload(
+                'tests/data/repository_example',
+                ['.git'],
+                'initial_parent_id',
+                jobs=4,
+            )
+        self.assertFalse(createpageMock.called)
+
+    def test_can_get_id_of_article_by_name(self):
+        '''Test we can get the id of an article by the name, we'll use it in
+        the update directory method'''
+
+        self.git2sc.pages = {
+            '371111110': {
+                "id": "371111110",
+                "type": "page",
+                "status": "current",
+                "title": "this is not the article"
+            },
+            '372222220': {
+                "id": "372222220",
+                "type": "page",
+                "status": "current",
+                "title": "article title"
+            },
+        }
+        result = self.git2sc._get_article_id('article title')
+        self.assertEqual(result, '372222220')
+
+    def test_get_article_id_returns_none_if_not_exists(self):
+        '''Test get_article_id returns None if no one exist'''
+
+        self.git2sc.pages = {
+            '371111110': {
+                "id": "371111110",
+                "type": "page",
+                "status": "current",
+                "title": "this is not the article"
+            },
+            '372222220': {
+                "id": "372222220",
+                "type": "page",
+                "status": "current",
+                "title": "article title"
+            },
+        }
+        result = self.git2sc._get_article_id('Non existing title')
+        self.assertEqual(result, None)
+
+    @patch('git2sc.git2sc.Git2SC._get_article_id', autospec=True)
+    @patch('git2sc.git2sc.Git2SC.delete_page', autospec=True)
+    @patch('git2sc.git2sc.Git2SC.create_page', autospec=True)
+    @patch('git2sc.git2sc.Git2SC.update_page', autospec=True)
+    @patch('git2sc.git2sc.Git2SC.import_file', autospec=True)
+    @patch('git2sc.git2sc.Git2SC._update_directory_readme', autospec=True)
+    @patch('git2sc.git2sc.Git2SC._create_directory_readme', autospec=True)
+    @patch('git2sc.git2sc.Git2SC._process_mainpage', autospec=True)
+    def test_can_update_a_directory(
+        self,
+        process_mainpageMock,
+        createreadmeMock,
+        updatereadmeMock,
+        importfileMock,
+        updatepageMock,
+        createpageMock,
+        deletepageMock,
+        getarticleidMock,
+    ):
+        '''Test that we can update a whole directory. For this testcase we'll
+        assume that all the following directories were already uploaded
+
+        ├── formation
+        │   ├── ansible
+        │   │   ├── molecule
+        │   │   │   ├── child_child_doc.adoc
+        │   │   │   └── README.md
+        │   │   └── README.md
+        │   ├── aws
+        │   │   └── README.md
+        │   ├── formation_guide.adoc
+        │   └── README.md
+        ├── parent_article.adoc
+        └── README.md
+
+        Now we don't exclude the excluded_dir so we'll create the readme of that
+        directory and the excluded_file.adoc file
+        '''
+
+        def createreadme_side_effect(git2sc, directory_name, parent_id=None):
+            return 'id_{}'.format(os.path.basename(directory_name))
+
+        def createpage_side_effect(git2sc, 
+            directory_name,
+            html,
+            parent_id=None,
+            fingerprint=None,
+        ):
+            return 'id_{}'.format(os.path.basename(directory_name))
+
+        def import_side_effect(git2sc, file_name):
+            if 'unknown.file' in file_name:
+                raise UnknownExtension
+            return "{}.html".format(os.path.basename(file_name))
+        excluded_directories = ['.git', '.gitignore']
+        createreadmeMock.side_effect = createreadme_side_effect
+        createpageMock.side_effect = createpage_side_effect
+        importfileMock.side_effect = import_side_effect
+        self.os.walk.side_effect = os.walk
+        self.os.path.basename.side_effect = os.path.basename
+        self.os.path.splitext.side_effect = os.path.splitext
+        self.os.path.dirname.side_effect = os.path.dirname
+        self.os.path.join.side_effect = os.path.join
+
+        def get_article_id_side_effect(git2sc, title):
+            if not title == 'excluded_dir'\
+                    and not title == 'excluded_file':
+                return 'id_{}'.format(title)
+            return None
+        getarticleidMock.side_effect = get_article_id_side_effect
+
+        self.git2sc.pages = {
+            'id_page_to_delete': {
+                "id": "371111110",
+                "type": "page",
+                "status": "current",
+            },
+            'id_formation': {
+                "id": "372222220",
+                "type": "page",
+                "status": "current",
+            },
+        }
 
-    def test_request_error_do_nothing_if_rc_is_200(self):
-        '''Required to ensure that the _requests_error method does nothing
-        if the return code is 200'''
+        self.git2sc.get_space_homepage = Mock(return_value='id_homepage')
 
-        self.requests_error_patch.stop()
-        self.requests_object = Mock()
-        self.requests_object.status_code = 200
-        self.requests_object.text = json.dumps({
-            'statusCode': 200,
-            'message': 'Error message',
-        })
-        self.git2sc._requests_error(self.requests_object)
-        self.assertFalse(self.print.called)
-        self.requests_error_patch.start()
+        self.git2sc.directory_update(
+            'tests/data/repository_example',
+            excluded_directories,
+        )
 
-    @patch('git2sc.git2sc.Git2SC.create_page', autospect=True)
-    @patch('git2sc.git2sc.Git2SC._create_directory_readme', autospect=True)
-    @patch('git2sc.git2sc.Git2SC._process_mainpage', autospect=True)
-    @patch('git2sc.git2sc.Git2SC.import_file', autospect=True)
-    def test_can_full_upload_directory(
+        self.assertEqual(
+            process_mainpageMock.assert_called_with(
+                self.git2sc,
+                'tests/data/repository_example',
+                'id_homepage',
+                ),
+            None
+        )
+
+        # Assert that the directories are updated
+        self.assertEqual(
+            updatereadmeMock.mock_calls,
+            [
+                call(self.git2sc, 'tests/data/repository_example/formation'),
+                call(
+                    self.git2sc,
+                    'tests/data/repository_example/formation/aws',
+                ),
+                call(
+                    self.git2sc,
+                    'tests/data/repository_example/formation/ansible',
+                ),
+                call(
+                    self.git2sc,
+                    'tests/data/repository_example/formation/ansible/molecule',
+                ),
+            ]
+        )
+
+        # Assert that new directories are created
+        self.assertEqual(
+            createreadmeMock.mock_calls,
+            [
+                call(
+                    self.git2sc,
+                    'tests/data/repository_example/formation/excluded_dir',
+                    'id_formation',
+                ),
+            ]
+        )
+
+        # Assert that the existing articles are updated
+        self.assertEqual(
+            updatepageMock.mock_calls,
+            [
+                call(
+                    self.git2sc,
+                    'id_parent_article',
+                    'parent_article.adoc.html',
+                    fingerprint='fingerprint_parent_article.adoc',
+                ),
+                call(
+                    self.git2sc,
+                    'id_formation_guide',
+                    'formation_guide.adoc.html',
+                    fingerprint='fingerprint_formation_guide.adoc',
+                ),
+                call(
+                    self.git2sc,
+                    'id_child_child_doc',
+                    'child_child_doc.adoc.html',
+                    fingerprint='fingerprint_child_child_doc.adoc',
+                )
+            ]
+        )
+
+        # Assert that the new files are created
+        self.assertEqual(
+            createpageMock.mock_calls,
+            [
+                call(
+                    self.git2sc,
+                    'excluded_file',
+                    'excluded_file.adoc.html',
+                    'id_formation',
+                    fingerprint='fingerprint_excluded_file.adoc',
+                )
+            ]
+        )
+
+        # Assert that the deleted files are deleted
+        self.assertEqual(
+            deletepageMock.mock_calls,
+            [call(self.git2sc, 'id_page_to_delete')],
+        )
+
+    @patch('git2sc.git2sc.Git2SC.delete_page', autospec=True)
+    @patch('git2sc.git2sc.Git2SC.create_page', autospec=True)
+    @patch('git2sc.git2sc.Git2SC.update_page', autospec=True)
+    @patch('git2sc.git2sc.Git2SC.import_file', autospec=True)
+    @patch('git2sc.git2sc.Git2SC._update_directory_readme', autospec=True)
+    def test_update_directory_skips_unchanged_articles(
         self,
+        updatereadmeMock,
         importfileMock,
-        mainpageMock,
-        readmeMock,
+        updatepageMock,
         createpageMock,
+        deletepageMock,
     ):
-        '''Given a directory path test that git2sc crawls all the files and
-        uploads them to confluence.
+        '''Test that the articles whose stored fingerprint matches the one of
+        their source are not converted, updated nor deleted'''
 
-        The repository structure is under tests/data:
-        └── repository_example
-            ├── formation
-            │   ├── ansible
-            │   │   ├── molecule
-            │   │   │   ├── child_child_doc.adoc
-            │   │   │   └── README.md
-            │   │   └── README.md
-            │   ├── aws
-            │   │   └── README.md
-            │   ├── excluded_dir
-            │   │   └── excluded_file
-            │   ├── formation_guide.adoc
-            │   └── README.md
-            ├── parent_article.adoc
-            ├── README.md
-            └── unknown.file
+        self.os.walk.side_effect = os.walk
+        self.os.path.basename.side_effect = os.path.basename
+        self.os.path.splitext.side_effect = os.path.splitext
+        self.os.path.dirname.side_effect = os.path.dirname
+        self.os.path.join.side_effect = os.path.join
 
-        It should ignore the .git, .gitignore and excluded_dir directories as
-        they are in the excluded list
+        def page(title, fingerprint):
+            return {
+                'id': 'id_{}'.format(title),
+                'title': title,
+                'metadata': {
+                    'properties': {
+                        'git2sc': {'value': {'fingerprint': fingerprint}},
+                    },
+                },
+            }
+        self.git2sc.pages = {
+            'id_molecule': page('molecule', 'fingerprint_molecule'),
+            'id_child_child_doc': page(
+                'child_child_doc',
+                'fingerprint_child_child_doc.adoc',
+            ),
+        }
+
+        self.git2sc.directory_update(
+            'tests/data/repository_example/formation/ansible/molecule',
+            ['.git'],
+            'initial_parent_id',
+        )
+
+        self.assertFalse(importfileMock.called)
+        self.assertFalse(updatepageMock.called)
+        self.assertFalse(createpageMock.called)
+        self.assertFalse(deletepageMock.called)
+
+    @patch('git2sc.git2sc.Git2SC._get_article_id', autospec=True)
+    @patch('git2sc.git2sc.Git2SC.create_page', autospec=True)
+    @patch('git2sc.git2sc.Git2SC.update_page', autospec=True)
+    @patch('git2sc.git2sc.Git2SC.import_file', autospec=True)
+    @patch('git2sc.git2sc.Git2SC._create_directory_readme', autospec=True)
+    @patch('git2sc.git2sc.Git2SC._process_mainpage', autospec=True)
+    def test_can_update_a_directory_with_parent_id_and_not_existing_readme(
+        self,
+        process_mainpageMock,
+        createreadmeMock,
+        importfileMock,
+        updatepageMock,
+        createpageMock,
+        getarticleidMock,
+    ):
+        '''Test that we can update a whole directory hanging from a parent id.
+        For this testcase we assume that the README.md of the directory we
+        are trying to upload doesn't exist.
+
+        The tree to sync will be:
+        └── molecule
+            ├── child_child_doc.adoc
+            └── README.md
+
+        And we'll assume that child_child_doc.adoc is already uploaded
         '''
 
-        def create_side_effect(directory_name, parent_id=None):
+        def createreadme_side_effect(git2sc, directory_name, parent_id=None):
+            return 'id_{}'.format(os.path.basename(directory_name))
+
+        def createpage_side_effect(git2sc, 
+            directory_name,
+            html,
+            parent_id=None,
+            fingerprint=None,
+        ):
             return 'id_{}'.format(os.path.basename(directory_name))
 
-        def import_side_effect(file_name):
+        def import_side_effect(git2sc, file_name):
             if 'unknown.file' in file_name:
                 raise UnknownExtension
-            return "article_id"
+            return "{}.html".format(os.path.basename(file_name))
+        excluded_directories = ['.git', '.gitignore']
+        createreadmeMock.side_effect = createreadme_side_effect
+        createpageMock.side_effect = createpage_side_effect
+        importfileMock.side_effect = import_side_effect
+        self.os.walk.side_effect = os.walk
+        self.os.path.basename.side_effect = os.path.basename
+        self.os.path.splitext.side_effect = os.path.splitext
+        self.os.path.dirname.side_effect = os.path.dirname
+        self.os.path.join.side_effect = os.path.join
 
-        excluded_directories = [
-            '.git',
-            '.gitignore',
-            'excluded_dir',
-            'excluded_file.adoc',
-        ]
-        readmeMock.side_effect = create_side_effect
+        def get_article_id_side_effect(git2sc, title):
+            if not title == 'molecule':
+                return 'id_{}'.format(title)
+            return None
+        getarticleidMock.side_effect = get_article_id_side_effect
+
+        self.git2sc.directory_update(
+            'tests/data/repository_example/formation/ansible/molecule',
+            excluded_directories,
+            'initial_parent_id',
+        )
+
+        # Assert that the homepage is not created
+        self.assertFalse(process_mainpageMock.called)
+
+        # Assert that new directories are created
+        self.assertEqual(
+            createreadmeMock.mock_calls,
+            [
+                call(
+                    self.git2sc,
+                    'tests/data/repository_example/formation/ansible/molecule',
+                    'initial_parent_id',
+                ),
+            ]
+        )
+
+        # Assert that the existing articles are updated
+        self.assertEqual(
+            updatepageMock.mock_calls,
+            [
+                call(
+                    self.git2sc,
+                    'id_child_child_doc',
+                    'child_child_doc.adoc.html',
+                    fingerprint='fingerprint_child_child_doc.adoc',
+                )
+            ]
+        )
+
+    @patch('git2sc.git2sc.Git2SC._get_article_id', autospec=True)
+    @patch('git2sc.git2sc.Git2SC.create_page', autospec=True)
+    @patch('git2sc.git2sc.Git2SC.update_page', autospec=True)
+    @patch('git2sc.git2sc.Git2SC.import_file', autospec=True)
+    @patch('git2sc.git2sc.Git2SC._update_directory_readme', autospec=True)
+    @patch('git2sc.git2sc.Git2SC._process_mainpage', autospec=True)
+    def test_can_update_a_directory_with_parent_id_and_existing_readme(
+        self,
+        process_mainpageMock,
+        updatereadmeMock,
+        importfileMock,
+        updatepageMock,
+        createpageMock,
+        getarticleidMock,
+    ):
+        '''Test that we can update a whole directory hanging from a parent id.
+        For this testcase we assume that the README.md of the directory we
+        are trying to upload already exist.
+
+        The tree to sync will be:
+        └── molecule
+            ├── child_child_doc.adoc
+            └── README.md
+
+        And we'll assume that child_child_doc.adoc is already uploaded
+        '''
+
+        def createpage_side_effect(git2sc, 
+            directory_name,
+            html,
+            parent_id=None,
+            fingerprint=None,
+        ):
+            return 'id_{}'.format(os.path.basename(directory_name))
+
+        def import_side_effect(git2sc, file_name):
+            if 'unknown.file' in file_name:
+                raise UnknownExtension
+            return "{}.html".format(os.path.basename(file_name))
+        excluded_directories = ['.git', '.gitignore']
+        createpageMock.side_effect = createpage_side_effect
         importfileMock.side_effect = import_side_effect
         self.os.walk.side_effect = os.walk
         self.os.path.basename.side_effect = os.path.basename
@@ -977,454 +2895,814 @@ class TestGit2SC(unittest.TestCase):
         self.os.path.dirname.side_effect = os.path.dirname
         self.os.path.join.side_effect = os.path.join
 
-        self.git2sc.directory_full_upload(
-            'tests/data/repository_example',
+        def get_article_id_side_effect(git2sc, title):
+            return 'id_{}'.format(title)
+        getarticleidMock.side_effect = get_article_id_side_effect
+
+        self.git2sc.directory_update(
+            'tests/data/repository_example/formation/ansible/molecule',
             excluded_directories,
+            'initial_parent_id',
         )
 
-        # Assert that the directories are created
+        # Assert that the homepage is not created
+        self.assertFalse(process_mainpageMock.called)
+
+        # Assert that new directories are created
         self.assertEqual(
-            readmeMock.mock_calls,
+            updatereadmeMock.mock_calls,
             [
-                call('tests/data/repository_example/formation', None),
-                call(
-                    'tests/data/repository_example/formation/aws',
-                    'id_formation',
-                ),
                 call(
-                    'tests/data/repository_example/formation/ansible',
-                    'id_formation',
+                    self.git2sc,
+                    'tests/data/repository_example/formation/ansible/molecule',
                 ),
+            ]
+        )
+
+        # Assert that the existing articles are updated
+        self.assertEqual(
+            updatepageMock.mock_calls,
+            [
                 call(
-                    'tests/data/repository_example/formation/ansible/molecule',
-                    'id_ansible',
+                    self.git2sc,
+                    'id_child_child_doc',
+                    'child_child_doc.adoc.html',
+                    fingerprint='fingerprint_child_child_doc.adoc',
                 )
             ]
         )
 
+    @patch('git2sc.git2sc.subprocess', autospec=True)
+    def test_can_tell_if_a_commit_is_checked_out(self, subprocessMock):
+        '''Required to sync the webhooks only once the pushed commit is in
+        the working tree'''
+
+        subprocessMock.call.return_value = 0
+        self.assertTrue(self.git2sc.contains_commit('/repo', 'abc1234'))
         self.assertEqual(
-            createpageMock.mock_calls,
+            subprocessMock.call.assert_called_with(
+                [
+                    'git',
+                    '-C',
+                    '/repo',
+                    'merge-base',
+                    '--is-ancestor',
+                    'abc1234',
+                    'HEAD',
+                ],
+                stdout=subprocessMock.DEVNULL,
+                stderr=subprocessMock.DEVNULL,
+            ),
+            None,
+        )
+
+        subprocessMock.call.return_value = 1
+        self.assertFalse(self.git2sc.contains_commit('/repo', 'abc1234'))
+
+    @patch('git2sc.git2sc.subprocess', autospec=True)
+    def test_can_get_changed_files_from_git(self, subprocessMock):
+        '''Test that the output of git diff is parsed into deleted and
+        changed files, renames being a deletion and an addition'''
+
+        subprocessMock.check_output.return_value = (
+            'M\0formation/formation_guide.adoc\0'
+            'A\0introducción.md\0'
+            'D\0old_article.md\0'
+            'R087\0formation/aws/README.md\0formation/gcp/README.md\0'
+        ).encode()
+
+        deleted, changed = self.git2sc.get_changed_files('/repo', 'abc')
+
+        self.assertEqual(
+            subprocessMock.check_output.assert_called_with(
+                [
+                    'git',
+                    '-C',
+                    '/repo',
+                    'diff',
+                    '-z',
+                    '--name-status',
+                    '-M',
+                    '--relative',
+                    'abc',
+                    'HEAD',
+                ],
+                shell=False,
+            ),
+            None,
+        )
+        self.assertEqual(
+            deleted,
+            ['old_article.md', 'formation/aws/README.md'],
+        )
+        self.assertEqual(
+            changed,
             [
-                call('parent_article', 'article_id', None),
-                call('formation_guide', 'article_id', 'id_formation'),
-                call('child_child_doc', 'article_id', 'id_molecule')
-            ]
+                'formation/formation_guide.adoc',
+                'introducción.md',
+                'formation/gcp/README.md',
+            ],
+        )
+
+    @patch('git2sc.git2sc.Git2SC.contains_commit', autospec=True)
+    @patch('git2sc.git2sc.Git2SC.set_synced_commit', autospec=True)
+    @patch('git2sc.git2sc.Git2SC.get_head_commit', autospec=True)
+    @patch('git2sc.git2sc.Git2SC.get_changed_files', autospec=True)
+    @patch('git2sc.git2sc.Git2SC._sync_deleted_file', autospec=True)
+    @patch('git2sc.git2sc.Git2SC._sync_changed_file', autospec=True)
+    @patch('git2sc.git2sc.Git2SC.get_space_homepage', autospec=True)
+    def test_incremental_update_syncs_changes_since_last_commit(
+        self,
+        gethomepageMock,
+        syncchangedMock,
+        syncdeletedMock,
+        getchangedMock,
+        getheadMock,
+        setsyncedMock,
+        containscommitMock,
+    ):
+        '''Test that the incremental update only syncs the files changed since
+        the commit stored in the root page, skipping the excluded ones, and
+        stores the new synced commit'''
+
+        self.os.path.normpath.side_effect = os.path.normpath
+        self.os.path.join.side_effect = os.path.join
+        gethomepageMock.return_value = 'id_home'
+        getheadMock.return_value = 'new_commit'
+        containscommitMock.return_value = True
+        getchangedMock.return_value = (
+            ['old_article.md', 'excluded_dir/article.md'],
+            ['new_article.md'],
+        )
+        self.git2sc.pages = {
+            'id_home': {
+                'metadata': {
+                    'properties': {
+                        'git2sc': {'value': {'commit': 'old_commit'}},
+                    },
+                },
+            },
+        }
+
+        self.git2sc.directory_incremental_update(
+            '/repo',
+            ['.git', 'excluded_dir'],
         )
 
-        # Assert that the homepage is created
         self.assertEqual(
-            mainpageMock.assert_called_with('tests/data/repository_example'),
+            getchangedMock.assert_called_with(
+                self.git2sc,
+                '/repo',
+                'old_commit',
+            ),
+            None,
+        )
+        self.assertEqual(
+            syncdeletedMock.mock_calls,
+            [call(self.git2sc, '/repo', '/repo/old_article.md', None)],
+        )
+        self.assertEqual(
+            syncchangedMock.mock_calls,
+            [call(self.git2sc, '/repo', '/repo/new_article.md', None)],
+        )
+        self.assertEqual(
+            setsyncedMock.assert_called_with(
+                self.git2sc,
+                'id_home',
+                'new_commit',
+            ),
+            None,
+        )
+        self.assertEqual(
+            containscommitMock.assert_called_with(
+                self.git2sc,
+                '/repo',
+                'old_commit',
+            ),
             None,
         )
 
-    @patch('git2sc.git2sc.Git2SC.create_page', autospect=True)
-    @patch('git2sc.git2sc.Git2SC._create_directory_readme', autospect=True)
-    @patch('git2sc.git2sc.Git2SC._process_mainpage', autospect=True)
-    @patch('git2sc.git2sc.Git2SC.import_file', autospect=True)
-    def test_can_full_upload_directory_hanging_from_parent_article(
+    @patch('git2sc.git2sc.Git2SC.set_synced_commit', autospec=True)
+    @patch('git2sc.git2sc.Git2SC.get_head_commit', autospec=True)
+    @patch('git2sc.git2sc.Git2SC.directory_update', autospec=True)
+    @patch('git2sc.git2sc.Git2SC._get_article_id', autospec=True)
+    def test_incremental_update_falls_back_to_full_update(
         self,
-        importfileMock,
-        mainpageMock,
-        readmeMock,
-        createpageMock,
+        getarticleidMock,
+        directoryupdateMock,
+        getheadMock,
+        setsyncedMock,
     ):
-        '''Test that we can upload the whole directory but hanging from an
-        confluence article'''
+        '''Test that the incremental update does a full update with its
+        workers and limit of deletions if there is no synced commit, and
+        stores HEAD afterwards'''
 
-        def create_side_effect(directory_name, parent_id=None):
-            return 'id_{}'.format(os.path.basename(directory_name))
+        self.os.path.normpath.side_effect = os.path.normpath
+        self.os.path.basename.side_effect = os.path.basename
+        getarticleidMock.side_effect = [None, 'id_repo']
+        getheadMock.return_value = 'new_commit'
 
-        def import_side_effect(file_name):
-            if 'unknown.file' in file_name:
-                raise UnknownExtension
-            return "article_id"
+        self.git2sc.directory_incremental_update(
+            '/repo',
+            ['.git'],
+            'initial_parent_id',
+            jobs=4,
+            max_deletes=5,
+        )
+
+        self.assertEqual(
+            directoryupdateMock.assert_called_with(
+                self.git2sc,
+                '/repo',
+                ['.git'],
+                'initial_parent_id',
+                4,
+                5,
+            ),
+            None,
+        )
+        self.assertEqual(
+            setsyncedMock.assert_called_with(
+                self.git2sc,
+                'id_repo',
+                'new_commit',
+            ),
+            None,
+        )
+
+    @patch('git2sc.git2sc.Git2SC.import_file', autospec=True)
+    @patch('git2sc.git2sc.Git2SC.create_page', autospec=True)
+    @patch('git2sc.git2sc.Git2SC._create_directory_readme', autospec=True)
+    def test_sync_changed_file_creates_missing_directories(
+        self,
+        createreadmeMock,
+        createpageMock,
+        importfileMock,
+    ):
+        '''Test that a new file in a new directory creates the pages of the
+        missing directories before its own page'''
 
-        excluded_directories = [
-            '.git',
-            '.gitignore',
-            'excluded_dir',
-            'excluded_file.adoc',
-        ]
-        readmeMock.side_effect = create_side_effect
-        importfileMock.side_effect = import_side_effect
-        self.os.walk.side_effect = os.walk
         self.os.path.basename.side_effect = os.path.basename
         self.os.path.splitext.side_effect = os.path.splitext
         self.os.path.dirname.side_effect = os.path.dirname
-        self.os.path.join.side_effect = os.path.join
+        self.git2sc.pages = {'id_a': {'id': 'id_a', 'title': 'a'}}
+        createreadmeMock.return_value = 'id_b'
 
-        self.git2sc.directory_full_upload(
-            'tests/data/repository_example',
-            excluded_directories,
-            'initial_parent_id',
+        self.git2sc._sync_changed_file('/repo', '/repo/a/b/new.md')
+
+        self.assertEqual(
+            createreadmeMock.assert_called_with(
+                self.git2sc,
+                '/repo/a/b',
+                'id_a',
+            ),
+            None,
+        )
+        self.assertEqual(
+            createpageMock.assert_called_with(
+                self.git2sc,
+                'new',
+                importfileMock.return_value,
+                'id_b',
+                fingerprint='fingerprint_new.md',
+            ),
+            None,
         )
 
-        # Assert that the directories are created
+    @patch('git2sc.git2sc.Git2SC.delete_page', autospec=True)
+    def test_sync_deleted_file_deletes_removed_directories(
+        self,
+        deletepageMock,
+    ):
+        '''Test that deleting the last file of a directory deletes its page
+        and the pages of the parent directories that no longer exist'''
+
+        self.os.path.basename.side_effect = os.path.basename
+        self.os.path.splitext.side_effect = os.path.splitext
+        self.os.path.dirname.side_effect = os.path.dirname
+        self.os.path.isdir.side_effect = lambda path: path == '/repo/a'
+        self.git2sc.pages = {
+            'id_a': {'id': 'id_a', 'title': 'a'},
+            'id_b': {'id': 'id_b', 'title': 'b'},
+            'id_c': {'id': 'id_c', 'title': 'c'},
+            'id_old': {'id': 'id_old', 'title': 'old'},
+        }
+
+        self.git2sc._sync_deleted_file('/repo', '/repo/a/b/c/old.md')
+
         self.assertEqual(
-            readmeMock.mock_calls,
+            deletepageMock.mock_calls,
             [
-                call('tests/data/repository_example', 'initial_parent_id'),
-                call(
-                    'tests/data/repository_example/formation',
-                    'id_repository_example'
-                ),
-                call(
-                    'tests/data/repository_example/formation/aws',
-                    'id_formation',
-                ),
-                call(
-                    'tests/data/repository_example/formation/ansible',
-                    'id_formation',
-                ),
-                call(
-                    'tests/data/repository_example/formation/ansible/molecule',
-                    'id_ansible',
-                )
-            ]
+                call(self.git2sc, 'id_old'),
+                call(self.git2sc, 'id_c'),
+                call(self.git2sc, 'id_b'),
+            ],
         )
 
-        # Assert that the files are created
+    @patch('git2sc.git2sc.Git2SC._sync_changed_file', autospec=True)
+    @patch('git2sc.git2sc.Git2SC._sync_deleted_file', autospec=True)
+    def test_sync_watched_changes_pushes_the_documents(
+        self,
+        syncdeletedMock,
+        syncchangedMock,
+    ):
+        '''Test that the deleted and changed documents of a batch are
+        synced, and the other files and the removed ones are skipped'''
+
+        self.os.path.splitext.side_effect = os.path.splitext
+        self.os.path.isfile.side_effect = lambda path: path != '/repo/gone.md'
+        changes = Changes()
+        for path in ['/repo/b.md', '/repo/a.adoc', '/repo/b.md~',
+                     '/repo/.a.md.swp', '/repo/gone.md']:
+            changes.change(path)
+        changes.delete('/repo/old.html')
+        changes.delete('/repo/old.tmp')
+
+        self.git2sc._sync_watched_changes('/repo', ['.git'], changes)
+
         self.assertEqual(
-            createpageMock.mock_calls,
+            syncdeletedMock.mock_calls,
+            [call(self.git2sc, '/repo', '/repo/old.html', None)],
+        )
+        self.assertEqual(
+            syncchangedMock.mock_calls,
             [
-                call('parent_article', 'article_id', 'id_repository_example'),
-                call('formation_guide', 'article_id', 'id_formation'),
-                call('child_child_doc', 'article_id', 'id_molecule')
-            ]
+                call(self.git2sc, '/repo', '/repo/a.adoc', None),
+                call(self.git2sc, '/repo', '/repo/b.md', None),
+            ],
         )
 
-        # Assert that the homepage is not created
-        self.assertFalse(mainpageMock.called)
-
-    def test_can_get_id_of_article_by_name(self):
-        '''Test we can get the id of an article by the name, we'll use it in
-        the update directory method'''
+    @patch('git2sc.git2sc.Git2SC._sync_changed_file', autospec=True)
+    def test_sync_watched_changes_survives_the_errors(self, syncchangedMock):
+        '''Test that an error syncing a file is printed and the rest of the
+        batch is synced'''
 
-        self.git2sc.pages = {
-            '371111110': {
-                "id": "371111110",
-                "type": "page",
-                "status": "current",
-                "title": "this is not the article"
-            },
-            '372222220': {
-                "id": "372222220",
-                "type": "page",
-                "status": "current",
-                "title": "article title"
-            },
-        }
-        result = self.git2sc._get_article_id('article title')
-        self.assertEqual(result, '372222220')
+        self.os.path.splitext.side_effect = os.path.splitext
+        syncchangedMock.side_effect = [Exception('Conflict'), None]
+        changes = Changes()
+        changes.change('/repo/a.md')
+        changes.change('/repo/b.md')
 
-    def test_get_article_id_returns_none_if_not_exists(self):
-        '''Test get_article_id returns None if no one exist'''
+        self.git2sc._sync_watched_changes('/repo', [], changes)
 
-        self.git2sc.pages = {
-            '371111110': {
-                "id": "371111110",
-                "type": "page",
-                "status": "current",
-                "title": "this is not the article"
-            },
-            '372222220': {
-                "id": "372222220",
-                "type": "page",
-                "status": "current",
-                "title": "article title"
-            },
-        }
-        result = self.git2sc._get_article_id('Non existing title')
-        self.assertEqual(result, None)
+        self.assertEqual(syncchangedMock.call_count, 2)
+        self.assertEqual(
+            self.print.assert_called_with(
+                'Error syncing /repo/a.md: Conflict'
+            ),
+            None,
+        )
 
-    @patch('git2sc.git2sc.Git2SC._get_article_id', autospect=True)
-    @patch('git2sc.git2sc.Git2SC.delete_page', autospect=True)
-    @patch('git2sc.git2sc.Git2SC.create_page', autospect=True)
-    @patch('git2sc.git2sc.Git2SC.update_page', autospect=True)
-    @patch('git2sc.git2sc.Git2SC.import_file', autospect=True)
-    @patch('git2sc.git2sc.Git2SC._update_directory_readme', autospect=True)
-    @patch('git2sc.git2sc.Git2SC._create_directory_readme', autospect=True)
-    @patch('git2sc.git2sc.Git2SC._process_mainpage', autospect=True)
-    def test_can_update_a_directory(
+    @patch('git2sc.git2sc.Git2SC.directory_update', autospec=True)
+    def test_sync_watched_changes_overflow_syncs_everything(
         self,
-        process_mainpageMock,
-        createreadmeMock,
-        updatereadmeMock,
-        importfileMock,
-        updatepageMock,
-        createpageMock,
-        deletepageMock,
-        getarticleidMock,
+        directoryupdateMock,
     ):
-        '''Test that we can update a whole directory. For this testcase we'll
-        assume that all the following directories were already uploaded
+        '''Test that the whole directory is synced when the watcher lost
+        events'''
 
-        ├── formation
-        │   ├── ansible
-        │   │   ├── molecule
-        │   │   │   ├── child_child_doc.adoc
-        │   │   │   └── README.md
-        │   │   └── README.md
-        │   ├── aws
-        │   │   └── README.md
-        │   ├── formation_guide.adoc
-        │   └── README.md
-        ├── parent_article.adoc
-        └── README.md
+        changes = Changes()
+        changes.overflow = True
 
-        Now we don't exclude the excluded_dir so we'll create the readme of that
-        directory and the excluded_file.adoc file
-        '''
+        self.git2sc._sync_watched_changes('/repo', ['.git'], changes, jobs=4)
+
+        self.assertEqual(
+            directoryupdateMock.assert_called_with(
+                self.git2sc, '/repo', ['.git'], None, 4, None,
+            ),
+            None,
+        )
+
+    @patch('git2sc.git2sc.Git2SC._sync_watched_changes', autospec=True)
+    @patch('git2sc.git2sc.Git2SC.directory_update', autospec=True)
+    def test_directory_watch_syncs_until_stopped(
+        self,
+        directoryupdateMock,
+        syncwatchedMock,
+    ):
+        '''Test that the watch starts watching before the first sync and
+        pushes the batches of changes until it's stopped'''
+
+        self.os.path.normpath.side_effect = os.path.normpath
+        stop = Mock()
+        stop.is_set.side_effect = [False, False, True]
+        watcher = Mock()
+        changes = Changes()
+        changes.change('/repo/a.md')
+        watcher.wait.side_effect = [Changes(), changes]
+
+        self.git2sc.directory_watch(
+            '/repo/',
+            ['.git'],
+            debounce=1,
+            max_delay=5,
+            stop=stop,
+            watcher=watcher,
+        )
 
-        def createreadme_side_effect(directory_name, parent_id=None):
-            return 'id_{}'.format(os.path.basename(directory_name))
+        self.assertEqual(
+            watcher.mock_calls[0:1] + watcher.mock_calls[-1:],
+            [call.start(), call.close()],
+        )
+        self.assertEqual(
+            directoryupdateMock.assert_called_once_with(
+                self.git2sc, '/repo', ['.git'], None, 1, None,
+            ),
+            None,
+        )
+        self.assertEqual(
+            watcher.wait.mock_calls,
+            [call(1, 5, stop), call(1, 5, stop)],
+        )
+        self.assertEqual(
+            syncwatchedMock.assert_called_once_with(
+                self.git2sc, '/repo', ['.git'], changes, None, 1, None,
+            ),
+            None,
+        )
 
-        def createpage_side_effect(directory_name, html, parent_id=None):
-            return 'id_{}'.format(os.path.basename(directory_name))
+    def test_lookup_article_id_uses_the_sync_state(self):
+        '''Test that the id of a path is resolved from the sync state, and
+        the page is known without fetching it'''
 
-        def import_side_effect(file_name):
-            if 'unknown.file' in file_name:
-                raise UnknownExtension
-            return "{}.html".format(os.path.basename(file_name))
-        excluded_directories = ['.git', '.gitignore']
-        createreadmeMock.side_effect = createreadme_side_effect
-        createpageMock.side_effect = createpage_side_effect
-        importfileMock.side_effect = import_side_effect
-        self.os.walk.side_effect = os.walk
+        self.os.path.relpath.side_effect = os.path.relpath
         self.os.path.basename.side_effect = os.path.basename
-        self.os.path.splitext.side_effect = os.path.splitext
-        self.os.path.dirname.side_effect = os.path.dirname
-        self.os.path.join.side_effect = os.path.join
-
-        def get_article_id_side_effect(title):
-            if not title == 'excluded_dir'\
-                    and not title == 'excluded_file':
-                return 'id_{}'.format(title)
-            return None
-        getarticleidMock.side_effect = get_article_id_side_effect
-
-        self.git2sc.pages = {
-            'id_page_to_delete': {
-                "id": "371111110",
-                "type": "page",
-                "status": "current",
-            },
-            'id_formation': {
-                "id": "372222220",
-                "type": "page",
-                "status": "current",
-            },
+        self.git2sc.state = Mock()
+        self.git2sc.state.get.return_value = {
+            'page_id': '1',
+            'parent_id': '2',
+            'version': 3,
+            'source_hash': 'source',
+            'html_hash': 'html',
+            'title': 'article',
         }
+        self.git2sc._sync_root = '/repo'
 
-        self.git2sc.directory_update(
-            'tests/data/repository_example',
-            excluded_directories,
-        )
+        result = self.git2sc._lookup_article_id('/repo/a/article.md', 'other')
 
+        self.assertEqual(result, '1')
         self.assertEqual(
-            process_mainpageMock.assert_called_with(
-                'tests/data/repository_example'
-                ),
-            None
+            self.git2sc.state.get.assert_called_with('a/article.md'),
+            None,
         )
-
-        # Assert that the directories are updated
         self.assertEqual(
-            updatereadmeMock.mock_calls,
-            [
-                call('tests/data/repository_example/formation'),
-                call('tests/data/repository_example/formation/aws'),
-                call('tests/data/repository_example/formation/ansible'),
-                call(
-                    'tests/data/repository_example/formation/ansible/molecule',
-                ),
-            ]
+            self.git2sc.pages['1'],
+            {
+                'id': '1',
+                'title': 'article',
+                'version': {'number': 3},
+                'ancestors': [{'id': '2'}],
+                '_expandable': {'metadata': ''},
+            }
         )
 
-        # Assert that new directories are created
+    def test_state_pages_without_title_are_not_assumed(self):
+        '''Required to never rename a page with a title guessed from its
+        path'''
+
+        self.os.path.relpath.side_effect = os.path.relpath
+        self.git2sc.state = Mock()
+        self.git2sc.state.get.return_value = {
+            'page_id': '1',
+            'parent_id': None,
+            'version': 3,
+            'source_hash': 'source',
+            'html_hash': 'html',
+            'title': None,
+        }
+        self.git2sc._sync_root = '/repo'
+
+        self.assertEqual(self.git2sc._get_state_page_id('/repo'), '1')
+        self.assertEqual(self.git2sc.pages, {})
+
+    @patch('git2sc.git2sc.Git2SC._get_article_id', autospec=True)
+    def test_lookup_article_id_falls_back_to_title(self, getarticleidMock):
+        '''Test that the paths unknown to the sync state are resolved by
+        their title'''
+
+        self.os.path.relpath.side_effect = os.path.relpath
+        self.git2sc.state = Mock()
+        self.git2sc.state.get.return_value = None
+        self.git2sc._sync_root = '/repo'
+
+        result = self.git2sc._lookup_article_id('/repo/article.md', 'article')
+
+        self.assertEqual(result, getarticleidMock.return_value)
         self.assertEqual(
-            createreadmeMock.mock_calls,
-            [
-                call(
-                    'tests/data/repository_example/formation/excluded_dir',
-                    'id_formation',
-                ),
-            ]
+            getarticleidMock.assert_called_with(self.git2sc, 'article'),
+            None,
         )
 
-        # Assert that the existing articles are updated
+    def test_record_path_stores_the_page_in_the_sync_state(self):
+        '''Test that the pushed pages are stored in the sync state with the
+        information of the pages attribute'''
+
+        self.os.path.relpath.side_effect = os.path.relpath
+        self.git2sc.state = Mock()
+        self.git2sc._sync_root = '/repo'
+        self.git2sc.pages = {
+            '1': {
+                'id': '1',
+                'title': 'article',
+                'version': {'number': 4},
+                'ancestors': [{'id': '3'}, {'id': '2'}],
+            },
+        }
+
+        self.git2sc._record_path('/repo/article.md', '1', 'source', '<p></p>')
+
         self.assertEqual(
-            updatepageMock.mock_calls,
-            [
-                call('id_parent_article', 'parent_article.adoc.html'),
-                call('id_formation_guide', 'formation_guide.adoc.html'),
-                call('id_child_child_doc', 'child_child_doc.adoc.html')
-            ]
+            self.git2sc.state.set.assert_called_with(
+                'article.md',
+                '1',
+                version=4,
+                parent_id='2',
+                title='article',
+                source_hash='source',
+                html_hash=hashlib.sha256(b'<p></p>').hexdigest(),
+            ),
+            None,
         )
 
-        # Assert that the new files are created
-        self.assertEqual(
-            createpageMock.mock_calls,
-            [call('excluded_file', 'excluded_file.adoc.html', 'id_formation')]
+    def test_page_is_current_uses_the_sync_state(self):
+        '''Test that the source hash of the sync state is used to skip the
+        unchanged pages'''
+
+        self.os.path.relpath.side_effect = os.path.relpath
+        self.git2sc.state = Mock()
+        self.git2sc.state.get.return_value = {
+            'page_id': '1',
+            'source_hash': 'source',
+        }
+        self.git2sc._sync_root = '/repo'
+
+        self.assertTrue(
+            self.git2sc._page_is_current('1', 'source', '/repo/article.md')
+        )
+        self.assertFalse(
+            self.git2sc._page_is_current('1', 'changed', '/repo/article.md')
         )
 
-        # Assert that the deleted files are deleted
+    def test_delete_page_removes_it_from_the_sync_state(self):
+        '''Test that the deleted pages are forgotten'''
+
+        self.git2sc.state = Mock()
+        self.session.request.return_value.status_code = 204
+
+        self.git2sc.delete_page('1')
+
         self.assertEqual(
-            deletepageMock.mock_calls,
-            [call('id_page_to_delete')],
+            self.git2sc.state.remove_page.assert_called_with('1'),
+            None,
         )
 
-    @patch('git2sc.git2sc.Git2SC._get_article_id', autospect=True)
-    @patch('git2sc.git2sc.Git2SC.create_page', autospect=True)
-    @patch('git2sc.git2sc.Git2SC.update_page', autospect=True)
-    @patch('git2sc.git2sc.Git2SC.import_file', autospect=True)
-    @patch('git2sc.git2sc.Git2SC._create_directory_readme', autospect=True)
-    @patch('git2sc.git2sc.Git2SC._process_mainpage', autospect=True)
-    def test_can_update_a_directory_with_parent_id_and_not_existing_readme(
+    @patch('git2sc.git2sc.Git2SC.delete_page', autospec=True)
+    @patch('git2sc.git2sc.Git2SC.update_page', autospec=True)
+    @patch('git2sc.git2sc.Git2SC.import_file', autospec=True)
+    @patch('git2sc.git2sc.Git2SC._update_directory_readme', autospec=True)
+    @patch('git2sc.git2sc.Git2SC._get_article_id', autospec=True)
+    def test_update_directory_only_deletes_pages_of_the_sync_state(
         self,
-        process_mainpageMock,
-        createreadmeMock,
+        getarticleidMock,
+        updatereadmeMock,
         importfileMock,
         updatepageMock,
-        createpageMock,
-        getarticleidMock,
+        deletepageMock,
     ):
-        '''Test that we can update a whole directory hanging from a parent id.
-        For this testcase we assume that the README.md of the directory we
-        are trying to upload doesn't exist.
-
-        The tree to sync will be:
-        └── molecule
-            ├── child_child_doc.adoc
-            └── README.md
-
-        And we'll assume that child_child_doc.adoc is already uploaded
-        '''
-
-        def createreadme_side_effect(directory_name, parent_id=None):
-            return 'id_{}'.format(os.path.basename(directory_name))
+        '''Test that with a sync state, only the pages pushed from paths that
+        no longer exist are deleted'''
 
-        def createpage_side_effect(directory_name, html, parent_id=None):
-            return 'id_{}'.format(os.path.basename(directory_name))
-
-        def import_side_effect(file_name):
-            if 'unknown.file' in file_name:
-                raise UnknownExtension
-            return "{}.html".format(os.path.basename(file_name))
-        excluded_directories = ['.git', '.gitignore']
-        createreadmeMock.side_effect = createreadme_side_effect
-        createpageMock.side_effect = createpage_side_effect
-        importfileMock.side_effect = import_side_effect
         self.os.walk.side_effect = os.walk
         self.os.path.basename.side_effect = os.path.basename
         self.os.path.splitext.side_effect = os.path.splitext
         self.os.path.dirname.side_effect = os.path.dirname
         self.os.path.join.side_effect = os.path.join
-
-        def get_article_id_side_effect(title):
-            if not title == 'molecule':
-                return 'id_{}'.format(title)
-            return None
-        getarticleidMock.side_effect = get_article_id_side_effect
+        self.os.path.relpath.side_effect = os.path.relpath
+        getarticleidMock.side_effect = lambda git2sc, title: 'id_{}'.format(
+            title,
+        )
+        importfileMock.return_value = '<p>html</p>'
+        self.git2sc.state = Mock()
+        self.git2sc.state.get.return_value = None
+        self.git2sc.state.entries.return_value = [
+            {
+                'path': 'child_child_doc.adoc',
+                'page_id': 'id_child_child_doc',
+                'parent_id': 'id_molecule',
+            },
+            {
+                'path': 'removed.adoc',
+                'page_id': 'id_removed',
+                'parent_id': 'id_molecule',
+            },
+        ]
+        self.git2sc.pages = {
+            'id_manual_page': {'id': 'id_manual_page', 'title': 'manual'},
+        }
 
         self.git2sc.directory_update(
             'tests/data/repository_example/formation/ansible/molecule',
-            excluded_directories,
+            ['.git'],
             'initial_parent_id',
         )
 
-        # Assert that the homepage is not created
-        self.assertFalse(process_mainpageMock.called)
-
-        # Assert that new directories are created
-        self.assertEqual(
-            createreadmeMock.mock_calls,
-            [
-                call(
-                    'tests/data/repository_example/formation/ansible/molecule',
-                    'initial_parent_id',
-                ),
-            ]
-        )
-
-        # Assert that the existing articles are updated
         self.assertEqual(
-            updatepageMock.mock_calls,
-            [
-                call('id_child_child_doc', 'child_child_doc.adoc.html')
-            ]
+            deletepageMock.mock_calls,
+            [call(self.git2sc, 'id_removed')],
         )
 
-    @patch('git2sc.git2sc.Git2SC._get_article_id', autospect=True)
-    @patch('git2sc.git2sc.Git2SC.create_page', autospect=True)
-    @patch('git2sc.git2sc.Git2SC.update_page', autospect=True)
-    @patch('git2sc.git2sc.Git2SC.import_file', autospect=True)
-    @patch('git2sc.git2sc.Git2SC._update_directory_readme', autospect=True)
-    @patch('git2sc.git2sc.Git2SC._process_mainpage', autospect=True)
-    def test_can_update_a_directory_with_parent_id_and_existing_readme(
+    @patch('git2sc.git2sc.Git2SC.get_space_homepage', autospec=True)
+    @patch('git2sc.git2sc.Git2SC.get_page_info', autospec=True)
+    @patch('git2sc.git2sc.Git2SC._get_article_id', autospec=True)
+    def test_plan_update_never_deletes_the_pages_the_tree_hangs_from(
         self,
-        process_mainpageMock,
-        updatereadmeMock,
-        importfileMock,
-        updatepageMock,
-        createpageMock,
         getarticleidMock,
+        getpageinfoMock,
+        getspacehomepageMock,
     ):
-        '''Test that we can update a whole directory hanging from a parent id.
-        For this testcase we assume that the README.md of the directory we
-        are trying to upload already exist.
-
-        The tree to sync will be:
-        └── molecule
-            ├── child_child_doc.adoc
-            └── README.md
-
-        And we'll assume that child_child_doc.adoc is already uploaded
-        '''
+        '''Required to keep the homepage, the parent page and its ancestors
+        even if a stale sync state says they were pushed from the tree'''
 
-        def createpage_side_effect(directory_name, html, parent_id=None):
-            return 'id_{}'.format(os.path.basename(directory_name))
-
-        def import_side_effect(file_name):
-            if 'unknown.file' in file_name:
-                raise UnknownExtension
-            return "{}.html".format(os.path.basename(file_name))
-        excluded_directories = ['.git', '.gitignore']
-        createpageMock.side_effect = createpage_side_effect
-        importfileMock.side_effect = import_side_effect
         self.os.walk.side_effect = os.walk
         self.os.path.basename.side_effect = os.path.basename
         self.os.path.splitext.side_effect = os.path.splitext
         self.os.path.dirname.side_effect = os.path.dirname
         self.os.path.join.side_effect = os.path.join
+        self.os.path.relpath.side_effect = os.path.relpath
+        getarticleidMock.side_effect = lambda git2sc, title: 'id_{}'.format(
+            title,
+        )
+        getpageinfoMock.return_value = {
+            'id': 'initial_parent_id',
+            'ancestors': [{'id': 'id_home'}, {'id': 'id_team'}],
+        }
+        getspacehomepageMock.return_value = 'id_home'
+        self.git2sc.state = Mock()
+        self.git2sc.state.get.return_value = None
+        self.git2sc.state.entries.return_value = [
+            {'path': path, 'page_id': page_id, 'parent_id': 'id_molecule'}
+            for path, page_id in [
+                ('removed.adoc', 'id_removed'),
+                ('old', 'initial_parent_id'),
+                ('older', 'id_team'),
+                ('oldest', 'id_home'),
+            ]
+        ]
 
-        def get_article_id_side_effect(title):
-            return 'id_{}'.format(title)
-        getarticleidMock.side_effect = get_article_id_side_effect
-
-        self.git2sc.directory_update(
+        plan = self.git2sc.plan_update(
             'tests/data/repository_example/formation/ansible/molecule',
-            excluded_directories,
+            ['.git'],
             'initial_parent_id',
         )
 
-        # Assert that the homepage is not created
-        self.assertFalse(process_mainpageMock.called)
+        self.assertEqual(
+            [action.page_id for action in plan.operations('delete')],
+            ['id_removed'],
+        )
+
+    @patch('git2sc.git2sc.Git2SC.get_page_info', autospec=True)
+    def test_update_page_retries_on_version_conflict(self, getPageInfoMock):
+        '''Test that a stale version is refreshed and the update retried'''
+
+        self.git2sc.pages = {
+            '1': {'title': 'Article', 'version': {'number': 1}, 'ancestors': []}
+        }
+        getPageInfoMock.return_value = {
+            'title': 'Article',
+            'version': {'number': 5},
+            'ancestors': [],
+        }
+        conflict = Mock()
+        conflict.status_code = 409
+        success = Mock()
+        success.status_code = 200
+        self.session.request.side_effect = [conflict, success]
+        self.json.dumps.side_effect = json.dumps
+
+        self.git2sc.update_page('1', '<p>html</p>')
 
-        # Assert that new directories are created
         self.assertEqual(
-            updatereadmeMock.mock_calls,
+            json.loads(self.session.request.call_args[1]['data'])['version'],
+            {'number': 6},
+        )
+        self.assertEqual(self.git2sc.pages['1']['version'], {'number': 6})
+
+    def test_get_attachment_names_follows_pagination(self):
+        '''Required to know every attachment a page already has'''
+
+        self.git2sc.page_size = 2
+        responses = []
+        for titles, links in [
+            (['a.png', 'b.png'], {'next': '/rest/api/content/1/child'}),
+            (['c.png'], {}),
+        ]:
+            response = Mock()
+            response.json.return_value = {
+                'results': [{'title': title} for title in titles],
+                'limit': 2,
+                '_links': links,
+            }
+            responses.append(response)
+        self.session.request.side_effect = responses
+
+        self.assertEqual(
+            self.git2sc.get_attachment_names('1'),
+            {'a.png', 'b.png', 'c.png'},
+        )
+        self.assertEqual(
+            self.session.request.mock_calls,
             [
                 call(
-                    'tests/data/repository_example/formation/ansible/molecule',
-                ),
+                    'GET',
+                    '{}/content/1/child/attachment?start={}&limit=2'.format(
+                        self.api_url,
+                        start,
+                    ),
+                    timeout=30,
+                )
+                for start in [0, 2]
             ]
         )
 
-        # Assert that the existing articles are updated
+    @patch('git2sc.git2sc.Git2SC._upload_attachment', autospec=True)
+    @patch('git2sc.git2sc.Git2SC.get_attachment_names', autospec=True)
+    def test_upload_attachments_skips_the_existing_ones(
+        self,
+        getattachmentnamesMock,
+        uploadattachmentMock,
+    ):
+        '''Required to never upload again the files a page already has'''
+
+        self.git2sc.attachments.sources = {
+            '0123456789abcdef-a.png': '/docs/a.png',
+            '0123456789abcdef-b.png': '/docs/b.png',
+        }
+        getattachmentnamesMock.return_value = {'0123456789abcdef-a.png'}
+
+        self.git2sc.upload_attachments(
+            '1',
+            '<ri:attachment ri:filename="0123456789abcdef-a.png" />'
+            '<ri:attachment ri:filename="0123456789abcdef-b.png" />',
+        )
+
         self.assertEqual(
-            updatepageMock.mock_calls,
-            [
-                call('id_child_child_doc', 'child_child_doc.adoc.html')
-            ]
+            uploadattachmentMock.mock_calls,
+            [call(self.git2sc, '1', '0123456789abcdef-b.png')],
+        )
+        self.assertEqual(
+            self.git2sc.metrics.attachments,
+            {'upload': 1, 'skip': 1},
+        )
+
+    @patch('git2sc.git2sc.Git2SC.get_attachment_names', autospec=True)
+    def test_upload_attachments_does_nothing_without_attachments(
+        self,
+        getattachmentnamesMock,
+    ):
+        self.git2sc.upload_attachments('1', '<p>html</p>')
+
+        self.assertFalse(getattachmentnamesMock.called)
+
+    @patch('git2sc.git2sc.Git2SC.set_page_fingerprint', autospec=True)
+    @patch('git2sc.git2sc.Git2SC.upload_attachments', autospec=True)
+    @patch('git2sc.git2sc.Git2SC._post_page', autospec=True)
+    def test_create_page_stores_the_fingerprint_after_the_attachments(
+        self,
+        postpageMock,
+        uploadattachmentsMock,
+        setpagefingerprintMock,
+    ):
+        '''Required to upload the attachments again in the next sync if they
+        fail'''
+
+        self.git2sc.pages = {}
+        self.git2sc.attachments.sources = {
+            '0123456789abcdef-a.png': '/docs/a.png',
+        }
+        postpageMock.return_value = '2'
+        html = '<ri:attachment ri:filename="0123456789abcdef-a.png" />'
+
+        self.git2sc.create_page('Article', html, '1', 'fingerprint')
+
+        self.assertEqual(
+            postpageMock.assert_called_with(
+                self.git2sc,
+                'Article',
+                html,
+                '1',
+                None,
+            ),
+            None,
+        )
+        self.assertEqual(
+            uploadattachmentsMock.assert_called_with(self.git2sc, '2', html),
+            None,
+        )
+        self.assertEqual(
+            setpagefingerprintMock.assert_called_with(
+                self.git2sc,
+                '2',
+                'fingerprint',
+            ),
+            None,
         )
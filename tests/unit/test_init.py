@@ -1,7 +1,10 @@
+import sys
+import subprocess
 import unittest
-from unittest.mock import patch, PropertyMock
+from unittest.mock import Mock, patch, call, PropertyMock, ANY
 
 from git2sc import main
+from git2sc.git2sc import TooManyDeletions
 
 
 class TestMain(unittest.TestCase):
@@ -16,16 +19,26 @@ class TestMain(unittest.TestCase):
         )
         type(self.os).environ = self.env
 
-        self.load_parser_patch = patch('git2sc.load_parser', autospect=True)
+        self.load_parser_patch = patch('git2sc.load_parser')
         self.load_parser = self.load_parser_patch.start()
         self.args = self.load_parser.return_value.parse_args.return_value
 
-        self.print_patch = patch('git2sc.print', autospect=True)
+        self.print_patch = patch('git2sc.print')
         self.print = self.print_patch.start()
 
         self.args.space = 'TST'
-        self.git2sc_patch = patch('git2sc.Git2SC', autospect=True)
+        self.args.state = None
+        self.args.cache_dir = None
+        self.args.plan = False
+        self.args.metrics = None
+        self.args.prometheus = None
+        self.args.trace = None
+        self.args.profile = None
+        self.git2sc_patch = patch('git2sc.git2sc.Git2SC', autospec=True)
         self.git2sc = self.git2sc_patch.start()
+        # The attributes set in the constructor aren't part of the spec
+        self.git2sc.return_value.metrics = Mock()
+        self.git2sc.return_value.transport = Mock()
 
     def tearDown(self):
         self.os_patch.stop()
@@ -91,6 +104,19 @@ class TestMain(unittest.TestCase):
                 'https://confluence.sucks.com/wiki/rest/api',
                 'user:password',
                 'TST',
+                pool_size=self.args.pool_size,
+                timeout=self.args.timeout,
+                keep_alive=self.args.keep_alive,
+                page_size=self.args.page_size,
+                fetch_concurrency=self.args.fetch_concurrency,
+                state=None,
+                max_retries=self.args.max_retries,
+                backoff=self.args.backoff,
+                adoc_workers=self.args.adoc_workers,
+                convert_workers=self.args.convert_workers,
+                upload_workers=self.args.upload_workers,
+                cache=None,
+                tracer=ANY,
             ),
             None,
         )
@@ -224,13 +250,15 @@ class TestMain(unittest.TestCase):
         self.args.path = '/path/to/directory'
         self.args.exclude = ['.git']
         self.args.parent_id = None
+        self.args.jobs = 4
 
         main()
         self.assertEqual(
             self.git2sc.return_value.directory_full_upload.assert_called_with(
                 self.args.path,
                 self.args.exclude,
-                None
+                None,
+                4,
             ),
             None
         )
@@ -242,12 +270,474 @@ class TestMain(unittest.TestCase):
         self.args.path = '/path/to/directory'
         self.args.exclude = ['.git']
         self.args.parent_id = None
+        self.args.since = None
+        self.args.incremental = False
 
         main()
         self.assertEqual(
             self.git2sc.return_value.directory_update.assert_called_with(
                 self.args.path,
                 self.args.exclude,
+                jobs=self.args.jobs,
+                max_deletes=self.args.max_deletes,
             ),
             None
         )
+
+    def test_sync_directory_subcommand_since_revision(self):
+        '''Required to ensure that the main program syncs only the changed
+        files when called with a revision'''
+        self.args.subcommand = 'sync'
+        self.args.path = '/path/to/directory'
+        self.args.exclude = ['.git']
+        self.args.since = 'HEAD~1'
+        self.args.incremental = False
+
+        main()
+        self.assertEqual(
+            self.git2sc.return_value.directory_incremental_update.
+            assert_called_with(
+                self.args.path,
+                self.args.exclude,
+                since='HEAD~1',
+                jobs=self.args.jobs,
+                max_deletes=self.args.max_deletes,
+            ),
+            None
+        )
+        self.assertFalse(self.git2sc.return_value.directory_update.called)
+
+    def test_sync_directory_subcommand_incremental(self):
+        '''Required to ensure that the main program syncs only the files
+        changed since the last synced commit'''
+        self.args.subcommand = 'sync'
+        self.args.path = '/path/to/directory'
+        self.args.exclude = ['.git']
+        self.args.since = None
+        self.args.incremental = True
+
+        main()
+        self.assertEqual(
+            self.git2sc.return_value.directory_incremental_update.
+            assert_called_with(
+                self.args.path,
+                self.args.exclude,
+                since=None,
+                jobs=self.args.jobs,
+                max_deletes=self.args.max_deletes,
+            ),
+            None
+        )
+
+    @patch('git2sc.state.SyncState', autospec=True)
+    def test_main_loads_sync_state(self, syncstateMock):
+        '''Required to ensure that the main program loads the sync state
+        database if it's configured'''
+
+        self.args.state = '/path/to/state.db'
+
+        main()
+        self.assertEqual(
+            syncstateMock.assert_called_with('/path/to/state.db', 'TST'),
+            None,
+        )
+        self.assertEqual(
+            self.git2sc.call_args[1]['state'],
+            syncstateMock.return_value,
+        )
+
+    def test_sync_prints_the_transport_summary(self):
+        '''Required to ensure that the main program reports the throughput of
+        the requests after a sync'''
+
+        self.args.subcommand = 'sync'
+        self.args.incremental = False
+        self.args.since = None
+        summary = self.git2sc.return_value.transport.stats.summary
+
+        main()
+        self.assertEqual(
+            self.print.assert_called_with(summary.return_value),
+            None,
+        )
+
+    def test_reports_go_to_stderr_with_metrics_on_stdout(self):
+        '''Required to keep the json of the metrics valid when they're
+        written to the standard output'''
+
+        self.args.subcommand = 'sync'
+        self.args.incremental = False
+        self.args.since = None
+        self.args.metrics = '-'
+        summary = self.git2sc.return_value.transport.stats.summary
+
+        main()
+        self.assertEqual(
+            self.print.assert_called_with(
+                summary.return_value,
+                file=sys.stderr,
+            ),
+            None,
+        )
+        self.assertEqual(
+            self.git2sc.return_value.metrics.write_json.assert_called_with(
+                '-',
+            ),
+            None,
+        )
+
+    @patch('git2sc.cache.RenderCache', autospec=True)
+    def test_main_loads_render_cache(self, cacheMock):
+        '''Required to ensure that the main program loads the rendered html
+        cache if it's configured'''
+
+        self.args.cache_dir = '/path/to/cache'
+        self.args.cache_size = 10
+
+        main()
+        self.assertEqual(
+            cacheMock.assert_called_with('/path/to/cache', 10 * 1024 * 1024),
+            None,
+        )
+        self.assertEqual(
+            self.git2sc.call_args[1]['cache'],
+            cacheMock.return_value,
+        )
+
+    def test_upload_plan_doesnt_upload(self):
+        '''Required to ensure that the main program only prints the plan of
+        the upload when called with --plan'''
+        self.args.subcommand = 'upload'
+        self.args.path = '/path/to/directory'
+        self.args.exclude = ['.git']
+        self.args.parent_id = None
+        self.args.plan = True
+
+        main()
+        plan = self.git2sc.return_value.plan_full_upload
+        self.assertEqual(
+            plan.assert_called_with(self.args.path, self.args.exclude, None),
+            None,
+        )
+        self.assertTrue(call(plan.return_value) in self.print.mock_calls)
+        self.assertFalse(
+            self.git2sc.return_value.directory_full_upload.called
+        )
+
+    def test_sync_plan_doesnt_sync(self):
+        '''Required to ensure that the main program only prints the plan of
+        the sync when called with --plan'''
+        self.args.subcommand = 'sync'
+        self.args.path = '/path/to/directory'
+        self.args.exclude = ['.git']
+        self.args.since = None
+        self.args.incremental = False
+        self.args.plan = True
+
+        main()
+        plan = self.git2sc.return_value.plan_update
+        self.assertEqual(
+            plan.assert_called_with(self.args.path, self.args.exclude),
+            None,
+        )
+        self.assertTrue(call(plan.return_value) in self.print.mock_calls)
+        self.assertFalse(self.git2sc.return_value.directory_update.called)
+
+    def test_sync_reports_too_many_deletions(self):
+        '''Required to ensure that the main program explains why the sync was
+        aborted'''
+        self.args.subcommand = 'sync'
+        self.args.since = None
+        self.args.incremental = False
+        error = TooManyDeletions(
+            'The sync would delete 3 pages and the limit is 1'
+        )
+        self.git2sc.return_value.directory_update.side_effect = error
+
+        with self.assertRaises(SystemExit) as context:
+            main()
+        self.assertEqual(context.exception.code, 1)
+        self.assertTrue(call(error) in self.print.mock_calls)
+
+    def test_incremental_sync_reports_too_many_deletions(self):
+        '''Required to ensure that the main program fails when the
+        incremental sync deletes too many pages'''
+        self.args.subcommand = 'sync'
+        self.args.since = 'HEAD~1'
+        self.args.incremental = False
+        self.args.max_deletes = 1
+        error = TooManyDeletions(
+            'The sync would delete 3 pages and the limit is 1'
+        )
+        incremental = self.git2sc.return_value.directory_incremental_update
+        incremental.side_effect = error
+
+        with self.assertRaises(SystemExit) as context:
+            main()
+        self.assertEqual(context.exception.code, 1)
+        self.assertTrue(call(error) in self.print.mock_calls)
+        self.assertEqual(incremental.call_args[1]['max_deletes'], 1)
+
+    def test_watch_subcommand(self):
+        '''Required to ensure that the main program keeps the directory
+        synced until it's interrupted'''
+        self.args.subcommand = 'watch'
+        self.args.path = '/path/to/directory'
+        self.args.exclude = ['.git']
+        self.args.debounce = 1
+        self.args.max_delay = 5
+        watch = self.git2sc.return_value.directory_watch
+        watch.side_effect = KeyboardInterrupt
+
+        main()
+        self.assertEqual(
+            watch.assert_called_with(
+                self.args.path,
+                self.args.exclude,
+                jobs=self.args.jobs,
+                max_deletes=self.args.max_deletes,
+                debounce=1,
+                max_delay=5,
+            ),
+            None
+        )
+        self.assertEqual(self.git2sc.return_value.close.called, True)
+
+    def test_watch_reports_too_many_deletions(self):
+        '''Required to ensure that the main program fails when the first
+        sync of the watch deletes too many pages'''
+        self.args.subcommand = 'watch'
+        error = TooManyDeletions(
+            'The sync would delete 3 pages and the limit is 1'
+        )
+        self.git2sc.return_value.directory_watch.side_effect = error
+
+        with self.assertRaises(SystemExit) as context:
+            main()
+        self.assertEqual(context.exception.code, 1)
+        self.assertTrue(call(error) in self.print.mock_calls)
+        self.assertEqual(self.git2sc.return_value.close.called, True)
+
+    @patch('git2sc.server.WebhookServer', autospec=True)
+    @patch('git2sc.server.SyncService', autospec=True)
+    def test_serve_subcommand(self, syncserviceMock, webhookserverMock):
+        '''Required to ensure that the main program serves the webhooks
+        with the instance of the space until it's interrupted'''
+        self.args.subcommand = 'serve'
+        self.args.host = '127.0.0.1'
+        self.args.port = 8080
+        self.args.workers = 2
+        self.args.exclude = ['.git']
+        self.args.allowed_path = None
+        server = webhookserverMock.return_value
+        server.serve_forever.side_effect = KeyboardInterrupt
+        server.url = 'http://127.0.0.1:8080'
+        server.server = Mock()
+
+        main()
+        self.assertEqual(
+            syncserviceMock.assert_called_with(
+                ANY,
+                2,
+                ['.git'],
+                instances={'TST': self.git2sc.return_value},
+                allowed_paths=None,
+            ),
+            None,
+        )
+        service = syncserviceMock.return_value.start.return_value
+        self.assertEqual(
+            webhookserverMock.assert_called_with(
+                service,
+                '127.0.0.1',
+                8080,
+                token=None,
+                default_space='TST',
+            ),
+            None,
+        )
+        self.assertTrue(service.stop.called)
+
+        # The factory builds the instances of the other spaces
+        factory = syncserviceMock.call_args[0][0]
+        factory('OTH')
+        self.assertEqual(self.git2sc.call_args[0][2], 'OTH')
+
+    @patch('git2sc.metrics.SyncMetrics', autospec=True)
+    @patch('git2sc.batch.format_results', autospec=True)
+    @patch('git2sc.batch.BatchRunner', autospec=True)
+    @patch('git2sc.batch.SharedPools', autospec=True)
+    @patch('git2sc.batch.load_config', autospec=True)
+    def test_batch_subcommand(
+        self,
+        loadconfigMock,
+        sharedpoolsMock,
+        batchrunnerMock,
+        formatresultsMock,
+        syncmetricsMock,
+    ):
+        '''Required to ensure that the main program syncs the targets of the
+        configuration with shared pools, and reports the metrics of all the
+        targets'''
+        self.args.subcommand = 'batch'
+        self.args.config = 'config.yaml'
+        self.args.parallel = 4
+        self.args.rate = 10
+        self.args.metrics = 'metrics.json'
+        pools = sharedpoolsMock.return_value
+        pools.git2sc_arguments.return_value = {'session': 'shared'}
+
+        main()
+        self.assertEqual(
+            loadconfigMock.assert_called_with('config.yaml', 'TST', False),
+            None,
+        )
+        sharedpoolsMock.assert_called_with(
+            ('user', 'password'),
+            ANY,
+            ANY,
+            10,
+            ANY,
+            ANY,
+        )
+        self.assertEqual(
+            batchrunnerMock.assert_called_with(
+                ANY,
+                loadconfigMock.return_value,
+                4,
+                syncmetricsMock.return_value,
+            ),
+            None,
+        )
+        self.assertTrue(pools.close.called)
+        syncmetricsMock.return_value.write_json.assert_called_with(
+            'metrics.json',
+        )
+
+        # The batch doesn't build an instance of its own
+        self.assertFalse(self.git2sc.called)
+        self.assertTrue(
+            call(formatresultsMock.return_value) in self.print.mock_calls
+        )
+
+        # The instances of the targets use the shared pools
+        factory = batchrunnerMock.call_args[0][0]
+        factory('OTH')
+        self.assertEqual(self.git2sc.call_args[0][2], 'OTH')
+        self.assertEqual(self.git2sc.call_args[1]['session'], 'shared')
+
+    @patch('git2sc.batch.format_results', autospec=True)
+    @patch('git2sc.batch.BatchRunner', autospec=True)
+    @patch('git2sc.batch.SharedPools', autospec=True)
+    @patch('git2sc.batch.load_config', autospec=True)
+    def test_batch_fails_if_a_target_failed(
+        self,
+        loadconfigMock,
+        sharedpoolsMock,
+        batchrunnerMock,
+        formatresultsMock,
+    ):
+        '''Required to ensure that the main program exits with an error
+        when a target of the batch failed'''
+        from git2sc.batch import TargetResult
+        self.args.subcommand = 'batch'
+        batchrunnerMock.return_value.run.return_value = [
+            TargetResult(Mock(), 'ok', 1, {}),
+            TargetResult(Mock(), 'failed', 1, {}, 'TooManyDeletions: 3'),
+        ]
+
+        with self.assertRaises(SystemExit) as context:
+            main()
+        self.assertEqual(context.exception.code, 1)
+        self.assertTrue(
+            call(formatresultsMock.return_value) in self.print.mock_calls
+        )
+
+    @patch('git2sc.batch.load_config', autospec=True)
+    def test_batch_reports_invalid_configurations(self, loadconfigMock):
+        from git2sc.batch import ConfigError
+        self.args.subcommand = 'batch'
+        error = ConfigError('config.yaml has no list of targets')
+        loadconfigMock.side_effect = error
+
+        main()
+        self.assertTrue(call(error) in self.print.mock_calls)
+
+    def test_heavy_modules_are_not_imported_on_load(self):
+        '''Required to keep the startup of the command line fast, requests
+        and pypandoc are only imported when a subcommand needs them'''
+
+        modules = subprocess.check_output(
+            [
+                sys.executable,
+                '-c',
+                'import sys, git2sc, git2sc.cli; '
+                'print(" ".join(sorted(sys.modules)))',
+            ],
+            universal_newlines=True,
+        ).split()
+
+        self.assertNotIn('requests', modules)
+        self.assertNotIn('pypandoc', modules)
+        self.assertNotIn('argcomplete', modules)
+
+    def test_main_writes_the_metrics(self):
+        '''Required to ensure that the metrics of the run are written where
+        the user asked for them'''
+        self.args.subcommand = 'sync'
+        self.args.metrics = 'metrics.json'
+        self.args.prometheus = 'git2sc.prom'
+
+        main()
+        metrics = self.git2sc.return_value.metrics
+        metrics.write_json.assert_called_with('metrics.json')
+        metrics.write_prometheus.assert_called_with('git2sc.prom')
+
+    def test_main_writes_the_metrics_of_failed_runs(self):
+        '''Required to know where the time went in the runs that failed'''
+        self.args.subcommand = 'sync'
+        self.args.since = None
+        self.args.incremental = False
+        self.args.metrics = 'metrics.json'
+        self.git2sc.return_value.directory_update.side_effect = \
+            Exception('Error 500: Internal error')
+
+        with self.assertRaises(Exception):
+            main()
+        metrics = self.git2sc.return_value.metrics
+        metrics.write_json.assert_called_with('metrics.json')
+        self.assertTrue(self.git2sc.return_value.close.called)
+
+    @patch('git2sc.tracing.Tracer', autospec=True)
+    def test_main_traces_the_run(self, tracerMock):
+        '''Required to ensure that the spans of the run are written to the
+        trace file'''
+        self.args.subcommand = 'sync'
+        self.args.trace = 'trace.jsonl'
+
+        main()
+        tracerMock.assert_called_with('trace.jsonl')
+        self.assertEqual(
+            self.git2sc.call_args[1]['tracer'],
+            tracerMock.return_value,
+        )
+        tracerMock.return_value.span.assert_called_with(
+            'git2sc sync',
+            space='TST',
+        )
+        self.assertTrue(tracerMock.return_value.close.called)
+
+    @patch('git2sc.profiling.profile', autospec=True)
+    def test_main_profiles_the_run(self, profileMock):
+        '''Required to ensure that the whole run is profiled when asked'''
+        self.args.subcommand = 'sync'
+        self.args.profile = 'cpu'
+        self.args.profile_dir = 'profiles'
+        self.args.profile_top = 10
+        profileMock.return_value.__enter__.return_value = ['run.prof']
+
+        main()
+        profileMock.assert_called_with('cpu', 'profiles', 'git2sc-sync', 10)
+        self.assertTrue(
+            call('Profile written to run.prof') in self.print.mock_calls
+        )
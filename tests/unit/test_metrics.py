@@ -0,0 +1,175 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from git2sc.metrics import Histogram, SyncMetrics
+
+
+class TestHistogram(unittest.TestCase):
+    '''Test class for the Histogram class'''
+
+    def test_observations_are_counted_in_their_bucket(self):
+        '''Required to know the distribution of the latencies'''
+
+        histogram = Histogram((0.1, 1))
+        for value in [0.05, 0.1, 0.5, 3]:
+            histogram.observe(value)
+
+        self.assertEqual(histogram.counts, [2, 1, 1])
+        self.assertEqual(
+            histogram.cumulative_counts(),
+            [('0.1', 2), ('1', 3), ('+Inf', 4)],
+        )
+        self.assertEqual(histogram.count, 4)
+        self.assertAlmostEqual(histogram.sum, 3.65)
+        self.assertEqual(histogram.max, 3)
+
+
+class TestSyncMetrics(unittest.TestCase):
+    '''Test class for the SyncMetrics class'''
+
+    def setUp(self):
+        self.metrics = SyncMetrics({'space': 'TST'})
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_summary_has_the_counters_of_the_run(self):
+        '''Required to know where the time of a sync goes'''
+
+        self.metrics.count_page('create')
+        self.metrics.count_page('skip')
+        self.metrics.count_page('skip')
+        self.metrics.observe_request(
+            'GET',
+            '/content/{id}',
+            200,
+            0.2,
+            received=100,
+        )
+        self.metrics.observe_request(
+            'GET',
+            '/content/{id}',
+            429,
+            0.01,
+            received=10,
+        )
+        self.metrics.observe_request('POST', '/content', 200, 0.3, sent=50)
+        self.metrics.observe_conversion('.adoc', 1.5)
+        self.metrics.count_cache_hit()
+
+        summary = self.metrics.summary()
+
+        self.assertEqual(summary['labels'], {'space': 'TST'})
+        self.assertEqual(
+            summary['pages'],
+            {'create': 1, 'update': 0, 'skip': 2, 'delete': 0},
+        )
+        self.assertEqual(
+            summary['requests']['GET /content/{id}']['statuses'],
+            {'200': 1, '429': 1},
+        )
+        self.assertEqual(
+            summary['requests']['GET /content/{id}']['latency']['count'],
+            2,
+        )
+        self.assertEqual(summary['conversions']['.adoc']['sum'], 1.5)
+        self.assertEqual(summary['cache_hits'], 1)
+        self.assertEqual(summary['bytes'], {'sent': 50, 'received': 110})
+
+    def test_metrics_can_be_merged(self):
+        '''Required to report the metrics of all the spaces of a batch'''
+
+        other = SyncMetrics({'space': 'OTH'})
+        for metrics in [self.metrics, other]:
+            metrics.count_page('create')
+            metrics.count_attachment('upload')
+            metrics.observe_request('GET', '/content', 200, 0.2, 10, 100)
+        other.observe_request('GET', '/content', 429, 3)
+        other.observe_conversion('.md', 0.5)
+        other.count_cache_hit()
+
+        self.metrics.merge(other)
+
+        summary = self.metrics.summary()
+        self.assertEqual(summary['labels'], {'space': 'TST'})
+        self.assertEqual(summary['pages']['create'], 2)
+        self.assertEqual(summary['attachments']['upload'], 2)
+        self.assertEqual(
+            summary['requests']['GET /content']['statuses'],
+            {'200': 2, '429': 1},
+        )
+        latency = summary['requests']['GET /content']['latency']
+        self.assertEqual(latency['count'], 3)
+        self.assertAlmostEqual(latency['sum'], 3.4)
+        self.assertEqual(latency['max'], 3)
+        self.assertEqual(summary['conversions']['.md']['count'], 1)
+        self.assertEqual(summary['cache_hits'], 1)
+        self.assertEqual(summary['bytes'], {'sent': 20, 'received': 200})
+        # The merged metrics are not changed
+        self.assertEqual(other.summary()['pages']['create'], 1)
+
+    def test_prometheus_textfile(self):
+        '''Required to scrape the metrics of the cron runs with the node
+        exporter'''
+
+        self.metrics.count_page('update')
+        self.metrics.observe_request('PUT', '/content/{id}', 200, 0.2)
+
+        lines = self.metrics.to_prometheus().splitlines()
+
+        self.assertIn(
+            'git2sc_pages_total{space="TST",operation="update"} 1',
+            lines,
+        )
+        self.assertIn(
+            'git2sc_requests_total{space="TST",method="PUT",'
+            'endpoint="/content/{id}",status="200"} 1',
+            lines,
+        )
+        self.assertIn(
+            'git2sc_request_duration_seconds_bucket{space="TST",le="0.25",'
+            'method="PUT",endpoint="/content/{id}"} 1',
+            lines,
+        )
+        self.assertIn(
+            'git2sc_request_duration_seconds_bucket{space="TST",le="0.1",'
+            'method="PUT",endpoint="/content/{id}"} 0',
+            lines,
+        )
+        self.assertIn(
+            '# TYPE git2sc_request_duration_seconds histogram',
+            lines,
+        )
+
+    def test_label_values_are_escaped(self):
+        '''Required to produce a valid textfile with any space key'''
+
+        metrics = SyncMetrics({'space': 'a"b'})
+
+        self.assertIn(
+            'git2sc_cache_hits_total{space="a\\"b"} 0',
+            metrics.to_prometheus().splitlines(),
+        )
+
+    def test_write_the_metrics_to_files(self):
+        '''Required to leave the metrics where the cron jobs can collect
+        them'''
+
+        json_path = os.path.join(self.tmp, 'metrics.json')
+        prometheus_path = os.path.join(self.tmp, 'git2sc.prom')
+        self.metrics.count_page('delete')
+
+        self.metrics.write_json(json_path)
+        self.metrics.write_prometheus(prometheus_path)
+
+        with open(json_path) as f:
+            self.assertEqual(json.load(f)['pages']['delete'], 1)
+        with open(prometheus_path) as f:
+            self.assertIn('git2sc_pages_total', f.read())
+        self.assertEqual(sorted(os.listdir(self.tmp)), [
+            'git2sc.prom',
+            'metrics.json',
+        ])
@@ -0,0 +1,84 @@
+import unittest
+from git2sc.pages import PageIndex, parent_id_of
+
+
+class TestPageIndex(unittest.TestCase):
+    '''Test class for the PageIndex class'''
+
+    def setUp(self):
+        self.pages = PageIndex({
+            '1': {'id': '1', 'title': 'Home', 'ancestors': []},
+            '2': {'id': '2', 'title': 'Child', 'ancestors': [{'id': '1'}]},
+            '3': {
+                'id': '3',
+                'title': 'Grandchild',
+                'ancestors': [{'id': '1'}, {'id': '2'}],
+            },
+        })
+
+    def test_is_a_dictionary_of_pages(self):
+        '''Required to keep the pages attribute interface of Git2SC'''
+
+        self.assertEqual(
+            PageIndex({'1': {'id': '1'}}),
+            {'1': {'id': '1'}},
+        )
+
+    def test_can_get_id_by_title(self):
+        '''Required to find the articles by title without scanning all the
+        pages'''
+
+        self.assertEqual(self.pages.get_id('Child'), '2')
+        self.assertEqual(self.pages.get_id('Non existing title'), None)
+
+    def test_can_get_children_of_a_page(self):
+        '''Required to find the direct children of a page'''
+
+        self.assertEqual(self.pages.children('1'), {'2'})
+        self.assertEqual(self.pages.children('2'), {'3'})
+        self.assertEqual(self.pages.children(None), {'1'})
+        self.assertEqual(self.pages.children('3'), set())
+
+    def test_indexes_are_updated_when_a_page_is_replaced(self):
+        '''Required to ensure that the indexes don't keep stale titles'''
+
+        self.pages['2'] = {'id': '2', 'title': 'Renamed', 'ancestors': []}
+
+        self.assertEqual(self.pages.get_id('Child'), None)
+        self.assertEqual(self.pages.get_id('Renamed'), '2')
+        self.assertEqual(self.pages.children('1'), set())
+        self.assertEqual(self.pages.children(None), {'1', '2'})
+
+    def test_indexes_are_updated_when_a_page_is_removed(self):
+        '''Required to ensure that the deleted pages can't be found'''
+
+        del self.pages['3']
+        self.pages.pop('2')
+
+        self.assertEqual(self.pages.get_id('Grandchild'), None)
+        self.assertEqual(self.pages.get_id('Child'), None)
+        self.assertEqual(self.pages.children('1'), set())
+
+    def test_can_reindex_a_page_changed_in_place(self):
+        '''Required to support the title changes of update_page'''
+
+        self.pages['2']['title'] = 'Renamed'
+        self.pages.reindex('2')
+
+        self.assertEqual(self.pages.get_id('Child'), None)
+        self.assertEqual(self.pages.get_id('Renamed'), '2')
+
+    def test_can_clear_the_pages(self):
+        '''Required to ensure that the indexes are cleared with the pages'''
+
+        self.pages.clear()
+
+        self.assertEqual(self.pages, {})
+        self.assertEqual(self.pages.get_id('Home'), None)
+        self.assertEqual(self.pages.children(None), set())
+
+    def test_parent_id_of_pages_without_ancestors_is_none(self):
+        '''Required to index the pages fetched without ancestors'''
+
+        self.assertEqual(parent_id_of({'id': '1'}), None)
+        self.assertEqual(parent_id_of({'id': '1', 'ancestors': []}), None)
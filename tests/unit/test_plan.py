@@ -0,0 +1,41 @@
+import unittest
+from git2sc.plan import SyncAction, SyncPlan, DIRECTORY, FILE, PAGE
+
+
+class TestSyncPlan(unittest.TestCase):
+    '''Test class for the SyncPlan class'''
+
+    def setUp(self):
+        self.plan = SyncPlan(
+            [
+                SyncAction('create', DIRECTORY, 'docs', title='docs'),
+                SyncAction('update', FILE, 'docs/a.md', page_id='1'),
+                SyncAction('skip', FILE, 'docs/b.md', page_id='2'),
+                SyncAction('delete', PAGE, None, title='old', page_id='3'),
+            ],
+            parent_id='0',
+        )
+
+    def test_can_filter_the_actions_by_operation(self):
+        self.assertEqual(self.plan.operations('skip'), [self.plan[2]])
+
+    def test_can_count_the_api_calls(self):
+        '''Required to know the cost of a sync before running it'''
+
+        self.assertEqual(self.plan.api_calls(), 4)
+
+    def test_can_print_the_plan(self):
+        '''Required to review a sync before running it'''
+
+        self.assertEqual(
+            str(self.plan),
+            'create directory docs\n'
+            'update file      docs/a.md\n'
+            'skip   file      docs/b.md\n'
+            'delete page      old\n'
+            '1 create, 1 update, 1 delete, 1 skip, 4 api calls',
+        )
+
+    def test_actions_have_known_operations(self):
+        with self.assertRaises(ValueError):
+            SyncAction('rename', FILE, 'docs/a.md')
@@ -0,0 +1,145 @@
+import os
+import pstats
+import shutil
+import tempfile
+import unittest
+import threading
+from unittest.mock import patch
+from git2sc import profiling
+from git2sc.profiling import phase, profile
+
+
+def allocate():
+    return [str(number) for number in range(2000)]
+
+
+class TestProfile(unittest.TestCase):
+    '''Test class for the profile context manager'''
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_phases_do_nothing_without_profile(self):
+        '''Required to keep the phases free when not profiling'''
+
+        with profile(None, self.tmp) as reports:
+            with phase('walk'):
+                pass
+
+        self.assertEqual(reports, [])
+        self.assertEqual(os.listdir(self.tmp), [])
+
+    def test_cpu_profile_covers_the_threads(self):
+        '''Required to see where the cpu goes in the concurrent syncs'''
+
+        with profile('cpu', self.tmp, 'git2sc-sync', 5) as reports:
+            thread = threading.Thread(target=allocate)
+            thread.start()
+            thread.join()
+
+        self.assertEqual(
+            [os.path.splitext(report)[1] for report in reports],
+            ['.prof', '.txt'],
+        )
+        functions = [
+            function
+            for _, _, function in pstats.Stats(reports[0]).stats
+        ]
+        self.assertIn('allocate', functions)
+        self.assertTrue(
+            os.path.basename(reports[0]).startswith('git2sc-sync-'),
+        )
+
+    def test_memory_profile_reports_the_phases(self):
+        '''Required to find the phase that drives the peak memory'''
+
+        with profile('mem', self.tmp, 'git2sc-sync', 5) as reports:
+            with phase('walk'):
+                with phase('inventory'):
+                    pages = allocate()
+            with phase('delete sweep'):
+                pass
+
+        with open(reports[0]) as f:
+            report = f.read()
+        self.assertTrue(reports[0].endswith('.mem.txt'))
+        self.assertIn('\n  walk ', report)
+        self.assertIn('\n    inventory ', report)
+        self.assertIn('\n  delete sweep ', report)
+        self.assertIn('Top 5 allocations of the inventory phase:', report)
+        self.assertIn('test_profiling.py', report)
+        self.assertEqual(profiling._memory_profiler, None)
+        self.assertEqual(len(pages), 2000)
+
+    def test_memory_profile_nested_peaks(self):
+        '''Required to attribute the peak of a phase to its parents'''
+
+        profiler = profiling.MemoryProfiler()
+        profiler.start()
+        profiler.enter('walk')
+        profiler.enter('inventory')
+        pages = allocate()
+        del pages
+        profiler.exit()
+        profiler.exit()
+        profiler.stop()
+
+        peaks = {phase['name']: phase['peak'] for phase in profiler.phases}
+        self.assertGreaterEqual(peaks['walk'], peaks['inventory'])
+        self.assertGreaterEqual(peaks['run'], peaks['walk'])
+        self.assertGreater(peaks['inventory'], 20000)
+
+    def test_memory_profile_peaks_without_reset_peak(self):
+        '''Required to profile the memory on python 3.7 and 3.8, where
+        tracemalloc can't reset the peak'''
+
+        profiler = profiling.MemoryProfiler()
+        with patch.object(profiling, '_reset_peak', None):
+            profiler.start()
+            profiler.enter('inventory')
+            pages = allocate()
+            del pages
+            profiler.exit()
+            profiler.enter('delete sweep')
+            profiler.exit()
+            profiler.stop()
+
+        peaks = {phase['name']: phase['peak'] for phase in profiler.phases}
+        self.assertGreater(peaks['inventory'], 20000)
+        self.assertLess(peaks['delete sweep'], peaks['inventory'])
+        self.assertGreaterEqual(peaks['run'], peaks['inventory'])
+
+    def test_memory_profile_phases_of_threads(self):
+        '''Required to keep the phases of the workers apart when they run at
+        the same time'''
+
+        entered = threading.Barrier(2)
+
+        def convert(name):
+            with phase(name):
+                entered.wait()
+                # The phase of the other thread ends first
+                if name == 'convert a':
+                    entered.wait()
+            if name == 'convert b':
+                entered.wait()
+
+        with profile('mem', self.tmp) as reports:
+            with phase('upload'):
+                threads = [
+                    threading.Thread(target=convert, args=(name,))
+                    for name in ['convert a', 'convert b']
+                ]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+
+        with open(reports[0]) as f:
+            report = f.read()
+        self.assertIn('\n  upload ', report)
+        self.assertIn('\n  convert a ', report)
+        self.assertIn('\n  convert b ', report)
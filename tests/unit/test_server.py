@@ -0,0 +1,262 @@
+import json
+import time
+import threading
+import unittest
+import urllib.error
+import urllib.request
+from unittest.mock import Mock, call
+from git2sc.server import InvalidJob, JobQueue, SyncJob, SyncService, \
+    WebhookServer
+
+
+class TestJobQueue(unittest.TestCase):
+    '''Test class for the JobQueue class'''
+
+    def setUp(self):
+        self.queue = JobQueue()
+
+    def test_pushes_of_the_same_tree_are_coalesced(self):
+        '''Required to sync a burst of pushes once, against the last
+        commit'''
+
+        first = self.queue.put(SyncJob(1, 'TST', '/repo', 'a'))
+        second = self.queue.put(SyncJob(2, 'TST', '/repo', 'b'))
+        self.queue.put(SyncJob(3, 'TST', '/other', 'c'))
+
+        self.assertIs(second, first)
+        self.assertEqual(first.commit, 'b')
+        self.assertEqual(first.pushes, 2)
+        self.assertEqual(len(self.queue), 2)
+
+    def test_the_jobs_of_a_space_run_one_at_a_time(self):
+        '''Required to never sync a space with two jobs at once'''
+
+        first = self.queue.put(SyncJob(1, 'TST', '/repo'))
+        self.queue.put(SyncJob(2, 'TST', '/other'))
+        other_space = self.queue.put(SyncJob(3, 'OTH', '/repo'))
+
+        self.assertIs(self.queue.get(0), first)
+        self.assertIs(self.queue.get(0), other_space)
+        self.assertEqual(self.queue.get(0.01), None)
+
+        self.queue.task_done(first)
+        self.assertEqual(self.queue.get(0).path, '/other')
+
+    def test_pushes_while_running_queue_a_new_job(self):
+        '''Required to sync the commits pushed during a sync'''
+
+        running = self.queue.put(SyncJob(1, 'TST', '/repo', 'a'))
+        self.queue.get(0)
+
+        queued = self.queue.put(SyncJob(2, 'TST', '/repo', 'b'))
+
+        self.assertIsNot(queued, running)
+        self.assertEqual(running.commit, 'a')
+
+    def test_close_wakes_up_the_workers(self):
+        jobs = []
+        worker = threading.Thread(
+            target=lambda: jobs.append(self.queue.get()),
+        )
+        worker.start()
+
+        self.queue.close()
+        worker.join(1)
+
+        self.assertEqual(jobs, [None])
+        with self.assertRaises(InvalidJob):
+            self.queue.put(SyncJob(1, 'TST', '/repo'))
+
+
+class TestSyncService(unittest.TestCase):
+    '''Test class for the SyncService class'''
+
+    def setUp(self):
+        self.factory = Mock()
+        self.service = SyncService(self.factory, workers=1)
+
+    def test_instances_are_reused_per_space(self):
+        '''Required to keep the inventory of the spaces between pushes
+        instead of starting a new process per push'''
+
+        for path in ['/repo', '/other', '/repo']:
+            job = self.service.submit('TST', path)
+            self.service.run(self.service.queue.get(0))
+            self.service.queue.task_done(job)
+
+        self.assertEqual(self.factory.mock_calls[0], call('TST'))
+        self.assertEqual(self.factory.call_count, 1)
+        self.assertEqual(
+            self.factory.return_value.directory_incremental_update.mock_calls,
+            [
+                call('/repo', ['.git', '.gitignore', '.gitmodules'], None),
+                call('/other', ['.git', '.gitignore', '.gitmodules'], None),
+                call('/repo', ['.git', '.gitignore', '.gitmodules'], None),
+            ],
+        )
+
+    def test_given_instances_are_used_and_not_closed(self):
+        instance = Mock()
+        service = SyncService(self.factory, instances={'TST': instance})
+
+        service.run(service.submit('TST', '/repo/'))
+        service.stop()
+
+        self.assertEqual(
+            instance.directory_incremental_update.assert_called_with(
+                '/repo', ['.git', '.gitignore', '.gitmodules'], None,
+            ),
+            None,
+        )
+        self.assertFalse(self.factory.called)
+        self.assertFalse(instance.close.called)
+
+    def test_failed_jobs_store_the_error(self):
+        self.factory.return_value.directory_incremental_update.side_effect = \
+            Exception('Conflict')
+
+        job = self.service.submit('TST', '/repo', 'abc')
+        self.service.run(job)
+
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.error, 'Exception: Conflict')
+
+    def test_jobs_check_the_parent_page_and_the_commit(self):
+        '''Required to ensure that the webhooks only hang the trees from the
+        pages of their space, and sync the pushed commit'''
+
+        instance = self.factory.return_value
+        instance.is_space_page.return_value = False
+
+        job = self.service.submit('TST', '/repo', 'abc1234', '42')
+        self.service.run(job)
+
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(
+            job.error,
+            'InvalidJob: The page 42 is not in the space TST',
+        )
+        instance.is_space_page.assert_called_with('42')
+
+        instance.is_space_page.return_value = True
+        instance.contains_commit.return_value = False
+        self.service.run(job)
+
+        self.assertEqual(
+            job.error,
+            'InvalidJob: The commit abc1234 is not checked out in /repo',
+        )
+        instance.contains_commit.assert_called_with('/repo', 'abc1234')
+        self.assertFalse(instance.directory_incremental_update.called)
+
+        instance.contains_commit.return_value = True
+        self.service.run(job)
+
+        self.assertEqual(job.status, 'done')
+        instance.directory_incremental_update.assert_called_with(
+            '/repo',
+            ['.git', '.gitignore', '.gitmodules'],
+            '42',
+        )
+
+    def test_paths_can_be_restricted(self):
+        '''Required to ensure that the webhooks can't sync any directory of
+        the server'''
+
+        service = SyncService(self.factory, allowed_paths=['/srv/docs'])
+
+        service.submit('TST', '/srv/docs/repo')
+        with self.assertRaises(InvalidJob):
+            service.submit('TST', '/srv/docs/../secrets')
+        with self.assertRaises(InvalidJob):
+            service.submit('TST', '/srv/docs-other')
+
+    def test_workers_run_the_jobs(self):
+        self.service.start()
+        job = self.service.submit('TST', '/repo')
+        deadline = time.monotonic() + 5
+        while job.finished is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.service.stop()
+
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(self.factory.return_value.close.called, True)
+
+
+class TestWebhookServer(unittest.TestCase):
+    '''Test class for the WebhookServer class'''
+
+    def setUp(self):
+        self.service = SyncService(Mock())
+        self.server = WebhookServer(
+            self.service,
+            port=0,
+            token='secret',
+            default_space='TST',
+        ).start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def request(self, method, path, data=None, token='secret'):
+        request = urllib.request.Request(
+            self.server.url + path,
+            data=None if data is None else json.dumps(data).encode(),
+            method=method,
+            headers={'Authorization': 'Bearer {}'.format(token)},
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as error:
+            return error.code, json.loads(error.read())
+
+    def test_pushes_queue_a_sync_job(self):
+        '''Required to ensure that a push webhook is answered at once and
+        the sync runs in the background'''
+
+        status, job = self.request(
+            'POST',
+            '/sync',
+            {'path': '/repo', 'commit': 'abc1234'},
+        )
+        self.assertEqual(status, 202)
+        self.assertEqual(job['space'], 'TST')
+        self.assertEqual(job['status'], 'queued')
+
+        status, job = self.request(
+            'POST',
+            '/sync',
+            {'path': '/repo', 'commit': 'def5678'},
+        )
+        self.assertEqual(job['pushes'], 2)
+
+        status, queued = self.request('GET', '/jobs/{}'.format(job['id']))
+        self.assertEqual(status, 200)
+        self.assertEqual(queued['commit'], 'def5678')
+
+        status, job = self.request(
+            'POST',
+            '/sync',
+            {'path': '/repo', 'parent_id': 1234},
+        )
+        self.assertEqual(status, 202)
+        self.assertEqual(job['parent_id'], '1234')
+
+    def test_invalid_requests_are_rejected(self):
+        self.assertEqual(self.request('POST', '/sync', {})[0], 400)
+        for data in [
+            {'path': '/repo', 'commit': '--output=/tmp/x'},
+            {'path': '/repo', 'commit': 'HEAD'},
+            {'path': '/repo', 'parent_id': '1 OR 1'},
+            {'path': '/repo', 'parent_id': '../1'},
+            {'path': '/repo', 'parent_id': True},
+            {'path': '/repo', 'parent_id': ['1']},
+        ]:
+            self.assertEqual(self.request('POST', '/sync', data)[0], 400)
+        self.assertEqual(self.request('GET', '/jobs/1')[0], 404)
+        self.assertEqual(
+            self.request('POST', '/sync', {'path': '/repo'}, 'wrong')[0],
+            401,
+        )
+        self.assertEqual(len(self.service.queue), 0)
@@ -0,0 +1,126 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from git2sc.state import SyncState
+
+
+class TestSyncState(unittest.TestCase):
+    '''Test class for the SyncState class'''
+
+    def setUp(self):
+        self.state = SyncState(':memory:', 'TST')
+
+    def tearDown(self):
+        self.state.close()
+
+    def test_unknown_paths_have_no_state(self):
+        '''Required to know which paths were never pushed'''
+
+        self.assertEqual(self.state.get('article.md'), None)
+
+    def test_can_store_the_state_of_a_path(self):
+        '''Required to resolve the page of a path without fetching the
+        space'''
+
+        self.state.set(
+            'formation/article.md',
+            '1',
+            parent_id='2',
+            version=3,
+            source_hash='source',
+            html_hash='html',
+            title='article',
+        )
+
+        self.assertEqual(
+            self.state.get('formation/article.md'),
+            {
+                'space': 'TST',
+                'path': 'formation/article.md',
+                'page_id': '1',
+                'parent_id': '2',
+                'version': 3,
+                'source_hash': 'source',
+                'html_hash': 'html',
+                'title': 'article',
+            }
+        )
+
+    def test_set_keeps_the_fields_not_given(self):
+        '''Required to refresh the state with partial information, like the
+        version returned by a write'''
+
+        self.state.set('article.md', '1', parent_id='2', source_hash='old')
+        self.state.set('article.md', '1', version=4)
+
+        entry = self.state.get('article.md')
+        self.assertEqual(entry['parent_id'], '2')
+        self.assertEqual(entry['source_hash'], 'old')
+        self.assertEqual(entry['version'], 4)
+
+    def test_set_resets_the_fields_if_the_page_changes(self):
+        '''Required to avoid mixing the state of two different pages'''
+
+        self.state.set('article.md', '1', parent_id='2', source_hash='old')
+        self.state.set('article.md', '5', version=1)
+
+        entry = self.state.get('article.md')
+        self.assertEqual(entry['page_id'], '5')
+        self.assertEqual(entry['parent_id'], None)
+        self.assertEqual(entry['source_hash'], None)
+
+    def test_set_fails_with_unknown_fields(self):
+        '''Required to catch typos in the stored fields'''
+
+        with self.assertRaises(ValueError):
+            self.state.set('article.md', '1', author='Article')
+
+    def test_can_remove_a_page(self):
+        '''Required to forget the deleted pages'''
+
+        self.state.set('article.md', '1')
+        self.state.set('other.md', '2')
+        self.state.remove_page('1')
+
+        self.assertEqual(self.state.get('article.md'), None)
+        self.assertEqual(
+            [entry['path'] for entry in self.state.entries()],
+            ['other.md'],
+        )
+
+    def test_spaces_are_isolated(self):
+        '''Required to share the database between spaces'''
+
+        other_space = SyncState(':memory:', 'OTH')
+        other_space.connection = self.state.connection
+        self.state.set('article.md', '1')
+
+        self.assertEqual(other_space.get('article.md'), None)
+        self.assertEqual(other_space.entries(), [])
+
+    def test_databases_without_titles_are_upgraded(self):
+        '''Required to keep using the databases of the older versions'''
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        database_path = os.path.join(directory, 'state.db')
+        connection = sqlite3.connect(database_path)
+        with connection:
+            connection.execute(
+                'CREATE TABLE pages (space TEXT NOT NULL, path TEXT NOT NULL, '
+                'page_id TEXT NOT NULL, parent_id TEXT, version INTEGER, '
+                'source_hash TEXT, html_hash TEXT, PRIMARY KEY (space, path))'
+            )
+            connection.execute(
+                "INSERT INTO pages (space, path, page_id) "
+                "VALUES ('TST', '.', '1')"
+            )
+        connection.close()
+
+        state = SyncState(database_path, 'TST')
+        self.addCleanup(state.close)
+        state.set('.', '1', title='TST Home')
+
+        self.assertEqual(state.get('.')['title'], 'TST Home')
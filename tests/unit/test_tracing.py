@@ -0,0 +1,107 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from git2sc.tracing import Tracer, NULL_SPAN, propagate
+
+
+class TestTracer(unittest.TestCase):
+    '''Test class for the Tracer class'''
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'trace.jsonl')
+        self.tracer = Tracer(self.path)
+
+    def tearDown(self):
+        self.tracer.close()
+        shutil.rmtree(self.tmp)
+
+    def spans(self):
+        '''Returns the spans written to the trace file by name'''
+
+        self.tracer.close()
+        spans = {}
+        with open(self.path) as f:
+            for line in f:
+                request = json.loads(line)
+                for span in request['resourceSpans'][0]['scopeSpans'][0][
+                    'spans'
+                ]:
+                    spans[span['name']] = span
+        return spans
+
+    def test_disabled_tracer_doesnt_record_anything(self):
+        '''Required to trace only when the user asks for it'''
+
+        tracer = Tracer()
+
+        with tracer.span('sync') as span:
+            span.set_attribute('path', '/path')
+
+        self.assertFalse(tracer.enabled)
+        self.assertEqual(span, NULL_SPAN)
+
+    def test_spans_are_children_of_the_current_span(self):
+        '''Required to see which operation stalled the critical path'''
+
+        with self.tracer.span('sync'):
+            with self.tracer.span('convert', path='/path/file.md') as span:
+                span.set_attribute('cache.hit', False)
+
+        spans = self.spans()
+        self.assertNotIn('parentSpanId', spans['sync'])
+        self.assertEqual(
+            spans['convert']['parentSpanId'],
+            spans['sync']['spanId'],
+        )
+        self.assertEqual(
+            spans['convert']['traceId'],
+            spans['sync']['traceId'],
+        )
+        self.assertEqual(spans['convert']['attributes'], [
+            {'key': 'path', 'value': {'stringValue': '/path/file.md'}},
+            {'key': 'cache.hit', 'value': {'boolValue': False}},
+        ])
+        self.assertLessEqual(
+            int(spans['sync']['startTimeUnixNano']),
+            int(spans['convert']['startTimeUnixNano']),
+        )
+        self.assertLessEqual(
+            int(spans['convert']['endTimeUnixNano']),
+            int(spans['sync']['endTimeUnixNano']),
+        )
+
+    def test_errors_are_recorded_in_the_span(self):
+        '''Required to find the failed operations in the trace'''
+
+        with self.assertRaises(ValueError):
+            with self.tracer.span('convert'):
+                raise ValueError('Unknown format')
+
+        self.assertEqual(
+            self.spans()['convert']['status'],
+            {'code': 2, 'message': 'ValueError: Unknown format'},
+        )
+
+    def test_propagate_keeps_the_parent_in_other_threads(self):
+        '''Required to relate the spans of the worker threads with the ones
+        that scheduled them'''
+
+        def convert(path):
+            with self.tracer.span(path):
+                pass
+
+        with self.tracer.span('sync'):
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                run = propagate(convert)
+                list(executor.map(run, ['a.md', 'b.md', 'c.md']))
+
+        spans = self.spans()
+        for path in ['a.md', 'b.md', 'c.md']:
+            self.assertEqual(
+                spans[path]['parentSpanId'],
+                spans['sync']['spanId'],
+            )
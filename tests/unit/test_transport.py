@@ -0,0 +1,283 @@
+import io
+import unittest
+from unittest.mock import patch, Mock, call
+from requests.exceptions import ConnectionError
+from git2sc.transport import AdaptiveLimiter, RateLimiter, Transport, \
+    TransportStats, retry_after
+
+
+def response(status_code, headers=None):
+    '''Build a fake requests response'''
+
+    r = Mock()
+    r.status_code = status_code
+    r.headers = headers or {}
+    return r
+
+
+class TestTransport(unittest.TestCase):
+    '''Test class for the Transport class'''
+
+    def setUp(self):
+        self.session = Mock()
+        self.time_patch = patch('git2sc.transport.time', autospec=True)
+        self.time = self.time_patch.start()
+        self.time.time.return_value = 0
+        self.random_patch = patch('git2sc.transport.random', autospec=True)
+        self.random = self.random_patch.start()
+        self.random.uniform.side_effect = lambda low, high: high
+        self.transport = Transport(self.session, timeout=10, max_retries=3)
+
+    def tearDown(self):
+        self.time_patch.stop()
+        self.random_patch.stop()
+
+    def test_request_sends_the_request_through_the_session(self):
+        '''Required to reuse the pooled connections'''
+
+        self.session.request.return_value = response(200)
+
+        result = self.transport.request('GET', 'url')
+
+        self.assertEqual(result, self.session.request.return_value)
+        self.assertEqual(
+            self.session.request.assert_called_with('GET', 'url', timeout=10),
+            None,
+        )
+        self.assertFalse(self.time.sleep.called)
+
+    def test_request_retries_transient_errors_with_backoff(self):
+        '''Required to survive the transient errors of the server'''
+
+        self.session.request.side_effect = [
+            response(502),
+            response(503),
+            response(200),
+        ]
+
+        result = self.transport.request('PUT', 'url')
+
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(
+            self.time.sleep.mock_calls,
+            [call(0.5), call(1.0)],
+        )
+        self.assertEqual(self.transport.stats.retries, 2)
+
+    def test_request_honours_retry_after(self):
+        '''Required to wait the time the server asks for when it throttles'''
+
+        self.session.request.side_effect = [
+            response(429, {'Retry-After': '7'}),
+            response(200),
+        ]
+
+        self.transport.request('POST', 'url')
+
+        self.assertEqual(self.time.sleep.mock_calls, [call(7.0)])
+        self.assertEqual(self.transport.stats.throttled, 1)
+
+    def test_request_rewinds_the_streamed_bodies(self):
+        '''Required to send the whole attachment again when it's throttled'''
+
+        body = io.BytesIO(b'attachment')
+        sent = []
+
+        def request_side_effect(method, url, data, timeout):
+            sent.append(data.read())
+            return response(200 if len(sent) > 1 else 429)
+        self.session.request.side_effect = request_side_effect
+
+        self.transport.request('POST', 'url', data=body)
+
+        self.assertEqual(sent, [b'attachment', b'attachment'])
+
+    def test_request_does_not_retry_non_idempotent_errors(self):
+        '''A POST that failed in the server may have been applied, sending it
+        again could duplicate a page'''
+
+        self.session.request.return_value = response(502)
+
+        result = self.transport.request('POST', 'url')
+
+        self.assertEqual(result.status_code, 502)
+        self.assertEqual(self.session.request.call_count, 1)
+
+    def test_request_gives_up_after_max_retries(self):
+        '''Required to report the errors that don't go away'''
+
+        self.session.request.return_value = response(503)
+
+        result = self.transport.request('GET', 'url')
+
+        self.assertEqual(result.status_code, 503)
+        self.assertEqual(self.session.request.call_count, 4)
+
+    def test_request_retries_idempotent_connection_errors(self):
+        '''Required to survive the dropped connections'''
+
+        self.session.request.side_effect = [ConnectionError(), response(200)]
+
+        result = self.transport.request('GET', 'url')
+
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(self.transport.stats.errors, 1)
+
+    def test_request_raises_non_idempotent_connection_errors(self):
+        '''Required to avoid duplicating the pages'''
+
+        self.session.request.side_effect = ConnectionError()
+
+        with self.assertRaises(ConnectionError):
+            self.transport.request('POST', 'url')
+
+    def test_throttled_responses_shrink_the_concurrency(self):
+        '''Required to adapt the concurrency to the throttling'''
+
+        self.transport.limiter.limit = 8
+        self.session.request.side_effect = [
+            response(429, {'Retry-After': '0'}),
+            response(200),
+        ]
+
+        self.transport.request('GET', 'url')
+
+        self.assertEqual(self.transport.limiter.limit, 4.25)
+
+    def test_request_records_each_attempt_in_the_metrics(self):
+        '''Required to measure the latency and size of the requests'''
+
+        metrics = Mock()
+        self.transport.metrics = metrics
+        self.time.perf_counter.side_effect = [0, 0.5, 1, 1.25]
+        written = response(200)
+        written.content = b'{"id": "1"}'
+        self.session.request.side_effect = [ConnectionError(), written]
+
+        self.transport.request(
+            'PUT',
+            'url',
+            endpoint='/content/{id}',
+            data='{}',
+        )
+
+        self.assertEqual(metrics.observe_request.mock_calls, [
+            call('PUT', '/content/{id}', 'error', 0.5, sent=2, received=0),
+            call('PUT', '/content/{id}', 200, 0.25, sent=2, received=11),
+        ])
+
+
+    def test_request_waits_for_the_rate_limiter(self):
+        '''Required to keep several transports under a shared budget of
+        requests'''
+
+        limiter = AdaptiveLimiter(4)
+        rate_limiter = Mock()
+        transport = Transport(
+            self.session,
+            limiter=limiter,
+            rate_limiter=rate_limiter,
+        )
+        self.session.request.return_value = response(200)
+
+        transport.request('GET', 'url')
+
+        self.assertEqual(transport.limiter, limiter)
+        self.assertTrue(rate_limiter.acquire.called)
+
+
+class TestRateLimiter(unittest.TestCase):
+    '''Test class for the RateLimiter class'''
+
+    @patch('git2sc.transport.time', autospec=True)
+    def test_requests_wait_for_their_slot(self, timeMock):
+        timeMock.monotonic.return_value = 100
+        limiter = RateLimiter(10, burst=2)
+
+        for _ in range(4):
+            limiter.acquire()
+
+        self.assertEqual(
+            [round(sleep[1][0], 3) for sleep in timeMock.sleep.mock_calls],
+            [0.1, 0.2],
+        )
+
+    @patch('git2sc.transport.time', autospec=True)
+    def test_budget_refills_with_time(self, timeMock):
+        timeMock.monotonic.return_value = 100
+        limiter = RateLimiter(10)
+        limiter.acquire()
+
+        timeMock.monotonic.return_value = 101
+        limiter.acquire()
+
+        self.assertFalse(timeMock.sleep.called)
+
+
+class TestAdaptiveLimiter(unittest.TestCase):
+    '''Test class for the AdaptiveLimiter class'''
+
+    def test_limit_decreases_multiplicatively(self):
+        limiter = AdaptiveLimiter(16)
+        limiter.acquire()
+        limiter.release(throttled=True)
+        self.assertEqual(limiter.limit, 8)
+
+    def test_limit_increases_additively_up_to_max(self):
+        limiter = AdaptiveLimiter(16)
+        limiter.limit = 4
+        for _ in range(4):
+            limiter.acquire()
+            limiter.release()
+        self.assertTrue(4.9 < limiter.limit < 5)
+
+        limiter.limit = 16
+        limiter.acquire()
+        limiter.release()
+        self.assertEqual(limiter.limit, 16)
+
+    def test_limit_never_goes_under_min(self):
+        limiter = AdaptiveLimiter(2)
+        for _ in range(4):
+            limiter.acquire()
+            limiter.release(throttled=True)
+        self.assertEqual(limiter.limit, 1)
+
+
+class TestRetryAfter(unittest.TestCase):
+    '''Test class for the retry_after function'''
+
+    def test_can_parse_seconds(self):
+        self.assertEqual(retry_after(response(429, {'Retry-After': '3'})), 3)
+
+    def test_can_parse_dates_in_the_past(self):
+        self.assertEqual(
+            retry_after(
+                response(429, {'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'})
+            ),
+            0,
+        )
+
+    def test_returns_none_without_header(self):
+        self.assertEqual(retry_after(response(429)), None)
+        self.assertEqual(
+            retry_after(response(429, {'Retry-After': 'soon'})),
+            None,
+        )
+
+
+class TestTransportStats(unittest.TestCase):
+    '''Test class for the TransportStats class'''
+
+    @patch('git2sc.transport.time', autospec=True)
+    def test_summary_reports_the_throughput(self, timeMock):
+        timeMock.time.return_value = 0
+        stats = TransportStats()
+        stats.add(requests=20, retries=2, throttled=1)
+        timeMock.time.return_value = 10
+
+        self.assertEqual(
+            stats.summary(),
+            '20 requests in 10.0s (2.0 req/s), 2 retries, 1 throttled, '
+            '0 errors',
+        )
@@ -0,0 +1,154 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from git2sc.watch import TreeWatcher, Changes, IN_Q_OVERFLOW
+
+
+class TestTreeWatcher(unittest.TestCase):
+    '''Test class for the TreeWatcher class'''
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.path, 'a'))
+        os.makedirs(os.path.join(self.path, '.git'))
+        self.write('README.md')
+        self.write('a/article.md')
+        self.watcher = TreeWatcher(self.path, ['.git'])
+        self.watcher.start()
+
+    def tearDown(self):
+        self.watcher.close()
+        shutil.rmtree(self.path)
+
+    def write(self, relative_path, content='content'):
+        with open(os.path.join(self.path, relative_path), 'w') as f:
+            f.write(content)
+
+    def join(self, *relative_paths):
+        return {
+            os.path.join(self.path, relative_path)
+            for relative_path in relative_paths
+        }
+
+    def wait(self):
+        return self.watcher.wait(debounce=0.05, max_delay=1, poll=0.05)
+
+    def test_watches_the_directories_of_the_tree(self):
+        '''Required to ensure that the excluded directories are not
+        watched'''
+
+        self.assertEqual(
+            sorted(self.watcher.directories.values()),
+            [self.path, os.path.join(self.path, 'a')],
+        )
+
+    def test_written_files_are_changed(self):
+        self.write('a/article.md', 'new content')
+        self.write('a/new.md')
+
+        changes = self.wait()
+
+        self.assertEqual(
+            changes.changed,
+            self.join('a/article.md', 'a/new.md'),
+        )
+        self.assertEqual(changes.deleted, set())
+
+    def test_removed_files_are_deleted(self):
+        os.remove(os.path.join(self.path, 'a', 'article.md'))
+
+        changes = self.wait()
+
+        self.assertEqual(changes.changed, set())
+        self.assertEqual(changes.deleted, self.join('a/article.md'))
+
+    def test_moved_files_are_deleted_and_changed(self):
+        os.rename(
+            os.path.join(self.path, 'a', 'article.md'),
+            os.path.join(self.path, 'moved.md'),
+        )
+
+        changes = self.wait()
+
+        self.assertEqual(changes.changed, self.join('moved.md'))
+        self.assertEqual(changes.deleted, self.join('a/article.md'))
+
+    def test_new_directories_are_watched(self):
+        '''Required to ensure that the files of the directories created
+        after the start are synced'''
+
+        os.makedirs(os.path.join(self.path, 'b', 'c'))
+        self.write('b/c/article.md')
+        changes = self.wait()
+        self.assertEqual(changes.changed, self.join('b/c/article.md'))
+
+        self.write('b/c/other.md')
+        changes = self.wait()
+        self.assertEqual(changes.changed, self.join('b/c/other.md'))
+
+    def test_removed_directories_delete_their_files(self):
+        shutil.rmtree(os.path.join(self.path, 'a'))
+
+        changes = self.wait()
+
+        self.assertEqual(changes.deleted, self.join('a/article.md'))
+        self.assertEqual(list(self.watcher.directories.values()), [self.path])
+
+    def test_excluded_items_are_ignored(self):
+        self.write('.git/index')
+        stop = threading.Event()
+        timer = threading.Timer(0.2, stop.set)
+        timer.start()
+
+        changes = self.watcher.wait(debounce=0.05, stop=stop, poll=0.05)
+        timer.join()
+
+        self.assertFalse(changes)
+
+    def test_burst_of_changes_is_one_batch(self):
+        '''Required to sync a checkout at once instead of file by file'''
+
+        for number in range(20):
+            self.write('article_{}.md'.format(number))
+        self.write('README.md', 'new content')
+        os.remove(os.path.join(self.path, 'a', 'article.md'))
+
+        changes = self.wait()
+
+        self.assertEqual(len(changes.changed), 21)
+        self.assertEqual(changes.deleted, self.join('a/article.md'))
+
+    def test_wait_returns_when_stopped(self):
+        stop = threading.Event()
+        stop.set()
+
+        changes = self.watcher.wait(stop=stop)
+
+        self.assertFalse(changes)
+
+    def test_overflow_is_reported(self):
+        '''Required to fall back to a full sync when the kernel drops
+        events'''
+
+        changes = Changes()
+        self.watcher._apply((-1, IN_Q_OVERFLOW, 0, ''), changes)
+
+        self.assertTrue(changes.overflow)
+        self.assertTrue(changes)
+
+
+class TestChanges(unittest.TestCase):
+    '''Test class for the Changes class'''
+
+    def test_the_last_event_of_a_file_wins(self):
+        changes = Changes()
+
+        changes.change('a.md')
+        changes.delete('a.md')
+        changes.delete('b.md')
+        changes.change('b.md')
+
+        self.assertEqual(changes.changed, {'b.md'})
+        self.assertEqual(changes.deleted, {'a.md'})